@@ -249,6 +249,13 @@ class ComputationError(InaSAFEError):
     pass
 
 
+class AnalysisCanceledError(InaSAFEError):
+
+    """When the analysis is canceled through its feedback."""
+
+    pass
+
+
 class NoFeaturesInExtentError(InaSAFEError):
 
     """An exception that gets thrown when no features are within the extent
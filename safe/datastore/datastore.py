@@ -8,7 +8,7 @@ from abc import ABCMeta, abstractmethod
 from qgis.core import QgsRasterLayer, QgsVectorLayer, QgsWkbTypes
 
 from safe.utilities.i18n import tr
-from safe.utilities.keyword_io import KeywordIO
+from safe.utilities.metadata import write_iso19115_metadata
 from safe.utilities.utilities import monkey_patch_keywords
 from future.utils import with_metaclass
 
@@ -127,16 +127,20 @@ class DataStore(with_metaclass(ABCMeta, object)):
                 'Layer saved {layer_name}'.format(layer_name=result[1]))
 
         try:
-            layer.keywords
-            real_layer = self.layer(result[1])
-            if isinstance(real_layer, bool):
+            keywords = layer.keywords
+        except AttributeError:
+            keywords = None
+
+        if keywords is not None:
+            # The keywords are written next to the new layer, without
+            # opening it.
+            uri = self.layer_uri(result[1])
+            if uri is None:
                 message = ('{name} was not found in the datastore or the '
                            'layer was not valid.'.format(name=result[1]))
                 LOGGER.debug(message)
                 return False, message
-            KeywordIO().write_keywords(real_layer, layer.keywords)
-        except AttributeError:
-            pass
+            write_iso19115_metadata(uri, keywords)
 
         return result
 
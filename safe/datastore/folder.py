@@ -2,30 +2,51 @@
 
 """Folder datastore implementation."""
 
-from itertools import product
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from osgeo import ogr
 
 from qgis.PyQt.QtCore import QFileInfo, QDir, QFile
 from qgis.core import (
     QgsVectorFileWriter,
+    QgsRasterLayer,
     QgsRasterPipe,
     QgsRasterFileWriter,
-    QgsCoordinateTransform
+    QgsCoordinateTransform,
+    QgsVectorLayer,
 )
 
 from safe.common.exceptions import ErrorDataStore
 from safe.datastore.datastore import DataStore
-from safe.utilities.utilities import human_sorting
+from safe.utilities.utilities import human_sorting, monkey_patch_keywords
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
-VECTOR_EXTENSIONS = ('shp', 'kml', 'geojson')
+LOGGER = logging.getLogger('InaSAFE')
+
+VECTOR_EXTENSIONS = ('shp', 'kml', 'geojson', 'gpkg', 'fgb')
+# OGR driver of each vector format.
+OGR_DRIVERS = {
+    'shp': 'ESRI Shapefile',
+    'kml': 'KML',
+    'geojson': 'GeoJSON',
+    'gpkg': 'GPKG',
+    # FlatGeobuf needs GDAL 3.1.
+    'fgb': 'FlatGeobuf',
+}
 RASTER_EXTENSIONS = ('asc', 'tiff', 'tif')
 TABULAR_EXTENSIONS = ('csv',)
 EXTENSIONS = RASTER_EXTENSIONS + VECTOR_EXTENSIONS + TABULAR_EXTENSIONS
 
+# The index of the layers written by the datastore, hidden in the folder.
+MANIFEST_FILE = '.datastore.json'
+
 
 class Folder(DataStore):
     """
@@ -34,6 +55,9 @@ class Folder(DataStore):
     A folder based data store is a collection of shape files and tiff images
     stored in a common folder.
 
+    The layers written by the datastore are kept in a manifest, saved in the
+    folder, so they are found without listing the folder.
+
     .. versionadded:: 4.0
     """
 
@@ -56,6 +80,8 @@ class Folder(DataStore):
         else:
             raise ErrorDataStore('Unknown type')
 
+        self._manifest = self._read_manifest()
+
     @property
     def default_vector_format(self):
         """Default vector format for the folder datastore.
@@ -69,11 +95,20 @@ class Folder(DataStore):
     def default_vector_format(self, default_format):
         """Set the default vector format for the folder datastore.
 
+        GeoPackage and FlatGeobuf are binary formats, faster to write and to
+        read again than GeoJSON. Each layer is still a file with its own
+        metadata next to it. A format not supported by GDAL is ignored.
+
         :param default_format: The default output format.
-            It can be 'shp', 'geojson' or 'kml'.
+            It can be 'shp', 'geojson', 'kml', 'gpkg' or 'fgb'.
         :param default_format: str
         """
         if default_format in VECTOR_EXTENSIONS:
+            if ogr.GetDriverByName(OGR_DRIVERS[default_format]) is None:
+                LOGGER.info(
+                    'The vector format %s is not supported by GDAL.'
+                    % default_format)
+                return
             self._default_vector_format = default_format
 
     @property
@@ -122,9 +157,97 @@ class Folder(DataStore):
         files = human_sorting([QFileInfo(f).baseName() for f in files])
         return files
 
+    @property
+    def manifest_path(self):
+        """Path of the manifest of the layers written by the datastore.
+
+        :return: The path of the JSON file.
+        :rtype: str
+
+        .. versionadded:: 5.0
+        """
+        return self.uri.filePath(MANIFEST_FILE)
+
+    def _read_manifest(self):
+        """Read the manifest written by a previous datastore in the folder.
+
+        :return: The layers by name.
+        :rtype: OrderedDict
+
+        .. versionadded:: 5.0
+        """
+        if not os.path.exists(self.manifest_path):
+            return OrderedDict()
+        try:
+            with open(self.manifest_path) as manifest:
+                return json.load(manifest, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            LOGGER.info('The datastore manifest %s is not valid.'
+                        % self.manifest_path)
+            return OrderedDict()
+
+    def _add_to_manifest(self, layer, output):
+        """Add a layer written by the datastore to the manifest.
+
+        :param layer: The layer which has been written.
+        :type layer: QgsMapLayer
+
+        :param output: The file of the layer.
+        :type output: QFileInfo
+
+        .. versionadded:: 5.0
+        """
+        if isinstance(layer, QgsVectorLayer):
+            feature_count = layer.featureCount()
+        else:
+            feature_count = None
+        extent = layer.extent()
+        if extent.isNull():
+            extent = None
+        else:
+            extent = [
+                extent.xMinimum(),
+                extent.yMinimum(),
+                extent.xMaximum(),
+                extent.yMaximum()]
+
+        self._manifest[output.baseName()] = OrderedDict([
+            ('path', output.fileName()),
+            ('format', output.suffix()),
+            ('feature_count', feature_count),
+            ('extent', extent),
+        ])
+        try:
+            with open(self.manifest_path, 'w') as manifest:
+                json.dump(self._manifest, manifest, indent=2)
+        except IOError:
+            LOGGER.info('The datastore manifest %s can not be written.'
+                        % self.manifest_path)
+
+    def layer_info(self, layer_name):
+        """Information about a layer written by the datastore.
+
+        :param layer_name: The name of the layer.
+        :type layer_name: str
+
+        :return: The path relative to the folder, the format, the feature
+            count and the extent of the layer. None if the layer has not been
+            written by the datastore.
+        :rtype: dict
+
+        .. versionadded:: 5.0
+        """
+        info = self._manifest.get(layer_name)
+        if info is None:
+            return None
+        return dict(info)
+
     def layer_uri(self, layer_name):
         """Get layer URI.
 
+        The manifest is used first. Otherwise, a file with this name is looked
+        for with each extension supported.
+
         :param layer_name: The name of the layer to fetch.
         :type layer_name: str
 
@@ -133,16 +256,48 @@ class Folder(DataStore):
 
         .. versionadded:: 4.0
         """
-        layers = self.layers()
-        for layer, extension in product(layers, EXTENSIONS):
+        info = self._manifest.get(layer_name)
+        if info is not None:
+            one_file = QFileInfo(self.uri.filePath(info['path']))
+            if one_file.exists():
+                return one_file.absoluteFilePath()
+
+        for extension in EXTENSIONS:
             one_file = QFileInfo(
-                self.uri.filePath(layer + '.' + extension))
+                self.uri.filePath(layer_name + '.' + extension))
             if one_file.exists():
-                if one_file.baseName() == layer_name:
-                    return one_file.absoluteFilePath()
+                return one_file.absoluteFilePath()
         else:
             return None
 
+    def layer(self, layer_name):
+        """Get QGIS layer.
+
+        The provider is known from the format of the layers in the manifest.
+
+        :param layer_name: The name of the layer to fetch.
+        :type layer_name: str
+
+        :return: The QGIS layer.
+        :rtype: QgsMapLayer
+
+        .. versionadded:: 4.0
+        """
+        info = self._manifest.get(layer_name)
+        if info is None:
+            return super(Folder, self).layer(layer_name)
+
+        uri = self.layer_uri(layer_name)
+        if info['format'] in RASTER_EXTENSIONS:
+            layer = QgsRasterLayer(uri, layer_name)
+        else:
+            layer = QgsVectorLayer(uri, layer_name, 'ogr')
+        if not layer.isValid():
+            return super(Folder, self).layer(layer_name)
+
+        monkey_patch_keywords(layer)
+        return layer
+
     def _add_tabular_layer(self, tabular_layer, layer_name, save_style=False):
         """Add a tabular layer to the folder.
 
@@ -177,6 +332,7 @@ class Folder(DataStore):
             tabular_layer.saveNamedStyle(style_path.absoluteFilePath())
 
         assert output.exists()
+        self._add_to_manifest(tabular_layer, output)
         return True, output.baseName()
 
     def _add_vector_layer(self, vector_layer, layer_name, save_style=False):
@@ -205,24 +361,19 @@ class Folder(DataStore):
         output = QFileInfo(
             self.uri.filePath(layer_name + '.' + self._default_vector_format))
 
-        driver_mapping = {
-            'shp': 'ESRI Shapefile',
-            'kml': 'KML',
-            'geojson': 'GeoJSON',
-        }
-
         QgsVectorFileWriter.writeAsVectorFormat(
             vector_layer,
             output.absoluteFilePath(),
             'utf-8',
             QgsCoordinateTransform(),  # No tranformation
-            driver_mapping[self._default_vector_format])
+            OGR_DRIVERS[self._default_vector_format])
 
         if save_style:
             style_path = QFileInfo(self.uri.filePath(layer_name + '.qml'))
             vector_layer.saveNamedStyle(style_path.absoluteFilePath())
 
         assert output.exists()
+        self._add_to_manifest(vector_layer, output)
         return True, output.baseName()
 
     def _add_raster_layer(self, raster_layer, layer_name, save_style=False):
@@ -281,4 +432,5 @@ class Folder(DataStore):
             raster_layer.saveNamedStyle(style_path.absoluteFilePath())
 
         assert output.exists()
+        self._add_to_manifest(raster_layer, output)
         return True, output.baseName()
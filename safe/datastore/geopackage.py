@@ -11,15 +11,40 @@ Contact : ole.moller.nielsen@gmail.com
 
 """
 
-from qgis.PyQt.QtCore import QFileInfo
+import logging
+import os
+from collections import OrderedDict
+
+from qgis.PyQt.QtCore import QFileInfo, QDate, QDateTime, QTime, Qt
 from osgeo import ogr, osr, gdal
-from qgis.core import (
-    QgsVectorLayer,
-)
+from qgis.core import NULL
 
 from safe.common.exceptions import ErrorDataStore
 from safe.datastore.datastore import DataStore
-from safe.definitions.gis import QGIS_OGR_GEOMETRY_MAP
+from safe.definitions.gis import QGIS_OGR_FIELD_TYPE_MAP, QGIS_OGR_GEOMETRY_MAP
+
+LOGGER = logging.getLogger('InaSAFE')
+
+VECTOR = 'vector'
+RASTER = 'raster'
+
+
+def ogr_value(value):
+    """Convert an attribute value from QGIS to a value accepted by OGR.
+
+    :param value: The attribute value of a QGIS feature.
+    :type value: object
+
+    :return: The value for ogr.Feature.SetField, None for a NULL value.
+    :rtype: object
+    """
+    if value is None or value == NULL:
+        return None
+    if isinstance(value, (QDate, QDateTime, QTime)):
+        return value.toString(Qt.ISODate)
+    if isinstance(value, bool):
+        return int(value)
+    return value
 
 
 class GeoPackage(DataStore):
@@ -39,6 +64,14 @@ class GeoPackage(DataStore):
         .. versionadded:: 4.0
         """
         super(GeoPackage, self).__init__(uri)
+        # The OGR connection kept open between the operations, see
+        # _datasource.
+        self._connection = None
+        self._connection_update = False
+        # The layers in the geopackage, with their type, and the signature of
+        # the file when they have been listed.
+        self._layers = None
+        self._layers_signature = None
         self.vector_driver = ogr.GetDriverByName('GPKG')
         self.raster_driver = gdal.GetDriverByName('GPKG')
 
@@ -100,6 +133,94 @@ class GeoPackage(DataStore):
         else:
             return True
 
+    def _datasource(self, update=False):
+        """Return the OGR connection to the geopackage.
+
+        The connection is kept open, so the geopackage is not opened again
+        for each operation. It is opened again in update mode if needed.
+
+        :param update: If the connection is used to write.
+        :type update: bool
+
+        :return: The OGR datasource.
+        :rtype: ogr.DataSource
+
+        .. versionadded:: 5.0
+        """
+        if self._connection is None or (
+                update and not self._connection_update):
+            self.close()
+            self._connection = self.vector_driver.Open(
+                self.uri.absoluteFilePath(), update)
+            self._connection_update = update
+            if self._connection is None:
+                raise ErrorDataStore(
+                    'Unable to open the geopackage %s.'
+                    % self.uri.absoluteFilePath())
+        return self._connection
+
+    def close(self):
+        """Close the OGR connection to the geopackage.
+
+        It is opened again by the next operation. It must be closed before
+        another library writes to the geopackage.
+
+        .. versionadded:: 5.0
+        """
+        if self._connection is not None:
+            self._connection.SyncToDisk()
+            self._connection = None
+            self._connection_update = False
+
+    def _signature(self):
+        """Signature of the geopackage file, to know if it has changed.
+
+        :return: The modification time and the size of the file.
+        :rtype: tuple
+
+        .. versionadded:: 5.0
+        """
+        status = os.stat(self.uri.absoluteFilePath())
+        return status.st_mtime_ns, status.st_size
+
+    def _list_layers(self):
+        """Return the layers in the geopackage with their type.
+
+        The list is kept until the file is changed by another datastore or
+        another program.
+
+        :return: The type of each layer, vector or raster, by name.
+        :rtype: OrderedDict
+
+        .. versionadded:: 5.0
+        """
+        signature = self._signature()
+        if self._layers is None or signature != self._layers_signature:
+            layers = OrderedDict()
+            vector_datasource = self._datasource()
+            for i in range(vector_datasource.GetLayerCount()):
+                layers[vector_datasource.GetLayer(i).GetName()] = VECTOR
+            for name in self._read_raster_layers():
+                layers[name] = RASTER
+            self._layers = layers
+            self._layers_signature = signature
+        return self._layers
+
+    def _layer_added(self, layer_name, layer_type):
+        """Add a layer written by this datastore to the list of layers.
+
+        :param layer_name: The name of the new layer.
+        :type layer_name: str
+
+        :param layer_type: The type of the layer, vector or raster.
+        :type layer_type: str
+
+        .. versionadded:: 5.0
+        """
+        if self._layers is not None:
+            self._layers[layer_name] = layer_type
+            self._layers_signature = self._signature()
+
     def _vector_layers(self):
         """Return a list of vector layers available.
 
@@ -108,13 +229,9 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
-        layers = []
-        vector_datasource = self.vector_driver.Open(
-            self.uri.absoluteFilePath())
-        if vector_datasource:
-            for i in range(vector_datasource.GetLayerCount()):
-                layers.append(vector_datasource.GetLayer(i).GetName())
-        return layers
+        return [
+            name for name, layer_type in list(self._list_layers().items())
+            if layer_type == VECTOR]
 
     def _raster_layers(self):
         """Return a list of raster layers available.
@@ -124,6 +241,18 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
+        return [
+            name for name, layer_type in list(self._list_layers().items())
+            if layer_type == RASTER]
+
+    def _read_raster_layers(self):
+        """Read the list of raster layers from the geopackage.
+
+        :return: List of raster layers available in the geopackage.
+        :rtype: list
+
+        .. versionadded:: 5.0
+        """
         layers = []
 
         raster_datasource = gdal.Open(self.uri.absoluteFilePath())
@@ -165,23 +294,22 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
-        for layer in self._vector_layers():
-            if layer == layer_name:
-                uri = '{}|layername={}'.format(
-                    self.uri.absoluteFilePath(), layer_name)
-                return uri
+        layer_type = self._list_layers().get(layer_name)
+        if layer_type == VECTOR:
+            return '{}|layername={}'.format(
+                self.uri.absoluteFilePath(), layer_name)
+        elif layer_type == RASTER:
+            return 'GPKG:{}:{}'.format(
+                self.uri.absoluteFilePath(), layer_name)
         else:
-            for layer in self._raster_layers():
-                if layer == layer_name:
-                    uri = 'GPKG:{}:{}'.format(
-                        self.uri.absoluteFilePath(), layer_name)
-                    return uri
-            else:
-                return None
+            return None
 
     def _add_vector_layer(self, vector_layer, layer_name, save_style=False):
         """Add a vector layer to the geopackage.
 
+        The features are written with a single transaction and the spatial
+        index is created once all of them are written.
+
         :param vector_layer: The layer to add.
         :type vector_layer: QgsVectorLayer
 
@@ -206,21 +334,68 @@ class GeoPackage(DataStore):
 
         geometry = QGIS_OGR_GEOMETRY_MAP[vector_layer.wkbType()]
 
-        spatial_reference = osr.SpatialReference()
-        qgis_spatial_reference = vector_layer.crs().authid()
-        spatial_reference.ImportFromEPSG(
-            int(qgis_spatial_reference.split(':')[1]))
-
-        vector_datasource = self.vector_driver.Open(
-            self.uri.absoluteFilePath(), True)
-        vector_datasource.CreateLayer(layer_name, spatial_reference, geometry)
-        uri = '{}|layerid=0'.format(self.uri.absoluteFilePath())
-        vector_layer = QgsVectorLayer(uri, layer_name, 'ogr')
-
-        data_provider = vector_layer.dataProvider()
-        for feature in vector_layer.getFeatures():
-            data_provider.addFeatures([feature])
-
+        spatial_reference = None
+        if vector_layer.crs().isValid():
+            spatial_reference = osr.SpatialReference()
+            spatial_reference.ImportFromWkt(vector_layer.crs().toWkt())
+
+        # The primary key of a source geopackage is not an attribute to copy,
+        # the new layer has its own one.
+        primary_keys = vector_layer.dataProvider().pkAttributeIndexes()
+        fields = [
+            (index, field) for index, field in enumerate(vector_layer.fields())
+            if index not in primary_keys]
+        names = [field.name().lower() for index, field in fields]
+        fid_column = 'fid'
+        while fid_column in names:
+            fid_column = '_' + fid_column
+
+        vector_datasource = self._datasource(update=True)
+        ogr_layer = vector_datasource.CreateLayer(
+            layer_name,
+            spatial_reference,
+            geometry,
+            ['SPATIAL_INDEX=NO', 'FID=%s' % fid_column])
+        if ogr_layer is None:
+            return False, gdal.GetLastErrorMsg()
+
+        for index, field in fields:
+            field_definition = ogr.FieldDefn(
+                field.name(),
+                QGIS_OGR_FIELD_TYPE_MAP.get(field.type(), ogr.OFTString))
+            ogr_layer.CreateField(field_definition)
+
+        layer_definition = ogr_layer.GetLayerDefn()
+        vector_datasource.StartTransaction()
+        try:
+            for feature in vector_layer.getFeatures():
+                ogr_feature = ogr.Feature(layer_definition)
+                attributes = feature.attributes()
+                for ogr_index, (index, field) in enumerate(fields):
+                    value = ogr_value(attributes[index])
+                    if value is not None:
+                        ogr_feature.SetField(ogr_index, value)
+                if feature.hasGeometry():
+                    ogr_feature.SetGeometry(ogr.CreateGeometryFromWkb(
+                        bytes(feature.geometry().asWkb())))
+                if ogr_layer.CreateFeature(ogr_feature) != 0:
+                    raise ErrorDataStore(gdal.GetLastErrorMsg())
+        except Exception as e:
+            vector_datasource.RollbackTransaction()
+            vector_datasource.DeleteLayer(
+                vector_datasource.GetLayerCount() - 1)
+            return False, str(e)
+        vector_datasource.CommitTransaction()
+
+        # Building the index once is faster than updating it for each feature.
+        if geometry != ogr.wkbNone:
+            result = vector_datasource.ExecuteSQL(
+                "SELECT CreateSpatialIndex('{}', '{}')".format(
+                    layer_name, ogr_layer.GetGeometryColumn()))
+            vector_datasource.ReleaseResultSet(result)
+        ogr_layer.SyncToDisk()
+
+        self._layer_added(layer_name, VECTOR)
         return True, layer_name
 
     def _add_raster_layer(self, raster_layer, layer_name, save_style=False):
@@ -243,6 +418,8 @@ class GeoPackage(DataStore):
 
         .. versionadded:: 4.0
         """
+        # GDAL writes the raster with its own connection.
+        self.close()
 
         source = gdal.Open(raster_layer.source())
         array = source.GetRasterBand(1).ReadAsArray()
@@ -266,6 +443,7 @@ class GeoPackage(DataStore):
         # Once we're done, close properly the dataset
         output = None
         source = None
+        self._layer_added(layer_name, RASTER)
         return True, layer_name
 
     def _add_tabular_layer(self, tabular_layer, layer_name, save_style=False):
@@ -0,0 +1,279 @@
+# coding=utf-8
+
+"""Cache of the prepared hazard layers shared between analyses.
+
+Preparing the hazard (clip, reclassify, polygonize, reproject, clean and union
+with the aggregation) gives the same layers for all analyses using the same
+hazard, classification, analysis extent and aggregation. These layers are
+saved in one GeoPackage per key, next to a JSON file with their keywords.
+The least recently used entries are removed when the cache is too big.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from glob import glob
+from os.path import exists, getsize, join, splitext
+
+from qgis.core import QgsVectorFileWriter, QgsVectorLayer
+
+from safe.common.exceptions import ErrorDataStore
+from safe.common.utilities import unique_filename
+from safe.common.version import get_version
+from safe.gis.tools import decode_full_layer_uri
+from safe.utilities.metadata import copy_layer_keywords
+from safe.utilities.profiling import profile, profiling_event
+from safe.utilities.settings import setting
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Name of the layers in each GeoPackage.
+HAZARD_CACHE_LAYERS = ('hazard', 'aggregate_hazard')
+
+
+def source_signature(full_layer_uri_string):
+    """Signature of the files of a layer: their name, size and modification.
+
+    All files sharing the base name are used, the DBF of a shapefile or the
+    keywords of the layer for instance.
+
+    :param full_layer_uri_string: The layer URI, with the provider type.
+    :type full_layer_uri_string: str
+
+    :returns: The signature or None if the layer is not file based.
+    :rtype: list
+    """
+    path = decode_full_layer_uri(full_layer_uri_string)[0]
+    if not path:
+        return None
+    path = path.split('|')[0]
+    if not exists(path):
+        return None
+
+    signature = []
+    for file_path in sorted(glob(splitext(path)[0] + '.*')):
+        status = os.stat(file_path)
+        signature.append(
+            [os.path.basename(file_path), status.st_size, status.st_mtime_ns])
+    return signature
+
+
+class HazardCache():
+    """On disk cache of the prepared hazard and aggregate hazard layers.
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(self, path=None, maximum_size=None):
+        """Constructor.
+
+        :param path: The folder of the cache. Default to the hazardCachePath
+            setting.
+        :type path: str
+
+        :param maximum_size: The maximum size of the cache in MB. Default to
+            the hazard_cache_size setting.
+        :type maximum_size: int
+        """
+        if path is None:
+            path = setting('hazardCachePath', expected_type=str)
+        if maximum_size is None:
+            maximum_size = setting('hazard_cache_size', expected_type=int)
+        self._path = path
+        self._maximum_size = maximum_size * 1024 * 1024
+        if not exists(self._path):
+            os.makedirs(self._path)
+
+    @property
+    def path(self):
+        """The folder of the cache.
+
+        :returns: The path of the folder.
+        :rtype: str
+        """
+        return self._path
+
+    @staticmethod
+    def key(impact_function):
+        """Key of the prepared hazard layers of an impact function.
+
+        It is a hash of the hazard preparation key of the impact function,
+        the signature of the hazard and aggregation files and the InaSAFE
+        version. A hazard file updated in place gets a new key.
+
+        :param impact_function: The prepared impact function.
+        :type impact_function: ImpactFunction
+
+        :returns: The key, None if the prepared layers can't be cached.
+        :rtype: str
+        """
+        preparation_key = impact_function.hazard_preparation_key()
+        if preparation_key is None:
+            return None
+
+        key = json.loads(preparation_key)
+        key['inasafe_version'] = get_version()
+        key['hazard_source'] = source_signature(key['hazard'])
+        if key['hazard_source'] is None:
+            return None
+        if key['aggregation']:
+            key['aggregation_source'] = source_signature(key['aggregation'])
+            if key['aggregation_source'] is None:
+                return None
+
+        key = json.dumps(key, sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _entry(self, key):
+        """Files of an entry in the cache.
+
+        :param key: The key of the entry.
+        :type key: str
+
+        :returns: The path of the GeoPackage and of the JSON file.
+        :rtype: (str, str)
+        """
+        return join(self._path, key + '.gpkg'), join(self._path, key + '.json')
+
+    def keys(self):
+        """Keys in the cache, the least recently used first.
+
+        :returns: List of keys.
+        :rtype: list
+        """
+        entries = []
+        for metadata in glob(join(self._path, '*.json')):
+            key = splitext(os.path.basename(metadata))[0]
+            if exists(self._entry(key)[0]):
+                entries.append((os.stat(metadata).st_mtime_ns, key))
+        return [key for _, key in sorted(entries)]
+
+    def size(self):
+        """Size of the cache.
+
+        :returns: The size in bytes.
+        :rtype: int
+        """
+        return sum(self._size(key) for key in self.keys())
+
+    def _size(self, key):
+        """Size of an entry in the cache.
+
+        :param key: The key of the entry.
+        :type key: str
+
+        :returns: The size in bytes.
+        :rtype: int
+        """
+        return sum(
+            getsize(path) for path in self._entry(key) if exists(path))
+
+    def remove(self, key):
+        """Remove an entry from the cache.
+
+        :param key: The key of the entry.
+        :type key: str
+        """
+        for path in self._entry(key):
+            if exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for key in self.keys():
+            self.remove(key)
+
+    @profile
+    def layers(self, key):
+        """Get the prepared layers from the cache.
+
+        A hit or a miss is recorded in the profiling.
+
+        :param key: The key of the entry, see HazardCache.key.
+        :type key: str
+
+        :returns: A tuple with the hazard and the aggregate hazard layers,
+            None if they are not in the cache.
+        :rtype: (QgsVectorLayer, QgsVectorLayer)
+        """
+        geopackage, metadata = self._entry(key)
+        if not exists(geopackage) or not exists(metadata):
+            profiling_event('hazard_cache_miss')
+            return None
+
+        with open(metadata) as metadata_file:
+            keywords = json.load(metadata_file)
+
+        layers = []
+        for name in HAZARD_CACHE_LAYERS:
+            layer = QgsVectorLayer(
+                '{}|layername={}'.format(geopackage, name), name, 'ogr')
+            if not layer.isValid():
+                LOGGER.info('The hazard cache entry %s is broken.' % key)
+                self.remove(key)
+                profiling_event('hazard_cache_miss')
+                return None
+            layer.keywords = keywords[name]
+            layers.append(layer)
+
+        # The modification time of the JSON file is the last access.
+        os.utime(metadata)
+        profiling_event('hazard_cache_hit')
+        return tuple(layers)
+
+    @profile
+    def add_layers(self, key, hazard, aggregate_hazard):
+        """Add the prepared layers to the cache.
+
+        The least recently used entries are removed if the cache is bigger
+        than its maximum size.
+
+        :param key: The key of the entry, see HazardCache.key.
+        :type key: str
+
+        :param hazard: The prepared hazard layer.
+        :type hazard: QgsVectorLayer
+
+        :param aggregate_hazard: The prepared aggregate hazard layer.
+        :type aggregate_hazard: QgsVectorLayer
+        """
+        # Another analysis might read or write the same entry, the
+        # GeoPackage is written in a temporary file first.
+        temporary = unique_filename(suffix='.gpkg', dir=self._path)
+        keywords = {}
+        layers = [hazard, aggregate_hazard]
+        for name, layer in zip(HAZARD_CACHE_LAYERS, layers):
+            options = QgsVectorFileWriter.SaveVectorOptions()
+            options.driverName = 'GPKG'
+            options.fileEncoding = 'utf-8'
+            options.layerName = name
+            if exists(temporary):
+                options.actionOnExistingFile = (
+                    QgsVectorFileWriter.CreateOrOverwriteLayer)
+            error, message = QgsVectorFileWriter.writeAsVectorFormat(
+                layer, temporary, options)
+            if error != QgsVectorFileWriter.NoError:
+                if exists(temporary):
+                    os.remove(temporary)
+                raise ErrorDataStore(message)
+            keywords[name] = copy_layer_keywords(layer.keywords)
+
+        geopackage, metadata = self._entry(key)
+        os.replace(temporary, geopackage)
+        with open(metadata, 'w') as metadata_file:
+            json.dump(keywords, metadata_file, default=str)
+
+        size = self.size()
+        for old_key in self.keys():
+            if size <= self._maximum_size:
+                break
+            if old_key == key:
+                continue
+            size -= self._size(old_key)
+            self.remove(old_key)
@@ -128,6 +128,58 @@ class TestFolder(unittest.TestCase):
             data_store.layer_keyword('layer_purpose', 'hazard')
         )
 
+    def test_manifest(self):
+        """Test the layers written are found from the manifest."""
+        path = mkdtemp()
+        data_store = Folder(path)
+        layer = load_test_vector_layer(
+            'hazard', 'flood_multipart_polygons.shp')
+        result, name = data_store.add_layer(layer, 'flood')
+        self.assertTrue(result, name)
+
+        info = data_store.layer_info(name)
+        self.assertEqual(info['path'], 'flood.shp')
+        self.assertEqual(info['format'], 'shp')
+        self.assertEqual(info['feature_count'], layer.featureCount())
+        self.assertEqual(len(info['extent']), 4)
+        self.assertTrue(exists(data_store.manifest_path))
+        self.assertIsNone(data_store.layer_info('fake_layer'))
+
+        # Another datastore on the same folder reads the manifest.
+        data_store = Folder(path)
+        self.assertEqual(data_store.layer_info(name), info)
+        self.assertEqual(
+            normcase(normpath(data_store.layer_uri(name))),
+            normcase(normpath(join(path, 'flood.shp'))))
+        self.assertTrue(data_store.layer(name).isValid())
+
+    def test_binary_vector_formats(self):
+        """Test the binary vector formats with their metadata."""
+        layer = load_test_vector_layer(
+            'gisv4', 'impacts', 'building-points-classified-vector.geojson')
+        for extension in ['gpkg', 'fgb']:
+            path = mkdtemp()
+            data_store = Folder(path)
+            data_store.default_vector_format = extension
+            if data_store.default_vector_format != extension:
+                # FlatGeobuf needs GDAL 3.1.
+                continue
+
+            result, name = data_store.add_layer(layer, 'impact')
+            self.assertTrue(result, name)
+            self.assertEqual(
+                normcase(normpath(data_store.layer_uri(name))),
+                normcase(normpath(join(path, name + '.' + extension))))
+            self.assertTrue(exists(join(path, name + '.xml')))
+
+            imported_layer = data_store.layer(name)
+            self.assertTrue(imported_layer.isValid())
+            self.assertEqual(
+                imported_layer.featureCount(), layer.featureCount())
+            self.assertEqual(
+                imported_layer.keywords['layer_purpose'],
+                layer.keywords['layer_purpose'])
+
     def test_empty_layer(self):
         """Test if we import an empty layer."""
         layer = create_memory_layer(
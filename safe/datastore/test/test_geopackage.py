@@ -11,6 +11,7 @@ Contact : ole.moller.nielsen@gmail.com
 
 """
 
+import sqlite3
 import unittest
 import sys
 from tempfile import mktemp
@@ -123,6 +124,47 @@ class TestGeoPackage(unittest.TestCase):
         result = data_store.add_layer(layer, tabular_layer_name)
         self.assertTrue(result[0])
 
+    @unittest.skipIf(
+        int(gdal.VersionInfo('VERSION_NUM')) < 2000000,
+        'GDAL 2.0 is required for geopackage.')
+    def test_geopackage_vector_layers(self):
+        """Test the features are written to their own layer with an index."""
+        path = QFileInfo(mktemp() + '.gpkg')
+        data_store = GeoPackage(path)
+
+        layer = load_test_vector_layer(
+            'hazard', 'flood_multipart_polygons.shp')
+        self.assertTrue(data_store.add_layer(layer, 'first')[0])
+        aggregation = load_test_vector_layer(
+            'aggregation', 'district_osm_jakarta.geojson')
+        self.assertTrue(data_store.add_layer(aggregation, 'second')[0])
+        data_store.close()
+
+        for name, source in [('first', layer), ('second', aggregation)]:
+            copy = data_store.layer(name)
+            self.assertTrue(copy.isValid())
+            self.assertEqual(copy.featureCount(), source.featureCount())
+            self.assertEqual(
+                sorted(field.name() for field in source.fields()),
+                sorted(
+                    field.name() for field in copy.fields()
+                    if field.name() != 'fid'))
+            expected = next(source.getFeatures())
+            feature = next(copy.getFeatures())
+            for field in source.fields():
+                self.assertEqual(
+                    feature[field.name()], expected[field.name()])
+            self.assertTrue(
+                feature.geometry().equals(expected.geometry()))
+
+        # The spatial index is created after writing the features.
+        connection = sqlite3.connect(path.absoluteFilePath())
+        tables = [row[0] for row in connection.execute(
+            'SELECT table_name FROM gpkg_extensions '
+            'WHERE extension_name = \'gpkg_rtree_index\'')]
+        connection.close()
+        self.assertEqual(sorted(tables), ['first', 'second'])
+
     @unittest.skipIf(
         int(gdal.VersionInfo('VERSION_NUM')) < 2000000,
         'GDAL 2.0 is required for geopackage.')
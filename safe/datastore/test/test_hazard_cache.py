@@ -0,0 +1,76 @@
+# coding=utf-8
+"""Test the cache of the prepared hazard layers."""
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from safe.definitions.constants import INASAFE_TEST
+from safe.test.utilities import get_qgis_app, load_test_vector_layer
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from safe.datastore.hazard_cache import HazardCache
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestHazardCache(unittest.TestCase):
+    """Test the hazard cache."""
+
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_hazard_cache(self):
+        """Test to add and get layers from the cache."""
+        cache = HazardCache(self.path, maximum_size=10)
+        hazard = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        aggregate_hazard = load_test_vector_layer(
+            'gisv4', 'intermediate', 'aggregate_classified_hazard.geojson')
+
+        self.assertIsNone(cache.layers('key'))
+
+        cache.add_layers('key', hazard, aggregate_hazard)
+        self.assertEqual(cache.keys(), ['key'])
+        self.assertGreater(cache.size(), 0)
+
+        layers = cache.layers('key')
+        self.assertIsNotNone(layers)
+        for layer, expected in zip(layers, [hazard, aggregate_hazard]):
+            self.assertTrue(layer.isValid())
+            self.assertEqual(layer.featureCount(), expected.featureCount())
+            self.assertEqual(
+                layer.keywords['layer_purpose'],
+                expected.keywords['layer_purpose'])
+
+        cache.clear()
+        self.assertEqual(cache.keys(), [])
+        self.assertIsNone(cache.layers('key'))
+
+    def test_hazard_cache_eviction(self):
+        """Test the least recently used entries are removed."""
+        cache = HazardCache(self.path, maximum_size=0)
+        hazard = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        aggregate_hazard = load_test_vector_layer(
+            'gisv4', 'intermediate', 'aggregate_classified_hazard.geojson')
+
+        cache.add_layers('first', hazard, aggregate_hazard)
+        # The last entry is kept even if it is too big for the cache.
+        self.assertEqual(cache.keys(), ['first'])
+
+        cache.add_layers('second', hazard, aggregate_hazard)
+        self.assertEqual(cache.keys(), ['second'])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.path, 'first.gpkg')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -76,6 +76,28 @@ APPLICATION_NAME = 'inasafe'
 # InaSAFE Testing QSetting context
 INASAFE_TEST = 'InaSAFETest'
 
+# Number of features changed in a single call to the data provider when
+# writing attributes in bulk.
+BULK_UPDATE_CHUNK_SIZE = 50000
+
+# Maximum width and height, in pixels, of a window read from a raster when it
+# is processed block by block.
+RASTER_TILE_SIZE = 1024
+
+# With the fractional coverage, polygons covering at most this number of cell
+# centres get their zonal statistics from the area of intersection with each
+# cell instead of the cells with their centre in the polygon.
+FRACTIONAL_COVERAGE_CELLS = 16
+
+# Creation options for rasters written block by block.
+TILED_GEOTIFF_OPTIONS = [
+    'TILED=YES',
+    'BLOCKXSIZE=256',
+    'BLOCKYSIZE=256',
+    'COMPRESS=DEFLATE',
+    'BIGTIFF=IF_SAFER',
+]
+
 # Layer properties
 MULTI_EXPOSURE_ANALYSIS_FLAG = 'multi_exposure_analysis'
 
@@ -89,7 +111,7 @@ RASTER_DRIVERS = ['gdal', 'wms', 'wcs', 'grassraster']
 QGIS_DRIVERS = VECTOR_DRIVERS + RASTER_DRIVERS
 
 # Small list of extensions
-OGR_EXTENSIONS = ['shp', 'geojson']
+OGR_EXTENSIONS = ['shp', 'geojson', 'gpkg', 'fgb']
 GDAL_EXTENSIONS = ['asc', 'tif', 'tiff']
 
 # Smoothing mode
@@ -22,6 +22,24 @@ inasafe_default_settings = {
     'developer_mode': False,
     'generate_report': True,
     'memory_profile': False,
+    # Number of processes running the exposures of a multi exposure analysis.
+    'multi_exposure_max_workers': 1,
+    # Run the analysis of the dock and the batch runner in a QGIS task.
+    'run_analysis_in_background': False,
+    # Zonal statistics on small polygons from the area of intersection with
+    # the cells, see FRACTIONAL_COVERAGE_CELLS.
+    'zonal_stats_fractional_coverage': False,
+    # Polygonize rasters with one polygon by class, in tiles of this size in
+    # pixels (0 for a single tile) and with this number of threads.
+    'polygonize_dissolve': False,
+    'polygonize_tile_size': 0,
+    'polygonize_workers': 1,
+    # Clip the hazard raster to a VRT referencing the source window instead
+    # of copying the pixels to a GeoTIFF.
+    'clip_raster_as_vrt': True,
+    # Number of processes running the intersections and the unions, split by
+    # a grid. With 1, the processing algorithms are used.
+    'overlay_workers': 1,
 
     'ISO19115_ORGANIZATION': 'InaSAFE.org',
     'ISO19115_URL': 'http://inasafe.org',
@@ -37,6 +55,12 @@ inasafe_default_settings = {
     'keywordCachePath': join(
         QgsApplication.qgisSettingsDirPath(), 'inasafe', 'metadata.db'),
 
+    # Prepared hazard layers reused between analyses, size in MB.
+    'use_hazard_cache': False,
+    'hazardCachePath': join(
+        QgsApplication.qgisSettingsDirPath(), 'inasafe', 'hazard_cache'),
+    'hazard_cache_size': 512,
+
     # Make sure first to not have cyclic import
     'organisation_logo_path': supporters_logo_path(),
     'north_arrow_path': default_north_arrow_path(),
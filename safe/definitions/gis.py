@@ -3,6 +3,7 @@
 """Utilities for GIS package."""
 
 from osgeo import ogr
+from qgis.PyQt.QtCore import QVariant
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -20,3 +21,17 @@ QGIS_OGR_GEOMETRY_MAP = {
     6: ogr.wkbMultiPolygon,
     100: ogr.wkbNone
 }
+
+# From QVariant types to OGR field types, used when writing with OGR.
+QGIS_OGR_FIELD_TYPE_MAP = {
+    QVariant.Bool: ogr.OFTInteger,
+    QVariant.Int: ogr.OFTInteger,
+    QVariant.UInt: ogr.OFTInteger64,
+    QVariant.LongLong: ogr.OFTInteger64,
+    QVariant.ULongLong: ogr.OFTInteger64,
+    QVariant.Double: ogr.OFTReal,
+    QVariant.String: ogr.OFTString,
+    QVariant.Date: ogr.OFTDate,
+    QVariant.Time: ogr.OFTTime,
+    QVariant.DateTime: ogr.OFTDateTime,
+}
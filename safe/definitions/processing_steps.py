@@ -139,3 +139,8 @@ zonal_stats_steps = {
     'step_name': tr('Zonal statistics'),
     'output_layer_name': 'zonal_stats',
 }
+
+raster_zonal_stats_steps = {
+    'step_name': tr('Raster zonal statistics'),
+    'output_layer_name': 'zonal_stats',
+}
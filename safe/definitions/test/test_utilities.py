@@ -85,6 +85,7 @@ from safe.definitions.utilities import (
     generate_default_profile,
     get_displacement_rate,
     is_affected,
+    HazardProfile,
 )
 
 from safe.utilities.resources import resources_path
@@ -113,6 +114,30 @@ class TestDefinitionsUtilities(unittest.TestCase):
         keyword_definition = definition(keyword)
         self.assertTrue('description' in keyword_definition)
 
+    def test_definition_registry(self):
+        """Test the registry gives the same result as scanning definitions."""
+        def scan(keyword, key=None):
+            for item in dir(definitions):
+                if not item.startswith("__"):
+                    var = getattr(definitions, item)
+                    if isinstance(var, dict):
+                        if (var.get('key') == keyword or
+                                var.get(key) == keyword):
+                            return var
+            return None
+
+        for item in dir(definitions):
+            var = getattr(definitions, item)
+            if isinstance(var, dict) and isinstance(var.get('key'), str):
+                self.assertIs(scan(var['key']), definition(var['key']))
+            if isinstance(var, dict) and 'field_name' in var:
+                self.assertIs(
+                    scan(var['field_name'], 'field_name'),
+                    definition(var['field_name'], 'field_name'))
+
+        self.assertIsNone(definition('Mega flux capacitor'))
+        self.assertIs(scan(None), definition(None))
+
     def test_get_name(self):
         """Test get_name method."""
         flood_name = get_name(hazard_flood['key'])
@@ -637,6 +662,50 @@ class TestDefinitionsUtilities(unittest.TestCase):
         # Should be 0 since it's not affected
         self.assertEqual(value, 0)
 
+    def test_hazard_profile(self):
+        """Test the hazard profile gives the same values as the settings."""
+        qsettings = QSettings(INASAFE_TEST)
+        qsettings.clear()
+        default_profile = generate_default_profile()
+        class_key = flood_hazard_classes['classes'][0]['key']
+        default_profile[
+            hazard_flood['key']][flood_hazard_classes['key']][class_key][
+            'displacement_rate'] = 0.5
+        set_setting('population_preference', default_profile, qsettings)
+
+        hazard_profile = HazardProfile(qsettings)
+        for hazard, classifications in list(default_profile.items()):
+            for classification, classes in list(classifications.items()):
+                for hazard_class in classes:
+                    self.assertEqual(
+                        is_affected(
+                            hazard, classification, hazard_class, qsettings),
+                        hazard_profile.is_affected(
+                            hazard, classification, hazard_class))
+                    self.assertEqual(
+                        get_displacement_rate(
+                            hazard, classification, hazard_class, qsettings),
+                        hazard_profile.displacement_rate(
+                            hazard, classification, hazard_class))
+
+        entry = hazard_profile.lookup(
+            hazard_flood['key'], flood_hazard_classes['key'], class_key)
+        self.assertEqual(0.5, entry.displacement_rate)
+
+        # Random key
+        entry = hazard_profile.lookup('foo', 'bar', 'boom')
+        self.assertEqual(not_exposed_class['key'], entry.affected)
+        self.assertEqual(0, entry.displacement_rate)
+        self.assertEqual(0.0, entry.fatality_rate)
+
+        # The snapshot doesn't change if the settings change.
+        default_profile[
+            hazard_flood['key']][flood_hazard_classes['key']][class_key][
+            'displacement_rate'] = 1
+        set_setting('population_preference', default_profile, qsettings)
+        self.assertEqual(0.5, hazard_profile.displacement_rate(
+            hazard_flood['key'], flood_hazard_classes['key'], class_key))
+
 
 if __name__ == '__main__':
     unittest.main()
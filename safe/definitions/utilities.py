@@ -1,7 +1,7 @@
 # coding=utf-8
 """Utilities module for helping definitions retrieval."""
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from copy import deepcopy
 from os import listdir
 from os.path import join, exists, splitext, split
@@ -16,6 +16,7 @@ from safe.definitions import (
     hazard_all,
     exposure_all,
     hazard_category_all,
+    hazard_classes_all,
     aggregation_fields,
     impact_fields,
     aggregation_name_field,
@@ -160,6 +161,43 @@ def get_fields(
         in_group=True):
     """Get all field based on the layer purpose.
 
+    The list is computed once for each set of parameters, the caller gets a
+    new list each time.
+
+    :param layer_purpose: The layer purpose.
+    :type layer_purpose: str
+
+    :param layer_subcategory: Exposure or hazard value.
+    :type layer_subcategory: str
+
+    :param replace_null: If None all fields are returned, if True only if
+        it's True, if False only if it's False.
+    :type replace_null: None or bool
+
+    :param in_group: Flag to include field in field_groups or not.
+    :type in_group: bool
+
+    :returns: List of fields.
+    :rtype: list
+    """
+    cache_key = (layer_purpose, layer_subcategory, replace_null, in_group)
+    try:
+        fields_for_purpose = _fields_cache.get(cache_key)
+    except TypeError:
+        # Unhashable parameter, we can't cache it.
+        return _get_fields(
+            layer_purpose, layer_subcategory, replace_null, in_group)
+
+    if fields_for_purpose is None:
+        fields_for_purpose = _get_fields(
+            layer_purpose, layer_subcategory, replace_null, in_group)
+        _fields_cache[cache_key] = fields_for_purpose
+    return list(fields_for_purpose)
+
+
+def _get_fields(layer_purpose, layer_subcategory, replace_null, in_group):
+    """Compute all field based on the layer purpose, see get_fields.
+
     :param layer_purpose: The layer purpose.
     :type layer_purpose: str
 
@@ -259,6 +297,75 @@ def get_non_compulsory_fields(layer_purpose, layer_subcategory=None):
     return all_fields
 
 
+def _all_definitions():
+    """Helper to list every definition dict in safe.definitions.
+
+    The order is the same as dir(definitions).
+
+    :returns: List of definitions.
+    :rtype: list
+    """
+    all_definitions = []
+    for item in dir(definitions):
+        if not item.startswith("__"):
+            var = getattr(definitions, item)
+            if isinstance(var, dict):
+                all_definitions.append(var)
+    return all_definitions
+
+
+def _index_definitions(key):
+    """Index every definition dict by the value of one of its keys.
+
+    If many definitions have the same value, the first one is kept, like a
+    scan over dir(definitions) would do.
+
+    :param key: The key to index on.
+    :type key: str
+
+    :returns: Dictionary of value : (position, definition).
+    :rtype: dict
+    """
+    index = {}
+    for position, var in enumerate(_definitions_registry):
+        try:
+            index.setdefault(var.get(key), (position, var))
+        except TypeError:
+            # Unhashable value, it can only be found by a scan.
+            continue
+    return index
+
+
+def _definitions_by(key):
+    """Get the index of definitions on a key, built on the first call.
+
+    :param key: The key to index on.
+    :type key: str
+
+    :returns: Dictionary of value : (position, definition).
+    :rtype: dict
+    """
+    index = _definitions_indexes.get(key)
+    if index is None:
+        index = _index_definitions(key)
+        _definitions_indexes[key] = index
+    return index
+
+
+# Registry of definitions, built once at import time. The module
+# safe.definitions is fully imported at this point.
+_definitions_registry = _all_definitions()
+_definitions_indexes = {}
+_definitions_by('key')
+_definitions_by(None)
+
+# Secondary indexes and caches for the other lookup helpers, filled on the
+# first call.
+_classes_index = {}
+_fields_cache = {}
+_allowed_geometries_cache = {}
+
+
 def definition(keyword, key=None):
     """Given a keyword and a key (optional), try to get a definition
     dict for it.
@@ -274,6 +381,9 @@ def definition(keyword, key=None):
     definition = kio.definition(keyword)
     print definition
 
+    Definitions are looked up in a registry built at import time, so the
+    cost of this function doesn't depend on the number of definitions.
+
     :param keyword: A keyword key.
     :type keyword: str
 
@@ -284,14 +394,21 @@ def definition(keyword, key=None):
         from definitions, otherwise None if no match was found.
     :rtype: dict, None
     """
-
-    for item in dir(definitions):
-        if not item.startswith("__"):
-            var = getattr(definitions, item)
-            if isinstance(var, dict):
-                if var.get('key') == keyword or var.get(key) == keyword:
-                    return var
-    return None
+    try:
+        matches = [
+            _definitions_by('key').get(keyword),
+            _definitions_by(key).get(keyword)]
+    except TypeError:
+        # The keyword is not hashable, we need to scan every definition.
+        for var in _definitions_registry:
+            if var.get('key') == keyword or var.get(key) == keyword:
+                return var
+        return None
+
+    matches = [match for match in matches if match is not None]
+    if not matches:
+        return None
+    return min(matches, key=lambda match: match[0])[1]
 
 
 def get_name(key):
@@ -332,11 +449,26 @@ def get_class_name(class_key, classification_key):
     :returns: The name of the class.
     :rtype: str
     """
-    classification = definition(classification_key)
-    for the_class in classification['classes']:
-        if the_class.get('key') == class_key:
-            return the_class.get('name', class_key)
-    return class_key
+    try:
+        classes = _classes_index.get(classification_key)
+        if classes is None:
+            classes = {}
+            classification = definition(classification_key)
+            for the_class in classification['classes']:
+                classes.setdefault(the_class.get('key'), the_class)
+            _classes_index[classification_key] = classes
+        the_class = classes.get(class_key)
+    except TypeError:
+        # Unhashable key, such as a null QVariant.
+        classification = definition(classification_key)
+        for the_class in classification['classes']:
+            if the_class.get('key') == class_key:
+                return the_class.get('name', class_key)
+        return class_key
+
+    if the_class is None:
+        return class_key
+    return the_class.get('name', class_key)
 
 
 def get_allowed_geometries(layer_purpose_key):
@@ -345,6 +477,27 @@ def get_allowed_geometries(layer_purpose_key):
     :param layer_purpose_key: A layer purpose key.
     :type layer_purpose_key: str
 
+    :returns: List of all allowed geometries.
+    :rtype: list
+    """
+    try:
+        allowed_geometries = _allowed_geometries_cache.get(layer_purpose_key)
+    except TypeError:
+        # Unhashable key, we can't cache it.
+        return _get_allowed_geometries(layer_purpose_key)
+
+    if allowed_geometries is None:
+        allowed_geometries = _get_allowed_geometries(layer_purpose_key)
+        _allowed_geometries_cache[layer_purpose_key] = allowed_geometries
+    return list(allowed_geometries)
+
+
+def _get_allowed_geometries(layer_purpose_key):
+    """Compute all possible geometry, see get_allowed_geometries.
+
+    :param layer_purpose_key: A layer purpose key.
+    :type layer_purpose_key: str
+
     :returns: List of all allowed geometries.
     :rtype: list
     """
@@ -799,3 +952,182 @@ def is_affected(hazard, classification, hazard_class, qsettings=None):
     # noinspection PyUnresolvedReferences
     return preference_data.get(hazard, {}).get(classification, {}).get(
         hazard_class, {}).get('affected', default_affected_value)
+
+
+def _lookup(table, key, default):
+    """Helper to get a value from a table, even with a null QVariant key.
+
+    :param table: The table to use.
+    :type table: dict
+
+    :param key: The key to look for.
+    :type key: tuple
+
+    :param default: The value if the key is not in the table.
+    :type default: object
+
+    :returns: The value from the table.
+    :rtype: object
+    """
+    try:
+        return table.get(key, default)
+    except TypeError:
+        # Unhashable value, such as a null QVariant, can't be in the table.
+        return default
+
+
+HazardClassProfile = namedtuple(
+    'HazardClassProfile', ['affected', 'displacement_rate', 'fatality_rate'])
+
+
+class HazardProfile():
+
+    """Read-only snapshot of the hazard classes used by an analysis.
+
+    The population preference is read from the settings only once, when the
+    object is created. Lookups are then dictionary accesses, giving the same
+    results as is_affected, get_displacement_rate and the fatality rate from
+    the hazard classifications, even if the settings change later.
+
+    .. versionadded:: 5.0
+    """
+
+    __slots__ = ('_population', '_classes')
+
+    def __init__(self, qsettings=None):
+        """Constructor, take the snapshot of the settings.
+
+        :param qsettings: A custom QSettings to use. If it's not defined, it
+            will use the default one.
+        :type qsettings: qgis.PyQt.QtCore.QSettings
+        """
+        default_profile = generate_default_profile()
+        preference_data = setting(
+            'population_preference',
+            default=default_profile,
+            qsettings=qsettings)
+
+        # The preference overrides the default profile, key by key.
+        merged = {}
+        for profile in (default_profile, preference_data):
+            for hazard, classifications in list(profile.items()):
+                for classification, classes in list(classifications.items()):
+                    for hazard_class, values in list(classes.items()):
+                        key = (hazard, classification, hazard_class)
+                        merged.setdefault(key, {}).update(values)
+
+        population = {}
+        for key, values in list(merged.items()):
+            affected = values.get('affected', not_exposed_class['key'])
+            if affected == not_exposed_class['key'] or not affected:
+                displacement_rate = 0
+            else:
+                displacement_rate = values.get('displacement_rate', 0)
+            population[key] = (affected, displacement_rate)
+        self._population = population
+
+        classes = {}
+        for classification in hazard_classes_all:
+            for the_class in classification['classes']:
+                fatality_rate = the_class.get('fatality_rate', 0.0)
+                if fatality_rate is None:
+                    fatality_rate = 0.0
+                key = (classification['key'], the_class['key'])
+                classes[key] = (the_class['affected'], float(fatality_rate))
+        self._classes = classes
+
+    def lookup(self, hazard, classification, hazard_class):
+        """Get the profile of a hazard class for the population.
+
+        :param hazard: The hazard key.
+        :type hazard: basestring
+
+        :param classification: The classification key.
+        :type classification: basestring
+
+        :param hazard_class: The hazard class key.
+        :type hazard_class: basestring
+
+        :returns: The affected flag, displacement rate and fatality rate.
+        :rtype: HazardClassProfile
+        """
+        affected, displacement_rate = _lookup(
+            self._population,
+            (hazard, classification, hazard_class),
+            (not_exposed_class['key'], 0))
+        return HazardClassProfile(
+            affected,
+            displacement_rate,
+            self.fatality_rate(classification, hazard_class))
+
+    def is_affected(
+            self,
+            hazard,
+            classification,
+            hazard_class,
+            exposure=exposure_population['key']):
+        """Get affected flag for hazard in classification in hazard class.
+
+        The population uses the preference from the settings, other
+        exposures use the hazard classification definition.
+
+        :param hazard: The hazard key.
+        :type hazard: basestring
+
+        :param classification: The classification key.
+        :type classification: basestring
+
+        :param hazard_class: The hazard class key.
+        :type hazard_class: basestring
+
+        :param exposure: The exposure key, default to the population.
+        :type exposure: basestring
+
+        :returns: True if it's affected, else False. It can be `not exposed`.
+        :rtype: bool, basestring
+        """
+        if exposure == exposure_population['key']:
+            return _lookup(
+                self._population,
+                (hazard, classification, hazard_class),
+                (not_exposed_class['key'], 0))[0]
+        return _lookup(
+            self._classes,
+            (classification, hazard_class),
+            (not_exposed_class['key'], 0.0))[0]
+
+    def displacement_rate(self, hazard, classification, hazard_class):
+        """Get displacement rate for hazard in classification in hazard class.
+
+        :param hazard: The hazard key.
+        :type hazard: basestring
+
+        :param classification: The classification key.
+        :type classification: basestring
+
+        :param hazard_class: The hazard class key.
+        :type hazard_class: basestring
+
+        :returns: The value of displacement rate. If it's not affected,
+            return 0.
+        :rtype: int
+        """
+        return _lookup(
+            self._population,
+            (hazard, classification, hazard_class),
+            (not_exposed_class['key'], 0))[1]
+
+    def fatality_rate(self, classification, hazard_class):
+        """Get fatality rate for a hazard class in a classification.
+
+        :param classification: The classification key.
+        :type classification: basestring
+
+        :param hazard_class: The hazard class key.
+        :type hazard_class: basestring
+
+        :returns: The fatality rate, 0 if there isn't any fatality model.
+        :rtype: float
+        """
+        return _lookup(
+            self._classes, (classification, hazard_class), (None, 0.0))[1]
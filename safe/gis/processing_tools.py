@@ -2,6 +2,8 @@
 
 """Processing utilities and tools."""
 
+import threading
+
 import processing
 
 from qgis.core import (
@@ -12,11 +14,18 @@ from qgis.core import (
     QgsProject)
 from qgis.analysis import QgsNativeAlgorithms
 
+from safe.common.exceptions import AnalysisCanceledError
+
 __copyright__ = "Copyright 2018, The InaSAFE Project"
 __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+# The feedback of the analysis running in each thread.
+_ANALYSIS_FEEDBACK = threading.local()
+# The coordinate transform context of the analysis running in each thread.
+_ANALYSIS_TRANSFORM_CONTEXT = threading.local()
+
 
 def initialize_processing():
     """
@@ -59,7 +68,13 @@ def create_processing_context(feedback):
     """
     context = QgsProcessingContext()
     context.setFeedback(feedback)
-    context.setProject(QgsProject.instance())
+    transform_context = getattr(
+        _ANALYSIS_TRANSFORM_CONTEXT, 'transform_context', None)
+    if transform_context is not None:
+        # The project must not be used outside of the main thread.
+        context.setTransformContext(transform_context)
+    else:
+        context.setProject(QgsProject.instance())
 
     # skip Processing geometry checks - Inasafe has its own geometry validation
     # routines which have already been used
@@ -71,7 +86,132 @@ def create_processing_feedback():
     """
     Creates a default processing feedback object
 
+    If an analysis with a feedback is running in this thread, its feedback is
+    used so algorithms report their progress and can be canceled.
+
     :return: Processing feedback
     :rtype: QgsProcessingFeedback
     """
+    feedback = analysis_feedback()
+    if feedback is not None:
+        return feedback
     return QgsProcessingFeedback()
+
+
+def set_analysis_feedback(feedback):
+    """Set the feedback of the analysis running in this thread.
+
+    :param feedback: The feedback, None when the analysis is finished.
+    :type feedback: QgsProcessingFeedback
+
+    .. versionadded:: 5.0
+    """
+    _ANALYSIS_FEEDBACK.feedback = feedback
+    _ANALYSIS_FEEDBACK.percent = None
+
+
+def analysis_feedback():
+    """The feedback of the analysis running in this thread.
+
+    :return: The feedback, None if there isn't any.
+    :rtype: QgsProcessingFeedback
+
+    .. versionadded:: 5.0
+    """
+    return getattr(_ANALYSIS_FEEDBACK, 'feedback', None)
+
+
+def set_analysis_transform_context(transform_context):
+    """Set the coordinate transform context of the analysis in this thread.
+
+    An analysis running in a task must not use the project, the context of
+    the project is copied in the main thread and set in the task thread.
+
+    :param transform_context: The context, None when the analysis is
+        finished.
+    :type transform_context: QgsCoordinateTransformContext
+
+    .. versionadded:: 5.0
+    """
+    _ANALYSIS_TRANSFORM_CONTEXT.transform_context = transform_context
+
+
+def analysis_transform_context():
+    """The coordinate transform context of the analysis in this thread.
+
+    :return: The context set for this thread, the one of the project if
+        there isn't any.
+    :rtype: QgsCoordinateTransformContext
+
+    .. versionadded:: 5.0
+    """
+    transform_context = getattr(
+        _ANALYSIS_TRANSFORM_CONTEXT, 'transform_context', None)
+    if transform_context is not None:
+        return transform_context
+    return QgsProject.instance().transformContext()
+
+
+def check_analysis_canceled():
+    """Stop the analysis running in this thread if it has been canceled.
+
+    :raises: AnalysisCanceledError if the feedback has been canceled.
+
+    .. versionadded:: 5.0
+    """
+    feedback = analysis_feedback()
+    if feedback is not None and feedback.isCanceled():
+        raise AnalysisCanceledError
+
+
+def report_progress(current, total):
+    """Report the progress of a loop of the analysis running in this thread.
+
+    It can be called for each feature, the feedback is only updated when the
+    percentage changes. It does nothing if there isn't any feedback.
+
+    :param current: The number of items done.
+    :type current: int
+
+    :param total: The number of items.
+    :type total: int
+
+    :raises: AnalysisCanceledError if the feedback has been canceled.
+
+    .. versionadded:: 5.0
+    """
+    feedback = analysis_feedback()
+    if feedback is None:
+        return
+    if feedback.isCanceled():
+        raise AnalysisCanceledError
+    if total:
+        percent = int(100 * current / total)
+        if percent != _ANALYSIS_FEEDBACK.percent:
+            _ANALYSIS_FEEDBACK.percent = percent
+            feedback.setProgress(percent)
+
+
+def gdal_progress_callback(complete, message, data):
+    """GDAL progress callback reporting to the analysis in this thread.
+
+    :param complete: The progress, between 0 and 1.
+    :type complete: float
+
+    :param message: The message from GDAL.
+    :type message: str
+
+    :param data: The user data given to GDAL, not used.
+    :type data: object
+
+    :return: 0 to stop GDAL if the analysis has been canceled, 1 otherwise.
+    :rtype: int
+
+    .. versionadded:: 5.0
+    """
+    del message, data
+    try:
+        report_progress(complete, 1)
+    except AnalysisCanceledError:
+        return 0
+    return 1
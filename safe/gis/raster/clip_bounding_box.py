@@ -3,8 +3,10 @@
 """Clip a raster by bounding box."""
 
 import logging
+from os.path import abspath, exists
 
 import processing
+from osgeo import gdal
 from qgis.core import QgsRasterLayer
 
 from safe.common.exceptions import ProcessingInstallationError
@@ -13,8 +15,10 @@ from safe.definitions.processing_steps import quick_clip_steps
 from safe.gis.sanity_check import check_layer
 from safe.utilities.gis import is_raster_y_inverted
 from safe.utilities.profiling import profile
+from safe.utilities.settings import setting
 from safe.utilities.utilities import get_error_message
 from safe.gis.processing_tools import (
+    check_analysis_canceled,
     create_processing_context,
     create_processing_feedback,
     initialize_processing)
@@ -28,30 +32,40 @@ LOGGER = logging.getLogger('InaSAFE')
 
 
 @profile
-def clip_by_extent(layer, extent):
-    """Clip a raster using a bounding box using processing.
+def clip_by_extent(layer, extent, virtual=None):
+    """Clip a raster using a bounding box.
 
     Issue https://github.com/inasafe/inasafe/issues/3183
 
+    By default, the clipped raster is a VRT file referencing the window of
+    the source raster, no pixel is copied. Otherwise, the window is copied
+    to a compressed GeoTIFF using processing. Both have the same window and
+    the same Float32 data type.
+
     :param layer: The layer to clip.
     :type layer: QgsRasterLayer
 
     :param extent: The extent.
     :type extent: QgsRectangle
 
+    :param virtual: If the clipped raster is a VRT. Default to the
+        clip_raster_as_vrt setting.
+    :type virtual: bool
+
     :return: Clipped layer.
     :rtype: QgsRasterLayer
 
     .. versionadded:: 4.0
     """
+    if virtual is None:
+        virtual = setting('clip_raster_as_vrt', expected_type=bool)
+
     parameters = dict()
     # noinspection PyBroadException
     try:
         output_layer_name = quick_clip_steps['output_layer_name']
         output_layer_name = output_layer_name % layer.keywords['layer_purpose']
 
-        output_raster = unique_filename(suffix='.tif', dir=temp_dir())
-
         # We make one pixel size buffer on the extent to cover every pixels.
         # See https://github.com/inasafe/inasafe/issues/3655
         pixel_size_x = layer.rasterUnitsPerPixelX()
@@ -59,54 +73,14 @@ def clip_by_extent(layer, extent):
         buffer_size = max(pixel_size_x, pixel_size_y)
         extent = extent.buffered(buffer_size)
 
-        if is_raster_y_inverted(layer):
-            # The raster is Y inverted. We need to switch Y min and Y max.
-            bbox = [
-                str(extent.xMinimum()),
-                str(extent.xMaximum()),
-                str(extent.yMaximum()),
-                str(extent.yMinimum())
-            ]
+        if virtual:
+            clipped = QgsRasterLayer(
+                clip_to_vrt(
+                    layer.source(), extent, is_raster_y_inverted(layer)),
+                output_layer_name)
         else:
-            # The raster is normal.
-            bbox = [
-                str(extent.xMinimum()),
-                str(extent.xMaximum()),
-                str(extent.yMinimum()),
-                str(extent.yMaximum())
-            ]
-
-        # These values are all from the processing algorithm.
-        # https://github.com/qgis/QGIS/blob/master/python/plugins/processing/
-        # algs/gdal/ClipByExtent.py
-        # Please read the file to know these parameters.
-        parameters['INPUT'] = layer.source()
-        parameters['NO_DATA'] = ''
-        parameters['PROJWIN'] = ','.join(bbox)
-        parameters['DATA_TYPE'] = 5
-        parameters['COMPRESS'] = 4
-        parameters['JPEGCOMPRESSION'] = 75
-        parameters['ZLEVEL'] = 6
-        parameters['PREDICTOR'] = 1
-        parameters['TILED'] = False
-        parameters['BIGTIFF'] = 0
-        parameters['TFW'] = False
-        parameters['EXTRA'] = ''
-        parameters['OUTPUT'] = output_raster
-
-        initialize_processing()
-        feedback = create_processing_feedback()
-        context = create_processing_context(feedback=feedback)
-
-        result = processing.run(
-            "gdal:cliprasterbyextent",
-            parameters,
-            context=context)
-
-        if result is None:
-            raise ProcessingInstallationError
-
-        clipped = QgsRasterLayer(result['OUTPUT'], output_layer_name)
+            clipped = _clip_with_processing(
+                layer, extent, output_layer_name, parameters)
 
         # We transfer keywords to the output.
         clipped.keywords = layer.keywords.copy()
@@ -133,3 +107,124 @@ def clip_by_extent(layer, extent):
         clipped = layer
 
     return clipped
+
+
+def clip_to_vrt(source, extent, y_inverted=False):
+    """Write a VRT file referencing the window of a raster covering an extent.
+
+    The window and the Float32 data type are the ones of the
+    gdal:cliprasterbyextent algorithm, the window is computed by GDAL from
+    the extent like gdal_translate -projwin. The VRT is a small XML file, the
+    pixels are read from the source raster when the VRT is read.
+
+    :param source: The path of the raster.
+    :type source: str
+
+    :param extent: The extent, in the CRS of the raster.
+    :type extent: QgsRectangle
+
+    :param y_inverted: If the raster is Y inverted.
+    :type y_inverted: bool
+
+    :return: The path of the VRT file.
+    :rtype: str
+
+    .. versionadded:: 5.0
+    """
+    if exists(source):
+        # The VRT must not depend on the current directory.
+        source = abspath(source)
+    dataset = gdal.Open(source, gdal.GA_ReadOnly)
+    if dataset is None:
+        raise Exception('GDAL can not open the raster %s.' % source)
+
+    if y_inverted:
+        # The raster is Y inverted. We need to switch Y min and Y max.
+        top, bottom = extent.yMinimum(), extent.yMaximum()
+    else:
+        top, bottom = extent.yMaximum(), extent.yMinimum()
+
+    output_raster = unique_filename(suffix='.vrt', dir=temp_dir())
+    clipped = gdal.Translate(
+        output_raster,
+        dataset,
+        format='VRT',
+        outputType=gdal.GDT_Float32,
+        projWin=[extent.xMinimum(), top, extent.xMaximum(), bottom])
+    if clipped is None:
+        raise Exception('The extent does not intersect the raster.')
+    # Close the dataset to write the VRT file.
+    clipped = None
+    return output_raster
+
+
+def _clip_with_processing(layer, extent, output_layer_name, parameters):
+    """Clip a raster to a compressed GeoTIFF with processing.
+
+    :param layer: The layer to clip.
+    :type layer: QgsRasterLayer
+
+    :param extent: The extent, already buffered.
+    :type extent: QgsRectangle
+
+    :param output_layer_name: The name of the clipped layer.
+    :type output_layer_name: str
+
+    :param parameters: The dictionary filled with the parameters of the
+        algorithm, for the logs.
+    :type parameters: dict
+
+    :return: Clipped layer.
+    :rtype: QgsRasterLayer
+    """
+    output_raster = unique_filename(suffix='.tif', dir=temp_dir())
+
+    if is_raster_y_inverted(layer):
+        # The raster is Y inverted. We need to switch Y min and Y max.
+        bbox = [
+            str(extent.xMinimum()),
+            str(extent.xMaximum()),
+            str(extent.yMaximum()),
+            str(extent.yMinimum())
+        ]
+    else:
+        # The raster is normal.
+        bbox = [
+            str(extent.xMinimum()),
+            str(extent.xMaximum()),
+            str(extent.yMinimum()),
+            str(extent.yMaximum())
+        ]
+
+    # These values are all from the processing algorithm.
+    # https://github.com/qgis/QGIS/blob/master/python/plugins/processing/
+    # algs/gdal/ClipByExtent.py
+    # Please read the file to know these parameters.
+    parameters['INPUT'] = layer.source()
+    parameters['NO_DATA'] = ''
+    parameters['PROJWIN'] = ','.join(bbox)
+    parameters['DATA_TYPE'] = 5
+    parameters['COMPRESS'] = 4
+    parameters['JPEGCOMPRESSION'] = 75
+    parameters['ZLEVEL'] = 6
+    parameters['PREDICTOR'] = 1
+    parameters['TILED'] = False
+    parameters['BIGTIFF'] = 0
+    parameters['TFW'] = False
+    parameters['EXTRA'] = ''
+    parameters['OUTPUT'] = output_raster
+
+    initialize_processing()
+    feedback = create_processing_feedback()
+    context = create_processing_context(feedback=feedback)
+
+    result = processing.run(
+        "gdal:cliprasterbyextent",
+        parameters,
+        context=context)
+
+    if result is None:
+        raise ProcessingInstallationError
+    check_analysis_canceled()
+
+    return QgsRasterLayer(result['OUTPUT'], output_layer_name)
@@ -114,11 +114,77 @@ def tile_and_reflect(input):
     return tiled_input
 
 
+def _correlate_1d(padded, weights, axis):
+    """Correlate a padded array with a 1 dimensional kernel along an axis.
+
+    The loop is done over the kernel, each step is a vectorized operation on
+    the whole array.
+
+    :param padded: The array, padded by half of the kernel on both sides of
+        the axis.
+    :type padded: numpy.ndarray
+
+    :param weights: The 1 dimensional kernel.
+    :type weights: numpy.ndarray
+
+    :param axis: The axis along which the kernel is applied.
+    :type axis: int
+
+    :returns: The correlated array, without the padding on this axis.
+    :rtype: numpy.ndarray
+    """
+    size = padded.shape[axis] - len(weights) + 1
+    output = np.zeros(
+        padded.shape[:axis] + (size,) + padded.shape[axis + 1:])
+    for offset, weight in enumerate(weights):
+        if axis == 0:
+            output += weight * padded[offset:offset + size]
+        else:
+            output += weight * padded[:, offset:offset + size]
+    return output
+
+
+def _correlate(input, weights):
+    """Correlate a 2 dimensional array, borders are handled with reflection.
+
+    If the kernel is separable, as a gaussian kernel is, the correlation is
+    done with two 1 dimensional passes.
+
+    :param input: The array.
+    :type input: numpy.ndarray
+
+    :param weights: The 2 dimensional kernel.
+    :type weights: numpy.ndarray
+
+    :returns: The correlated array, with the same shape as the input.
+    :rtype: numpy.ndarray
+    """
+    hw_row = weights.shape[0] // 2
+    hw_col = weights.shape[1] // 2
+    padded = np.pad(
+        np.asarray(input, dtype=np.float64),
+        ((hw_row, weights.shape[0] - 1 - hw_row),
+         (hw_col, weights.shape[1] - 1 - hw_col)),
+        mode='symmetric')
+
+    u, s, vt = np.linalg.svd(weights)
+    if len(s) == 1 or s[1] <= s[0] * 1e-12:
+        # The kernel is the outer product of two vectors.
+        scale = np.sqrt(s[0])
+        output = _correlate_1d(padded, u[:, 0] * scale, 0)
+        return _correlate_1d(output, vt[0] * scale, 1)
+
+    rows, cols = input.shape
+    output = np.zeros((rows, cols))
+    for k in range(weights.shape[0]):
+        for m in range(weights.shape[1]):
+            output += weights[k, m] * padded[k:k + rows, m:m + cols]
+    return output
+
+
 def convolve(input, weights, mask=None, slow=False):
     """2 dimensional convolution.
 
-    This is a Python implementation of what will be written in Fortran.
-
     Borders are handled with reflection.
 
     Masking is supported in the following way:
@@ -128,9 +194,27 @@ def convolve(input, weights, mask=None, slow=False):
           masked parts of the kernel are evenly distributed over the non-masked
           parts.
 
+    The convolution is vectorized: the masked weights and the number of
+    non-masked points around each point are themselves computed by
+    convolutions of the mask.
+
     Adapted from https://github.com/nicjhan/gaussian-filter
-    """
 
+    :param input: The 2 dimensional array.
+    :type input: numpy.ndarray
+
+    :param weights: The kernel, for instance from gaussian_kernel.
+    :type weights: numpy.ndarray
+
+    :param mask: Optional boolean array, True for the masked points.
+    :type mask: numpy.ndarray
+
+    :param slow: Not used anymore, kept for backward compatibility.
+    :type slow: bool
+
+    :returns: The convolved array, with the same shape and type as the input.
+    :rtype: numpy.ndarray
+    """
     assert (len(input.shape) == 2)
     assert (len(weights.shape) == 2)
 
@@ -139,91 +223,28 @@ def convolve(input, weights, mask=None, slow=False):
     assert (weights.shape[0] < input.shape[0] + 1)
     assert (weights.shape[1] < input.shape[1] + 1)
 
-    if mask is not None:
-        # The slow convolve does not support masking.
-        assert (not slow)
-        assert (input.shape == mask.shape)
-        tiled_mask = tile_and_reflect(mask)
-
     output = np.copy(input)
-    tiled_input = tile_and_reflect(input)
 
-    rows = input.shape[0]
-    cols = input.shape[1]
-    # Stands for half weights row.
-    hw_row = np.int(weights.shape[0] / 2)
-    hw_col = np.int(weights.shape[1] / 2)
-    # Stands for full weights row.
-    fw_row = weights.shape[0]
-    fw_col = weights.shape[0]
-
-    # Now do convolution on central array.
-    # Iterate over tiled_input.
-    for i, io in zip(list(range(rows, rows * 2)), list(range(rows))):
-        for j, jo in zip(list(range(cols, cols * 2)), list(range(cols))):
-            # The current central pixel is at (i, j)
-
-            # Skip masked points.
-            if mask is not None and tiled_mask[i, j]:
-                continue
-
-            average = 0.0
-            if slow:
-                # Iterate over weights/kernel.
-                for k in range(weights.shape[0]):
-                    for l in range(weights.shape[1]):
-                        # Get coordinates of tiled_input array that match given
-                        # weights
-                        m = i + k - hw_row
-                        n = j + l - hw_col
-
-                        average += tiled_input[m, n] * weights[k, l]
-            else:
-                # Find the part of the tiled_input array that overlaps with the
-                # weights array.
-                overlapping = tiled_input[
-                    i - hw_row:i - hw_row + fw_row,
-                    j - hw_col:j - hw_col + fw_col]
-                assert (overlapping.shape == weights.shape)
-
-                # If any of 'overlapping' is masked then set the corresponding
-                # points in the weights matrix to 0 and redistribute these to
-                # non-masked points.
-                if mask is not None:
-                    overlapping_mask = tiled_mask[
-                        i - hw_row:i - hw_row + fw_row,
-                        j - hw_col:j - hw_col + fw_row]
-                    assert (overlapping_mask.shape == weights.shape)
-
-                    # Total value and number of weights clobbered by the mask.
-                    clobber_total = np.sum(weights[overlapping_mask])
-                    remaining_num = np.sum(np.logical_not(overlapping_mask))
-                    # This is impossible since at least i, j is not masked.
-                    assert (remaining_num > 0)
-                    correction = clobber_total / remaining_num
-
-                    # It is OK if nothing is masked - the weights will not be
-                    #  changed.
-                    if correction == 0:
-                        assert (not overlapping_mask.any())
-
-                    # Redistribute to non-masked points.
-                    tmp_weights = np.copy(weights)
-                    tmp_weights[overlapping_mask] = 0.0
-                    tmp_weights[np.where(tmp_weights != 0)] += correction
-
-                    # Should be very close to 1. May not be exact due to
-                    # rounding.
-                    assert (abs(np.sum(tmp_weights) - 1) < 1e-15)
-
-                else:
-                    tmp_weights = weights
-
-                merged = tmp_weights[:] * overlapping
-                average = np.sum(merged)
-
-            # Set new output value.
-            output[io, jo] = average
+    if mask is None:
+        output[:] = _correlate(input, weights)
+        return output
+
+    assert (input.shape == mask.shape)
+    mask = np.asarray(mask, dtype=bool)
+    not_masked = np.logical_not(mask).astype(np.float64)
+    masked_input = np.where(mask, 0.0, input)
+    box = np.ones(weights.shape)
+
+    # Sum of the weights and number of points clobbered by the mask.
+    clobber_total = _correlate(mask.astype(np.float64), weights)
+    remaining_num = _correlate(not_masked, box)
+    # Weighted sum and plain sum of the non-masked points.
+    weighted = _correlate(masked_input, weights)
+    total = _correlate(masked_input, box)
+
+    keep = np.logical_not(mask)
+    correction = clobber_total[keep] / remaining_num[keep]
+    output[keep] = weighted[keep] + correction * total[keep]
 
     return output
 
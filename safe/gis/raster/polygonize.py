@@ -2,12 +2,13 @@
 
 """Polygonize a raster layer into a vector layer."""
 
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+import numpy as np
 from osgeo import gdal, osr, ogr
-from qgis.core import (
-    QgsVectorLayer,
-    QgsFeatureRequest,
-)
+from qgis.core import QgsGeometry, QgsVectorLayer
 
 from safe.common.utilities import unique_filename, temp_dir
 from safe.definitions.constants import no_data_value
@@ -15,8 +16,12 @@ from safe.definitions.fields import hazard_value_field, exposure_type_field
 from safe.definitions.layer_geometry import (
     layer_geometry, layer_geometry_polygon)
 from safe.definitions.processing_steps import polygonize_steps
+from safe.gis.processing_tools import (
+    check_analysis_canceled, gdal_progress_callback)
+from safe.gis.raster.reclassify import raster_windows
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
+from safe.utilities.settings import setting
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -25,16 +30,37 @@ __revision__ = '$Format:%H$'
 
 
 @profile
-def polygonize(layer):
+def polygonize(layer, dissolve=None, tile_size=None, workers=None):
     """Polygonize a raster layer into a vector layer using GDAL.
 
     Issue https://github.com/inasafe/inasafe/issues/3183
 
-    :param layer: The layer to reproject.
+    The cells with the no_data_value are masked, they are never
+    polygonized. The polygons are written to a GeoPackage in a single
+    transaction, tile by tile. Only the polygons to dissolve are kept in
+    memory.
+
+    Large rasters can be polygonized in tiles, in parallel. The polygons
+    crossing a tile border are split on it, unless they are dissolved.
+
+    :param layer: The layer to polygonize.
     :type layer: QgsRasterLayer
 
-    :return: Reprojected memory layer.
-    :rtype: QgsRasterLayer
+    :param dissolve: If the polygons are dissolved into a single feature by
+        value. Default to the polygonize_dissolve setting.
+    :type dissolve: bool
+
+    :param tile_size: The width and height of the tiles in pixels, 0 to
+        polygonize the raster in a single tile. Default to the
+        polygonize_tile_size setting.
+    :type tile_size: int
+
+    :param workers: The number of threads polygonizing the tiles. Default to
+        the polygonize_workers setting.
+    :type workers: int
+
+    :return: The polygonized vector layer.
+    :rtype: QgsVectorLayer
 
     .. versionadded:: 4.0
     """
@@ -42,46 +68,117 @@ def polygonize(layer):
     output_layer_name = output_layer_name % layer.keywords['layer_purpose']
     gdal_layer_name = polygonize_steps['gdal_layer_name']
 
+    if dissolve is None:
+        dissolve = setting('polygonize_dissolve', expected_type=bool)
+    if tile_size is None:
+        tile_size = setting('polygonize_tile_size', expected_type=int)
+    if workers is None:
+        workers = setting('polygonize_workers', expected_type=int)
+
     if layer.keywords.get('layer_purpose') == 'exposure':
         output_field = exposure_type_field
     else:
         output_field = hazard_value_field
 
     input_raster = gdal.Open(layer.source(), gdal.GA_ReadOnly)
+    width = input_raster.RasterXSize
+    height = input_raster.RasterYSize
 
     srs = osr.SpatialReference()
     srs.ImportFromWkt(input_raster.GetProjectionRef())
 
+    active_band = layer.keywords.get('active_band', 1)
+    if tile_size > 0:
+        windows = [
+            (x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)]
+    else:
+        windows = [(0, 0, width, height)]
+
+    if dissolve:
+        geometry_type = ogr.wkbMultiPolygon
+    else:
+        geometry_type = ogr.wkbPolygon
+
+    # The name used when the output was a shapefile, the next steps expect it.
+    field_name = output_field['field_name'][0:10]
+
     temporary_dir = temp_dir(sub_dir='pre-process')
-    out_shapefile = unique_filename(
-        suffix='-%s.shp' % output_layer_name, dir=temporary_dir)
+    out_geopackage = unique_filename(
+        suffix='-%s.gpkg' % output_layer_name, dir=temporary_dir)
+    destination = ogr.GetDriverByName('GPKG').CreateDataSource(out_geopackage)
+    output_layer = destination.CreateLayer(
+        gdal_layer_name, srs, geometry_type)
+    output_layer.CreateField(ogr.FieldDefn(field_name, ogr.OFTInteger))
+    layer_definition = output_layer.GetLayerDefn()
 
-    driver = ogr.GetDriverByName("ESRI Shapefile")
-    destination = driver.CreateDataSource(out_shapefile)
+    # Only the dissolved polygons are kept in memory, the other ones are
+    # written to the GeoPackage tile by tile.
+    polygons = []
 
-    output_layer = destination.CreateLayer(gdal_layer_name, srs)
+    def add_tile(tile):
+        """Write or keep the polygons of a tile polygonized in memory."""
+        check_analysis_canceled()
+        for feature in tile.GetLayer(0):
+            if dissolve:
+                polygons.append((
+                    feature.GetField(0),
+                    feature.GetGeometryRef().ExportToWkb()))
+            else:
+                output_feature = ogr.Feature(layer_definition)
+                output_feature.SetField(0, feature.GetField(0))
+                output_feature.SetGeometry(feature.GetGeometryRef())
+                output_layer.CreateFeature(output_feature)
 
-    # We have no other way to use a shapefile. We need only the first 10 chars.
-    field_name = output_field['field_name'][0:10]
-    fd = ogr.FieldDefn(field_name, ogr.OFTInteger)
-    output_layer.CreateField(fd)
+    polygonize_tile = partial(
+        _polygonize_tile,
+        layer.source(),
+        active_band,
+        input_raster.GetProjectionRef())
+    destination.StartTransaction()
+    if len(windows) == 1 and not dissolve:
+        # GDAL writes the polygons straight to the GeoPackage.
+        _polygonize_window(
+            layer.source(),
+            active_band,
+            windows[0],
+            output_layer,
+            gdal_progress_callback)
+    elif len(windows) == 1:
+        add_tile(polygonize_tile(windows[0], gdal_progress_callback))
+    elif workers > 1:
+        # GDAL releases the GIL, each thread opens its own dataset. A few
+        # tiles are polygonized ahead of the ones being written.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            try:
+                for window in windows:
+                    pending.append(executor.submit(polygonize_tile, window))
+                    if len(pending) >= 2 * workers:
+                        add_tile(pending.popleft().result())
+                while pending:
+                    add_tile(pending.popleft().result())
+            finally:
+                for future in pending:
+                    future.cancel()
+    else:
+        for window in windows:
+            add_tile(polygonize_tile(window))
+    check_analysis_canceled()
 
-    active_band = layer.keywords.get('active_band', 1)
-    input_band = input_raster.GetRasterBand(active_band)
-    # Fixme : add our own callback to Polygonize
-    gdal.Polygonize(input_band, None, output_layer, 0, [], callback=None)
-    destination.Destroy()
-
-    vector_layer = QgsVectorLayer(out_shapefile, output_layer_name, 'ogr')
-
-    # Let's remove polygons which were no data
-    request = QgsFeatureRequest()
-    expression = '"%s" = %s' % (field_name, no_data_value)
-    request.setFilterExpression(expression)
-    vector_layer.startEditing()
-    for feature in vector_layer.getFeatures(request):
-        vector_layer.deleteFeature(feature.id())
-    vector_layer.commitChanges()
+    for value, wkb in _dissolve(polygons):
+        feature = ogr.Feature(layer_definition)
+        feature.SetField(0, value)
+        feature.SetGeometry(ogr.CreateGeometryFromWkb(wkb))
+        output_layer.CreateFeature(feature)
+    destination.CommitTransaction()
+    destination = None
+
+    vector_layer = QgsVectorLayer(
+        '%s|layername=%s' % (out_geopackage, gdal_layer_name),
+        output_layer_name,
+        'ogr')
 
     # We transfer keywords to the output.
     vector_layer.keywords = layer.keywords.copy()
@@ -96,3 +193,99 @@ def polygonize(layer):
 
     check_layer(vector_layer)
     return vector_layer
+
+
+def _polygonize_tile(source, band_number, projection, window, callback=None):
+    """Polygonize a window of a raster into a new memory layer.
+
+    :param source: The path of the raster.
+    :type source: str
+
+    :param band_number: The band to polygonize.
+    :type band_number: int
+
+    :param projection: The projection of the raster, as WKT.
+    :type projection: str
+
+    :param window: The x offset, y offset, width and height of the window.
+    :type window: tuple
+
+    :param callback: The GDAL progress callback.
+    :type callback: function
+
+    :returns: The OGR memory datasource, its layer has the polygons with
+        their value in the first field.
+    :rtype: ogr.DataSource
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(projection)
+    memory = ogr.GetDriverByName('Memory').CreateDataSource('polygons')
+    polygons_layer = memory.CreateLayer('polygons', srs, ogr.wkbPolygon)
+    polygons_layer.CreateField(ogr.FieldDefn('value', ogr.OFTInteger))
+    _polygonize_window(source, band_number, window, polygons_layer, callback)
+    return memory
+
+
+def _polygonize_window(
+        source, band_number, window, polygons_layer, callback=None):
+    """Polygonize a window of a raster, without the no_data_value cells.
+
+    :param source: The path of the raster.
+    :type source: str
+
+    :param band_number: The band to polygonize.
+    :type band_number: int
+
+    :param window: The x offset, y offset, width and height of the window.
+    :type window: tuple
+
+    :param polygons_layer: The OGR layer where the polygons are written,
+        with their value in the first field.
+    :type polygons_layer: ogr.Layer
+
+    :param callback: The GDAL progress callback.
+    :type callback: function
+    """
+    x, y, width, height = window
+    dataset = gdal.Open(source, gdal.GA_ReadOnly)
+    if (x, y, width, height) != (
+            0, 0, dataset.RasterXSize, dataset.RasterYSize):
+        # A virtual raster of the window, nothing is read yet.
+        dataset = gdal.Translate(
+            '', dataset, format='VRT', srcWin=[x, y, width, height])
+    band = dataset.GetRasterBand(band_number)
+
+    # The mask of the cells which are not no_data_value, filled block by
+    # block. These cells used to be polygonized and deleted afterwards.
+    mask = gdal.GetDriverByName('MEM').Create(
+        '', width, height, 1, gdal.GDT_Byte)
+    mask_band = mask.GetRasterBand(1)
+    for x_offset, y_offset, x_size, y_size in raster_windows(band):
+        values = band.ReadAsArray(x_offset, y_offset, x_size, y_size)
+        valid = values != no_data_value
+        mask_band.WriteArray(valid.astype(np.uint8), x_offset, y_offset)
+
+    gdal.Polygonize(band, mask_band, polygons_layer, 0, [], callback=callback)
+
+
+def _dissolve(polygons):
+    """Dissolve polygons into one multipolygon by value.
+
+    :param polygons: List of polygons, with their value and their WKB.
+    :type polygons: list
+
+    :returns: List of multipolygons, with their value and their WKB.
+    :rtype: list
+    """
+    geometries = OrderedDict()
+    for value, wkb in polygons:
+        geometry = QgsGeometry()
+        geometry.fromWkb(wkb)
+        geometries.setdefault(value, []).append(geometry)
+
+    dissolved = []
+    for value, parts in sorted(geometries.items()):
+        geometry = QgsGeometry.unaryUnion(parts)
+        geometry.convertToMultiType()
+        dissolved.append((value, bytes(geometry.asWkb())))
+    return dissolved
@@ -0,0 +1,309 @@
+# coding=utf-8
+
+"""Zonal statistics of a continuous raster exposure by aggregation and hazard.
+
+This is the path for a raster hazard on a continuous raster exposure. The
+exposure is summed by zone, a pair (aggregation area, hazard class), instead
+of by feature of the aggregate hazard layer.
+"""
+
+import logging
+from uuid import uuid4
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsGeometry,
+    QgsRectangle,
+)
+
+from safe.definitions.constants import RASTER_TILE_SIZE, TILED_GEOTIFF_OPTIONS
+from safe.definitions.fields import (
+    aggregation_id_field,
+    exposure_count_field,
+    hazard_class_field,
+    total_field,
+)
+from safe.definitions.layer_purposes import (
+    layer_purpose_aggregate_hazard_impacted)
+from safe.definitions.processing_steps import raster_zonal_stats_steps
+from safe.gis.processing_tools import analysis_transform_context
+from safe.gis.raster.reclassify import raster_windows
+from safe.gis.sanity_check import check_layer
+from safe.gis.vector.tools import (
+    create_field_from_definition, create_memory_layer)
+from safe.utilities.profiling import profile
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+
+@profile
+def raster_zonal_stats(
+        exposure, aggregate_hazard, tile_size=RASTER_TILE_SIZE):
+    """Sum a continuous raster exposure by aggregation area and hazard class.
+
+    Each feature of the aggregate hazard layer gets the ID of its zone, a
+    pair (aggregation area, hazard class). The zones are rasterized once on
+    the exposure grid and the exposure is summed by zone with
+    numpy.bincount, window by window. A cell is counted in the zone
+    containing its centre.
+
+    The output has a feature by zone, with the geometries of the aggregate
+    hazard features of the zone and the attributes of the first one. It has
+    the same fields and keywords as zonal_stats, so it feeds the same
+    summaries.
+
+    :param exposure: The continuous raster exposure.
+    :type exposure: QgsRasterLayer
+
+    :param aggregate_hazard: The aggregate hazard layer.
+    :type aggregate_hazard: QgsVectorLayer
+
+    :param tile_size: Maximum width and height of the windows read from the
+        rasters.
+    :type tile_size: int
+
+    :return: The aggregate hazard layer with the exposure count.
+    :rtype: QgsVectorLayer
+
+    .. versionadded:: 5.0
+    """
+    output_layer_name = raster_zonal_stats_steps['output_layer_name']
+    exposure_key = exposure.keywords['exposure']
+
+    source_fields = aggregate_hazard.keywords['inasafe_fields']
+    aggregation_index = aggregate_hazard.fields().lookupField(
+        source_fields[aggregation_id_field['key']])
+    hazard_class_index = aggregate_hazard.fields().lookupField(
+        source_fields[hazard_class_field['key']])
+
+    # Zone 0 is for the cells outside of the aggregate hazard features.
+    zone_ids = {}
+    zone_features = [[]]
+    features = list(aggregate_hazard.getFeatures())
+    feature_zones = []
+    for feature in features:
+        attributes = feature.attributes()
+        key = (attributes[aggregation_index], attributes[hazard_class_index])
+        zone = zone_ids.get(key)
+        if zone is None:
+            zone = zone_ids[key] = len(zone_features)
+            zone_features.append([])
+        zone_features[zone].append(feature)
+        feature_zones.append(zone)
+
+    # The geometries are only transformed to be rasterized.
+    geometries = [QgsGeometry(feature.geometry()) for feature in features]
+    if exposure.crs().authid() != aggregate_hazard.crs().authid():
+        transform = QgsCoordinateTransform(
+            aggregate_hazard.crs(),
+            exposure.crs(),
+            analysis_transform_context())
+        for geometry in geometries:
+            if not geometry.isNull():
+                geometry.transform(transform)
+    extent = QgsRectangle()
+    extent.setMinimal()
+    for geometry in geometries:
+        if not geometry.isNull():
+            extent.combineExtentWith(geometry.boundingBox())
+
+    exposure_file = gdal.Open(exposure.source())
+    exposure_band = exposure_file.GetRasterBand(
+        exposure.keywords.get('active_band', 1))
+    exposure_no_data = exposure_band.GetNoDataValue()
+
+    totals = np.zeros(len(zone_features), dtype=np.float64)
+    if not extent.isEmpty():
+        grid = grid_window(exposure_file, extent)
+        memory_directory = '/vsimem/raster_zonal_stats_%s' % uuid4().hex
+        try:
+            zone_grid = _rasterize(
+                geometries,
+                feature_zones,
+                exposure_file.GetProjection(),
+                grid,
+                memory_directory + '/zones.tif')
+            zone_band = zone_grid.GetRasterBand(1)
+
+            x_offset, y_offset = grid['offset']
+            for x, y, width, height in raster_windows(zone_band, tile_size):
+                zone = zone_band.ReadAsArray(x, y, width, height)
+                exposure_values = exposure_band.ReadAsArray(
+                    x + x_offset, y + y_offset, width, height).astype(
+                    np.float64)
+
+                valid = np.isfinite(exposure_values)
+                if exposure_no_data is not None:
+                    valid &= exposure_values != exposure_no_data
+                weights = np.where(valid, exposure_values, 0.0)
+                totals += np.bincount(
+                    zone.ravel(), weights.ravel(), minlength=len(totals))
+        finally:
+            zone_band = None
+            zone_grid = None
+            for filename in gdal.ReadDir(memory_directory) or []:
+                gdal.Unlink('%s/%s' % (memory_directory, filename))
+
+    # The output layer, with the sum added to the fields of the aggregate
+    # hazard.
+    output_field = exposure_count_field['field_name'] % exposure_key
+    fields = aggregate_hazard.fields()
+    fields.append(
+        create_field_from_definition(exposure_count_field, exposure_key))
+    layer = create_memory_layer(
+        output_layer_name,
+        aggregate_hazard.geometryType(),
+        aggregate_hazard.crs(),
+        fields)
+
+    output_features = []
+    for zone, zone_feature_list in enumerate(zone_features):
+        if not zone_feature_list:
+            continue
+        parts = []
+        for feature in zone_feature_list:
+            if feature.hasGeometry():
+                parts.extend(feature.geometry().asGeometryCollection())
+        output_feature = QgsFeature(fields)
+        if parts:
+            output_feature.setGeometry(QgsGeometry.collectGeometry(parts))
+        output_feature.setAttributes(
+            zone_feature_list[0].attributes() + [float(totals[zone])])
+        output_features.append(output_feature)
+    layer.dataProvider().addFeatures(output_features)
+    layer.updateExtents()
+    LOGGER.debug('Raster zonal stats on %s : %s features in %s zones' % (
+        exposure.source(), len(features), len(output_features)))
+
+    layer.keywords = exposure.keywords.copy()
+    layer.keywords['inasafe_fields'] = source_fields.copy()
+    layer.keywords['inasafe_default_values'] = (
+        exposure.keywords['inasafe_default_values'].copy())
+
+    key = exposure_count_field['key'] % exposure_key
+    # Special case here, one field is the exposure count and the total.
+    layer.keywords['inasafe_fields'][key] = output_field
+    layer.keywords['inasafe_fields'][total_field['key']] = output_field
+
+    layer.keywords['exposure_keywords'] = exposure.keywords.copy()
+    layer.keywords['hazard_keywords'] = aggregate_hazard.keywords[
+        'hazard_keywords'].copy()
+    layer.keywords['aggregation_keywords'] = (
+        aggregate_hazard.keywords['aggregation_keywords'])
+    layer.keywords['layer_purpose'] = (
+        layer_purpose_aggregate_hazard_impacted['key'])
+    layer.keywords['title'] = output_layer_name
+
+    check_layer(layer)
+    return layer
+
+
+def grid_window(raster_file, extent):
+    """Get the window of a raster grid covering an extent.
+
+    :param raster_file: The raster.
+    :type raster_file: gdal.Dataset
+
+    :param extent: The extent, in the CRS of the raster.
+    :type extent: QgsRectangle
+
+    :returns: Dictionary with the offset and the size of the window in the
+        raster, and its geotransform.
+    :rtype: dict
+    """
+    origin_x, size_x, _, origin_y, _, size_y = raster_file.GetGeoTransform()
+    width = raster_file.RasterXSize
+    height = raster_file.RasterYSize
+
+    column_min = int(np.floor((extent.xMinimum() - origin_x) / size_x))
+    column_max = int(np.ceil((extent.xMaximum() - origin_x) / size_x))
+    row_min = int(np.floor((extent.yMaximum() - origin_y) / size_y))
+    row_max = int(np.ceil((extent.yMinimum() - origin_y) / size_y))
+
+    column_min = min(max(column_min, 0), width - 1)
+    row_min = min(max(row_min, 0), height - 1)
+    column_max = min(max(column_max, column_min + 1), width)
+    row_max = min(max(row_max, row_min + 1), height)
+
+    return {
+        'offset': (column_min, row_min),
+        'size': (column_max - column_min, row_max - row_min),
+        'geotransform': (
+            origin_x + column_min * size_x, size_x, 0,
+            origin_y + row_min * size_y, 0, size_y),
+    }
+
+
+def _create_grid(projection, grid, path, data_type=gdal.GDT_Int32):
+    """Create an empty raster on a grid.
+
+    :param projection: The projection, as WKT.
+    :type projection: str
+
+    :param grid: The grid from grid_window.
+    :type grid: dict
+
+    :param path: The path of the raster, usually in /vsimem/.
+    :type path: str
+
+    :param data_type: The GDAL data type.
+    :type data_type: int
+
+    :returns: The raster, filled with 0.
+    :rtype: gdal.Dataset
+    """
+    width, height = grid['size']
+    dataset = gdal.GetDriverByName('GTiff').Create(
+        path, width, height, 1, data_type, TILED_GEOTIFF_OPTIONS)
+    dataset.SetProjection(projection)
+    dataset.SetGeoTransform(grid['geotransform'])
+    dataset.GetRasterBand(1).Fill(0)
+    return dataset
+
+
+def _rasterize(geometries, zones, projection, grid, path):
+    """Rasterize the zone of each polygon on a grid.
+
+    :param geometries: The polygons, in the grid CRS.
+    :type geometries: list
+
+    :param zones: The zone of each polygon, starting at 1.
+    :type zones: list
+
+    :param projection: The projection, as WKT.
+    :type projection: str
+
+    :param grid: The grid from grid_window.
+    :type grid: dict
+
+    :param path: The path of the raster, usually in /vsimem/.
+    :type path: str
+
+    :returns: The raster, with 0 outside of the polygons.
+    :rtype: gdal.Dataset
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(projection)
+    source = ogr.GetDriverByName('Memory').CreateDataSource('zones')
+    layer = source.CreateLayer('zones', srs, ogr.wkbMultiPolygon)
+    layer.CreateField(ogr.FieldDefn('zone', ogr.OFTInteger))
+    for geometry, zone in zip(geometries, zones):
+        if geometry.isNull():
+            continue
+        ogr_feature = ogr.Feature(layer.GetLayerDefn())
+        ogr_feature.SetField('zone', zone)
+        ogr_feature.SetGeometry(
+            ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+        layer.CreateFeature(ogr_feature)
+
+    dataset = _create_grid(projection, grid, path)
+    gdal.RasterizeLayer(dataset, [1], layer, options=['ATTRIBUTE=zone'])
+    return dataset
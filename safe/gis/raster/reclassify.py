@@ -3,6 +3,7 @@
 """Reclassify a raster layer."""
 
 from os.path import isfile
+from shutil import move
 
 import numpy as np
 from osgeo import gdal
@@ -11,9 +12,11 @@ from qgis.core import QgsRasterLayer
 from safe.common.exceptions import (
     FileNotFoundError, InvalidKeywordsForProcessingAlgorithm)
 from safe.common.utilities import unique_filename, temp_dir
-from safe.definitions.constants import no_data_value
+from safe.definitions.constants import (
+    no_data_value, RASTER_TILE_SIZE, TILED_GEOTIFF_OPTIONS)
 from safe.definitions.processing_steps import reclassify_raster_steps
 from safe.definitions.utilities import definition
+from safe.gis.processing_tools import report_progress
 from safe.gis.sanity_check import check_layer
 from safe.utilities.metadata import (
     active_thresholds_value_maps, active_classification)
@@ -26,7 +29,11 @@ __revision__ = '$Format:%H$'
 
 
 @profile
-def reclassify(layer, exposure_key=None, overwrite_input=False):
+def reclassify(
+        layer,
+        exposure_key=None,
+        overwrite_input=False,
+        tile_size=RASTER_TILE_SIZE):
     """Reclassify a continuous raster layer.
 
     Issue https://github.com/inasafe/inasafe/issues/3182
@@ -59,9 +66,16 @@ def reclassify(layer, exposure_key=None, overwrite_input=False):
     :param exposure_key: The exposure key.
     :type exposure_key: str
 
+    :param tile_size: Maximum width and height of the windows read from the
+        raster. It caps the memory used whatever the size of the raster.
+    :type tile_size: int
+
     :return: The classified raster layer.
     :rtype: QgsRasterLayer
 
+    The raster is processed window by window, aligned on the blocks of the
+    raster. The output is a tiled and compressed GeoTIFF.
+
     .. versionadded:: 4.0
     """
     output_layer_name = reclassify_raster_steps['output_layer_name']
@@ -93,45 +107,47 @@ def reclassify(layer, exposure_key=None, overwrite_input=False):
         ranges[hazard_class['value']] = thresholds[hazard_class['key']]
         value_map[hazard_class['key']] = [hazard_class['value']]
 
-    if overwrite_input:
-        output_raster = layer.source()
-    else:
-        output_raster = unique_filename(suffix='.tiff', dir=temp_dir())
+    # The input is read while the output is written, so the output is
+    # always created in a temporary file first.
+    output_raster = unique_filename(suffix='.tiff', dir=temp_dir())
 
-    driver = gdal.GetDriverByName('GTiff')
+    boundaries, class_values, keep_source = reclassify_lookup(ranges)
 
     raster_file = gdal.Open(layer.source())
     band = raster_file.GetRasterBand(1)
     no_data = band.GetNoDataValue()
-    source = band.ReadAsArray()
-    destination = source.copy()
-
-    for value, interval in list(ranges.items()):
-        v_min = interval[0]
-        v_max = interval[1]
-
-        if v_min is None:
-            destination[np.where(source <= v_max)] = value
-        elif v_max is None:
-            destination[np.where(source > v_min)] = value
-        elif v_min < v_max:
-            destination[np.where((v_min < source) & (source <= v_max))] = value
-
-    # Tag no data cells
-    destination[np.where(source == no_data)] = no_data_value
+    width = raster_file.RasterXSize
+    height = raster_file.RasterYSize
 
     # Create the new file.
+    driver = gdal.GetDriverByName('GTiff')
     output_file = driver.Create(
-        output_raster, raster_file.RasterXSize, raster_file.RasterYSize, 1)
-    output_file.GetRasterBand(1).WriteArray(destination)
-    output_file.GetRasterBand(1).SetNoDataValue(no_data_value)
+        output_raster, width, height, 1, gdal.GDT_Byte,
+        TILED_GEOTIFF_OPTIONS)
+    output_band = output_file.GetRasterBand(1)
+    output_band.SetNoDataValue(no_data_value)
 
     # CRS
     output_file.SetProjection(raster_file.GetProjection())
     output_file.SetGeoTransform(raster_file.GetGeoTransform())
+
+    for x_offset, y_offset, x_size, y_size in raster_windows(
+            band, tile_size):
+        source = band.ReadAsArray(x_offset, y_offset, x_size, y_size)
+        destination = reclassify_array(
+            source, boundaries, class_values, keep_source, no_data)
+        output_band.WriteArray(destination, x_offset, y_offset)
+
     output_file.FlushCache()
 
+    del output_band
     del output_file
+    del band
+    del raster_file
+
+    if overwrite_input:
+        move(output_raster, layer.source())
+        output_raster = layer.source()
 
     if not isfile(output_raster):
         raise FileNotFoundError
@@ -153,3 +169,114 @@ def reclassify(layer, exposure_key=None, overwrite_input=False):
 
     check_layer(reclassified)
     return reclassified
+
+
+def reclassify_lookup(ranges):
+    """Build a lookup table between the thresholds and the class values.
+
+    The thresholds split the real line in elementary intervals
+    ]boundary[i - 1], boundary[i]]. Each interval gets the value of the last
+    range containing it, as if the ranges were applied one after the other.
+
+    :param ranges: Ordered dictionary with the class value as key and the
+        interval [min, max] as value. None means no limit.
+    :type ranges: dict
+
+    :returns: Tuple with the sorted boundaries, the class value of each
+        elementary interval and a boolean array, True if an interval is not
+        in any range and keeps the source value.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    limits = set()
+    for interval in ranges.values():
+        for limit in interval:
+            if limit is not None:
+                limits.add(limit)
+    boundaries = np.array(sorted(limits), dtype=np.float64)
+
+    # Interval i is ]lower[i], upper[i]].
+    lower = np.concatenate(([-np.inf], boundaries))
+    upper = np.concatenate((boundaries, [np.inf]))
+    class_values = np.zeros(len(lower), dtype=np.float64)
+    keep_source = np.ones(len(lower), dtype=bool)
+
+    for value, interval in ranges.items():
+        v_min = -np.inf if interval[0] is None else interval[0]
+        v_max = np.inf if interval[1] is None else interval[1]
+        inside = (lower >= v_min) & (upper <= v_max)
+        class_values[inside] = value
+        keep_source[inside] = False
+
+    return boundaries, class_values, keep_source
+
+
+def reclassify_array(source, boundaries, class_values, keep_source, no_data):
+    """Reclassify an array with a lookup table from reclassify_lookup.
+
+    :param source: The values to reclassify.
+    :type source: numpy.ndarray
+
+    :param boundaries: The sorted boundaries of the intervals.
+    :type boundaries: numpy.ndarray
+
+    :param class_values: The class value of each interval.
+    :type class_values: numpy.ndarray
+
+    :param keep_source: True for the intervals keeping the source value.
+    :type keep_source: numpy.ndarray
+
+    :param no_data: The no data value of the source, can be None.
+    :type no_data: float
+
+    :returns: The reclassified array, with the type of the source.
+    :rtype: numpy.ndarray
+    """
+    if np.issubdtype(source.dtype, np.floating):
+        # Compare with the precision of the raster, not the thresholds.
+        boundaries = boundaries.astype(source.dtype)
+    interval = np.searchsorted(boundaries, source, side='left')
+    keep = keep_source[interval]
+    if np.issubdtype(source.dtype, np.floating):
+        keep |= np.isnan(source)
+
+    destination = np.where(keep, source, class_values[interval])
+    destination = destination.astype(source.dtype, copy=False)
+
+    # Tag no data cells
+    if no_data is not None:
+        destination[source == no_data] = no_data_value
+    return destination
+
+
+def raster_windows(band, tile_size=RASTER_TILE_SIZE):
+    """Iterate over windows of a raster band aligned on its blocks.
+
+    :param band: The raster band.
+    :type band: gdal.Band
+
+    :param tile_size: Maximum width and height of a window, in pixels.
+    :type tile_size: int
+
+    :returns: Generator of (x offset, y offset, width, height).
+    :rtype: generator
+    """
+    width = band.XSize
+    height = band.YSize
+    block_width, block_height = band.GetBlockSize()
+
+    def window_size(block_size, size):
+        if block_size > tile_size:
+            window = tile_size
+        else:
+            window = (tile_size // block_size) * block_size
+        return max(1, min(window, size))
+
+    window_width = window_size(block_width, width)
+    window_height = window_size(block_height, height)
+
+    for y_offset in range(0, height, window_height):
+        y_size = min(window_height, height - y_offset)
+        for x_offset in range(0, width, window_width):
+            x_size = min(window_width, width - x_offset)
+            report_progress(y_offset * width + x_offset, width * height)
+            yield x_offset, y_offset, x_size, y_size
@@ -8,6 +8,8 @@ from safe.definitions.constants import INASAFE_TEST
 from safe.test.utilities import get_qgis_app, load_test_raster_layer
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 
+from osgeo import gdal
+
 from safe.gis.raster.clip_bounding_box import clip_by_extent
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -31,3 +33,50 @@ class TestClipRaster(unittest.TestCase):
         self.assertAlmostEqual(expected.xMaximum(), extent.xMaximum(), 0)
         self.assertAlmostEqual(expected.yMinimum(), extent.yMinimum(), 0)
         self.assertAlmostEqual(expected.yMaximum(), extent.yMaximum(), 0)
+
+    def test_clip_raster_to_vrt(self):
+        """Test the clipped raster can reference the source window."""
+        layer = load_test_raster_layer('gisv4', 'hazard', 'earthquake.asc')
+        expected = QgsRectangle(106.75, -6.2, 106.80, -6.1)
+        virtual_layer = clip_by_extent(layer, expected, virtual=True)
+        copied_layer = clip_by_extent(layer, expected, virtual=False)
+
+        self.assertTrue(virtual_layer.source().endswith('.vrt'))
+        self.assertEqual(virtual_layer.keywords, copied_layer.keywords)
+        extent = virtual_layer.extent()
+        self.assertAlmostEqual(expected.xMinimum(), extent.xMinimum(), 0)
+        self.assertAlmostEqual(expected.xMaximum(), extent.xMaximum(), 0)
+        self.assertAlmostEqual(expected.yMinimum(), extent.yMinimum(), 0)
+        self.assertAlmostEqual(expected.yMaximum(), extent.yMaximum(), 0)
+
+        # The same window and data type as the copied raster.
+        copied = gdal.Open(copied_layer.source())
+        virtual = gdal.Open(virtual_layer.source())
+        self.assertEqual(
+            (virtual.RasterXSize, virtual.RasterYSize),
+            (copied.RasterXSize, copied.RasterYSize))
+        for value, copied_value in zip(
+                virtual.GetGeoTransform(), copied.GetGeoTransform()):
+            self.assertAlmostEqual(value, copied_value)
+        self.assertEqual(
+            virtual.GetRasterBand(1).DataType, gdal.GDT_Float32)
+        self.assertEqual(
+            copied.GetRasterBand(1).DataType, gdal.GDT_Float32)
+
+        # The VRT reads the pixels of the source window.
+        source = gdal.Open(layer.source())
+        origin_x, size_x, _, origin_y, _, size_y = source.GetGeoTransform()
+        window_x, _, _, window_y, _, _ = virtual.GetGeoTransform()
+        column = int(round((window_x - origin_x) / size_x))
+        row = int(round((window_y - origin_y) / size_y))
+        self.assertEqual(
+            virtual.GetRasterBand(1).ReadAsArray().tolist(),
+            source.GetRasterBand(1).ReadAsArray(
+                column, row, virtual.RasterXSize, virtual.RasterYSize
+            ).tolist())
+
+        # An extent outside of the raster returns the original layer.
+        outside = QgsRectangle(0, 0, 1, 1)
+        self.assertEqual(
+            layer.source(),
+            clip_by_extent(layer, outside, virtual=True).source())
@@ -4,12 +4,18 @@
 
 import os
 
+import numpy as np
+
 from safe.definitions.constants import INASAFE_TEST
 from safe.test.utilities import (
     load_test_raster_layer, standard_data_path)
 import unittest
 from safe.gis.raster.contour import (
-    create_smooth_contour, smooth_shakemap, shakemap_contour)
+    create_smooth_contour,
+    smooth_shakemap,
+    shakemap_contour,
+    convolve,
+    gaussian_kernel)
 from safe.common.utilities import unique_filename
 
 from safe.test.utilities import get_qgis_app
@@ -71,6 +77,37 @@ class TestContour(unittest.TestCase):
         self.assertTrue(os.path.exists(contour_path))
         print(contour_path)
 
+    def test_convolve(self):
+        """Test the vectorized convolution against a per point one."""
+        random = np.random.RandomState(42)
+        data = random.random_sample((12, 15)) * 10
+        mask = random.random_sample((12, 15)) < 0.2
+        weights = gaussian_kernel(0.9)
+        half = weights.shape[0] // 2
+        padded = np.pad(data, half, mode='symmetric')
+        padded_mask = np.pad(mask, half, mode='symmetric')
+
+        expected = np.copy(data)
+        expected_masked = np.copy(data)
+        for i in range(data.shape[0]):
+            for j in range(data.shape[1]):
+                window = padded[i:i + weights.shape[0], j:j + weights.shape[1]]
+                expected[i, j] = np.sum(window * weights)
+
+                if mask[i, j]:
+                    continue
+                window_mask = padded_mask[
+                    i:i + weights.shape[0], j:j + weights.shape[1]]
+                masked_weights = np.copy(weights)
+                masked_weights[window_mask] = 0
+                masked_weights[~window_mask] += (
+                    np.sum(weights[window_mask]) / np.sum(~window_mask))
+                expected_masked[i, j] = np.sum(window * masked_weights)
+
+        self.assertTrue(np.allclose(convolve(data, weights), expected))
+        self.assertTrue(np.allclose(
+            convolve(data, weights, mask=mask), expected_masked))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -64,3 +64,34 @@ class TestPolygonizeRaster(unittest.TestCase):
             request = QgsFeatureRequest().setFilterExpression(expression)
             self.assertEqual(
                 sum(1 for _ in polygonized.getFeatures(request)), count)
+
+    def test_polygonize_dissolve_tiles(self):
+        """Test we can polygonize in tiles and dissolve by class."""
+        layer = load_test_raster_layer('hazard', 'classified_flood_20_20.asc')
+        polygonized = polygonize(layer, dissolve=False, tile_size=0)
+        area = sum(f.geometry().area() for f in polygonized.getFeatures())
+
+        # The polygons of a class are dissolved into a single feature.
+        dissolved = polygonize(layer, dissolve=True, tile_size=0)
+        self.assertEqual(dissolved.featureCount(), 3)
+
+        # The tiles give the same polygons, each cell is a polygon here.
+        def polygons(vector):
+            inasafe_fields = vector.keywords['inasafe_fields']
+            field = inasafe_fields[hazard_value_field['key']]
+            return sorted(
+                (feature[field],
+                 round(feature.geometry().area(), 9),
+                 round(feature.geometry().centroid().asPoint().x(), 9),
+                 round(feature.geometry().centroid().asPoint().y(), 9))
+                for feature in vector.getFeatures())
+
+        tiled = polygonize(layer, dissolve=False, tile_size=7, workers=2)
+        self.assertEqual(polygons(tiled), polygons(polygonized))
+        tiled = polygonize(layer, dissolve=False, tile_size=7, workers=1)
+        self.assertEqual(polygons(tiled), polygons(polygonized))
+
+        tiled = polygonize(layer, dissolve=True, tile_size=7, workers=2)
+        self.assertEqual(tiled.featureCount(), 3)
+        self.assertAlmostEqual(
+            sum(f.geometry().area() for f in tiled.getFeatures()), area)
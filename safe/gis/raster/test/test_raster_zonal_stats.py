@@ -0,0 +1,74 @@
+# coding=utf-8
+import unittest
+
+from safe.definitions.constants import INASAFE_TEST
+from safe.test.utilities import (
+    get_qgis_app,
+    load_test_raster_layer,
+    load_test_vector_layer
+)
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from qgis.core import QgsWkbTypes
+from safe.definitions.fields import (
+    aggregation_id_field,
+    exposure_count_field,
+    hazard_class_field,
+    total_field,
+)
+from safe.definitions.layer_purposes import (
+    layer_purpose_aggregate_hazard_impacted)
+from safe.gis.raster.raster_zonal_stats import raster_zonal_stats
+from safe.gis.raster.zonal_statistics import zonal_stats
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestRasterZonalStats(unittest.TestCase):
+
+    def test_raster_zonal_stats(self):
+        """Test the zonal statistics by aggregation area and hazard class."""
+        exposure = load_test_raster_layer(
+            'exposure', 'pop_binary_raster_20_20.asc')
+        exposure.keywords['inasafe_default_values'] = {}
+        exposure_key = exposure.keywords['exposure']
+        aggregate_hazard = load_test_vector_layer(
+            'gisv4', 'intermediate', 'aggregate_classified_hazard.geojson')
+        aggregate_hazard.keywords['hazard_keywords'] = {}
+        aggregate_hazard.keywords['aggregation_keywords'] = {}
+
+        number_fields = aggregate_hazard.fields().count()
+        layer = raster_zonal_stats(exposure, aggregate_hazard)
+
+        self.assertEqual(layer.geometryType(), QgsWkbTypes.PolygonGeometry)
+        self.assertEqual(layer.fields().count(), number_fields + 1)
+        self.assertEqual(
+            layer.keywords['layer_purpose'],
+            layer_purpose_aggregate_hazard_impacted['key'])
+
+        inasafe_fields = layer.keywords['inasafe_fields']
+        count_field = exposure_count_field['field_name'] % exposure_key
+        self.assertEqual(inasafe_fields[total_field['key']], count_field)
+        aggregation_id = inasafe_fields[aggregation_id_field['key']]
+        hazard_class = inasafe_fields[hazard_class_field['key']]
+
+        # One feature by aggregation area and hazard class.
+        zones = {}
+        for feature in layer.getFeatures():
+            key = (feature[aggregation_id], feature[hazard_class])
+            self.assertNotIn(key, zones)
+            zones[key] = feature[count_field]
+
+        # The same sums as the zonal statistics of the aggregate hazard
+        # features, grouped by zone.
+        expected = {}
+        for feature in zonal_stats(exposure, aggregate_hazard).getFeatures():
+            key = (feature[aggregation_id], feature[hazard_class])
+            expected[key] = expected.get(key, 0) + feature[count_field]
+        self.assertEqual(sorted(zones.keys()), sorted(expected.keys()))
+        total = sum(expected.values())
+        for key, value in list(expected.items()):
+            self.assertAlmostEqual(zones[key], value, delta=total * 0.01)
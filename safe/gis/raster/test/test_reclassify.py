@@ -2,8 +2,12 @@
 """Test Reclassify Raster."""
 
 import unittest
+from collections import OrderedDict
 
-from safe.definitions.constants import INASAFE_TEST
+import numpy as np
+from osgeo import gdal
+
+from safe.definitions.constants import INASAFE_TEST, no_data_value
 from safe.test.utilities import (
     get_qgis_app,
     load_test_raster_layer)
@@ -12,7 +16,8 @@ QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 from qgis.core import QgsRasterBandStats
 
 from safe.definitions.processing_steps import reclassify_raster_steps
-from safe.gis.raster.reclassify import reclassify
+from safe.gis.raster.reclassify import (
+    reclassify, reclassify_array, reclassify_lookup)
 from safe.definitions.exposure import exposure_structure
 from safe.definitions.hazard_classifications import generic_hazard_classes
 
@@ -76,3 +81,47 @@ class TestReclassifyRaster(unittest.TestCase):
             1, QgsRasterBandStats.Min | QgsRasterBandStats.Max)
         self.assertEqual(stats.minimumValue, 1.0)
         self.assertEqual(stats.maximumValue, 3.0)
+
+    def test_reclassify_raster_windows(self):
+        """Test the result does not depend on the size of the windows."""
+        classes = {
+            'low': [None, 0.2],
+            'medium': [0.2, 1],
+            'high': [1, None],
+        }
+
+        results = []
+        for tile_size in [3, 1024]:
+            layer = load_test_raster_layer(
+                'hazard', 'continuous_flood_20_20.asc')
+            layer.keywords['thresholds'] = classes
+            layer.keywords['classification'] = generic_hazard_classes['key']
+            reclassified = reclassify(layer, tile_size=tile_size)
+            dataset = gdal.Open(reclassified.source())
+            results.append(dataset.GetRasterBand(1).ReadAsArray())
+            dataset = None
+
+        self.assertEqual(results[0].shape, (20, 20))
+        self.assertTrue(np.array_equal(results[0], results[1]))
+
+    def test_reclassify_array(self):
+        """Test the lookup table gives the same result as the ranges."""
+        ranges = OrderedDict()
+        ranges[1] = [None, 0]
+        ranges[2] = [0.0, 0.5]
+        ranges[3] = [0.5, 5]
+        ranges[6] = [5, None]
+        source = np.array(
+            [[-1, 0, 0.2, 0.5], [1, 5, 10, -9999]], dtype=np.float32)
+        expected = np.array(
+            [[1, 1, 2, 2], [3, 3, 6, no_data_value]], dtype=np.float32)
+        result = reclassify_array(
+            source, *reclassify_lookup(ranges), no_data=-9999)
+        self.assertTrue(np.array_equal(result, expected))
+
+        # Values outside of the ranges are not changed.
+        ranges = OrderedDict()
+        ranges[1] = [0, 1]
+        result = reclassify_array(
+            source, *reclassify_lookup(ranges), no_data=None)
+        self.assertEqual(result[0].tolist(), [-1, 0, 1, 1])
@@ -9,9 +9,16 @@ from safe.test.utilities import (
 )
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 
-from qgis.core import QgsWkbTypes, QgsCoordinateReferenceSystem
+from qgis.core import (
+    QgsWkbTypes,
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsGeometry,
+    QgsRectangle,
+)
 from safe.gis.vector.reproject import reproject
 from safe.gis.raster.zonal_statistics import zonal_stats
+from safe.gis.vector.tools import create_memory_layer
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -66,3 +73,80 @@ class TestReclassifyRaster(unittest.TestCase):
         for feature_a, feature_b in zip(
                 vector.getFeatures(), vector_b.getFeatures()):
             self.assertEqual(feature_a.attributes(), feature_b.attributes())
+
+    def test_zonal_statistics_small_polygons(self):
+        """Test the sum of polygons smaller than the cells."""
+        raster = load_test_raster_layer(
+            'exposure', 'pop_binary_raster_20_20.asc')
+        raster.keywords['inasafe_default_values'] = {}
+        vector = create_memory_layer(
+            'zones', QgsWkbTypes.PolygonGeometry, raster.crs())
+        vector.keywords['inasafe_fields'] = {}
+        vector.keywords['hazard_keywords'] = {}
+        vector.keywords['aggregation_keywords'] = {}
+
+        # The top left cell has a value of 1, the next one 0.
+        extent = raster.extent()
+        size = raster.rasterUnitsPerPixelX()
+        left = extent.xMinimum()
+        top = extent.yMaximum()
+        rectangles = [
+            # A quarter of the first cell.
+            QgsRectangle(left, top - size / 2, left + size / 2, top),
+            # Three cells wide, shifted by a quarter of a cell.
+            QgsRectangle(
+                left + size / 4, top - size, left + size * 3.25, top),
+        ]
+        features = []
+        for rectangle in rectangles:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromRect(rectangle))
+            features.append(feature)
+        vector.dataProvider().addFeatures(features)
+
+        output = zonal_stats(raster, vector, fractional_coverage=False)
+        sums = [feature.attributes()[-1] for feature in output.getFeatures()]
+        self.assertAlmostEqual(sums[0], 0.25)
+        # The centres of the first three cells are in the polygon.
+        self.assertAlmostEqual(sums[1], 2)
+
+        output = zonal_stats(raster, vector, fractional_coverage=True)
+        sums = [feature.attributes()[-1] for feature in output.getFeatures()]
+        self.assertAlmostEqual(sums[0], 0.25)
+        # Three quarters of the first cell and all of the third one.
+        self.assertAlmostEqual(sums[1], 1.75)
+
+    def test_zonal_statistics_overlapping_polygons(self):
+        """Test a cell is counted in every polygon containing its centre."""
+        raster = load_test_raster_layer(
+            'exposure', 'pop_binary_raster_20_20.asc')
+        raster.keywords['inasafe_default_values'] = {}
+        vector = create_memory_layer(
+            'zones', QgsWkbTypes.PolygonGeometry, raster.crs())
+        vector.keywords['inasafe_fields'] = {}
+        vector.keywords['hazard_keywords'] = {}
+        vector.keywords['aggregation_keywords'] = {}
+
+        # The first row of cells is 1 0 1 0 1 0 ...
+        extent = raster.extent()
+        size = raster.rasterUnitsPerPixelX()
+        left = extent.xMinimum()
+        top = extent.yMaximum()
+        rectangles = [
+            # The first four cells.
+            QgsRectangle(left, top - size, left + size * 4, top),
+            # The third to the sixth cells, two cells are in both polygons.
+            QgsRectangle(left + size * 2, top - size, left + size * 6, top),
+            # Touching the second polygon only.
+            QgsRectangle(left + size * 6, top - size, left + size * 8, top),
+        ]
+        features = []
+        for rectangle in rectangles:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromRect(rectangle))
+            features.append(feature)
+        vector.dataProvider().addFeatures(features)
+
+        output = zonal_stats(raster, vector, fractional_coverage=False)
+        sums = [feature.attributes()[-1] for feature in output.getFeatures()]
+        self.assertEqual(sums, [2, 2, 1])
@@ -4,26 +4,33 @@
 
 
 import logging
+from math import ceil, floor, isinf, isnan
 
-from qgis.analysis import QgsZonalStatistics
-from qgis.core import QgsFeatureRequest
+import numpy as np
+from osgeo import gdal, ogr, osr
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsGeometry,
+    QgsRectangle,
+    QgsSpatialIndex,
+)
 
+from safe.definitions.constants import (
+    FRACTIONAL_COVERAGE_CELLS, RASTER_TILE_SIZE)
 from safe.definitions.fields import exposure_count_field, total_field
 from safe.definitions.layer_purposes import (
     layer_purpose_aggregate_hazard_impacted)
 from safe.definitions.processing_steps import zonal_stats_steps
+from safe.gis.processing_tools import analysis_transform_context
+from safe.gis.raster.raster_zonal_stats import grid_window
+from safe.gis.raster.reclassify import raster_windows
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.reproject import reproject
 from safe.gis.vector.tools import (
-    copy_layer,
-    copy_fields,
-    remove_fields,
-    rename_fields,
     create_memory_layer,
     create_field_from_definition)
-from safe.utilities.gis import qgis_version
-from safe.utilities.i18n import tr
 from safe.utilities.profiling import profile
+from safe.utilities.settings import setting
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -34,15 +41,25 @@ LOGGER = logging.getLogger('InaSAFE')
 
 
 @profile
-def zonal_stats(raster, vector):
-    """Reclassify a continuous raster layer.
+def zonal_stats(
+        raster, vector, fractional_coverage=None, tile_size=RASTER_TILE_SIZE):
+    """Sum a continuous raster layer in each polygon of a vector layer.
 
     Issue https://github.com/inasafe/inasafe/issues/3190
 
     The algorithm will take care about projections.
     We don't want to reproject the raster layer.
-    So if CRS are different, we reproject the vector layer and then we do a
-    lookup from the reprojected layer to the original vector layer.
+    So if CRS are different, the polygons are transformed to the raster CRS
+    and the sums are added to the original polygons.
+
+    The index of each polygon is burnt on the raster grid window by window
+    and the cells are summed by polygon with numpy.bincount. Polygons
+    overlapping each other are burnt in separate passes, so like
+    QgsZonalStatistics a cell is counted in every polygon containing its
+    centre. Like QgsZonalStatistics, a polygon covering one cell centre or
+    less is summed with the area of intersection with each cell instead.
+    With the fractional coverage, it is the case for polygons covering up to
+    FRACTIONAL_COVERAGE_CELLS cell centres.
 
     :param raster: The raster layer.
     :type raster: QgsRasterLayer
@@ -50,84 +67,114 @@ def zonal_stats(raster, vector):
     :param vector: The vector layer.
     :type vector: QgsVectorLayer
 
+    :param fractional_coverage: If small polygons use the area of
+        intersection with the cells. Default to the
+        zonal_stats_fractional_coverage setting.
+    :type fractional_coverage: bool
+
+    :param tile_size: Maximum width and height of the windows read from the
+        raster.
+    :type tile_size: int
+
     :return: The output of the zonal stats.
     :rtype: QgsVectorLayer
 
     .. versionadded:: 4.0
     """
     output_layer_name = zonal_stats_steps['output_layer_name']
-
     exposure = raster.keywords['exposure']
-    if raster.crs().authid() != vector.crs().authid():
-        layer = reproject(vector, raster.crs())
-
-        # We prepare the copy
-        output_layer = create_memory_layer(
-            output_layer_name,
-            vector.geometryType(),
-            vector.crs(),
-            vector.fields()
-        )
-        copy_layer(vector, output_layer)
+
+    if fractional_coverage is None:
+        fractional_coverage = setting(
+            'zonal_stats_fractional_coverage', expected_type=bool)
+    if fractional_coverage:
+        precise_limit = FRACTIONAL_COVERAGE_CELLS
     else:
-        layer = create_memory_layer(
-            output_layer_name,
-            vector.geometryType(),
-            vector.crs(),
-            vector.fields()
-        )
-        copy_layer(vector, layer)
-
-    input_band = layer.keywords.get('active_band', 1)
-    analysis = QgsZonalStatistics(
-        layer,
-        raster,
-        'exposure_',
-        input_band,
-        QgsZonalStatistics.Sum)
-    result = analysis.calculateStatistics(None)
-    LOGGER.debug(tr('Zonal stats on %s : %s' % (raster.source(), result)))
+        precise_limit = 1
 
-    output_field = exposure_count_field['field_name'] % exposure
+    features = list(vector.getFeatures())
+    geometries = [QgsGeometry(feature.geometry()) for feature in features]
     if raster.crs().authid() != vector.crs().authid():
-        output_layer.startEditing()
-        field = create_field_from_definition(
-            exposure_count_field, exposure)
-
-        output_layer.addAttribute(field)
-        new_index = output_layer.fields().lookupField(field.name())
-        old_index = layer.fields().lookupField('exposure_sum')
-        for feature_input, feature_output in zip(
-                layer.getFeatures(), output_layer.getFeatures()):
-            output_layer.changeAttributeValue(
-                feature_input.id(), new_index, feature_input[old_index])
-        output_layer.commitChanges()
-        layer = output_layer
-    else:
-        fields_to_rename = {
-            'exposure_sum': output_field
-        }
-        if qgis_version() >= 21600:
-            rename_fields(layer, fields_to_rename)
-        else:
-            copy_fields(layer, fields_to_rename)
-            remove_fields(layer, list(fields_to_rename.keys()))
-        layer.commitChanges()
-
-    # The zonal stats is producing some None values. We need to fill these
-    # with 0. See issue : #3778
-    # We should start a new editing session as previous fields need to be
-    # committed first.
-    layer.startEditing()
-    request = QgsFeatureRequest()
-    expression = '\"%s\" is None' % output_field
-    request.setFilterExpression(expression)
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    index = layer.fields().lookupField(output_field)
-    for feature in layer.getFeatures():
-        if feature[output_field] is None:
-            layer.changeAttributeValue(feature.id(), index, 0)
-    layer.commitChanges()
+        transform = QgsCoordinateTransform(
+            vector.crs(), raster.crs(), analysis_transform_context())
+        for geometry in geometries:
+            if not geometry.isNull():
+                geometry.transform(transform)
+
+    raster_file = gdal.Open(raster.source())
+    band = raster_file.GetRasterBand(raster.keywords.get('active_band', 1))
+    no_data = band.GetNoDataValue()
+    geotransform = raster_file.GetGeoTransform()
+
+    # Index 0 is for the cells outside of the polygons.
+    sums = np.zeros(len(features) + 1, dtype=np.float64)
+    counts = np.zeros(len(features) + 1, dtype=np.int64)
+    zones_source, zones = _zones_layers(
+        geometries, raster_file.GetProjection())
+    extent = QgsRectangle()
+    extent.setMinimal()
+    for geometry in geometries:
+        if not geometry.isNull():
+            extent.combineExtentWith(geometry.boundingBox())
+
+    if not extent.isEmpty():
+        grid = grid_window(raster_file, extent)
+        grid_x, grid_y = grid['offset']
+        grid_width, grid_height = grid['size']
+        for x, y, width, height in raster_windows(band, tile_size):
+            left = max(x, grid_x)
+            top = max(y, grid_y)
+            right = min(x + width, grid_x + grid_width)
+            bottom = min(y + height, grid_y + grid_height)
+            if right <= left or bottom <= top:
+                continue
+
+            values = band.ReadAsArray(
+                left, top, right - left, bottom - top).astype(np.float64)
+            valid_values = np.isfinite(values)
+            if no_data is not None:
+                valid_values &= values != no_data
+            for zones_pass in zones:
+                labels = _burn_window(
+                    zones_pass,
+                    geotransform,
+                    left,
+                    top,
+                    right - left,
+                    bottom - top)
+                valid = (labels > 0) & valid_values
+                sums += np.bincount(
+                    labels[valid], values[valid], minlength=len(sums))
+                counts += np.bincount(labels[valid], minlength=len(counts))
+    # The layer is only valid while its datasource exists.
+    del zones, zones_source
+
+    for index in np.nonzero(counts[1:] <= precise_limit)[0]:
+        sums[index + 1] = _precise_sum(
+            geometries[index], band, geotransform, no_data)
+    LOGGER.debug('Zonal stats on %s : %s polygons, %s summed precisely' % (
+        raster.source(),
+        len(features),
+        np.count_nonzero(counts[1:] <= precise_limit)))
+
+    # The output layer, with the sum added to the fields of the polygons.
+    output_field = exposure_count_field['field_name'] % exposure
+    fields = vector.fields()
+    fields.append(create_field_from_definition(exposure_count_field, exposure))
+    layer = create_memory_layer(
+        output_layer_name,
+        vector.geometryType(),
+        vector.crs(),
+        fields)
+    output_features = []
+    for index, feature in enumerate(features):
+        output_feature = QgsFeature(fields)
+        output_feature.setGeometry(feature.geometry())
+        output_feature.setAttributes(
+            feature.attributes() + [float(sums[index + 1])])
+        output_features.append(output_feature)
+    layer.dataProvider().addFeatures(output_features)
+    layer.updateExtents()
 
     layer.keywords = raster.keywords.copy()
     layer.keywords['inasafe_fields'] = vector.keywords['inasafe_fields'].copy()
@@ -152,3 +199,176 @@ def zonal_stats(raster, vector):
 
     check_layer(layer)
     return layer
+
+
+def _overlap_passes(geometries):
+    """Split the polygons in passes without overlapping polygons.
+
+    A raster cell can only get the index of one polygon when they are
+    burnt, polygons overlapping each other must be burnt in separate passes.
+    Polygons only touching each other are in the same pass.
+
+    :param geometries: The polygons.
+    :type geometries: list
+
+    :returns: The pass of each polygon, starting at 0. None for the null
+        geometries.
+    :rtype: list
+    """
+    passes = [None] * len(geometries)
+    index = QgsSpatialIndex()
+    for i, geometry in enumerate(geometries):
+        if geometry.isNull():
+            continue
+        candidates = index.intersects(geometry.boundingBox())
+        used = set()
+        if candidates:
+            engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+            engine.prepareGeometry()
+            for j in candidates:
+                # The interiors of the polygons intersect.
+                if engine.relatePattern(
+                        geometries[j].constGet(), 'T********'):
+                    used.add(passes[j])
+        current = 0
+        while current in used:
+            current += 1
+        passes[i] = current
+        index.insertFeature(i, geometry.boundingBox())
+    return passes
+
+
+def _zones_layers(geometries, projection):
+    """Create OGR layers with the index (starting at 1) of each polygon.
+
+    There is one layer per pass of _overlap_passes, only one if the polygons
+    don't overlap.
+
+    :param geometries: The polygons, in the raster CRS.
+    :type geometries: list
+
+    :param projection: The projection of the raster, as WKT.
+    :type projection: str
+
+    :returns: The OGR datasource, which must be kept while the layers are
+        used, and the list of layers.
+    :rtype: (ogr.DataSource, list)
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(projection)
+    source = ogr.GetDriverByName('Memory').CreateDataSource('zones')
+    passes = _overlap_passes(geometries)
+    layers = []
+    for _ in range(max([p for p in passes if p is not None] or [0]) + 1):
+        layer = source.CreateLayer(
+            'zones_%s' % len(layers), srs, ogr.wkbMultiPolygon)
+        layer.CreateField(ogr.FieldDefn('index', ogr.OFTInteger))
+        layers.append(layer)
+    for index, geometry in enumerate(geometries):
+        if geometry.isNull():
+            continue
+        layer = layers[passes[index]]
+        ogr_feature = ogr.Feature(layer.GetLayerDefn())
+        ogr_feature.SetField(0, index + 1)
+        ogr_feature.SetGeometry(
+            ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+        layer.CreateFeature(ogr_feature)
+    if len(layers) > 1:
+        LOGGER.debug(
+            'Zonal stats: overlapping polygons burnt in %s passes'
+            % len(layers))
+    return source, layers
+
+
+def _burn_window(zones, geotransform, x, y, width, height):
+    """Burn the index of the polygons in a window of the raster grid.
+
+    A cell gets the index of the polygon containing its centre.
+
+    :param zones: A layer from _zones_layers.
+    :type zones: ogr.Layer
+
+    :param geotransform: The geotransform of the raster.
+    :type geotransform: tuple
+
+    :param x: The column of the window.
+    :type x: int
+
+    :param y: The row of the window.
+    :type y: int
+
+    :param width: The width of the window.
+    :type width: int
+
+    :param height: The height of the window.
+    :type height: int
+
+    :returns: The index of the polygon of each cell, 0 outside of them.
+    :rtype: numpy.ndarray
+    """
+    origin_x, size_x, _, origin_y, _, size_y = geotransform
+    window_x = origin_x + x * size_x
+    window_y = origin_y + y * size_y
+    dataset = gdal.GetDriverByName('MEM').Create(
+        '', width, height, 1, gdal.GDT_Int32)
+    dataset.SetGeoTransform((window_x, size_x, 0, window_y, 0, size_y))
+
+    # Only the polygons in the window are burnt.
+    zones.SetSpatialFilterRect(
+        min(window_x, window_x + width * size_x),
+        min(window_y, window_y + height * size_y),
+        max(window_x, window_x + width * size_x),
+        max(window_y, window_y + height * size_y))
+    gdal.RasterizeLayer(dataset, [1], zones, options=['ATTRIBUTE=index'])
+    zones.SetSpatialFilter(None)
+    return dataset.GetRasterBand(1).ReadAsArray()
+
+
+def _precise_sum(geometry, band, geotransform, no_data):
+    """Sum the cells of a polygon weighted by their area in the polygon.
+
+    It is the same as QgsZonalStatistics for small polygons.
+
+    :param geometry: The polygon, in the raster CRS.
+    :type geometry: QgsGeometry
+
+    :param band: The raster band.
+    :type band: gdal.Band
+
+    :param geotransform: The geotransform of the raster.
+    :type geotransform: tuple
+
+    :param no_data: The no data value of the band.
+    :type no_data: float
+
+    :returns: The sum.
+    :rtype: float
+    """
+    if geometry.isNull():
+        return 0.0
+    origin_x, size_x, _, origin_y, _, size_y = geotransform
+    box = geometry.boundingBox()
+    column_min = max(int(floor((box.xMinimum() - origin_x) / size_x)), 0)
+    column_max = min(
+        int(ceil((box.xMaximum() - origin_x) / size_x)), band.XSize)
+    row_min = max(int(floor((box.yMaximum() - origin_y) / size_y)), 0)
+    row_max = min(int(ceil((box.yMinimum() - origin_y) / size_y)), band.YSize)
+    if column_max <= column_min or row_max <= row_min:
+        return 0.0
+
+    values = band.ReadAsArray(
+        column_min, row_min, column_max - column_min, row_max - row_min)
+    cell_area = abs(size_x * size_y)
+    total = 0.0
+    for row in range(row_max - row_min):
+        for column in range(column_max - column_min):
+            value = float(values[row, column])
+            if isnan(value) or isinf(value) or value == no_data:
+                continue
+            x = origin_x + (column_min + column) * size_x
+            y = origin_y + (row_min + row) * size_y
+            cell = QgsGeometry.fromRect(
+                QgsRectangle(x, y, x + size_x, y + size_y))
+            area = geometry.intersection(cell).area()
+            total += value * area / cell_area
+    return total
@@ -0,0 +1,61 @@
+# coding=utf-8
+
+import unittest
+
+from safe.definitions.constants import INASAFE_TEST
+from safe.test.utilities import get_qgis_app
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from qgis.core import QgsProcessingFeedback
+
+from safe.common.exceptions import AnalysisCanceledError
+from safe.gis.processing_tools import (
+    analysis_feedback,
+    check_analysis_canceled,
+    create_processing_feedback,
+    gdal_progress_callback,
+    report_progress,
+    set_analysis_feedback)
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class ProcessingToolsTest(unittest.TestCase):
+
+    def tearDown(self):
+        set_analysis_feedback(None)
+
+    def test_without_feedback(self):
+        """Test progress is ignored without analysis feedback."""
+        self.assertIsNone(analysis_feedback())
+        report_progress(5, 10)
+        check_analysis_canceled()
+        self.assertEqual(gdal_progress_callback(0.5, '', None), 1)
+        self.assertIsNotNone(create_processing_feedback())
+
+    def test_analysis_feedback(self):
+        """Test progress and cancellation through the analysis feedback."""
+        feedback = QgsProcessingFeedback()
+        set_analysis_feedback(feedback)
+        self.assertIs(create_processing_feedback(), feedback)
+
+        report_progress(5, 10)
+        self.assertEqual(feedback.progress(), 50)
+        report_progress(0, 0)
+        self.assertEqual(feedback.progress(), 50)
+        self.assertEqual(gdal_progress_callback(0.25, '', None), 1)
+        self.assertEqual(feedback.progress(), 25)
+
+        feedback.cancel()
+        with self.assertRaises(AnalysisCanceledError):
+            report_progress(6, 10)
+        with self.assertRaises(AnalysisCanceledError):
+            check_analysis_canceled()
+        self.assertEqual(gdal_progress_callback(0.5, '', None), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,10 +5,7 @@
 
 import logging
 
-from qgis.core import (
-    QgsFeatureRequest,
-    QgsGeometry,
-)
+from qgis.core import QgsFeatureRequest
 
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import hazard_class_field
@@ -17,7 +14,7 @@ from safe.definitions.hazard_classifications import (
 from safe.definitions.layer_purposes import layer_purpose_exposure_summary
 from safe.definitions.processing_steps import assign_highest_value_steps
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.tools import create_spatial_index
+from safe.gis.vector.spatial_join import highest_class_join
 from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -43,6 +40,9 @@ def assign_highest_value(exposure, hazard):
     touches the hazard is affected, and the greatest hazard is the effective
     hazard.
 
+    The hazard areas are joined to the exposure features in bulk, see
+    highest_class_join.
+
     :param exposure: The building vector layer.
     :type exposure: QgsVectorLayer
 
@@ -71,16 +71,6 @@ def assign_highest_value(exposure, hazard):
     exposure.commitChanges()
     provider = exposure.dataProvider()
 
-    spatial_index = create_spatial_index(exposure)
-
-    # cache features from exposure layer for faster retrieval
-    exposure_features = {}
-    for f in exposure.getFeatures():
-        exposure_features[f.id()] = f
-
-    # Todo callback
-    # total = 100.0 / len(selectionA)
-
     hazard_field = hazard_inasafe_fields[hazard_class_field['key']]
 
     layer_classification = None
@@ -93,35 +83,26 @@ def assign_highest_value(exposure, hazard):
     levels = [key['key'] for key in layer_classification['classes']]
     levels.append(not_exposed_class['key'])
 
-    # Let's loop over the hazard layer, from high to low hazard zone.
-    for hazard_value in levels:
-        expression = '"%s" = \'%s\'' % (hazard_field, hazard_value)
-        hazard_request = QgsFeatureRequest().setFilterExpression(expression)
-        update_map = {}
-        for area in hazard.getFeatures(hazard_request):
-            geometry = area.geometry().constGet()
-            intersects = spatial_index.intersects(geometry.boundingBox())
-
-            # use prepared geometry: makes multiple intersection tests faster
-            geometry_prepared = QgsGeometry.createGeometryEngine(
-                geometry)
-            geometry_prepared.prepareGeometry()
-
-            # We need to loop over each intersections exposure / hazard.
-            for i in intersects:
-                building = exposure_features[i]
-                building_geometry = building.geometry()
-
-                if geometry_prepared.intersects(building_geometry.constGet()):
-                    update_map[building.id()] = {}
-                    for index, value in zip(indices, area.attributes()):
-                        update_map[building.id()][index] = value
-
-                    # We don't want this building again, let's remove it from
-                    # the index.
-                    spatial_index.deleteFeature(building)
-
-        provider.changeAttributeValues(update_map)
+    # The rank of each hazard area, from the high to the low hazard zone.
+    hazard_index = hazard.fields().lookupField(hazard_field)
+    areas = list(hazard.getFeatures())
+    ranks = [
+        levels.index(area[hazard_index])
+        if area[hazard_index] in levels else -1 for area in areas]
+
+    request = QgsFeatureRequest().setSubsetOfAttributes([])
+    buildings = list(exposure.getFeatures(request))
+    winners = highest_class_join(
+        [area.geometry() for area in areas],
+        ranks,
+        [building.geometry() for building in buildings])
+
+    update_map = {}
+    for building, winner in zip(buildings, winners):
+        if winner >= 0:
+            update_map[building.id()] = dict(
+                zip(indices, areas[winner].attributes()))
+    provider.changeAttributeValues(update_map)
 
     exposure.updateExtents()
     exposure.updateFields()
@@ -5,6 +5,7 @@ from qgis.core import QgsFeatureRequest
 
 from safe.common.custom_logging import LOGGER
 from safe.definitions.processing_steps import clean_geometry_steps
+from safe.gis.processing_tools import report_progress
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 
@@ -30,10 +31,12 @@ def clean_layer(layer):
     # start editing
     layer.startEditing()
     count = 0
+    total = layer.featureCount()
 
     # iterate through all features
     request = QgsFeatureRequest().setSubsetOfAttributes([])
-    for feature in layer.getFeatures(request):
+    for i, feature in enumerate(layer.getFeatures(request)):
+        report_progress(i, total)
         geom = feature.geometry()
         was_valid, geometry_cleaned = geometry_checker(geom)
 
@@ -9,6 +9,7 @@ from safe.definitions.processing_steps import clip_steps
 from safe.gis.sanity_check import check_layer
 from safe.utilities.profiling import profile
 from safe.gis.processing_tools import (
+    check_analysis_canceled,
     create_processing_context,
     create_processing_feedback,
     initialize_processing)
@@ -44,8 +45,6 @@ def clip(layer_to_clip, mask_layer):
                   'OVERLAY': mask_layer,
                   'OUTPUT': 'memory:'}
 
-    # TODO implement callback through QgsProcessingFeedback object
-
     initialize_processing()
 
     feedback = create_processing_feedback()
@@ -53,6 +52,7 @@ def clip(layer_to_clip, mask_layer):
     result = processing.run('native:clip', parameters, context=context)
     if result is None:
         raise ProcessingInstallationError
+    check_analysis_canceled()
 
     clipped = result['OUTPUT']
     clipped.setName(output_layer_name)
@@ -4,12 +4,15 @@
 
 import logging
 
+from qgis.core import QgsFeatureRequest
+
 from safe.common.exceptions import (
     InvalidKeywordsForProcessingAlgorithm)
 from safe.definitions.processing_steps import assign_default_values_steps
 from safe.definitions.utilities import definition
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.tools import create_field_from_definition
+from safe.gis.vector.tools import (
+    create_field_from_definition, BulkAttributeWriter)
 from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -58,11 +61,13 @@ def add_default_values(layer):
             'ratios for this layer.')
         return layer
 
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+
     for default in list(defaults.keys()):
 
         field = fields.get(default)
         target_field = definition(default)
-        layer.startEditing()
 
         if not field:
             # Case 3
@@ -76,13 +81,16 @@ def add_default_values(layer):
 
             new_field = create_field_from_definition(target_field)
 
+            layer.startEditing()
             layer.addAttribute(new_field)
+            layer.commitChanges()
 
             new_index = layer.fields().lookupField(new_field.name())
 
-            for feature in layer.getFeatures():
-                layer.changeAttributeValue(
-                    feature.id(), new_index, defaults[default])
+            with BulkAttributeWriter(layer) as writer:
+                for feature in layer.getFeatures(request):
+                    writer.change_attribute_value(
+                        feature.id(), new_index, defaults[default])
 
             layer.keywords['inasafe_fields'][target_field['key']] = (
                 target_field['field_name'])
@@ -96,14 +104,15 @@ def add_default_values(layer):
 
             index = layer.fields().lookupField(field)
 
-            for feature in layer.getFeatures():
-                attr_val = feature.attributes()[index]
-                if (attr_val is None or attr_val == '' or (
-                        hasattr(attr_val, 'isNull') and attr_val.isNull())):
-                    layer.changeAttributeValue(
-                        feature.id(), index, defaults[default])
+            with BulkAttributeWriter(layer) as writer:
+                for feature in layer.getFeatures(request):
+                    attr_val = feature.attributes()[index]
+                    if (attr_val is None or attr_val == '' or (
+                            hasattr(attr_val, 'isNull') and
+                            attr_val.isNull())):
+                        writer.change_attribute_value(
+                            feature.id(), index, defaults[default])
 
-        layer.commitChanges()
         layer.keywords['title'] = output_layer_name
 
     check_layer(layer)
@@ -4,6 +4,8 @@
 
 import logging
 
+from qgis.core import QgsFeatureRequest
+
 from safe.definitions import count_ratio_mapping
 from safe.definitions.fields import population_count_field
 from safe.definitions.layer_purposes import layer_purpose_exposure
@@ -11,7 +13,8 @@ from safe.definitions.processing_steps import (
     recompute_counts_steps)
 from safe.definitions.utilities import definition, get_non_compulsory_fields
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.tools import create_field_from_definition
+from safe.gis.vector.tools import (
+    create_field_from_definition, BulkAttributeWriter)
 from safe.utilities.profiling import profile
 
 LOGGER = logging.getLogger('InaSAFE')
@@ -81,25 +84,29 @@ def from_counts_to_ratios(layer):
                 'will not compute a ratio from this field.'.format(
                     count_field=count_field['key']))
 
+    layer.commitChanges()
+
     if len(mapping) == 0:
         # There is not a subset count field. Let's skip this layer.
-        layer.commitChanges()
         return layer
 
-    for feature in layer.getFeatures():
-        total_count = feature[inasafe_fields[population_count_field['key']]]
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    with BulkAttributeWriter(layer) as writer:
+        for feature in layer.getFeatures(request):
+            total_count = feature[
+                inasafe_fields[population_count_field['key']]]
+
+            for count_field, index in list(mapping.items()):
+                count = feature[count_field]
+                try:
+                    # For #4669, fix always get 0
+                    new_value = count / float(total_count)
+                except TypeError:
+                    new_value = ''
+                except ZeroDivisionError:
+                    new_value = 0
+                writer.change_attribute_value(feature.id(), index, new_value)
 
-        for count_field, index in list(mapping.items()):
-            count = feature[count_field]
-            try:
-                # For #4669, fix always get 0
-                new_value = count / float(total_count)
-            except TypeError:
-                new_value = ''
-            except ZeroDivisionError:
-                new_value = 0
-            layer.changeAttributeValue(feature.id(), index, new_value)
-
-    layer.commitChanges()
     check_layer(layer)
     return layer
@@ -10,8 +10,10 @@ from safe.common.exceptions import ProcessingInstallationError
 from safe.definitions.layer_purposes import layer_purpose_exposure_summary
 from safe.definitions.processing_steps import intersection_steps
 from safe.gis.sanity_check import check_layer
+from safe.gis.vector.overlay import overlay_workers, partitioned_intersection
 from safe.utilities.profiling import profile
 from safe.gis.processing_tools import (
+    check_analysis_canceled,
     create_processing_context,
     create_processing_feedback,
     initialize_processing)
@@ -30,6 +32,9 @@ def intersection(source, mask):
 
     Issue https://github.com/inasafe/inasafe/issues/3186
 
+    With the overlay_workers setting, the layers are intersected by
+    partitions in many processes.
+
     :param source: The vector layer to clip.
     :type source: QgsVectorLayer
 
@@ -45,21 +50,25 @@ def intersection(source, mask):
     output_layer_name = output_layer_name % (
         source.keywords['layer_purpose'])
 
-    parameters = {'INPUT': source,
-                  'OVERLAY': mask,
-                  'OUTPUT': 'memory:'}
-
-    # TODO implement callback through QgsProcessingFeedback object
-
-    initialize_processing()
-
-    feedback = create_processing_feedback()
-    context = create_processing_context(feedback=feedback)
-    result = processing.run('native:intersection', parameters, context=context)
-    if result is None:
-        raise ProcessingInstallationError
-
-    intersect = result['OUTPUT']
+    workers = overlay_workers()
+    if workers > 1:
+        intersect = partitioned_intersection(source, mask, workers)
+    else:
+        parameters = {'INPUT': source,
+                      'OVERLAY': mask,
+                      'OUTPUT': 'memory:'}
+
+        initialize_processing()
+
+        feedback = create_processing_feedback()
+        context = create_processing_context(feedback=feedback)
+        result = processing.run(
+            'native:intersection', parameters, context=context)
+        if result is None:
+            raise ProcessingInstallationError
+        check_analysis_canceled()
+
+        intersect = result['OUTPUT']
     intersect.setName(output_layer_name)
     intersect.keywords = dict(source.keywords)
     intersect.keywords['title'] = output_layer_name
@@ -5,7 +5,6 @@
 from qgis.core import (
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
-    QgsProject,
     QgsGeometry,
     QgsFeature,
     QgsWkbTypes,
@@ -15,6 +14,7 @@ from safe.common.utilities import get_utm_epsg
 from safe.definitions.fields import hazard_class_field, buffer_distance_field
 from safe.definitions.layer_purposes import layer_purpose_hazard
 from safe.definitions.processing_steps import buffer_steps
+from safe.gis.processing_tools import analysis_transform_context
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.tools import (
     create_memory_layer,
@@ -81,9 +81,9 @@ def multi_buffering(layer, radii, callback=None):
         utm = QgsCoordinateReferenceSystem(
             get_utm_epsg(center.x(), center.y(), input_crs))
         transform = QgsCoordinateTransform(
-            layer.crs(), utm, QgsProject.instance())
+            layer.crs(), utm, analysis_transform_context())
         reverse_transform = QgsCoordinateTransform(
-            utm, layer.crs(), QgsProject.instance())
+            utm, layer.crs(), analysis_transform_context())
     else:
         transform = None
         reverse_transform = None
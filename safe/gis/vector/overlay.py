@@ -0,0 +1,338 @@
+# coding=utf-8
+
+"""Intersection and union of two layers, partitioned in a process pool."""
+
+import logging
+import multiprocessing
+from math import ceil, sqrt
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeature,
+    QgsGeometry,
+    QgsProcessingUtils,
+    QgsRectangle,
+    QgsSpatialIndex,
+)
+
+from safe.gis.processing_tools import (
+    analysis_transform_context, check_analysis_canceled, report_progress)
+from safe.gis.vector.overlay_worker import (
+    DIFFERENCE, INTERSECTION, overlay_partition)
+from safe.gis.vector.tools import create_memory_layer
+from safe.utilities.profiling import profile
+from safe.utilities.settings import setting
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Number of partitions for each worker, so the workers stay busy when the
+# partitions are not equally loaded.
+PARTITIONS_PER_WORKER = 4
+
+
+def overlay_workers():
+    """The number of processes running the intersections and the unions.
+
+    :returns: The overlay_workers setting, 1 in a worker process which can't
+        start other processes.
+    :rtype: int
+
+    .. versionadded:: 5.0
+    """
+    if multiprocessing.current_process().daemon:
+        return 1
+    return setting('overlay_workers', expected_type=int)
+
+
+@profile
+def partitioned_intersection(source, overlay, workers):
+    """Intersect two layers like native:intersection, in many processes.
+
+    The features of the source layer are split in partitions by a grid on
+    the layer extent. Each partition is sent to a process with the features
+    of the overlay layer it may intersect, as WKB.
+
+    :param source: The vector layer to intersect.
+    :type source: QgsVectorLayer
+
+    :param overlay: The overlay vector layer.
+    :type overlay: QgsVectorLayer
+
+    :param workers: The number of processes.
+    :type workers: int
+
+    :return: The layer with the fields of both layers. The features are
+        ordered by source feature, then by overlay feature.
+    :rtype: QgsVectorLayer
+
+    .. versionadded:: 5.0
+    """
+    features_a = _read_features(source)
+    features_b = _read_features(overlay, source.crs())
+    dimension = int(source.geometryType())
+
+    tasks = _partition_tasks(
+        INTERSECTION, features_a, features_b, dimension, workers)
+    results = _run_tasks(tasks, workers)
+
+    fields = QgsProcessingUtils.combineFields(
+        source.fields(), overlay.fields())
+    layer = create_memory_layer(
+        'output', source.geometryType(), source.crs(), fields)
+    _add_results(layer, results, [(features_a, features_b)])
+    return layer
+
+
+@profile
+def partitioned_union(union_a, union_b, workers):
+    """Union of two layers like native:union, in many processes.
+
+    The union is the intersection of the two layers, then the difference
+    between the first layer and the second one and finally the difference
+    between the second layer and the first one. Each of them is split in
+    partitions by a grid like partitioned_intersection.
+
+    :param union_a: The vector layer for the union.
+    :type union_a: QgsVectorLayer
+
+    :param union_b: The vector layer for the union.
+    :type union_b: QgsVectorLayer
+
+    :param workers: The number of processes.
+    :type workers: int
+
+    :return: The layer with the fields of both layers.
+    :rtype: QgsVectorLayer
+
+    .. versionadded:: 5.0
+    """
+    features_a = _read_features(union_a)
+    features_b = _read_features(union_b, union_a.crs())
+    dimension = int(union_a.geometryType())
+
+    tasks = _partition_tasks(
+        INTERSECTION, features_a, features_b, dimension, workers)
+    tasks += _partition_tasks(
+        DIFFERENCE, features_a, features_b, dimension, workers, stage=1)
+    tasks += _partition_tasks(
+        DIFFERENCE, features_b, features_a, dimension, workers, stage=2)
+    results = _run_tasks(tasks, workers)
+
+    # Features without geometry are not intersected but they are kept by the
+    # differences.
+    for stage, features in [(1, features_a), (2, features_b)]:
+        for index, (_, wkb, _) in enumerate(features):
+            if wkb is None:
+                results.append((stage, index, -1, None))
+
+    fields = QgsProcessingUtils.combineFields(
+        union_a.fields(), union_b.fields())
+    layer = create_memory_layer(
+        'output', union_a.geometryType(), union_a.crs(), fields)
+    _add_results(
+        layer,
+        results,
+        [(features_a, features_b),
+         (features_a, None),
+         (None, features_b)])
+    return layer
+
+
+def _read_features(layer, crs=None):
+    """Read the attributes, the WKB and the bounding box of each feature.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param crs: The CRS of the geometries. Default to the layer CRS.
+    :type crs: QgsCoordinateReferenceSystem
+
+    :returns: List of attributes, WKB (None without geometry) and bounding
+        box, in the order of the layer.
+    :rtype: list
+    """
+    transform = None
+    if crs is not None and crs.authid() != layer.crs().authid():
+        transform = QgsCoordinateTransform(
+            layer.crs(), crs, analysis_transform_context())
+
+    features = []
+    for feature in layer.getFeatures():
+        if not feature.hasGeometry():
+            features.append((feature.attributes(), None, None))
+            continue
+        geometry = QgsGeometry(feature.geometry())
+        if transform is not None:
+            geometry.transform(transform)
+        features.append((
+            feature.attributes(),
+            bytes(geometry.asWkb()),
+            geometry.boundingBox()))
+    return features
+
+
+def _partition_tasks(
+        operation, features, overlay, dimension, workers, stage=0):
+    """Split the features in partitions by a grid on their extent.
+
+    The candidates of each feature are the overlay features intersecting
+    its bounding box, like the spatial index used by processing.
+
+    :param operation: INTERSECTION or DIFFERENCE.
+    :type operation: str
+
+    :param features: The features from _read_features.
+    :type features: list
+
+    :param overlay: The overlay features from _read_features.
+    :type overlay: list
+
+    :param dimension: The dimension of the geometries, from QgsWkbTypes.
+    :type dimension: int
+
+    :param workers: The number of processes.
+    :type workers: int
+
+    :param stage: The order of the results of the operation in the output.
+    :type stage: int
+
+    :returns: List of tasks for overlay_partition.
+    :rtype: list
+    """
+    index = QgsSpatialIndex()
+    for overlay_index, (_, wkb, box) in enumerate(overlay):
+        if wkb is not None:
+            feature = QgsFeature(overlay_index)
+            feature.setGeometry(QgsGeometry.fromRect(box))
+            index.insertFeature(feature)
+
+    boxes = [box for _, wkb, box in features if wkb is not None]
+    if not boxes:
+        return []
+    extent = QgsRectangle(boxes[0])
+    for box in boxes[1:]:
+        extent.combineExtentWith(box)
+
+    grid = int(ceil(sqrt(workers * PARTITIONS_PER_WORKER)))
+    width = extent.width() / grid or 1
+    height = extent.height() / grid or 1
+    partitions = {}
+    for feature_index, (_, wkb, box) in enumerate(features):
+        if wkb is None:
+            continue
+        centre = box.center()
+        column = min(int((centre.x() - extent.xMinimum()) / width), grid - 1)
+        row = min(int((centre.y() - extent.yMinimum()) / height), grid - 1)
+        partitions.setdefault((row, column), []).append(feature_index)
+
+    tasks = []
+    for key in sorted(partitions):
+        candidates = dict(
+            (feature_index, index.intersects(features[feature_index][2]))
+            for feature_index in partitions[key])
+        overlay_indexes = sorted(set(
+            candidate
+            for feature_candidates in candidates.values()
+            for candidate in feature_candidates))
+        tasks.append({
+            'operation': operation,
+            'stage': stage,
+            'dimension': dimension,
+            'features': [
+                (feature_index, features[feature_index][1])
+                for feature_index in partitions[key]],
+            'overlay': [
+                (overlay_index, overlay[overlay_index][1])
+                for overlay_index in overlay_indexes],
+            'candidates': candidates,
+        })
+    return tasks
+
+
+def _run_tasks(tasks, workers):
+    """Run the tasks in a process pool.
+
+    :param tasks: The tasks from _partition_tasks.
+    :type tasks: list
+
+    :param workers: The number of processes.
+    :type workers: int
+
+    :returns: The results of all tasks, sorted by stage, feature and overlay
+        feature.
+    :rtype: list
+    """
+    # Imported here, the impact function imports this module.
+    from safe.impact_function.multi_exposure_worker import python_executable
+
+    LOGGER.debug('Overlay of %s partitions in %s processes' % (
+        len(tasks), workers))
+    results = []
+    if not tasks:
+        return results
+
+    # QGIS can't be forked. The workers only import overlay_worker, which
+    # uses OGR, they don't start QGIS nor Processing.
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python_executable())
+    pool = context.Pool(processes=min(workers, len(tasks)))
+    try:
+        for done, partition in enumerate(
+                pool.imap_unordered(overlay_partition, tasks)):
+            results.extend(partition)
+            report_progress(done + 1, len(tasks))
+    finally:
+        pool.terminate()
+        pool.join()
+    check_analysis_canceled()
+
+    results.sort(key=lambda result: result[0:3])
+    return results
+
+
+def _add_results(layer, results, stages):
+    """Add the results to the output layer, with the attributes of the
+    features which have been overlaid.
+
+    :param layer: The output layer, with the fields of both layers.
+    :type layer: QgsVectorLayer
+
+    :param results: The sorted results from _run_tasks.
+    :type results: list
+
+    :param stages: For each stage, the features whose attributes are used
+        before and after the WKB, None to fill the attributes with NULL.
+    :type stages: list
+    """
+    fields = layer.fields()
+    output_features = []
+    for stage, index, overlay_index, wkb in results:
+        features, overlay = stages[stage]
+        if features is None:
+            # The features and the overlay are swapped in this stage.
+            attributes_b = overlay[index][0]
+            attributes_a = [None] * (fields.count() - len(attributes_b))
+        else:
+            attributes_a = features[index][0]
+            if overlay is None:
+                attributes_b = [None] * (fields.count() - len(attributes_a))
+            else:
+                attributes_b = overlay[overlay_index][0]
+
+        feature = QgsFeature(fields)
+        if wkb is not None:
+            geometry = QgsGeometry()
+            geometry.fromWkb(wkb)
+            geometry.convertToMultiType()
+            feature.setGeometry(geometry)
+        feature.setAttributes(list(attributes_a) + list(attributes_b))
+        output_features.append(feature)
+
+    # The memory provider gives the feature IDs in this order.
+    layer.dataProvider().addFeatures(output_features)
+    layer.updateExtents()
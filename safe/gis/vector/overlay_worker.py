@@ -0,0 +1,114 @@
+# coding=utf-8
+
+"""Overlay of a partition of two layers, in a worker process.
+
+The worker processes of the partitioned intersection and union only import
+this module. It must only use OGR, not QGIS nor Processing.
+"""
+
+from osgeo import ogr
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+INTERSECTION = 'intersection'
+DIFFERENCE = 'difference'
+
+# The multi geometry type for each dimension.
+MULTI_TYPES = {
+    0: ogr.wkbMultiPoint,
+    1: ogr.wkbMultiLineString,
+    2: ogr.wkbMultiPolygon,
+}
+
+
+def overlay_partition(task):
+    """Intersect or subtract the features of a partition.
+
+    Like QgsOverlayUtils, the intersection of two features is kept if they
+    intersect and the difference subtracts the union of the intersecting
+    overlay features. Only the parts with the dimension of the layer are
+    kept, a result without any of them is dropped.
+
+    :param task: The stage and the operation, the dimension of the
+        geometries, the features of the partition and the overlay features
+        with their index and WKB and the indexes of the candidate overlay
+        features of each feature.
+    :type task: dict
+
+    :returns: List of the stage, the index of the feature, the index of the
+        overlay feature (-1 for a difference) and the WKB of the result.
+    :rtype: list
+    """
+    overlay = dict(
+        (index, ogr.CreateGeometryFromWkb(wkb))
+        for index, wkb in task['overlay'])
+    results = []
+    for index, wkb in task['features']:
+        geometry = ogr.CreateGeometryFromWkb(wkb)
+        candidates = [
+            candidate for candidate in task['candidates'][index]
+            if geometry.Intersects(overlay[candidate])]
+
+        if task['operation'] == INTERSECTION:
+            for candidate in sorted(candidates):
+                intersection = geometry.Intersection(overlay[candidate])
+                intersection = _sanitize(intersection, task['dimension'])
+                if intersection is not None:
+                    results.append((
+                        task['stage'],
+                        index,
+                        candidate,
+                        intersection.ExportToIsoWkb()))
+        else:
+            difference = geometry
+            if candidates:
+                union = overlay[candidates[0]].Clone()
+                for candidate in candidates[1:]:
+                    union = union.Union(overlay[candidate])
+                difference = geometry.Difference(union)
+            if difference is None:
+                raise Exception('GEOS geoprocessing error: difference failed.')
+            difference = _sanitize(difference, task['dimension'])
+            if difference is not None:
+                results.append((
+                    task['stage'], index, -1, difference.ExportToIsoWkb()))
+    return results
+
+
+def _sanitize(geometry, dimension):
+    """Keep the parts of a result with the dimension of the layer.
+
+    :param geometry: The intersection or the difference.
+    :type geometry: ogr.Geometry
+
+    :param dimension: The dimension of the layer, from QgsWkbTypes.
+    :type dimension: int
+
+    :returns: The geometry or None if there is no part to keep.
+    :rtype: ogr.Geometry
+    """
+    if geometry is None or geometry.IsEmpty():
+        return None
+    if ogr.GT_Flatten(geometry.GetGeometryType()) != (
+            ogr.wkbGeometryCollection):
+        if geometry.GetDimension() != dimension:
+            # A line where two polygons touch for instance.
+            return None
+        return geometry
+
+    parts = ogr.Geometry(MULTI_TYPES[dimension])
+    for index in range(geometry.GetGeometryCount()):
+        part = geometry.GetGeometryRef(index)
+        if part.GetDimension() != dimension or part.IsEmpty():
+            continue
+        if ogr.GT_Flatten(part.GetGeometryType()) == MULTI_TYPES[dimension]:
+            for sub_index in range(part.GetGeometryCount()):
+                parts.AddGeometry(part.GetGeometryRef(sub_index))
+        else:
+            parts.AddGeometry(part)
+    if parts.IsEmpty():
+        return None
+    return parts
@@ -43,7 +43,8 @@ from safe.gis.vector.tools import (
     remove_fields,
     copy_fields,
     copy_layer,
-    create_field_from_definition
+    create_field_from_definition,
+    BulkAttributeWriter
 )
 from safe.impact_function.postprocessors import run_single_post_processor
 from safe.processors import post_processor_size
@@ -309,54 +310,55 @@ def _remove_features(layer):
 
         request = QgsFeatureRequest()
         request.setSubsetOfAttributes([field_name], layer.fields())
-        layer.startEditing()
         i = 0
-        for feature in layer.getFeatures(request):
-            feat_attr = feature.attributes()[index]
-            if feat_attr is None or (hasattr(feat_attr, 'isNull') and
-                                     feat_attr.isNull()):
-                if layer_purpose == 'hazard':
-                    # Remove the feature if the hazard is null.
-                    layer.deleteFeature(feature.id())
+        with BulkAttributeWriter(layer) as writer:
+            for feature in layer.getFeatures(request):
+                feat_attr = feature.attributes()[index]
+                if feat_attr is None or (hasattr(feat_attr, 'isNull') and
+                                         feat_attr.isNull()):
+                    if layer_purpose == 'hazard':
+                        # Remove the feature if the hazard is null.
+                        writer.delete_feature(feature.id())
+                        i += 1
+                        # Only once, even if its geometry is empty too.
+                        continue
+                    elif layer_purpose == 'aggregation':
+                        # Put the ID if the value is null.
+                        writer.change_attribute_value(
+                            feature.id(), index, str(feature.id()))
+                    elif layer_purpose == 'exposure':
+                        # Put an empty value, the value mapping will take
+                        # care of it in the 'other' group.
+                        writer.change_attribute_value(
+                            feature.id(), index, '')
+
+                # Check if there is en empty geometry.
+                geometry = feature.geometry()
+                if not geometry:
+                    writer.delete_feature(feature.id())
                     i += 1
-                elif layer_purpose == 'aggregation':
-                    # Put the ID if the value is null.
-                    layer.changeAttributeValue(
-                        feature.id(), index, str(feature.id()))
-                elif layer_purpose == 'exposure':
-                    # Put an empty value, the value mapping will take care of
-                    # it in the 'other' group.
-                    layer.changeAttributeValue(
-                        feature.id(), index, '')
-
-            # Check if there is en empty geometry.
-            geometry = feature.geometry()
-            if not geometry:
-                layer.deleteFeature(feature.id())
-                i += 1
-                continue
-
-            # Check if the geometry is empty.
-            if geometry.isEmpty():
-                layer.deleteFeature(feature.id())
-                i += 1
-                continue
-
-            # Check if the geometry is valid.
-            if not geometry.isGeosValid():
-                # polygonize can produce some invalid geometries
-                # For instance a polygon like this, sharing a same point :
-                #      _______
-                #      |  ___|__
-                #      |  |__|  |
-                #      |________|
-                # layer.deleteFeature(feature.id())
-                # i += 1
-                pass
-
-            # TODO We need to add more tests
-            # like checking if the value is in the value_mapping.
-        layer.commitChanges()
+                    continue
+
+                # Check if the geometry is empty.
+                if geometry.isEmpty():
+                    writer.delete_feature(feature.id())
+                    i += 1
+                    continue
+
+                # Check if the geometry is valid.
+                if not geometry.isGeosValid():
+                    # polygonize can produce some invalid geometries
+                    # For instance a polygon like this, sharing a same point :
+                    #      _______
+                    #      |  ___|__
+                    #      |  |__|  |
+                    #      |________|
+                    # writer.delete_feature(feature.id())
+                    # i += 1
+                    pass
+
+                # TODO We need to add more tests
+                # like checking if the value is in the value_mapping.
         if i:
             LOGGER.critical(
                 'Features which have been removed from %s : %s'
@@ -406,14 +408,17 @@ def _add_id_column(layer):
         id_field.setLength(safe_id['length'])
 
         layer.addAttribute(id_field)
+        layer.commitChanges()
 
         new_index = layer.fields().lookupField(id_field.name())
 
-        for feature in layer.getFeatures():
-            layer.changeAttributeValue(
-                feature.id(), new_index, feature.id())
-
-        layer.commitChanges()
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([])
+        with BulkAttributeWriter(layer) as writer:
+            for feature in layer.getFeatures(request):
+                writer.change_attribute_value(
+                    feature.id(), new_index, feature.id())
 
         layer.keywords['inasafe_fields'][safe_id['key']] = (
             safe_id['field_name'])
@@ -432,6 +437,7 @@ def _add_default_exposure_class(layer):
     layer.keywords['inasafe_fields'][exposure_class_field['key']] = (
         exposure_class_field['field_name'])
     layer.addAttribute(field)
+    layer.commitChanges()
 
     index = layer.fields().lookupField(exposure_class_field['field_name'])
 
@@ -439,10 +445,10 @@ def _add_default_exposure_class(layer):
 
     request = QgsFeatureRequest()
     request.setFlags(QgsFeatureRequest.NoGeometry)
-    for feature in layer.getFeatures(request):
-        layer.changeAttributeValue(feature.id(), index, exposure)
-
-    layer.commitChanges()
+    request.setSubsetOfAttributes([])
+    with BulkAttributeWriter(layer) as writer:
+        for feature in layer.getFeatures(request):
+            writer.change_attribute_value(feature.id(), index, exposure)
     return
 
 
@@ -486,17 +492,19 @@ def sum_fields(layer, output_field_key, input_fields):
         # Get the output field index
         output_idx = layer.fields().lookupField(output_field_name)
         # Output index is not found
-        layer.startEditing()
         if output_idx == -1:
             output_field = create_field_from_definition(field_definition)
+            layer.startEditing()
             layer.addAttribute(output_field)
+            layer.commitChanges()
             output_idx = layer.fields().lookupField(output_field_name)
 
         # Iterate to all features
-        for feature in layer.getFeatures():
-            context.setFeature(feature)
-            result = sum_expression.evaluate(context)
-            feature[output_idx] = result
-            layer.updateFeature(feature)
-
-        layer.commitChanges()
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        with BulkAttributeWriter(layer) as writer:
+            for feature in layer.getFeatures(request):
+                context.setFeature(feature)
+                result = sum_expression.evaluate(context)
+                writer.change_attribute_value(
+                    feature.id(), output_idx, result)
@@ -2,7 +2,7 @@
 
 """Reclassify a continuous vector layer."""
 
-from qgis.core import QgsField
+from qgis.core import QgsField, QgsFeatureRequest
 
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import hazard_class_field, hazard_value_field
@@ -10,6 +10,7 @@ from safe.definitions.processing_steps import reclassify_vector_steps
 from safe.definitions.utilities import definition
 from safe.gis.sanity_check import check_layer
 from safe.gis.tools import reclassify_value
+from safe.gis.vector.tools import BulkAttributeWriter
 from safe.utilities.metadata import (
     active_thresholds_value_maps, active_classification)
 from safe.utilities.profiling import profile
@@ -83,24 +84,27 @@ def reclassify(layer, exposure_key=None):
 
     layer.startEditing()
     layer.addAttribute(classified_field)
+    layer.commitChanges()
+    layer.updateFields()
 
     classified_field_index = layer.fields(). \
         lookupField(classified_field.name())
 
-    for feature in layer.getFeatures():
-        attributes = feature.attributes()
-        source_value = attributes[continuous_index]
-        classified_value = reclassify_value(source_value, thresholds)
-        if classified_value is None or \
-                (hasattr(classified_value, 'isNull') and
-                    classified_value.isNull()):
-            layer.deleteFeature(feature.id())
-        else:
-            layer.changeAttributeValue(
-                feature.id(), classified_field_index, classified_value)
-
-    layer.commitChanges()
-    layer.updateFields()
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([continuous_index])
+    with BulkAttributeWriter(layer) as writer:
+        for feature in layer.getFeatures(request):
+            attributes = feature.attributes()
+            source_value = attributes[continuous_index]
+            classified_value = reclassify_value(source_value, thresholds)
+            if classified_value is None or \
+                    (hasattr(classified_value, 'isNull') and
+                        classified_value.isNull()):
+                writer.delete_feature(feature.id())
+            else:
+                writer.change_attribute_value(
+                    feature.id(), classified_field_index, classified_value)
 
     # We transfer keywords to the output.
     inasafe_fields[hazard_class_field['key']] = (
@@ -12,7 +12,7 @@ from safe.definitions.fields import (
 from safe.definitions.processing_steps import (
     recompute_counts_steps)
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.tools import SizeCalculator
+from safe.gis.vector.tools import SizeCalculator, BulkAttributeWriter
 from safe.processors.post_processor_functions import size
 from safe.utilities.profiling import profile
 
@@ -67,31 +67,29 @@ def recompute_counts(layer):
     size_field_name = fields[size_field['key']]
     size_field_index = layer.fields().lookupField(size_field_name)
 
-    layer.startEditing()
-
     exposure_key = layer.keywords['exposure_keywords']['exposure']
     size_calculator = SizeCalculator(
         layer.crs(), layer.geometryType(), exposure_key)
 
-    for feature in layer.getFeatures():
-        old_size = feature[size_field_name]
-        new_size = size(
-            size_calculator=size_calculator, geometry=feature.geometry())
-
-        layer.changeAttributeValue(feature.id(), size_field_index, new_size)
-
-        # Cross multiplication for each field
-        for index in indexes:
-            old_count = feature[index]
-            try:
-                new_value = new_size * old_count / old_size
-            except TypeError:
-                new_value = ''
-            except ZeroDivisionError:
-                new_value = 0
-            layer.changeAttributeValue(feature.id(), index, new_value)
-
-    layer.commitChanges()
+    with BulkAttributeWriter(layer) as writer:
+        for feature in layer.getFeatures():
+            old_size = feature[size_field_name]
+            new_size = size(
+                size_calculator=size_calculator, geometry=feature.geometry())
+
+            writer.change_attribute_value(
+                feature.id(), size_field_index, new_size)
+
+            # Cross multiplication for each field
+            for index in indexes:
+                old_count = feature[index]
+                try:
+                    new_value = new_size * old_count / old_size
+                except TypeError:
+                    new_value = ''
+                except ZeroDivisionError:
+                    new_value = 0
+                writer.change_attribute_value(feature.id(), index, new_value)
 
     layer.keywords['title'] = output_layer_name
 
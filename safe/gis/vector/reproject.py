@@ -5,10 +5,11 @@
 from qgis.core import (
     QgsCoordinateTransform,
     QgsFeature,
-    QgsProject,
 )
 
 from safe.definitions.processing_steps import reproject_steps
+from safe.gis.processing_tools import (
+    analysis_transform_context, report_progress)
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.tools import create_memory_layer
 from safe.utilities.profiling import profile
@@ -54,11 +55,12 @@ def reproject(layer, output_crs, callback=None):
     reprojected.startEditing()
 
     crs_transform = QgsCoordinateTransform(
-        input_crs, output_crs, QgsProject.instance())
+        input_crs, output_crs, analysis_transform_context())
 
     out_feature = QgsFeature()
 
     for i, feature in enumerate(layer.getFeatures()):
+        report_progress(i, feature_count)
         geom = feature.geometry()
         geom.transform(crs_transform)
         out_feature.setGeometry(geom)
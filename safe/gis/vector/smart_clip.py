@@ -12,6 +12,7 @@ from qgis.core import (
 )
 
 from safe.definitions.processing_steps import smart_clip_steps
+from safe.gis.processing_tools import report_progress
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.tools import create_memory_layer
 from safe.utilities.profiling import profile
@@ -64,8 +65,11 @@ def smart_clip(layer_to_clip, mask_layer):
     engine.prepareGeometry()
 
     extent = mask_layer.extent()
+    total = layer_to_clip.featureCount()
 
-    for feature in layer_to_clip.getFeatures(QgsFeatureRequest(extent)):
+    request = QgsFeatureRequest(extent)
+    for i, feature in enumerate(layer_to_clip.getFeatures(request)):
+        report_progress(i, total)
 
         if engine.intersects(feature.geometry().constGet()):
             out_feat = QgsFeature()
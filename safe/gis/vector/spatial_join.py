@@ -0,0 +1,364 @@
+# coding=utf-8
+
+"""Bulk spatial join between zones and many geometries with NumPy."""
+
+import logging
+from math import ceil, sqrt
+
+import numpy as np
+from qgis.core import QgsGeometry, QgsWkbTypes
+
+from safe.gis.processing_tools import report_progress
+from safe.utilities.profiling import profile
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+# Maximum number of children of a node of the R-tree.
+NODE_CAPACITY = 16
+
+# Maximum number of elements of the arrays used by a batch of tests.
+BATCH_SIZE = 1000000
+
+
+class PackedRTree(object):
+
+    """A static R-tree of bounding boxes stored in NumPy arrays.
+
+    The boxes are sorted with Sort-Tile-Recursive, then grouped by
+    NODE_CAPACITY in the nodes of each level. Queries are done for many
+    boxes at once, level by level.
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(self, boxes, node_capacity=NODE_CAPACITY):
+        """Constructor.
+
+        :param boxes: The xmin, ymin, xmax and ymax of each box.
+        :type boxes: numpy.ndarray
+
+        :param node_capacity: Maximum number of children of a node.
+        :type node_capacity: int
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.node_capacity = node_capacity
+        self.order = _sort_tile_recursive(boxes, node_capacity)
+
+        # From the boxes, sorted, to the root. NaN boxes are ignored.
+        self.levels = [boxes[self.order]]
+        while len(self.levels[-1]) > node_capacity:
+            children = self.levels[-1]
+            starts = np.arange(0, len(children), node_capacity)
+            self.levels.append(np.column_stack([
+                np.fmin.reduceat(children[:, 0], starts),
+                np.fmin.reduceat(children[:, 1], starts),
+                np.fmax.reduceat(children[:, 2], starts),
+                np.fmax.reduceat(children[:, 3], starts)]))
+
+    def __len__(self):
+        """The number of boxes in the tree.
+
+        :returns: The number of boxes.
+        :rtype: int
+        """
+        return len(self.order)
+
+    def query(self, boxes):
+        """Find the boxes of the tree intersecting each box.
+
+        :param boxes: The xmin, ymin, xmax and ymax of each box.
+        :type boxes: numpy.ndarray
+
+        :returns: The indexes of the query boxes and of the boxes of the tree
+            of each intersecting pair, sorted by query box.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(self) or not len(boxes):
+            return empty, empty
+
+        queries = []
+        indexes = []
+        batch = max(
+            BATCH_SIZE // (len(self.levels[-1]) * self.node_capacity), 1)
+        for start in range(0, len(boxes), batch):
+            query, index = self._query_batch(boxes[start:start + batch])
+            queries.append(query + start)
+            indexes.append(index)
+        query = np.concatenate(queries)
+        index = np.concatenate(indexes)
+        order = np.lexsort((index, query))
+        return query[order], index[order]
+
+    def _query_batch(self, boxes):
+        """Find the boxes of the tree intersecting a batch of boxes.
+
+        :param boxes: The xmin, ymin, xmax and ymax of each box.
+        :type boxes: numpy.ndarray
+
+        :returns: The indexes of the query boxes and of the boxes of the tree
+            of each intersecting pair.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        top = self.levels[-1]
+        query = np.repeat(np.arange(len(boxes)), len(top))
+        node = np.tile(np.arange(len(top)), len(boxes))
+        for level in range(len(self.levels) - 1, -1, -1):
+            nodes = self.levels[level]
+            hit = _overlaps(boxes[query], nodes[node])
+            query = query[hit]
+            node = node[hit]
+            if level == 0:
+                break
+
+            # The children of each node are the next ones of the level below.
+            starts = node * self.node_capacity
+            counts = np.minimum(
+                starts + self.node_capacity,
+                len(self.levels[level - 1])) - starts
+            offsets = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts)
+            query = np.repeat(query, counts)
+            node = np.repeat(starts, counts) + offsets
+        return query, self.order[node]
+
+
+@profile
+def highest_class_join(zones, ranks, geometries):
+    """Find the zone with the lowest rank intersecting each geometry.
+
+    It is the "highest hazard class wins" join: the ranks are the order of
+    the hazard classes, from the highest one. Within a rank, the first zone
+    wins. The pairs are found with a PackedRTree, then the intersections are
+    tested rank by rank, only for the geometries which don't have a zone
+    yet. Points are tested in batches with NumPy, other geometries with the
+    prepared geometry of the zone.
+
+    :param zones: The zones.
+    :type zones: list
+
+    :param ranks: The rank of each zone, -1 to ignore the zone.
+    :type ranks: numpy.ndarray
+
+    :param geometries: The geometries to join, as QgsGeometry.
+    :type geometries: list
+
+    :returns: The index of the zone of each geometry, -1 if none intersects.
+    :rtype: numpy.ndarray
+
+    .. versionadded:: 5.0
+    """
+    ranks = np.asarray(ranks, dtype=np.int64)
+    result = np.full(len(geometries), -1, dtype=np.int64)
+
+    tree = PackedRTree(geometry_boxes(geometries))
+    zone_boxes = geometry_boxes(zones)
+    zone_boxes[ranks < 0] = np.nan
+    zone_index, geometry_index = tree.query(zone_boxes)
+
+    # Sorted like the zones are visited: by rank, then by zone.
+    order = np.argsort(ranks[zone_index], kind='mergesort')
+    zone_index = zone_index[order]
+    geometry_index = geometry_index[order]
+    points = point_coordinates(geometries)
+
+    done = 0
+    total = len(np.unique(zone_index))
+    for rank in np.unique(ranks[zone_index]):
+        selected = (ranks[zone_index] == rank) & (result[geometry_index] < 0)
+        level_zones = zone_index[selected]
+        level_geometries = geometry_index[selected]
+        if not len(level_zones):
+            continue
+        intersects = np.zeros(len(level_zones), dtype=bool)
+
+        # The pairs of each zone are contiguous.
+        bounds = np.flatnonzero(np.diff(level_zones)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(level_zones)]])
+        for start, end in zip(starts, ends):
+            report_progress(done, total)
+            done += 1
+            zone = zones[level_zones[start]]
+            candidates = level_geometries[start:end]
+            if points is not None:
+                intersects[start:end] = points_in_polygon(
+                    points[0][candidates], points[1][candidates], zone)
+            else:
+                engine = QgsGeometry.createGeometryEngine(zone.constGet())
+                engine.prepareGeometry()
+                intersects[start:end] = [
+                    engine.intersects(geometries[candidate].constGet())
+                    for candidate in candidates]
+
+        # The first zone intersecting each geometry wins.
+        winners, first = np.unique(
+            level_geometries[intersects], return_index=True)
+        result[winners] = level_zones[intersects][first]
+
+    LOGGER.debug('Spatial join of %s geometries with %s zones: %s pairs' % (
+        len(geometries), len(zones), len(zone_index)))
+    return result
+
+
+def geometry_boxes(geometries):
+    """The bounding box of each geometry.
+
+    :param geometries: The geometries, as QgsGeometry.
+    :type geometries: list
+
+    :returns: The xmin, ymin, xmax and ymax of each geometry, NaN for null
+        geometries which never intersect.
+    :rtype: numpy.ndarray
+    """
+    boxes = np.full((len(geometries), 4), np.nan)
+    for index, geometry in enumerate(geometries):
+        if geometry is None or geometry.isNull():
+            continue
+        box = geometry.boundingBox()
+        boxes[index] = (
+            box.xMinimum(), box.yMinimum(), box.xMaximum(), box.yMaximum())
+    return boxes
+
+
+def point_coordinates(geometries):
+    """The coordinates of geometries which are all single points.
+
+    :param geometries: The geometries, as QgsGeometry.
+    :type geometries: list
+
+    :returns: The x and y arrays or None if a geometry is not a single point.
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    coordinates = np.full((len(geometries), 2), np.nan)
+    for index, geometry in enumerate(geometries):
+        if geometry is None or geometry.isNull():
+            continue
+        if geometry.type() != QgsWkbTypes.PointGeometry:
+            return None
+        if geometry.isMultipart():
+            parts = geometry.asMultiPoint()
+            if len(parts) != 1:
+                return None
+            point = parts[0]
+        else:
+            point = geometry.asPoint()
+        coordinates[index] = (point.x(), point.y())
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def points_in_polygon(x, y, polygon):
+    """Test if points intersect a polygon, points on the boundary included.
+
+    :param x: The x of the points.
+    :type x: numpy.ndarray
+
+    :param y: The y of the points.
+    :type y: numpy.ndarray
+
+    :param polygon: The polygon or multipolygon.
+    :type polygon: QgsGeometry
+
+    :returns: If each point intersects the polygon.
+    :rtype: numpy.ndarray
+    """
+    x0, y0, x1, y1 = _polygon_edges(polygon)
+    inside = np.zeros(len(x), dtype=bool)
+    if not len(x0):
+        return inside
+
+    batch = max(BATCH_SIZE // len(x0), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(x), batch):
+            px = x[start:start + batch, np.newaxis]
+            py = y[start:start + batch, np.newaxis]
+
+            # Even-odd rule, with the rings of all the parts.
+            crossing = ((y0 > py) != (y1 > py)) & (
+                px < (x1 - x0) * (py - y0) / (y1 - y0) + x0)
+            result = np.count_nonzero(crossing, axis=1) % 2 == 1
+
+            on_edge = (
+                ((x1 - x0) * (py - y0) == (y1 - y0) * (px - x0)) &
+                (px >= np.minimum(x0, x1)) & (px <= np.maximum(x0, x1)) &
+                (py >= np.minimum(y0, y1)) & (py <= np.maximum(y0, y1)))
+            result |= on_edge.any(axis=1)
+            inside[start:start + batch] = result
+    return inside
+
+
+def _polygon_edges(polygon):
+    """The edges of all the rings of a polygon or a multipolygon.
+
+    :param polygon: The polygon or multipolygon.
+    :type polygon: QgsGeometry
+
+    :returns: The x and y of the start and the end of each edge.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    if polygon.isMultipart():
+        parts = polygon.asMultiPolygon()
+    else:
+        parts = [polygon.asPolygon()]
+
+    edges = []
+    for part in parts:
+        for ring in part:
+            vertices = np.array(
+                [(point.x(), point.y()) for point in ring], dtype=np.float64)
+            if len(vertices) > 1:
+                edges.append(np.column_stack([vertices[:-1], vertices[1:]]))
+    if not edges:
+        return [np.zeros(0)] * 4
+    edges = np.concatenate(edges)
+    return edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+
+
+def _overlaps(boxes, others):
+    """Test if boxes overlap other boxes, pair by pair.
+
+    :param boxes: The xmin, ymin, xmax and ymax of each box.
+    :type boxes: numpy.ndarray
+
+    :param others: The xmin, ymin, xmax and ymax of each other box.
+    :type others: numpy.ndarray
+
+    :returns: If each pair of boxes overlaps. NaN boxes never overlap.
+    :rtype: numpy.ndarray
+    """
+    return (
+        (boxes[:, 0] <= others[:, 2]) & (boxes[:, 2] >= others[:, 0]) &
+        (boxes[:, 1] <= others[:, 3]) & (boxes[:, 3] >= others[:, 1]))
+
+
+def _sort_tile_recursive(boxes, node_capacity):
+    """Sort boxes with Sort-Tile-Recursive.
+
+    The boxes are sorted in vertical slices by the x of their centre, then
+    by the y of their centre in each slice.
+
+    :param boxes: The xmin, ymin, xmax and ymax of each box.
+    :type boxes: numpy.ndarray
+
+    :param node_capacity: Maximum number of children of a node.
+    :type node_capacity: int
+
+    :returns: The indexes of the boxes, sorted.
+    :rtype: numpy.ndarray
+    """
+    if not len(boxes):
+        return np.zeros(0, dtype=np.int64)
+    centre_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centre_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    leaves = int(ceil(len(boxes) / float(node_capacity)))
+    slice_size = int(ceil(sqrt(leaves))) * node_capacity
+
+    order = np.argsort(centre_x, kind='mergesort')
+    slices = np.arange(len(boxes)) // slice_size
+    return order[np.lexsort((centre_y[order], slices))]
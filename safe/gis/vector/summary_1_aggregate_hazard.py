@@ -5,7 +5,8 @@
 
 import logging
 
-from qgis.core import QgsWkbTypes, QgsFeatureRequest
+import numpy as np
+from qgis.core import QgsWkbTypes
 
 from safe.definitions.exposure import exposure_structure
 from safe.definitions.fields import (
@@ -23,10 +24,18 @@ from safe.definitions.fields import (
 from safe.definitions.hazard_classifications import not_exposed_class
 from safe.definitions.layer_purposes import (
     layer_purpose_aggregate_hazard_impacted)
-from safe.definitions.utilities import definition
+from safe.definitions.utilities import definition, HazardProfile
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.summary_tools import (
-    check_inputs, create_absolute_values_structure, add_fields)
+    check_inputs,
+    create_absolute_values_structure,
+    add_fields,
+    is_null,
+    read_columns,
+    replace_null,
+    summarize_absolute_values,
+)
+from safe.gis.vector.tools import BulkAttributeWriter
 from safe.processors import post_processor_affected_function
 from safe.utilities.gis import qgis_version
 from safe.utilities.i18n import tr
@@ -42,7 +51,7 @@ LOGGER = logging.getLogger('InaSAFE')
 
 
 @profile
-def aggregate_hazard_summary(impact, aggregate_hazard):
+def aggregate_hazard_summary(impact, aggregate_hazard, hazard_profile=None):
     """Compute the summary from the source layer to the aggregate_hazard layer.
 
     Source layer :
@@ -62,6 +71,10 @@ def aggregate_hazard_summary(impact, aggregate_hazard):
         statistics.
     :type aggregate_hazard: QgsVectorLayer
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, a new one is created from the current settings.
+    :type hazard_profile: HazardProfile
+
     :return: The new aggregate_hazard layer with summary.
     :rtype: QgsVectorLayer
 
@@ -116,50 +129,41 @@ def aggregate_hazard_summary(impact, aggregate_hazard):
         [affected_field, total_field],
         dynamic_structure,
     )
+    aggregate_hazard.commitChanges()
+
+    LOGGER.debug('Computing the aggregate hazard summary.')
+    fields = [aggregation_id, hazard_id, exposure_class]
+    fields.extend(absolute_values.keys())
+    if field_index is not None:
+        fields.append(field_index)
+    _, columns = read_columns(impact, fields)
+
+    # Field_index can be equal to 0.
+    if field_index is not None:
+        values = replace_null(columns[field_index], 0)
+    else:
+        values = np.ones(len(columns[aggregation_id]), dtype=np.int64)
+
+    aggregation_values = columns[aggregation_id]
+    hazard_values = replace_null(
+        columns[hazard_id], not_exposed_class['key'])
+    exposure_values = replace_null(columns[exposure_class], 'NULL')
 
     flat_table = FlatTable('aggregation_id', 'hazard_id', 'exposure_class')
+    flat_table.add_values(
+        values,
+        aggregation_id=aggregation_values,
+        hazard_id=hazard_values,
+        exposure_class=exposure_values
+    )
 
-    request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    LOGGER.debug('Computing the aggregate hazard summary.')
-    for feature in impact.getFeatures(request):
-        # Field_index can be equal to 0.
-        if field_index is not None:
-            value = feature[field_index]
-        else:
-            value = 1
-
-        aggregation_value = feature[aggregation_id]
-        hazard_value = feature[hazard_id]
-        if (hazard_value is None or hazard_value == '' or
-                (hasattr(hazard_value, 'isNull') and
-                    hazard_value.isNull())):
-            hazard_value = not_exposed_class['key']
-        exposure_value = feature[exposure_class]
-        if (exposure_value is None or exposure_value == '' or
-                (hasattr(exposure_value, 'isNull') and
-                    exposure_value.isNull())):
-            exposure_value = 'NULL'
-
-        flat_table.add_value(
-            value,
-            aggregation_id=aggregation_value,
-            hazard_id=hazard_value,
-            exposure_class=exposure_value
-        )
-
-        # We summarize every absolute values.
-        for field, field_definition in list(absolute_values.items()):
-            value = feature[field]
-            if (value == '' or value is None or
-                    (hasattr(value, 'isNull') and
-                        value.isNull())):
-                value = 0
-            field_definition[0].add_value(
-                value,
-                aggregation_id=aggregation_value,
-                hazard_id=hazard_value
-            )
+    # We summarize every absolute values.
+    summarize_absolute_values(
+        absolute_values,
+        columns,
+        aggregation_id=aggregation_values,
+        hazard_id=hazard_values
+    )
 
     hazard_keywords = aggregate_hazard.keywords['hazard_keywords']
     hazard = hazard_keywords['hazard']
@@ -168,45 +172,56 @@ def aggregate_hazard_summary(impact, aggregate_hazard):
     exposure_keywords = impact.keywords['exposure_keywords']
     exposure = exposure_keywords['exposure']
 
-    for area in aggregate_hazard.getFeatures(request):
-        aggregation_value = area[aggregation_id]
-        feature_hazard_id = area[hazard_id]
-        if (feature_hazard_id == '' or feature_hazard_id is None or
-                (hasattr(feature_hazard_id, 'isNull') and
-                    feature_hazard_id.isNull())):
-            feature_hazard_id = not_exposed_class['key']
-        feature_hazard_value = area[hazard_class]
+    if hazard_profile is None:
+        hazard_profile = HazardProfile()
+
+    sums = flat_table.data
+    absolute_sums = [field[0].data for field in absolute_values.values()]
+
+    feature_ids, areas = read_columns(
+        aggregate_hazard, [aggregation_id, hazard_id, hazard_class])
+    area_hazard_ids = replace_null(
+        areas[hazard_id], not_exposed_class['key'])
+
+    # The affected status only depends on the hazard class.
+    affected_classes = {}
+
+    writer = BulkAttributeWriter(aggregate_hazard)
+    for feature_id, aggregation_value, feature_hazard_id, \
+            feature_hazard_value in zip(
+                feature_ids,
+                areas[aggregation_id],
+                area_hazard_ids,
+                areas[hazard_class]):
+        attributes = {}
         total = 0
         for i, val in enumerate(unique_exposure):
-            sum = flat_table.get_value(
-                aggregation_id=aggregation_value,
-                hazard_id=feature_hazard_id,
-                exposure_class=val
-            )
+            sum = sums.get((aggregation_value, feature_hazard_id, val), 0)
             total += sum
-            aggregate_hazard.changeAttributeValue(area.id(), shift + i, sum)
-
-        affected = post_processor_affected_function(
-            exposure=exposure,
-            hazard=hazard,
-            classification=classification,
-            hazard_class=feature_hazard_value)
-        affected = tr(str(affected))
-        aggregate_hazard.changeAttributeValue(
-            area.id(), shift + len(unique_exposure), affected)
-
-        aggregate_hazard.changeAttributeValue(
-            area.id(), shift + len(unique_exposure) + 1, total)
-
-        for i, field in enumerate(absolute_values.values()):
-            value = field[0].get_value(
-                aggregation_id=aggregation_value,
-                hazard_id=feature_hazard_id
-            )
-            aggregate_hazard.changeAttributeValue(
-                area.id(), shift + len(unique_exposure) + 2 + i, value)
-
-    aggregate_hazard.commitChanges()
+            attributes[shift + i] = sum
+
+        hazard_class_key = (
+            None if is_null(feature_hazard_value) else feature_hazard_value)
+        if hazard_class_key not in affected_classes:
+            affected = post_processor_affected_function(
+                exposure=exposure,
+                hazard=hazard,
+                classification=classification,
+                hazard_class=feature_hazard_value,
+                hazard_profile=hazard_profile)
+            affected_classes[hazard_class_key] = tr(str(affected))
+        attributes[shift + len(unique_exposure)] = (
+            affected_classes[hazard_class_key])
+
+        attributes[shift + len(unique_exposure) + 1] = total
+
+        for i, field_sums in enumerate(absolute_sums):
+            value = field_sums.get((aggregation_value, feature_hazard_id), 0)
+            attributes[shift + len(unique_exposure) + 2 + i] = value
+
+        writer.change_attribute_values(feature_id, attributes)
+
+    writer.flush()
 
     aggregate_hazard.keywords['title'] = (
         layer_purpose_aggregate_hazard_impacted['name'])
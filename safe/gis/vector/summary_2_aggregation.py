@@ -18,8 +18,15 @@ from safe.definitions.layer_purposes import (
     layer_purpose_aggregation_summary)
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.summary_tools import (
-    check_inputs, create_absolute_values_structure, add_fields)
-from safe.gis.vector.tools import read_dynamic_inasafe_field
+    check_inputs,
+    create_absolute_values_structure,
+    add_fields,
+    read_columns,
+    replace_null,
+    summarize_absolute_values,
+)
+from safe.gis.vector.tools import (
+    BulkAttributeWriter, read_dynamic_inasafe_field)
 from safe.utilities.gis import qgis_version
 from safe.utilities.i18n import tr
 from safe.utilities.pivot_table import FlatTable
@@ -82,39 +89,39 @@ def aggregation_summary(aggregate_hazard, aggregation):
     absolute_values = create_absolute_values_structure(
         aggregate_hazard, ['aggregation_id'])
 
-    flat_table = FlatTable('aggregation_id', 'exposure_class')
-
     aggregation_index = source_fields[aggregation_id_field['key']]
 
+    # Fields of the exposure counts, by exposure class.
+    exposure_fields = {}
+    for key, name_field in list(source_fields.items()):
+        if key.endswith(pattern):
+            exposure_fields[key.replace(pattern, '')] = name_field
+
     # We want to loop over affected features only.
     request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
     expression = '\"%s\" = \'%s\'' % (
         affected_field['field_name'], tr('True'))
     request.setFilterExpression(expression)
-    for area in aggregate_hazard.getFeatures(request):
-
-        for key, name_field in list(source_fields.items()):
-            if key.endswith(pattern):
-                aggregation_id = area[aggregation_index]
-                exposure_class = key.replace(pattern, '')
-                value = area[name_field]
-                flat_table.add_value(
-                    value,
-                    aggregation_id=aggregation_id,
-                    exposure_class=exposure_class
-                )
-
-        # We summarize every absolute values.
-        for field, field_definition in list(absolute_values.items()):
-            value = area[field]
-            if (value is None or value == '' or
-                    (hasattr(value, 'isNull') and value.isNull())):
-                value = 0
-            field_definition[0].add_value(
-                value,
-                aggregation_id=area[aggregation_index],
-            )
+    fields = [aggregation_index]
+    fields.extend(exposure_fields.values())
+    fields.extend(absolute_values.keys())
+    _, columns = read_columns(aggregate_hazard, fields, request)
+    aggregation_values = columns[aggregation_index]
+
+    flat_table = FlatTable('aggregation_id', 'exposure_class')
+    for exposure_class, name_field in list(exposure_fields.items()):
+        flat_table.add_values(
+            replace_null(columns[name_field], 0),
+            aggregation_id=aggregation_values,
+            exposure_class=[exposure_class] * len(aggregation_values)
+        )
+
+    # We summarize every absolute values.
+    summarize_absolute_values(
+        absolute_values,
+        columns,
+        aggregation_id=aggregation_values,
+    )
 
     shift = aggregation.fields().count()
 
@@ -127,34 +134,35 @@ def aggregation_summary(aggregate_hazard, aggregation):
         absolute_values,
         [total_affected_field],
         dynamic_structure)
+    aggregation.commitChanges()
 
     aggregation_index = target_fields[aggregation_id_field['key']]
 
-    request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    for area in aggregation.getFeatures(request):
-        aggregation_value = area[aggregation_index]
+    sums = flat_table.data
+    absolute_sums = [field[0].data for field in absolute_values.values()]
+
+    feature_ids, areas = read_columns(aggregation, [aggregation_index])
+
+    writer = BulkAttributeWriter(aggregation)
+    for feature_id, aggregation_value in zip(
+            feature_ids, areas[aggregation_index]):
+        attributes = {}
         total = 0
         for i, val in enumerate(unique_exposure):
-            sum = flat_table.get_value(
-                aggregation_id=aggregation_value,
-                exposure_class=val
-            )
+            sum = sums.get((aggregation_value, val), 0)
             total += sum
-            aggregation.changeAttributeValue(area.id(), shift + i, sum)
+            attributes[shift + i] = sum
 
-        aggregation.changeAttributeValue(
-            area.id(), shift + len(unique_exposure), total)
+        attributes[shift + len(unique_exposure)] = total
 
-        for i, field in enumerate(absolute_values.values()):
-            value = field[0].get_value(
-                aggregation_id=aggregation_value,
-            )
+        for i, field_sums in enumerate(absolute_sums):
+            value = field_sums.get((aggregation_value, ), 0)
             target_index = shift + len(unique_exposure) + 1 + i
-            aggregation.changeAttributeValue(
-                area.id(), target_index, value)
+            attributes[target_index] = value
 
-    aggregation.commitChanges()
+        writer.change_attribute_values(feature_id, attributes)
+
+    writer.flush()
 
     aggregation.keywords['title'] = layer_purpose_aggregation_summary['name']
     if qgis_version() >= 21800:
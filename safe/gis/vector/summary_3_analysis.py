@@ -2,10 +2,6 @@
 
 """Aggregate the aggregate hazard to the analysis layer."""
 
-from math import isnan
-
-from qgis.core import QgsFeatureRequest
-
 from safe.definitions.fields import (
     analysis_name_field,
     aggregation_id_field,
@@ -22,10 +18,18 @@ from safe.definitions.fields import (
 )
 from safe.definitions.hazard_classifications import not_exposed_class
 from safe.definitions.layer_purposes import layer_purpose_analysis_impacted
+from safe.definitions.utilities import HazardProfile
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.summary_tools import (
-    check_inputs, create_absolute_values_structure, add_fields)
-from safe.gis.vector.tools import create_field_from_definition
+    check_inputs,
+    create_absolute_values_structure,
+    add_fields,
+    read_columns,
+    replace_null,
+    summarize_absolute_values,
+)
+from safe.gis.vector.tools import (
+    BulkAttributeWriter, create_field_from_definition)
 from safe.processors import post_processor_affected_function
 from safe.utilities.gis import qgis_version
 from safe.utilities.pivot_table import FlatTable
@@ -38,7 +42,7 @@ __revision__ = '$Format:%H$'
 
 
 @profile
-def analysis_summary(aggregate_hazard, analysis):
+def analysis_summary(aggregate_hazard, analysis, hazard_profile=None):
     """Compute the summary from the aggregate hazard to analysis.
 
     Source layer :
@@ -56,6 +60,10 @@ def analysis_summary(aggregate_hazard, analysis):
     :param analysis: The target vector layer where to write statistics.
     :type analysis: QgsVectorLayer
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, a new one is created from the current settings.
+    :type hazard_profile: HazardProfile
+
     :return: The new target layer with summary.
     :rtype: QgsVectorLayer
 
@@ -92,41 +100,42 @@ def analysis_summary(aggregate_hazard, analysis):
     exposure_keywords = aggregate_hazard.keywords['exposure_keywords']
     exposure = exposure_keywords['exposure']
 
+    if hazard_profile is None:
+        hazard_profile = HazardProfile()
+
     total = source_fields[total_field['key']]
 
+    # Summarization rules which can be applied on this layer.
+    rules = []
+    for key, summary_rule in list(summary_rules.items()):
+        input_field = summary_rule['input_field']
+        case_field = summary_rule['case_field']
+        if aggregate_hazard.fields().lookupField(input_field['field_name']) \
+                == -1:
+            continue
+        if aggregate_hazard.fields().lookupField(case_field['field_name']) \
+                == -1:
+            continue
+        rules.append(key)
+
+    # Single pass over the aggregate_hazard layer
+    fields = [hazard_class, total]
+    fields.extend(absolute_values.keys())
+    for key in rules:
+        fields.append(summary_rules[key]['input_field']['field_name'])
+        fields.append(summary_rules[key]['case_field']['field_name'])
+    _, columns = read_columns(aggregate_hazard, fields)
+
+    # For isnan, see ticket #3812
+    values = replace_null(columns[total], 0, nan=True)
+    hazard_values = replace_null(columns[hazard_class], 'NULL')
+
     flat_table = FlatTable('hazard_class')
+    flat_table.add_values(values, hazard_class=hazard_values)
 
-    # First loop over the aggregate_hazard layer
-    request = QgsFeatureRequest()
-    request.setSubsetOfAttributes(
-        [hazard_class, total], aggregate_hazard.fields())
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    for area in aggregate_hazard.getFeatures():
-        hazard_value = area[hazard_class_index]
-        value = area[total]
-        if (value == '' or value is None or isnan(value) or
-                (hasattr(value, 'isNull') and value.isNull())):
-            # For isnan, see ticket #3812
-            value = 0
-        if (hazard_value == '' or hazard_value is None or
-                (hasattr(hazard_value, 'isNull') and
-                    hazard_value.isNull())):
-            hazard_value = 'NULL'
-        flat_table.add_value(
-            value,
-            hazard_class=hazard_value
-        )
-
-        # We summarize every absolute values.
-        for field, field_definition in list(absolute_values.items()):
-            value = area[field]
-            if (value == '' or value is None or
-                    (hasattr(value, 'isNull') and value.isNull())):
-                value = 0
-            field_definition[0].add_value(
-                value,
-                all='all'
-            )
+    # We summarize every absolute values.
+    summarize_absolute_values(
+        absolute_values, columns, all=['all'] * len(values))
 
     analysis.startEditing()
 
@@ -148,45 +157,54 @@ def analysis_summary(aggregate_hazard, analysis):
         counts,
         dynamic_structure)
 
+    # Summarizer of custom attributes
+    summary_values = {}
+    for key in rules:
+        summary_rule = summary_rules[key]
+        case_values = columns[summary_rule['case_field']['field_name']]
+        input_values = columns[summary_rule['input_field']['field_name']]
+        summary_value = 0
+        for case_value, input_value in zip(case_values, input_values):
+            if case_value in summary_rule['case_values']:
+                summary_value += input_value
+        summary_values[key] = summary_value
+
+        summary_field = summary_rule['summary_field']
+        field = create_field_from_definition(summary_field)
+        analysis.addAttribute(field)
+        # noinspection PyTypeChecker
+        analysis.keywords['inasafe_fields'][summary_field['key']] = (
+            summary_field['field_name'])
+
+    analysis.commitChanges()
+
     affected_sum = 0
     not_affected_sum = 0
     not_exposed_sum = 0
 
-    # Summarization
-    summary_values = {}
-    for key, summary_rule in list(summary_rules.items()):
-        input_field = summary_rule['input_field']
-        case_field = summary_rule['case_field']
-        if aggregate_hazard.fields().lookupField(input_field['field_name']) \
-                == -1:
-            continue
-        if aggregate_hazard.fields().lookupField(case_field['field_name']) \
-                == -1:
-            continue
-
-        summary_value = 0
-        for area in aggregate_hazard.getFeatures():
-            case_value = area[case_field['field_name']]
-            if case_value in summary_rule['case_values']:
-                summary_value += area[input_field['field_name']]
+    sums = flat_table.data
+    absolute_sums = [field[0].data for field in absolute_values.values()]
 
-        summary_values[key] = summary_value
+    feature_ids, _ = read_columns(analysis, [])
 
-    for area in analysis.getFeatures(request):
+    writer = BulkAttributeWriter(analysis)
+    for feature_id in feature_ids:
+        attributes = {}
         total = 0
         for i, val in enumerate(unique_hazard):
             if (val == '' or val is None or
                     (hasattr(val, 'isNull') and val.isNull())):
                 val = 'NULL'
-            sum = flat_table.get_value(hazard_class=val)
+            sum = sums.get((val, ), 0)
             total += sum
-            analysis.changeAttributeValue(area.id(), shift + i, sum)
+            attributes[shift + i] = sum
 
             affected = post_processor_affected_function(
                 exposure=exposure,
                 hazard=hazard,
                 classification=classification,
-                hazard_class=val)
+                hazard_class=val,
+                hazard_profile=hazard_profile)
             if affected == not_exposed_class['key']:
                 not_exposed_sum += sum
             elif affected:
@@ -195,45 +213,35 @@ def analysis_summary(aggregate_hazard, analysis):
                 not_affected_sum += sum
 
         # Total Affected field
-        analysis.changeAttributeValue(
-            area.id(), shift + len(unique_hazard), affected_sum)
+        attributes[shift + len(unique_hazard)] = affected_sum
 
         # Total Not affected field
-        analysis.changeAttributeValue(
-            area.id(), shift + len(unique_hazard) + 1, not_affected_sum)
+        attributes[shift + len(unique_hazard) + 1] = not_affected_sum
 
         # Total Exposed field
-        analysis.changeAttributeValue(
-            area.id(), shift + len(unique_hazard) + 2, total - not_exposed_sum)
+        attributes[shift + len(unique_hazard) + 2] = total - not_exposed_sum
 
         # Total Not exposed field
-        analysis.changeAttributeValue(
-            area.id(), shift + len(unique_hazard) + 3, not_exposed_sum)
+        attributes[shift + len(unique_hazard) + 3] = not_exposed_sum
 
         # Total field
-        analysis.changeAttributeValue(
-            area.id(), shift + len(unique_hazard) + 4, total)
+        attributes[shift + len(unique_hazard) + 4] = total
 
         # Any absolute postprocessors
-        for i, field in enumerate(absolute_values.values()):
-            value = field[0].get_value(
-                all='all'
-            )
-            analysis.changeAttributeValue(
-                area.id(), shift + len(unique_hazard) + 5 + i, value)
+        for i, field_sums in enumerate(absolute_sums):
+            value = field_sums.get(('all', ), 0)
+            attributes[shift + len(unique_hazard) + 5 + i] = value
 
         # Summarizer of custom attributes
         for key, summary_value in list(summary_values.items()):
             summary_field = summary_rules[key]['summary_field']
-            field = create_field_from_definition(summary_field)
-            analysis.addAttribute(field)
-            field_index = analysis.fields().lookupField(field.name())
-            # noinspection PyTypeChecker
-            analysis.keywords['inasafe_fields'][summary_field['key']] = (
+            field_index = analysis.fields().lookupField(
                 summary_field['field_name'])
+            attributes[field_index] = summary_value
+
+        writer.change_attribute_values(feature_id, attributes)
 
-            analysis.changeAttributeValue(
-                area.id(), field_index, summary_value)
+    writer.flush()
 
     # Sanity check ± 1 to the result. Disabled for now as it seems ± 1 is not
     # enough. ET 13/02/17
@@ -242,8 +250,6 @@ def analysis_summary(aggregate_hazard, analysis):
     # if not -1 < (total_computed - total) < 1:
     #     raise ComputationError
 
-    analysis.commitChanges()
-
     analysis.keywords['title'] = layer_purpose_analysis_impacted['name']
     if qgis_version() >= 21600:
         analysis.setName(analysis.keywords['title'])
@@ -4,7 +4,7 @@
 
 from numbers import Number
 
-from qgis.core import QgsWkbTypes, QgsFeatureRequest, QgsFeature
+from qgis.core import QgsWkbTypes, QgsFeature
 
 from safe.definitions.fields import (
     aggregation_id_field,
@@ -27,10 +27,10 @@ from safe.definitions.layer_purposes import \
     layer_purpose_exposure_summary_table
 from safe.definitions.processing_steps import (
     summary_4_exposure_summary_table_steps)
-from safe.definitions.utilities import definition
+from safe.definitions.utilities import definition, HazardProfile
 from safe.gis.sanity_check import check_layer
 from safe.gis.vector.summary_tools import (
-    check_inputs, create_absolute_values_structure)
+    check_inputs, create_absolute_values_structure, read_columns)
 from safe.gis.vector.tools import (
     create_field_from_definition,
     read_dynamic_inasafe_field,
@@ -48,7 +48,10 @@ __revision__ = '$Format:%H$'
 
 @profile
 def exposure_summary_table(
-        aggregate_hazard, exposure_summary=None, callback=None):
+        aggregate_hazard,
+        exposure_summary=None,
+        callback=None,
+        hazard_profile=None):
     """Compute the summary from the aggregate hazard to analysis.
 
     Source layer :
@@ -68,6 +71,10 @@ def exposure_summary_table(
         Defaults to None.
     :type callback: function
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, a new one is created from the current settings.
+    :type hazard_profile: HazardProfile
+
     :return: The new tabular table, without geometry.
     :rtype: QgsVectorLayer
 
@@ -98,34 +105,29 @@ def exposure_summary_table(
     unique_exposure = read_dynamic_inasafe_field(
         source_fields, exposure_count_field)
 
+    exposure_fields = [
+        source_fields[exposure_count_field['key'] % exposure]
+        for exposure in unique_exposure]
+    fields = [hazard_class_index]
+    fields.extend(exposure_fields)
+    fields.extend(absolute_values.keys())
+    _, columns = read_columns(aggregate_hazard, fields)
+    hazard_values = columns[hazard_class_index]
+
     flat_table = FlatTable('hazard_class', 'exposure_class')
+    for exposure, field_name in zip(unique_exposure, exposure_fields):
+        flat_table.add_values(
+            [value if value else 0 for value in columns[field_name]],
+            hazard_class=hazard_values,
+            exposure_class=[exposure] * len(hazard_values)
+        )
 
-    request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    for area in aggregate_hazard.getFeatures():
-        hazard_value = area[hazard_class_index]
-        for exposure in unique_exposure:
-            key_name = exposure_count_field['key'] % exposure
-            field_name = source_fields[key_name]
-            exposure_count = area[field_name]
-            if not exposure_count:
-                exposure_count = 0
-
-            flat_table.add_value(
-                exposure_count,
-                hazard_class=hazard_value,
-                exposure_class=exposure
-            )
-
-        # We summarize every absolute values.
-        for field, field_definition in list(absolute_values.items()):
-            value = area[field]
-            if not value:
-                value = 0
-            field_definition[0].add_value(
-                value,
-                all='all'
-            )
+    # We summarize every absolute values.
+    for field, field_definition in list(absolute_values.items()):
+        field_definition[0].add_values(
+            [value if value else 0 for value in columns[field]],
+            all=['all'] * len(hazard_values)
+        )
 
     tabular = create_memory_layer(output_layer_name, QgsWkbTypes.NullGeometry)
     tabular.startEditing()
@@ -142,6 +144,9 @@ def exposure_summary_table(
     exposure_keywords = aggregate_hazard.keywords['exposure_keywords']
     exposure = exposure_keywords['exposure']
 
+    if hazard_profile is None:
+        hazard_profile = HazardProfile()
+
     hazard_affected = {}
     for hazard_class in unique_hazard:
         if (hazard_class == '' or hazard_class is None or
@@ -158,7 +163,8 @@ def exposure_summary_table(
             exposure=exposure,
             hazard=hazard,
             classification=classification,
-            hazard_class=hazard_class
+            hazard_class=hazard_class,
+            hazard_profile=hazard_profile
         )
 
     field = create_field_from_definition(total_affected_field)
@@ -210,6 +216,12 @@ def exposure_summary_table(
             value = field_definition['field_name']
             tabular.keywords['inasafe_fields'][key] = value
 
+    tabular.commitChanges()
+
+    sums = flat_table.data
+    absolute_sums = [field[0].data for field in absolute_values.values()]
+
+    features = []
     for exposure_type in unique_exposure:
         feature = QgsFeature()
         attributes = [exposure_type]
@@ -220,10 +232,7 @@ def exposure_summary_table(
         for hazard_class in unique_hazard:
             if hazard_class == '' or hazard_class is None:
                 hazard_class = 'NULL'
-            value = flat_table.get_value(
-                hazard_class=hazard_class,
-                exposure_class=exposure_type
-            )
+            value = sums.get((hazard_class, exposure_type), 0)
             attributes.append(value)
 
             if hazard_affected[hazard_class] == not_exposed_class['key']:
@@ -245,14 +254,11 @@ def exposure_summary_table(
                 attributes.append(summarization_dicts[key].get(
                     exposure_type, 0))
         else:
-            for i, field in enumerate(absolute_values.values()):
-                value = field[0].get_value(
-                    all='all'
-                )
-                attributes.append(value)
+            for field_sums in absolute_sums:
+                attributes.append(field_sums.get(('all', ), 0))
 
         feature.setAttributes(attributes)
-        tabular.addFeature(feature)
+        features.append(feature)
 
         # Sanity check ± 1 to the result. Disabled for now as it seems ± 1 is
         # not enough. ET 13/02/17
@@ -261,7 +267,8 @@ def exposure_summary_table(
         # if not -1 < (total_computed - total) < 1:
         #     raise ComputationError
 
-    tabular.commitChanges()
+    tabular.dataProvider().addFeatures(features)
+    tabular.updateExtents()
 
     tabular.keywords['title'] = layer_purpose_exposure_summary_table['name']
     if qgis_version() >= 21800:
@@ -300,22 +307,26 @@ def summarize_result(exposure_summary):
             summarizer_flags[key] = True
             summarization_dicts[key] = {}
 
-    for feature in exposure_summary.getFeatures():
-        exposure_class_name = feature[exposure_class_field['field_name']]
-        # for summarizer_field in summarizer_fields:
-        for key, summary_rule in list(summary_rules.items()):
-            input_field = summary_rule['input_field']
-            case_field = summary_rule['case_field']
-            case_value = feature[case_field['field_name']]
-
-            flag = summarizer_flags[key]
-            if not flag:
-                continue
+    fields = [exposure_class_field['field_name']]
+    for key, summary_rule in list(summary_rules.items()):
+        if summarizer_flags[key]:
+            fields.append(summary_rule['input_field']['field_name'])
+            fields.append(summary_rule['case_field']['field_name'])
+    _, columns = read_columns(exposure_summary, fields)
+    exposure_class_names = columns[exposure_class_field['field_name']]
+
+    for key, summary_rule in list(summary_rules.items()):
+        if not summarizer_flags[key]:
+            continue
+        summarization_dict = summarization_dicts[key]
+        case_values = columns[summary_rule['case_field']['field_name']]
+        input_values = columns[summary_rule['input_field']['field_name']]
+        for exposure_class_name, case_value, value in zip(
+                exposure_class_names, case_values, input_values):
             if case_value in summary_rule['case_values']:
-                if exposure_class_name not in summarization_dicts[key]:
-                    summarization_dicts[key][exposure_class_name] = 0
-                value = feature[input_field['field_name']]
+                if exposure_class_name not in summarization_dict:
+                    summarization_dict[exposure_class_name] = 0
                 if isinstance(value, Number):
-                    summarization_dicts[key][exposure_class_name] += value
+                    summarization_dict[exposure_class_name] += value
 
     return summarization_dicts
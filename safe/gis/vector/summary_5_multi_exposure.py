@@ -28,7 +28,9 @@ from safe.definitions.layer_purposes import (
     layer_purpose_analysis_impacted,
     layer_purpose_aggregation_summary,
 )
+from safe.gis.vector.summary_tools import is_null, read_columns
 from safe.gis.vector.tools import (
+    BulkAttributeWriter,
     create_field_from_definition,
     read_dynamic_inasafe_field,
 )
@@ -40,6 +42,41 @@ __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
 
+def join_key(value):
+    """Key of an aggregation ID used to join layers.
+
+    The IDs were compared with an expression, so 3, 3.0 and '3' are the same
+    ID.
+
+    :param value: The aggregation ID.
+    :type value: int, float, str
+
+    :return: The key to use in the index.
+    :rtype: float, str
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def column_sum(column):
+    """Sum of the values of a column, empty values are ignored.
+
+    :param column: The values.
+    :type column: list
+
+    :return: The sum, None if every value is empty.
+    :rtype: int, float
+    """
+    values = [value for value in column if not is_null(value)]
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return sum(values)
+
+
 def multi_exposure_analysis_summary(analysis, intermediate_analysis):
     """Merge intermediate analysis into one analysis summary.
 
@@ -52,6 +89,9 @@ def multi_exposure_analysis_summary(analysis, intermediate_analysis):
     Output layer :
     | analysis_id | count_hazard_class | affected_count | total |
 
+    Each column of an intermediate analysis is read once and summed. The new
+    fields are then created and written in bulk.
+
     :param analysis: The target vector layer where to write statistics.
     :type analysis: QgsVectorLayer
 
@@ -63,102 +103,68 @@ def multi_exposure_analysis_summary(analysis, intermediate_analysis):
 
     .. versionadded:: 4.3
     """
-    analysis.startEditing()
-
-    request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
-    target_id = next(analysis.getFeatures(request)).id()
+    if analysis.isEditable():
+        analysis.commitChanges()
 
+    fields = []
+    values = []
     for analysis_result in intermediate_analysis:
         exposure = analysis_result.keywords['exposure_keywords']['exposure']
-
-        iterator = analysis_result.getFeatures(request)
-        feature = next(iterator)
-
         source_fields = analysis_result.keywords['inasafe_fields']
 
+        # List of (source field name, target field definition, dynamic value)
+        mapping = []
+
         # Dynamic fields
         hazards = read_dynamic_inasafe_field(source_fields, hazard_count_field)
         for hazard_zone in hazards:
-            field = create_field_from_definition(
-                exposure_hazard_count_field, exposure, hazard_zone)
-            analysis.addAttribute(field)
-            index = analysis.fields().lookupField(field.name())
-            value = feature[analysis_result.fields().lookupField(
-                hazard_count_field['field_name'] % hazard_zone)]
-            analysis.changeAttributeValue(target_id, index, value)
+            mapping.append((
+                hazard_count_field['field_name'] % hazard_zone,
+                exposure_hazard_count_field,
+                hazard_zone))
+
+        # Totals
+        static_fields = [
+            (total_affected_field, exposure_total_affected_field),
+            (total_not_affected_field, exposure_total_not_affected_field),
+            (total_exposed_field, exposure_total_exposed_field),
+            (total_not_exposed_field, exposure_total_not_exposed_field),
+            (total_field, exposure_total_field),
+        ]
+        for source_field, target_field in static_fields:
+            mapping.append((source_field['field_name'], target_field, None))
+
+        _, columns = read_columns(
+            analysis_result, [source for source, _, _ in mapping])
+
+        for source, target_field, hazard_zone in mapping:
+            if hazard_zone is None:
+                field = create_field_from_definition(target_field, exposure)
+                key = target_field['key'] % exposure
+                value = target_field['field_name'] % exposure
+            else:
+                field = create_field_from_definition(
+                    target_field, exposure, hazard_zone)
+                key = target_field['key'] % (exposure, hazard_zone)
+                value = target_field['field_name'] % (exposure, hazard_zone)
+            fields.append(field)
+            values.append(column_sum(columns[source]))
             # keywords
-            key = exposure_hazard_count_field['key'] % (exposure, hazard_zone)
-            value = exposure_hazard_count_field['field_name'] % (
-                exposure, hazard_zone)
             analysis.keywords['inasafe_fields'][key] = value
 
-        # total affected
-        source_index = analysis_result.fields().lookupField(
-            total_affected_field['field_name'])
-        field = create_field_from_definition(
-            exposure_total_affected_field, exposure)
-        analysis.addAttribute(field)
-        index = analysis.fields().lookupField(field.name())
-        analysis.changeAttributeValue(target_id, index, feature[source_index])
-        # keywords
-        key = exposure_total_affected_field['key'] % exposure
-        value = exposure_total_affected_field['field_name'] % exposure
-        analysis.keywords['inasafe_fields'][key] = value
-
-        # total not affected
-        source_index = analysis_result.fields().lookupField(
-            total_not_affected_field['field_name'])
-        field = create_field_from_definition(
-            exposure_total_not_affected_field, exposure)
-        analysis.addAttribute(field)
-        index = analysis.fields().lookupField(field.name())
-        analysis.changeAttributeValue(target_id, index, feature[source_index])
-        # keywords
-        key = exposure_total_not_affected_field['key'] % exposure
-        value = exposure_total_not_affected_field['field_name'] % exposure
-        analysis.keywords['inasafe_fields'][key] = value
-
-        # total exposed
-        source_index = analysis_result.fields().lookupField(
-            total_exposed_field['field_name'])
-        field = create_field_from_definition(
-            exposure_total_exposed_field, exposure)
-        analysis.addAttribute(field)
-        index = analysis.fields().lookupField(field.name())
-        analysis.changeAttributeValue(target_id, index, feature[source_index])
-        # keywords
-        key = exposure_total_exposed_field['key'] % exposure
-        value = exposure_total_exposed_field['field_name'] % exposure
-        analysis.keywords['inasafe_fields'][key] = value
-
-        # total not exposed
-        source_index = analysis_result.fields().lookupField(
-            total_not_exposed_field['field_name'])
-        field = create_field_from_definition(
-            exposure_total_not_exposed_field, exposure)
-        analysis.addAttribute(field)
-        index = analysis.fields().lookupField(field.name())
-        analysis.changeAttributeValue(target_id, index, feature[source_index])
-        # keywords
-        key = exposure_total_not_exposed_field['key'] % exposure
-        value = exposure_total_not_exposed_field['field_name'] % exposure
-        analysis.keywords['inasafe_fields'][key] = value
-
-        # total
-        source_index = analysis_result.fields().lookupField(
-            total_field['field_name'])
-        field = create_field_from_definition(
-            exposure_total_field, exposure)
-        analysis.addAttribute(field)
-        index = analysis.fields().lookupField(field.name())
-        analysis.changeAttributeValue(target_id, index, feature[source_index])
-        # keywords
-        key = exposure_total_field['key'] % exposure
-        value = exposure_total_field['field_name'] % exposure
-        analysis.keywords['inasafe_fields'][key] = value
-
-    analysis.commitChanges()
+    analysis.dataProvider().addAttributes(fields)
+    analysis.updateFields()
+
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([])
+    target_id = next(analysis.getFeatures(request)).id()
+
+    with BulkAttributeWriter(analysis) as writer:
+        for field, value in zip(fields, values):
+            index = analysis.fields().lookupField(field.name())
+            writer.change_attribute_value(target_id, index, value)
+
     analysis.keywords['title'] = (
         layer_purpose_analysis_impacted['multi_exposure_name'])
     analysis.keywords['layer_purpose'] = layer_purpose_analysis_impacted['key']
@@ -203,10 +209,24 @@ def multi_exposure_aggregation_summary(aggregation, intermediate_layers):
     target_index_field_name = (
         aggregation.keywords['inasafe_fields'][aggregation_id_field['key']])
 
-    aggregation.startEditing()
+    if aggregation.isEditable():
+        aggregation.commitChanges()
+
+    # Index of the target features by aggregation ID, built once.
+    target_ids, columns = read_columns(
+        aggregation, [target_index_field_name])
+    target_index = {}
+    for feature_id, aggregation_id in zip(
+            target_ids, columns[target_index_field_name]):
+        aggregation_id = join_key(aggregation_id)
+        if aggregation_id in target_index:
+            # This should never happen ! IDs are duplicated in the
+            # aggregation layer.
+            raise Exception(
+                'Aggregation IDs are duplicated in the aggregation layer. '
+                'We can\'t make any joins.')
+        target_index[aggregation_id] = feature_id
 
-    request = QgsFeatureRequest()
-    request.setFlags(QgsFeatureRequest.NoGeometry)
     for layer in intermediate_layers:
         source_fields = layer.keywords['inasafe_fields']
         exposure = layer.keywords['exposure_keywords']['exposure']
@@ -214,64 +234,47 @@ def multi_exposure_aggregation_summary(aggregation, intermediate_layers):
             source_fields,
             affected_exposure_count_field,
             [total_affected_field])
-        field_map = {}
 
+        # List of (source field name, target field)
+        mapping = []
         for exposure_class in unique_exposure:
             field = create_field_from_definition(
                 exposure_affected_exposure_type_count_field,
                 name=exposure, sub_name=exposure_class
             )
-            aggregation.addAttribute(field)
-            source_field_index = layer.fields().lookupField(
-                affected_exposure_count_field['field_name'] % exposure_class)
-            target_field_index = aggregation.fields().lookupField(field.name())
-            field_map[source_field_index] = target_field_index
+            mapping.append((
+                affected_exposure_count_field['field_name'] % exposure_class,
+                field))
 
         # Total affected field
         field = create_field_from_definition(
             exposure_total_not_affected_field, exposure)
-        aggregation.addAttribute(field)
-        source_field_index = layer.fields().lookupField(
-            total_affected_field['field_name'])
-        target_field_index = aggregation.fields().lookupField(field.name())
-        field_map[source_field_index] = target_field_index
+        mapping.append((total_affected_field['field_name'], field))
+
+        aggregation.dataProvider().addAttributes(
+            [field for _, field in mapping])
+        aggregation.updateFields()
 
         # Get Aggregation ID from original feature
-        index = (
-            layer.fields().lookupField(
-                source_fields[aggregation_id_field['key']]
-            )
-        )
-
-        for source_feature in layer.getFeatures(request):
-            target_expression = QgsFeatureRequest()
-            target_expression.setFlags(QgsFeatureRequest.NoGeometry)
-            expression = '\"{field_name}\" = {id_value}'.format(
-                field_name=target_index_field_name,
-                id_value=source_feature[index])
-            target_expression.setFilterExpression(expression)
-            iterator = aggregation.getFeatures(target_expression)
-            target_feature = next(iterator)  # It must return only 1 feature.
-
-            for source_field, target_field in list(field_map.items()):
-                aggregation.changeAttributeValue(
-                    target_feature.id(),
-                    target_field,
-                    source_feature[source_field])
-
-            try:
-                next(iterator)
-            except StopIteration:
-                # Everything is fine, it's normal.
-                pass
-            else:
-                # This should never happen ! IDs are duplicated in the
-                # aggregation layer.
-                raise Exception(
-                    'Aggregation IDs are duplicated in the aggregation layer. '
-                    'We can\'t make any joins.')
+        source_id = source_fields[aggregation_id_field['key']]
+        _, columns = read_columns(
+            layer, [source_id] + [source for source, _ in mapping])
+
+        with BulkAttributeWriter(aggregation) as writer:
+            for source, field in mapping:
+                target_field = aggregation.fields().lookupField(field.name())
+                for aggregation_id, value in zip(
+                        columns[source_id], columns[source]):
+                    try:
+                        target_id = target_index[join_key(aggregation_id)]
+                    except KeyError:
+                        raise Exception(
+                            'Aggregation ID %s is not in the aggregation '
+                            'layer. We can\'t make any joins.'
+                            % aggregation_id)
+                    writer.change_attribute_value(
+                        target_id, target_field, value)
 
-    aggregation.commitChanges()
     aggregation.keywords['title'] = (
         layer_purpose_aggregation_summary['multi_exposure_name'])
     aggregation.keywords['layer_purpose'] = (
@@ -2,11 +2,17 @@
 
 """Some helpers about the summary calculation."""
 
+from math import isnan
+
+from qgis.core import QgsFeatureRequest
+
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import count_fields
 from safe.definitions.utilities import definition
+from safe.gis.processing_tools import report_progress
 from safe.gis.vector.tools import create_field_from_definition
 from safe.utilities.pivot_table import FlatTable
+from safe.utilities.profiling import profile
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -111,3 +117,111 @@ def add_fields(
         key = field_definition['key']
         value = field_definition['field_name']
         layer.keywords['inasafe_fields'][key] = value
+
+
+def is_null(value):
+    """Check if an attribute value is empty.
+
+    :param value: The attribute value.
+    :type value: any
+
+    :return: True if the value is None, an empty string or a NULL QVariant.
+    :rtype: bool
+    """
+    return (
+        value is None or value == '' or
+        (hasattr(value, 'isNull') and value.isNull()))
+
+
+def replace_null(column, replacement, nan=False):
+    """Replace empty values in a column.
+
+    :param column: The values.
+    :type column: list
+
+    :param replacement: The value to use instead of an empty value.
+    :type replacement: any
+
+    :param nan: If NaN values should also be replaced.
+    :type nan: bool
+
+    :return: The new list of values.
+    :rtype: list
+    """
+    if nan:
+        return [
+            replacement if is_null(value) or (
+                isinstance(value, float) and isnan(value)) else value
+            for value in column]
+    return [replacement if is_null(value) else value for value in column]
+
+
+@profile
+def read_columns(layer, fields, request=None):
+    """Read some attributes of every feature of a layer, in a single pass.
+
+    Geometries are not fetched. Summaries then compute their statistics on
+    these columns instead of reading features one attribute at a time.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param fields: List of field names or field indexes to read.
+    :type fields: list
+
+    :param request: An optional request to filter features.
+    :type request: QgsFeatureRequest
+
+    :return: Tuple with the list of feature IDs and a dictionary with the
+        list of values, in the same order, for each requested field.
+    :rtype: (list, dict)
+
+    :raises: InvalidKeywordsForProcessingAlgorithm if a field is not in the
+        layer.
+
+    .. versionadded:: 5.0
+    """
+    if request is None:
+        request = QgsFeatureRequest()
+    request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+
+    layer_fields = layer.fields()
+    indexes = []
+    for field in fields:
+        if isinstance(field, int):
+            index = field
+        else:
+            index = layer_fields.lookupField(field)
+        if not 0 <= index < layer_fields.count():
+            msg = '%s not found in %s' % (field, layer_fields.names())
+            raise InvalidKeywordsForProcessingAlgorithm(msg)
+        indexes.append(index)
+    request.setSubsetOfAttributes(sorted(set(indexes)))
+
+    feature_ids = []
+    columns = [[] for _ in fields]
+    total = layer.featureCount()
+    for feature in layer.getFeatures(request):
+        report_progress(len(feature_ids), total)
+        feature_ids.append(feature.id())
+        attributes = feature.attributes()
+        for column, index in zip(columns, indexes):
+            column.append(attributes[index])
+    return feature_ids, dict(zip(fields, columns))
+
+
+def summarize_absolute_values(absolute_values, columns, **groups):
+    """Sum the columns of absolute values by groups.
+
+    :param absolute_values: The absolute value structure.
+    :type absolute_values: dict
+
+    :param columns: Dictionary with the list of values of each field index.
+    :type columns: dict
+
+    :param groups: For each group of the flat tables, the list of values.
+    :type groups: dict
+    """
+    for field, field_definition in list(absolute_values.items()):
+        values = replace_null(columns[field], 0)
+        field_definition[0].add_values(values, **groups)
@@ -9,6 +9,7 @@ from safe.test.utilities import (
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 
 from safe.gis.vector.intersection import intersection
+from safe.gis.vector.overlay import partitioned_intersection
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -46,3 +47,31 @@ class TestIntersectionVector(unittest.TestCase):
             aggregation.fields().count() + exposure.fields().count(),
             layer.fields().count()
         )
+
+    def test_partitioned_intersection(self):
+        """Test the intersection by partitions gives the same features."""
+        exposure = load_test_vector_layer(
+            'gisv4', 'exposure', 'roads.geojson')
+        aggregation = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        aggregation.keywords = {
+            'aggregation_keywords': {},
+            'hazard_keywords': {},
+            'inasafe_fields': {}
+        }
+        expected = intersection(exposure, aggregation)
+
+        layer = partitioned_intersection(exposure, aggregation, 2)
+        self.assertEqual(expected.featureCount(), layer.featureCount())
+        self.assertEqual(expected.fields().names(), layer.fields().names())
+        self.assertEqual(
+            sorted(
+                round(f.geometry().length(), 8)
+                for f in layer.getFeatures()),
+            sorted(
+                round(f.geometry().length(), 8)
+                for f in expected.getFeatures()))
+        # The feature IDs follow the order of the exposure features.
+        self.assertEqual(
+            list(range(1, layer.featureCount() + 1)),
+            [f.id() for f in layer.getFeatures()])
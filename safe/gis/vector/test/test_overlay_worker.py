@@ -0,0 +1,59 @@
+# coding=utf-8
+
+import unittest
+
+from osgeo import ogr
+
+from safe.gis.vector.overlay_worker import (
+    DIFFERENCE, INTERSECTION, overlay_partition)
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+def _task(operation, feature, overlay):
+    """A task with one polygon and one overlay polygon, given as WKT."""
+    return {
+        'operation': operation,
+        'stage': 0,
+        'dimension': 2,
+        'features': [(0, ogr.CreateGeometryFromWkt(feature).ExportToWkb())],
+        'overlay': [(0, ogr.CreateGeometryFromWkt(overlay).ExportToWkb())],
+        'candidates': {0: [0]},
+    }
+
+
+class TestOverlayWorker(unittest.TestCase):
+
+    def test_overlay_partition_dimension(self):
+        """Test only the results with the dimension of the layer are kept."""
+        square = 'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))'
+        touching = 'POLYGON ((1 0, 2 0, 2 1, 1 1, 1 0))'
+        half = 'POLYGON ((0.5 0, 2 0, 2 1, 0.5 1, 0.5 0))'
+
+        # Two squares touching on a side intersect on a line.
+        self.assertEqual(
+            overlay_partition(_task(INTERSECTION, square, touching)), [])
+
+        results = overlay_partition(_task(INTERSECTION, square, half))
+        self.assertEqual(len(results), 1)
+        geometry = ogr.CreateGeometryFromWkb(results[0][3])
+        self.assertAlmostEqual(geometry.GetArea(), 0.5)
+
+        results = overlay_partition(_task(DIFFERENCE, square, half))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][2], -1)
+        geometry = ogr.CreateGeometryFromWkb(results[0][3])
+        self.assertEqual(geometry.GetDimension(), 2)
+        self.assertAlmostEqual(geometry.GetArea(), 0.5)
+
+        # Nothing is left when the feature is covered.
+        cover = 'POLYGON ((-1 -1, 3 -1, 3 2, -1 2, -1 -1))'
+        self.assertEqual(
+            overlay_partition(_task(DIFFERENCE, square, cover)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# coding=utf-8
+
+import unittest
+
+import numpy as np
+
+from safe.definitions.constants import INASAFE_TEST
+from safe.test.utilities import (
+    get_qgis_app,
+    load_test_vector_layer)
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from safe.gis.vector.spatial_join import (
+    PackedRTree, highest_class_join, points_in_polygon)
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestSpatialJoin(unittest.TestCase):
+
+    """Tests for the bulk spatial join."""
+
+    def test_packed_rtree(self):
+        """Test the R-tree finds the same pairs as a brute force search."""
+        random = np.random.RandomState(0)
+        corners = random.random_sample((1000, 2)) * 100
+        boxes = np.column_stack(
+            [corners, corners + random.random_sample((1000, 2)) * 5])
+        boxes[10] = np.nan
+        corners = random.random_sample((50, 2)) * 100
+        queries = np.column_stack([corners, corners + 10])
+
+        query, index = PackedRTree(boxes).query(queries)
+        expected = [
+            (i, j) for i in range(len(queries)) for j in range(len(boxes))
+            if queries[i, 0] <= boxes[j, 2] and queries[i, 2] >= boxes[j, 0]
+            and queries[i, 1] <= boxes[j, 3] and queries[i, 3] >= boxes[j, 1]]
+        self.assertEqual(expected, list(zip(query, index)))
+
+    def test_highest_class_join_points(self):
+        """Test the points are joined like the prepared geometries do."""
+        exposure = load_test_vector_layer(
+            'gisv4', 'exposure', 'building-points.geojson')
+        hazard = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        zones = [feature.geometry() for feature in hazard.getFeatures()]
+        points = [feature.geometry() for feature in exposure.getFeatures()]
+        ranks = list(range(len(zones)))
+
+        result = highest_class_join(zones, ranks, points)
+
+        for point, zone_index in zip(points, result):
+            expected = -1
+            for index, zone in enumerate(zones):
+                if zone.intersects(point):
+                    expected = index
+                    break
+            self.assertEqual(expected, zone_index)
+
+    def test_points_in_polygon(self):
+        """Test points on the boundary intersect the polygon."""
+        hazard = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        polygon = next(hazard.getFeatures()).geometry()
+        box = polygon.boundingBox()
+        vertex = polygon.vertexAt(0)
+
+        x = np.array([vertex.x(), box.xMinimum() - 1])
+        y = np.array([vertex.y(), box.yMinimum() - 1])
+        self.assertEqual(
+            [True, False], points_in_polygon(x, y, polygon).tolist())
@@ -7,7 +7,11 @@ from safe.definitions.constants import INASAFE_TEST
 from safe.test.utilities import (
     load_test_vector_layer)
 
+from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import (
+    aggregation_id_field,
+    exposure_total_not_affected_field,
+    total_affected_field,
     total_field,
     exposure_class_field,
     hazard_class_field,
@@ -25,6 +29,7 @@ from safe.gis.vector.summary_4_exposure_summary_table import (
     exposure_summary_table, summarize_result)
 from safe.gis.vector.summary_5_multi_exposure import (
     multi_exposure_aggregation_summary, multi_exposure_analysis_summary)
+from safe.gis.vector.summary_tools import read_columns
 from safe.gis.sanity_check import check_inasafe_fields
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -279,6 +284,35 @@ class TestSummary(unittest.TestCase):
         self.assertIsNotNone(production_cost_summary)
         self.assertIsNotNone(production_value_summary)
 
+    def test_read_columns(self):
+        """Test we can read the attribute columns of a layer at once."""
+        impact = load_test_vector_layer(
+            'gisv4',
+            'impacts',
+            'building-points-classified-vector.geojson')
+        fields = impact.keywords['inasafe_fields']
+        exposure_class = fields[exposure_class_field['key']]
+        hazard_class = fields[hazard_class_field['key']]
+        hazard_class_index = impact.fields().lookupField(hazard_class)
+
+        feature_ids, columns = read_columns(
+            impact, [exposure_class, hazard_class_index])
+
+        self.assertEqual(
+            sorted(columns.keys(), key=str),
+            sorted([exposure_class, hazard_class_index], key=str))
+        features = list(impact.getFeatures())
+        self.assertEqual(feature_ids, [f.id() for f in features])
+        self.assertEqual(
+            columns[exposure_class], [f[exposure_class] for f in features])
+        self.assertEqual(
+            columns[hazard_class_index],
+            [f[hazard_class_index] for f in features])
+
+        # An unknown field is an error, not the last column.
+        with self.assertRaises(InvalidKeywordsForProcessingAlgorithm):
+            read_columns(impact, ['unknown_field'])
+
     def test_aggregation_multi_exposure(self):
         """Test we can merge two aggregation summary layer."""
         aggregation_summary_buildings = load_test_vector_layer(
@@ -331,6 +365,52 @@ class TestSummary(unittest.TestCase):
         # Concatenation is a subset of attributes
         self.assertTrue(set(concatenation) < set(attributes))
 
+    def test_aggregation_multi_exposure_join(self):
+        """Test merged values are written on the matching aggregation."""
+        aggregation_summary_buildings = load_test_vector_layer(
+            'gisv4',
+            'intermediate',
+            'summaries',
+            'multi_exposure_aggregation_buildings.geojson'
+        )
+
+        aggregation = load_test_vector_layer(
+            'gisv4',
+            'aggregation',
+            'aggregation_cleaned.geojson',
+            clone=True)
+        target_id_field = aggregation.keywords['inasafe_fields'][
+            aggregation_id_field['key']]
+
+        aggregation = multi_exposure_aggregation_summary(
+            aggregation, [aggregation_summary_buildings])
+
+        source_fields = aggregation_summary_buildings.keywords[
+            'inasafe_fields']
+        exposure = aggregation_summary_buildings.keywords[
+            'exposure_keywords']['exposure']
+        source_id_field = source_fields[aggregation_id_field['key']]
+        target_field = (
+            exposure_total_not_affected_field['field_name'] % exposure)
+
+        _, source = read_columns(
+            aggregation_summary_buildings,
+            [source_id_field, total_affected_field['field_name']])
+        expected = dict(zip(
+            source[source_id_field],
+            source[total_affected_field['field_name']]))
+
+        _, target = read_columns(
+            aggregation, [target_id_field, target_field])
+        matched = 0
+        for aggregation_id, value in zip(
+                target[target_id_field], target[target_field]):
+            if aggregation_id in expected:
+                matched += 1
+                self.assertEqual(value, expected[aggregation_id])
+        # Every aggregation of the summary is found in the target.
+        self.assertEqual(matched, len(expected))
+
     def test_analysis_multi_exposure(self):
         """Test we can merge two analysis layers."""
         analysis_summary_buildings = load_test_vector_layer(
@@ -13,7 +13,7 @@ from safe.test.utilities import (
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 
 
-from safe.gis.vector.tools import create_memory_layer
+from safe.gis.vector.tools import create_memory_layer, BulkAttributeWriter
 
 __copyright__ = "Copyright 2018, The InaSAFE Project"
 __license__ = "GPL version 3"
@@ -47,6 +47,26 @@ class TestVectorTools(unittest.TestCase):
         self.assertEqual(new_layer.crs(), layer.crs())
         self.assertEqual(new_layer.wkbType(), QgsWkbTypes.MultiPolygon)
 
+    def test_bulk_attribute_writer(self):
+        """Test we can change attributes and delete features in bulk."""
+        layer = load_test_vector_layer(
+            'exposure', 'buildings.shp', clone_to_memory=True)
+        count = layer.featureCount()
+        feature_ids = [feature.id() for feature in layer.getFeatures()]
+        index = 0
+
+        # A small chunk size to check that we flush many times.
+        with BulkAttributeWriter(layer, chunk_size=3) as writer:
+            for feature_id in feature_ids:
+                writer.change_attribute_value(feature_id, index, 'foo')
+            writer.delete_feature(feature_ids[0])
+            # The deletion is only written at the end of the block.
+            self.assertEqual(count, layer.featureCount())
+
+        self.assertEqual(count - 1, layer.featureCount())
+        for feature in layer.getFeatures():
+            self.assertEqual('foo', feature.attributes()[index])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -10,6 +10,7 @@ from safe.gis.vector.clean_geometry import clean_layer
 QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
 
 from safe.gis.vector.union import union
+from safe.gis.vector.overlay import partitioned_union
 from safe.definitions.fields import hazard_class_field, hazard_value_field
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -45,6 +46,25 @@ class TestUnionVector(unittest.TestCase):
             layer.fields().count()
         )
 
+    def test_partitioned_union(self):
+        """Test the union by partitions gives the same features."""
+        union_a = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        union_b = load_test_vector_layer(
+            'gisv4', 'aggregation', 'small_grid.geojson')
+        union_a.keywords['inasafe_fields'][hazard_class_field['key']] = (
+            union_a.keywords['inasafe_fields'][hazard_value_field['key']])
+        expected = union(union_a, union_b)
+
+        layer = partitioned_union(union_a, union_b, 2)
+        self.assertEqual(expected.featureCount(), layer.featureCount())
+        self.assertEqual(expected.fields().names(), layer.fields().names())
+        self.assertEqual(
+            sorted(round(f.geometry().area(), 8) for f in layer.getFeatures()),
+            sorted(
+                round(f.geometry().area(), 8)
+                for f in expected.getFeatures()))
+
     @unittest.expectedFailure
     def test_union_error(self):
         """Test we can union two layers like hazard and aggregation (2)."""
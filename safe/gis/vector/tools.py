@@ -12,7 +12,6 @@ from qgis.core import (
     QgsFeatureRequest,
     QgsFeature,
     QgsField,
-    QgsProject,
     QgsDistanceArea,
     QgsWkbTypes,
     QgsCoordinateReferenceSystem,
@@ -26,8 +25,11 @@ from safe.common.exceptions import (
     MemoryLayerCreationError,
     # SpatialIndexCreationError,
 )
+from safe.definitions.constants import BULK_UPDATE_CHUNK_SIZE
 from safe.definitions.units import unit_metres, unit_square_metres
 from safe.definitions.utilities import definition
+from safe.gis.processing_tools import (
+    analysis_transform_context, report_progress)
 from safe.gis.vector.clean_geometry import geometry_checker, clean_layer
 from safe.utilities.profiling import profile
 from safe.utilities.rounding import convert_unit
@@ -182,7 +184,9 @@ def copy_layer(source, target):
 
         aggregation_layer = True
 
+    total = source.featureCount()
     for i, feature in enumerate(source.getFeatures(request)):
+        report_progress(i, total)
         geom = feature.geometry()
         if aggregation_layer and feature.hasGeometry():
             # See issue https://github.com/inasafe/inasafe/issues/3713
@@ -248,17 +252,20 @@ def copy_fields(layer, fields_to_copy):
             new_field.setName(fields_to_copy[field])
 
             layer.addAttribute(new_field)
+            layer.commitChanges()
+            layer.updateFields()  # Avoid crash #4729
 
             new_index = layer.fields().lookupField(fields_to_copy[field])
 
-            for feature in layer.getFeatures():
-                attributes = feature.attributes()
-                source_value = attributes[index]
-                layer.changeAttributeValue(
-                    feature.id(), new_index, source_value)
-
-            layer.commitChanges()
-            layer.updateFields()  # Avoid crash #4729
+            request = QgsFeatureRequest()
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes([index])
+            with BulkAttributeWriter(layer) as writer:
+                for feature in layer.getFeatures(request):
+                    attributes = feature.attributes()
+                    source_value = attributes[index]
+                    writer.change_attribute_value(
+                        feature.id(), new_index, source_value)
 
 
 @profile
@@ -442,7 +449,7 @@ class SizeCalculator():
         self.calculator = QgsDistanceArea()
         self.calculator.setSourceCrs(
             coordinate_reference_system,
-            QgsProject.instance().transformContext()
+            analysis_transform_context()
         )
         self.calculator.setEllipsoid('WGS84')
 
@@ -522,3 +529,120 @@ class SizeCalculator():
                     feature_size, self.default_unit, self.output_unit)
 
         return feature_size
+
+
+class BulkAttributeWriter():
+
+    """Accumulate attribute changes and write them in bulk to a layer.
+
+    Changes are stored in a {fid: {index: value}} map and flushed in chunks
+    through the data provider, like assign_highest_value does. It avoids the
+    edit buffer and the undo stack of the layer for each change.
+
+    The fields must already exist in the data provider, so the layer must not
+    have uncommitted new fields.
+
+    It can be used as a context manager, changes are flushed when leaving the
+    block without exception::
+
+        with BulkAttributeWriter(layer) as writer:
+            for feature in layer.getFeatures():
+                writer.change_attribute_value(feature.id(), index, value)
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(self, layer, chunk_size=BULK_UPDATE_CHUNK_SIZE):
+        """Constructor for the bulk writer.
+
+        :param layer: The vector layer to update.
+        :type layer: QgsVectorLayer
+
+        :param chunk_size: Number of features to send to the data provider
+            in a single call.
+        :type chunk_size: int
+        """
+        self.layer = layer
+        self.provider = layer.dataProvider()
+        self.chunk_size = chunk_size
+        self.changes = {}
+        self.deleted = []
+
+    def __enter__(self):
+        """Enter the context manager.
+
+        :return: The writer itself.
+        :rtype: BulkAttributeWriter
+        """
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        """Flush pending changes if the block has been executed correctly."""
+        if exception_type is None:
+            self.flush()
+
+    def change_attribute_value(self, feature_id, index, value):
+        """Change an attribute value of a feature.
+
+        :param feature_id: The feature ID.
+        :type feature_id: int
+
+        :param index: The field index.
+        :type index: int
+
+        :param value: The new value.
+        :type value: object
+        """
+        attributes = self.changes.get(feature_id)
+        if attributes is None:
+            if len(self.changes) >= self.chunk_size:
+                self.flush_changes()
+            attributes = self.changes[feature_id] = {}
+        attributes[index] = value
+
+    def change_attribute_values(self, feature_id, attributes):
+        """Change many attribute values of a feature.
+
+        :param feature_id: The feature ID.
+        :type feature_id: int
+
+        :param attributes: Dictionary of field index and new value.
+        :type attributes: dict
+        """
+        for index, value in list(attributes.items()):
+            self.change_attribute_value(feature_id, index, value)
+
+    def delete_feature(self, feature_id):
+        """Delete a feature.
+
+        :param feature_id: The feature ID.
+        :type feature_id: int
+        """
+        self.changes.pop(feature_id, None)
+        self.deleted.append(feature_id)
+        if len(self.deleted) >= self.chunk_size:
+            self.flush_deleted()
+
+    def flush_changes(self):
+        """Write pending attribute changes to the data provider."""
+        if self.changes:
+            if not self.provider.changeAttributeValues(self.changes):
+                LOGGER.warning(
+                    'Some attributes could not be changed in %s'
+                    % self.layer.name())
+            self.changes = {}
+
+    def flush_deleted(self):
+        """Delete pending features from the data provider."""
+        if self.deleted:
+            if not self.provider.deleteFeatures(self.deleted):
+                LOGGER.warning(
+                    'Some features could not be deleted from %s'
+                    % self.layer.name())
+            self.deleted = []
+            self.layer.updateExtents()
+
+    def flush(self):
+        """Write every pending change to the data provider."""
+        self.flush_changes()
+        self.flush_deleted()
@@ -15,8 +15,10 @@ from safe.definitions.fields import hazard_class_field
 from safe.definitions.hazard_classifications import not_exposed_class
 from safe.definitions.processing_steps import union_steps
 from safe.gis.sanity_check import check_layer
+from safe.gis.vector.overlay import overlay_workers, partitioned_union
 from safe.utilities.profiling import profile
 from safe.gis.processing_tools import (
+    check_analysis_canceled,
     create_processing_context,
     create_processing_feedback,
     initialize_processing)
@@ -35,6 +37,9 @@ def union(union_a, union_b):
 
     Issue https://github.com/inasafe/inasafe/issues/3186
 
+    With the overlay_workers setting, the union is computed by partitions in
+    many processes.
+
     :param union_a: The vector layer for the union.
     :type union_a: QgsVectorLayer
 
@@ -59,21 +64,24 @@ def union(union_a, union_b):
     inasafe_fields = inasafe_fields_union_1
     inasafe_fields.update(inasafe_fields_union_2)
 
-    parameters = {'INPUT': union_a,
-                  'OVERLAY': union_b,
-                  'OUTPUT': 'memory:'}
-
-    # TODO implement callback through QgsProcessingFeedback object
+    workers = overlay_workers()
+    if workers > 1:
+        union_layer = partitioned_union(union_a, union_b, workers)
+    else:
+        parameters = {'INPUT': union_a,
+                      'OVERLAY': union_b,
+                      'OUTPUT': 'memory:'}
 
-    initialize_processing()
+        initialize_processing()
 
-    feedback = create_processing_feedback()
-    context = create_processing_context(feedback=feedback)
-    result = processing.run('native:union', parameters, context=context)
-    if result is None:
-        raise ProcessingInstallationError
+        feedback = create_processing_feedback()
+        context = create_processing_context(feedback=feedback)
+        result = processing.run('native:union', parameters, context=context)
+        if result is None:
+            raise ProcessingInstallationError
+        check_analysis_canceled()
 
-    union_layer = result['OUTPUT']
+        union_layer = result['OUTPUT']
     union_layer.setName(output_layer_name)
 
     # use to avoid modifying original source
@@ -2,7 +2,7 @@
 
 """Reclassify a continuous vector layer."""
 
-from qgis.core import QgsField
+from qgis.core import QgsField, QgsFeatureRequest
 
 from safe.common.exceptions import InvalidKeywordsForProcessingAlgorithm
 from safe.definitions.fields import (
@@ -15,7 +15,7 @@ from safe.definitions.layer_purposes import (
     layer_purpose_hazard, layer_purpose_exposure)
 from safe.definitions.processing_steps import assign_inasafe_values_steps
 from safe.gis.sanity_check import check_layer
-from safe.gis.vector.tools import remove_fields
+from safe.gis.vector.tools import remove_fields, BulkAttributeWriter
 from safe.utilities.metadata import (
     active_thresholds_value_maps, active_classification)
 from safe.utilities.profiling import profile
@@ -90,22 +90,25 @@ def update_value_map(layer, exposure_key=None):
 
     layer.startEditing()
     layer.addAttribute(classified_field)
+    layer.commitChanges()
 
     classified_field_index = layer.fields(). \
         lookupField(classified_field.name())
 
-    for feature in layer.getFeatures():
-        attributes = feature.attributes()
-        source_value = attributes[unclassified_index]
-        classified_value = reversed_value_map.get(source_value)
-
-        if not classified_value:
-            classified_value = ''
+    request = QgsFeatureRequest()
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setSubsetOfAttributes([unclassified_index])
+    with BulkAttributeWriter(layer) as writer:
+        for feature in layer.getFeatures(request):
+            attributes = feature.attributes()
+            source_value = attributes[unclassified_index]
+            classified_value = reversed_value_map.get(source_value)
 
-        layer.changeAttributeValue(
-            feature.id(), classified_field_index, classified_value)
+            if not classified_value:
+                classified_value = ''
 
-    layer.commitChanges()
+            writer.change_attribute_value(
+                feature.id(), classified_field_index, classified_value)
 
     remove_fields(layer, [unclassified_column])
 
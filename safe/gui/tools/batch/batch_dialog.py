@@ -14,10 +14,9 @@ Contact : ole.moller.nielsen@gmail.com
 import logging
 import os
 import sys
-from configparser import ConfigParser, MissingSectionHeaderError, Error
+from configparser import Error
 from datetime import datetime
 from importlib import reload
-from io import StringIO
 
 from future import standard_library
 from qgis.core import (
@@ -61,7 +60,10 @@ from safe.definitions.reports.components import (
 )
 from safe.definitions.utilities import update_template_component
 from safe.gui.tools.help.batch_help import batch_help
+from safe.impact_function.batch_runner import read_scenarios
 from safe.impact_function.impact_function import ImpactFunction
+from safe.impact_function.impact_function_task import (
+    run_impact_function_in_background)
 from safe.messaging import styles
 from safe.report.impact_report import ImpactReport
 from safe.report.report_metadata import ReportMetadata
@@ -501,7 +503,12 @@ class BatchDialog(QDialog, FORM_CLASS):
             prepare_status, prepare_message = impact_function.prepare()
             if prepare_status == PREPARE_SUCCESS:
                 LOGGER.info('Impact function ready')
-                status, message = impact_function.run()
+                if setting(
+                        'run_analysis_in_background', expected_type=bool):
+                    status, message = run_impact_function_in_background(
+                        impact_function)
+                else:
+                    status, message = impact_function.run()
                 if status == ANALYSIS_SUCCESS:
                     status_item.setText(self.tr('Analysis Success'))
                     impact_layer = impact_function.impact
@@ -846,65 +853,6 @@ class BatchDialog(QDialog, FORM_CLASS):
         self.help_web_view.setHtml(string)
 
 
-def read_scenarios(filename):
-    """Read keywords dictionary from file.
-
-    :param filename: Name of file holding scenarios .
-
-    :return Dictionary of with structure like this
-        {{ 'foo' : { 'a': 'b', 'c': 'd'},
-            { 'bar' : { 'd': 'e', 'f': 'g'}}
-
-    A scenarios file may look like this:
-
-        [jakarta_flood]
-        hazard: /path/to/hazard.tif
-        exposure: /path/to/exposure.tif
-        function: function_id
-        aggregation: /path/to/aggregation_layer.tif
-        extent: minx, miny, maxx, maxy
-
-    Notes:
-        path for hazard, exposure, and aggregation are relative to scenario
-        file path
-    """
-    # Input checks
-    filename = os.path.abspath(filename)
-
-    blocks = {}
-    parser = ConfigParser()
-
-    # Parse the file content.
-    # if the content don't have section header
-    # we use the filename.
-    try:
-        parser.read(filename)
-    except MissingSectionHeaderError:
-        base_name = os.path.basename(filename)
-        name = os.path.splitext(base_name)[0]
-        section = '[%s]\n' % name
-        content = section + open(filename).read()
-        parser.readfp(StringIO(content))
-
-    # convert to dictionary
-    for section in parser.sections():
-        items = parser.items(section)
-        # add section as scenario name
-        items.append(('scenario_name', section))
-        # add full path to the blocks
-        items.append(('full_path', filename))
-        blocks[section] = {}
-        for key, value in items:
-            blocks[section][key] = value
-
-    # Ok we have generated a structure that looks like this:
-    # blocks = {{ 'foo' : { 'a': 'b', 'c': 'd'},
-    #           { 'bar' : { 'd': 'e', 'f': 'g'}}
-    # where foo and bar are scenarios and their dicts are the options for
-    # that scenario (e.g. hazard, exposure etc)
-    return blocks
-
-
 def validate_scenario(blocks, scenario_directory):
     """Function to validate input layer stored in scenario file.
 
@@ -3,13 +3,13 @@
 
 
 import codecs
+import io
 import logging
 import os
 import shutil
-import sys
 from datetime import datetime
-from subprocess import call, CalledProcessError
-from xml.dom import minidom
+from uuid import uuid4
+from xml.etree import ElementTree
 
 import numpy as np
 import pytz
@@ -29,7 +29,6 @@ from safe.common.exceptions import (
     ContourCreationError,
     InvalidLayerError,
     CallGDALError)
-from safe.common.utilities import which
 from safe.definitions.constants import (
     NONE_SMOOTHING, NUMPY_SMOOTHING, SCIPY_SMOOTHING
 )
@@ -77,6 +76,29 @@ USE_ASCII = 'use_ascii'
 NEAREST_NEIGHBOUR = 'nearest'
 INVDIST = 'invdist'
 
+# Number of bytes of grid data parsed at once.
+GRID_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def vrt_string(csv_path):
+    """Get the content of the OGR VRT file for a mmi CSV file.
+
+    :param csv_path: Path to the CSV file.
+    :type csv_path: str
+
+    :returns: The content of the VRT.
+    :rtype: str
+    """
+    return (
+        '<OGRVRTDataSource>'
+        '  <OGRVRTLayer name="mmi">'
+        '    <SrcDataSource>%s</SrcDataSource>'
+        '    <GeometryType>wkbPoint</GeometryType>'
+        '    <GeometryField encoding="PointFromColumns"'
+        '                      x="lon" y="lat" z="mmi"/>'
+        '  </OGRVRTLayer>'
+        '</OGRVRTDataSource>' % csv_path)
+
 
 class ShakeGrid():
 
@@ -149,8 +171,13 @@ class ShakeGrid():
         self.grid_bounding_box = None
         self.rows = None
         self.columns = None
-        self.mmi_data = None
+        # Coordinates of the grid points and the MMI grid (rows, columns)
+        self.longitudes = None
+        self.latitudes = None
+        self.mmi_grid = None
         self.event_id = None
+        # Directory in /vsimem/ for intermediate files
+        self._memory_directory = None
         if output_dir is None:
             self.output_dir = os.path.dirname(grid_xml_path)
         else:
@@ -272,111 +299,167 @@ class ShakeGrid():
         LOGGER.debug('ParseGridXml requested.')
         grid_path = self.grid_file_path()
         try:
-            document = minidom.parse(grid_path)
-            shakemap_grid_element = document.getElementsByTagName(
-                'shakemap_grid')
-            shakemap_grid_element = shakemap_grid_element[0]
-            self.event_id = shakemap_grid_element.attributes[
-                'event_id'].nodeValue
-
-            event_element = document.getElementsByTagName('event')
-            event_element = event_element[0]
-            self.magnitude = float(
-                event_element.attributes['magnitude'].nodeValue)
-            self.longitude = float(
-                event_element.attributes['lon'].nodeValue)
-            self.latitude = float(
-                event_element.attributes['lat'].nodeValue)
-            self.location = event_element.attributes[
-                'event_description'].nodeValue.strip()
-            self.depth = float(
-                event_element.attributes['depth'].nodeValue)
-            # Get the date - it's going to look something like this:
-            # 2012-08-07T01:55:12WIB
-            time_stamp = event_element.attributes['event_timestamp'].nodeValue
-            # Note the timezone here is inconsistent with YZ from grid.xml
-            # use the latter
-            self.time_zone = time_stamp[19:]
-            self.extract_date_time(time_stamp)
-
-            specification_element = document.getElementsByTagName(
-                'grid_specification')
-            specification_element = specification_element[0]
-            self.x_minimum = float(
-                specification_element.attributes['lon_min'].nodeValue)
-            self.x_maximum = float(
-                specification_element.attributes['lon_max'].nodeValue)
-            self.y_minimum = float(
-                specification_element.attributes['lat_min'].nodeValue)
-            self.y_maximum = float(
-                specification_element.attributes['lat_max'].nodeValue)
-            self.grid_bounding_box = QgsRectangle(
-                self.x_minimum, self.y_maximum, self.x_maximum, self.y_minimum)
-            self.rows = int(float(
-                specification_element.attributes['nlat'].nodeValue))
-            self.columns = int(float(
-                specification_element.attributes['nlon'].nodeValue))
-            data_element = document.getElementsByTagName(
-                'grid_data')
-            data_element = data_element[0]
-            data = data_element.firstChild.nodeValue
-
-            # Extract the 1,2 and 5th (MMI) columns and populate mmi_data
-            longitude_column = 0
-            latitude_column = 1
-            mmi_column = 4
-            lon_list = []
-            lat_list = []
-            mmi_list = []
-            for line in data.split('\n'):
-                if not line:
-                    continue
-                tokens = line.split(' ')
-                longitude = tokens[longitude_column]
-                latitude = tokens[latitude_column]
-                mmi = tokens[mmi_column]
-                lon_list.append(float(longitude))
-                lat_list.append(float(latitude))
-                mmi_list.append(float(mmi))
+            with open(grid_path, 'rb') as grid_file:
+                header = self._parse_grid_header(grid_file)
+                self._parse_event(header)
+                data = self._parse_grid_data(grid_file, header)
+
+            longitudes = data[:, 0]
+            latitudes = data[:, 1]
+            mmi_values = data[:, 2]
+
+            # The grid is sorted by rows, from north to south.
+            if self.rows * self.columns != len(mmi_values):
+                self.columns = int(np.count_nonzero(
+                    latitudes == latitudes[0]))
+                self.rows = int(np.count_nonzero(
+                    longitudes == longitudes[0]))
+            mmi_grid = np.ascontiguousarray(
+                mmi_values.reshape((self.rows, self.columns)))
 
             if self.smoothing_method == NUMPY_SMOOTHING:
                 LOGGER.debug('We are using NUMPY smoothing')
-                ncols = len(np.where(np.array(lon_list) == lon_list[0])[0])
-                nrows = len(np.where(np.array(lat_list) == lat_list[0])[0])
-
-                # reshape mmi_list to 2D array to apply gaussian filter
-                Z = np.reshape(mmi_list, (nrows, ncols))
-
                 # smooth MMI matrix
-                mmi_list = convolve(Z, gaussian_kernel(self.smoothing_sigma))
-
-                # reshape array back to 1D long list of mmi
-                mmi_list = np.reshape(mmi_list, ncols * nrows)
+                mmi_grid = convolve(
+                    mmi_grid, gaussian_kernel(self.smoothing_sigma))
 
             elif self.smoothing_method == SCIPY_SMOOTHING:
                 LOGGER.debug('We are using SCIPY smoothing')
                 from scipy.ndimage.filters import gaussian_filter
-                ncols = len(np.where(np.array(lon_list) == lon_list[0])[0])
-                nrows = len(np.where(np.array(lat_list) == lat_list[0])[0])
-
-                # reshape mmi_list to 2D array to apply gaussian filter
-                Z = np.reshape(mmi_list, (nrows, ncols))
-
                 # smooth MMI matrix
                 # Help from Hadi Ghasemi
-                mmi_list = gaussian_filter(Z, self.smoothing_sigma)
+                mmi_grid = gaussian_filter(mmi_grid, self.smoothing_sigma)
 
-                # reshape array back to 1D long list of mmi
-                mmi_list = np.reshape(mmi_list, ncols * nrows)
-
-            # zip lists as list of tuples
-            self.mmi_data = list(zip(lon_list, lat_list, mmi_list))
+            self.longitudes = longitudes
+            self.latitudes = latitudes
+            self.mmi_grid = mmi_grid
 
         except Exception as e:
             LOGGER.exception('Event parse failed')
             raise GridXmlParseError(
                 'Failed to parse grid file.\n%s\n%s' % (e.__class__, str(e)))
 
+    @staticmethod
+    def _parse_grid_header(grid_file):
+        """Parse the elements of the grid file before the grid data.
+
+        The file is read line by line until the grid_data element starts, so
+        the grid data itself is never loaded in the XML tree.
+
+        :param grid_file: The grid file, opened in binary mode.
+        :type grid_file: file
+
+        :returns: A dictionary with the attributes of shakemap_grid, event
+            and grid_specification, the list of grid fields and the data
+            found on the same line as the grid_data tag.
+        :rtype: dict
+        """
+        parser = ElementTree.XMLPullParser(events=('start',))
+        header = {'grid_field': [], 'remainder': b''}
+        for line in grid_file:
+            start = line.find(b'<grid_data')
+            if start != -1:
+                end = line.find(b'>', start)
+                parser.feed(line[:end + 1])
+                header['remainder'] = line[end + 1:]
+            else:
+                parser.feed(line)
+            for _, element in parser.read_events():
+                # Remove the namespace.
+                tag = element.tag.split('}')[-1]
+                if tag == 'grid_field':
+                    header['grid_field'].append(dict(element.attrib))
+                elif tag != 'grid_data':
+                    header[tag] = dict(element.attrib)
+            if start != -1:
+                return header
+        raise GridXmlParseError('No grid_data element in the grid file.')
+
+    def _parse_event(self, header):
+        """Set the event and the grid specification from the grid header.
+
+        :param header: The header returned by _parse_grid_header.
+        :type header: dict
+        """
+        self.event_id = header['shakemap_grid']['event_id']
+
+        event = header['event']
+        self.magnitude = float(event['magnitude'])
+        self.longitude = float(event['lon'])
+        self.latitude = float(event['lat'])
+        self.location = event['event_description'].strip()
+        self.depth = float(event['depth'])
+        # Get the date - it's going to look something like this:
+        # 2012-08-07T01:55:12WIB
+        time_stamp = event['event_timestamp']
+        # Note the timezone here is inconsistent with YZ from grid.xml
+        # use the latter
+        self.time_zone = time_stamp[19:]
+        self.extract_date_time(time_stamp)
+
+        specification = header['grid_specification']
+        self.x_minimum = float(specification['lon_min'])
+        self.x_maximum = float(specification['lon_max'])
+        self.y_minimum = float(specification['lat_min'])
+        self.y_maximum = float(specification['lat_max'])
+        self.grid_bounding_box = QgsRectangle(
+            self.x_minimum, self.y_maximum, self.x_maximum, self.y_minimum)
+        self.rows = int(float(specification['nlat']))
+        self.columns = int(float(specification['nlon']))
+
+    @staticmethod
+    def _parse_grid_data(grid_file, header):
+        """Parse the grid data in blocks with numpy.
+
+        Only the longitude, latitude and MMI columns are kept.
+
+        :param grid_file: The grid file, positioned after the grid_data tag.
+        :type grid_file: file
+
+        :param header: The header returned by _parse_grid_header.
+        :type header: dict
+
+        :returns: An array of shape (N, 3) with longitude, latitude and MMI.
+        :rtype: numpy.ndarray
+        """
+        # Extract the 1,2 and 5th (MMI) columns by default.
+        indexes = {'LON': 0, 'LAT': 1, 'MMI': 4}
+        fields_count = len(header['grid_field'])
+        for grid_field in header['grid_field']:
+            name = grid_field.get('name', '').upper()
+            if name in indexes:
+                indexes[name] = int(grid_field['index']) - 1
+        columns = [indexes['LON'], indexes['LAT'], indexes['MMI']]
+
+        blocks = []
+        pending = header['remainder']
+        finished = False
+        while not finished:
+            lines = grid_file.readlines(GRID_BLOCK_SIZE)
+            if not lines:
+                finished = True
+            text = pending + b''.join(lines)
+            end = text.find(b'</grid_data>')
+            if end != -1:
+                text = text[:end]
+                finished = True
+                pending = b''
+            elif not finished:
+                # Keep an incomplete last line for the next block.
+                last_line = text.rfind(b'\n') + 1
+                text, pending = text[:last_line], text[last_line:]
+            if not fields_count and text.strip():
+                # No grid_field element, use the first line of data.
+                fields_count = len(text.strip().split(b'\n', 1)[0].split())
+            values = np.fromstring(text.decode('ascii'), sep=' ')
+            if values.size:
+                values = values.reshape((-1, fields_count))
+                blocks.append(values[:, columns])
+
+        if not blocks:
+            raise GridXmlParseError('The grid data is empty.')
+        return np.concatenate(blocks)
+
     def grid_file_path(self):
         """Validate that grid file path points to a file.
 
@@ -390,6 +473,33 @@ class ShakeGrid():
         else:
             raise GridXmlFileNotFoundError
 
+    @property
+    def mmi_data(self):
+        """The MMI data as an array of longitude, latitude and MMI.
+
+        :returns: An array of shape (rows * columns, 3) or None if the grid
+            is not parsed.
+        :rtype: numpy.ndarray
+        """
+        if self.mmi_grid is None:
+            return None
+        return np.column_stack(
+            (self.longitudes, self.latitudes, self.mmi_grid.ravel()))
+
+    def _write_delimited_text(self, output):
+        """Write the mmi data as delimited text.
+
+        :param output: A file like object.
+        :type output: file
+        """
+        np.savetxt(
+            output,
+            self.mmi_data,
+            fmt='%s',
+            delimiter=',',
+            header='lon,lat,mmi',
+            comments='')
+
     def mmi_to_delimited_text(self):
         """Return the mmi data as a delimited test string.
 
@@ -405,10 +515,9 @@ class ShakeGrid():
            123.1500,01.7900,1.16
            etc...
         """
-        delimited_text = 'lon,lat,mmi\n'
-        for row in self.mmi_data:
-            delimited_text += '%s,%s,%s\n' % (row[0], row[1], row[2])
-        return delimited_text
+        output = io.StringIO()
+        self._write_delimited_text(output)
+        return output.getvalue()
 
     def mmi_to_delimited_file(self, force_flag=True):
         """Save mmi_data to delimited text file suitable for gdal_grid.
@@ -437,9 +546,8 @@ class ShakeGrid():
         # short circuit if the csv is already created.
         if os.path.exists(csv_path) and force_flag is not True:
             return csv_path
-        csv_file = open(csv_path, 'w')
-        csv_file.write(self.mmi_to_delimited_text())
-        csv_file.close()
+        with open(csv_path, 'w') as csv_file:
+            self._write_delimited_text(csv_file)
 
         # Also write the .csvt which contains metadata about field types
         csvt_path = os.path.join(
@@ -475,67 +583,82 @@ class ShakeGrid():
 
         csv_path = self.mmi_to_delimited_file(True)
 
-        vrt_string = (
-            '<OGRVRTDataSource>'
-            '  <OGRVRTLayer name="mmi">'
-            '    <SrcDataSource>%s</SrcDataSource>'
-            '    <GeometryType>wkbPoint</GeometryType>'
-            '    <GeometryField encoding="PointFromColumns"'
-            '                      x="lon" y="lat" z="mmi"/>'
-            '  </OGRVRTLayer>'
-            '</OGRVRTDataSource>' % csv_path)
-
         with codecs.open(vrt_path, 'w', encoding='utf-8') as f:
-            f.write(vrt_string)
+            f.write(vrt_string(csv_path))
 
         return vrt_path
 
-    def _run_command(self, command):
-        """Run a command and raise any error as needed.
+    def _memory_path(self, filename):
+        """Get a path in the GDAL in-memory file system for this grid.
 
-        This is a simple runner for executing gdal commands.
+        :param filename: The file name.
+        :type filename: str
+
+        :returns: The path in /vsimem/.
+        :rtype: str
+        """
+        if self._memory_directory is None:
+            self._memory_directory = '/vsimem/shakemap_%s' % uuid4().hex
+        return '%s/%s' % (self._memory_directory, filename)
 
-        :param command: A command string to be run.
-        :type command: str
+    def _mmi_to_memory_vrt(self):
+        """Write the mmi data as a CSV and a VRT in GDAL's memory.
 
-        :raises: Any exceptions will be propagated.
+        These files are the same as the ones from mmi_to_delimited_file and
+        mmi_to_vrt, without writing them on the disk.
+
+        :returns: The path of the VRT in /vsimem/.
+        :rtype: str
         """
-        try:
-            my_result = call(command, shell=True)
-            del my_result
-        except CalledProcessError as e:
-            LOGGER.exception('Running command failed %s' % command)
-            message = (
-                'Error while executing the following shell '
-                'command: %s\nError message: %s' % (command, str(e)))
-            # shameless hack - see https://github.com/AIFDR/inasafe/issues/141
-            if sys.platform == 'darwin':  # Mac OS X
-                if 'Errno 4' in str(e):
-                    # continue as the error seems to be non critical
-                    pass
-                else:
-                    raise Exception(message)
-            else:
-                raise Exception(message)
+        csv_path = self._memory_path('mmi.csv')
+        output = io.StringIO()
+        self._write_delimited_text(output)
+        gdal.FileFromMemBuffer(csv_path, output.getvalue().encode('ascii'))
+
+        csvt_path = self._memory_path(self.output_basename + '.csvt')
+        gdal.FileFromMemBuffer(csvt_path, b'"Real","Real","Real"')
+
+        vrt_path = self._memory_path(self.output_basename + '.vrt')
+        gdal.FileFromMemBuffer(
+            vrt_path, vrt_string(csv_path).encode('utf-8'))
+        return vrt_path
+
+    def _mmi_to_memory_ascii(self):
+        """Write the mmi grid as an ascii raster in GDAL's memory.
+
+        :returns: The path of the ascii raster in /vsimem/.
+        :rtype: str
+        """
+        ascii_path = self._memory_path(self.output_basename + '.asc')
+        output = io.StringIO()
+        self._write_ascii(output)
+        gdal.FileFromMemBuffer(ascii_path, output.getvalue().encode('ascii'))
+        return ascii_path
+
+    def _clear_memory_files(self):
+        """Remove the files written in GDAL's memory."""
+        if self._memory_directory is None:
+            return
+        for filename in gdal.ReadDir(self._memory_directory) or []:
+            gdal.Unlink('%s/%s' % (self._memory_directory, filename))
+        self._memory_directory = None
 
     def mmi_to_raster(self, force_flag=False, algorithm=USE_ASCII):
         """Convert the grid.xml's mmi column to a raster using gdal_grid.
 
         A geotiff file will be created.
 
-        Unfortunately no python bindings exist for doing this so we are
-        going to do it using a shell call.
+        GDAL is used through its python bindings, with the intermediate
+        files written in GDAL's memory.
 
         .. see also:: http://www.gdal.org/gdal_grid.html
 
-        Example of the gdal_grid call we generate::
+        Example of the equivalent gdal_grid call::
 
            gdal_grid -zfield "mmi" -a invdist:power=2.0:smoothing=1.0 \
            -txe 126.29 130.29 -tye 0.802 4.798 -outsize 400 400 -of GTiff \
            -ot Float16 -l mmi mmi.vrt mmi.tif
 
-        .. note:: It is assumed that gdal_grid is in your path.
-
         :param force_flag: Whether to force the regeneration of the output
             file. Defaults to False.
         :type force_flag: bool
@@ -577,66 +700,58 @@ class ShakeGrid():
         if os.path.exists(tif_path) and force_flag is not True:
             return tif_path
 
-        if algorithm == USE_ASCII:
-            # Convert to ascii
-            ascii_path = self.mmi_to_ascii(True)
-
-            # Creating command to convert to tif
-            command = (
-                (
-                    '%(gdal_translate)s -a_srs EPSG:4326 '
-                    '"%(ascii)s" "%(tif)s"'
-                ) % {
-                    'gdal_translate': which('gdal_translate')[0],
-                    'ascii': ascii_path,
-                    'tif': tif_path
-                }
-            )
-
-            LOGGER.info('Created this gdal command:\n%s' % command)
-            # Now run GDAL warp scottie...
-            self._run_command(command)
-        else:
-            # Ensure the vrt mmi file exists (it will generate csv too if
-            # needed)
-            vrt_path = self.mmi_to_vrt(force_flag)
-
-            # now generate the tif using default nearest neighbour
-            # interpolation options. This gives us the same output as the
-            # mmi.grd generated by the earthquake server.
-
-            if INVDIST in algorithm:
-                algorithm = 'invdist:power=2.0:smoothing=1.0'
-
-            command = (
-                (
-                    '%(gdal_grid)s -a %(alg)s -zfield "mmi" -txe %(xMin)s '
-                    '%(xMax)s -tye %(yMin)s %(yMax)s -outsize %(dimX)i '
-                    '%(dimY)i -of GTiff -ot Float16 -a_srs EPSG:4326 -l mmi '
-                    '"%(vrt)s" "%(tif)s"'
-                ) % {
-                    'gdal_grid': which('gdal_grid')[0],
-                    'alg': algorithm,
-                    'xMin': self.x_minimum,
-                    'xMax': self.x_maximum,
-                    'yMin': self.y_minimum,
-                    'yMax': self.y_maximum,
-                    'dimX': self.columns,
-                    'dimY': self.rows,
-                    'vrt': vrt_path,
-                    'tif': tif_path
-                }
-            )
-
-            LOGGER.info('Created this gdal command:\n%s' % command)
-            # Now run GDAL warp scottie...
-            self._run_command(command)
-
-            # We will use keywords file name with simple algorithm name since
-            # it will raise an error in windows related to having double
-            # colon in path
-            if INVDIST in algorithm:
-                algorithm = 'invdist'
+        try:
+            if algorithm == USE_ASCII:
+                # Convert to ascii
+                ascii_path = self._mmi_to_memory_ascii()
+
+                # Equivalent of gdal_translate -a_srs EPSG:4326 ascii tif
+                options = ['-a_srs', 'EPSG:4326']
+                LOGGER.info(
+                    'gdal_translate %s "%s" "%s"' % (
+                        ' '.join(options), ascii_path, tif_path))
+                dataset = gdal.Translate(
+                    tif_path, ascii_path, options=options)
+            else:
+                # Ensure the vrt mmi file exists
+                vrt_path = self._mmi_to_memory_vrt()
+
+                # now generate the tif using default nearest neighbour
+                # interpolation options. This gives us the same output as
+                # the mmi.grd generated by the earthquake server.
+
+                if INVDIST in algorithm:
+                    algorithm = 'invdist:power=2.0:smoothing=1.0'
+
+                options = [
+                    '-a', algorithm,
+                    '-zfield', 'mmi',
+                    '-txe', str(self.x_minimum), str(self.x_maximum),
+                    '-tye', str(self.y_minimum), str(self.y_maximum),
+                    '-outsize', str(self.columns), str(self.rows),
+                    '-of', 'GTiff',
+                    '-ot', 'Float16',
+                    '-a_srs', 'EPSG:4326',
+                    '-l', 'mmi',
+                ]
+                LOGGER.info(
+                    'gdal_grid %s "%s" "%s"' % (
+                        ' '.join(options), vrt_path, tif_path))
+                dataset = gdal.Grid(tif_path, vrt_path, options=options)
+
+                # We will use keywords file name with simple algorithm name
+                # since it will raise an error in windows related to having
+                # double colon in path
+                if INVDIST in algorithm:
+                    algorithm = 'invdist'
+
+            if dataset is None:
+                raise CallGDALError(
+                    tr('GDAL could not create the raster %s') % tif_path)
+            # Flush the raster on the disk.
+            dataset = None
+        finally:
+            self._clear_memory_files()
 
         # copy the keywords file from fixtures for this layer
         self.create_keyword_file(algorithm)
@@ -664,11 +779,9 @@ class ShakeGrid():
         :return: Path to the resulting tif file.
         :rtype: str
 
-        Example of the ogr2ogr call we generate::
+        Example of the equivalent ogr2ogr call::
 
            ogr2ogr -select mmi -a_srs EPSG:4326 mmi.shp mmi.vrt mmi
-
-        .. note:: It is assumed that ogr2ogr is in your path.
         """
         LOGGER.debug('mmi_to_shapefile requested.')
 
@@ -678,29 +791,22 @@ class ShakeGrid():
         if os.path.exists(shp_path) and force_flag is not True:
             return shp_path
 
-        # Ensure the vrt mmi file exists (it will generate csv too if needed)
-        vrt_path = self.mmi_to_vrt(force_flag)
-
-        # now generate the tif using default interpolation options
-
-        binary_list = which('ogr2ogr')
-        LOGGER.debug('Path for ogr2ogr: %s' % binary_list)
-        if len(binary_list) < 1:
-            raise CallGDALError(
-                tr('ogr2ogr could not be found on your computer'))
-        # Use the first matching gdalwarp found
-        binary = binary_list[0]
-        command = (
-            ('%(ogr2ogr)s -overwrite -select mmi -a_srs EPSG:4326 '
-             '%(shp)s %(vrt)s mmi') % {
-                'ogr2ogr': binary,
-                'shp': shp_path,
-                'vrt': vrt_path})
-
-        LOGGER.info('Created this ogr command:\n%s' % command)
-        # Now run ogr2ogr ...
-        # noinspection PyProtectedMember
-        self._run_command(command)
+        try:
+            vrt_path = self._mmi_to_memory_vrt()
+
+            options = [
+                '-overwrite', '-select', 'mmi', '-a_srs', 'EPSG:4326', 'mmi']
+            LOGGER.info(
+                'ogr2ogr %s %s %s' % (' '.join(options), shp_path, vrt_path))
+            dataset = gdal.VectorTranslate(
+                shp_path, vrt_path, options=options)
+            if dataset is None:
+                raise CallGDALError(
+                    tr('GDAL could not create the shapefile %s') % shp_path)
+            # Flush the shapefile on the disk.
+            dataset = None
+        finally:
+            self._clear_memory_files()
 
         # Lastly copy over the standard qml (QGIS Style file) for the mmi.tif
         qml_path = os.path.join(
@@ -963,8 +1069,18 @@ class ShakeGrid():
         if os.path.exists(ascii_path) and force_flag is not True:
             return ascii_path
 
+        with open(ascii_path, 'w') as asc_file:
+            self._write_ascii(asc_file)
+
+        return ascii_path
+
+    def _write_ascii(self, asc_file):
+        """Write the mmi grid as an ascii raster.
+
+        :param asc_file: A file like object.
+        :type asc_file: file
+        """
         cell_size = (self.x_maximum - self.x_minimum) / (self.rows - 1)
-        asc_file = open(ascii_path, 'w')
         asc_file.write('ncols %d\n' % self.columns)
         asc_file.write('nrows %d\n' % self.rows)
         asc_file.write('xllcorner %.3f\n' % self.x_minimum)
@@ -972,19 +1088,9 @@ class ShakeGrid():
         asc_file.write('cellsize %.3f\n' % cell_size)
         asc_file.write('nodata_value -9999\n')
 
-        cell_string = ''
-        cell_values = np.reshape(
-            [v[2] for v in self.mmi_data], (self.rows, self.columns))
-        for i in range(self.rows):
-            for j in range(self.columns):
-                cell_string += '%.3f ' % cell_values[i][j]
-            cell_string += '\n'
-
-        asc_file.write(cell_string)
-
-        asc_file.close()
-
-        return ascii_path
+        np.savetxt(
+            asc_file, self.mmi_grid, fmt='%.3f', delimiter=' ',
+            newline=' \n')
 
 
 def convert_mmi_data(
@@ -5,6 +5,8 @@ import os
 import unittest
 import shutil
 
+import numpy
+from osgeo import gdal
 from qgis.core import QgsVectorLayer
 
 from safe.definitions.hazard import hazard_earthquake
@@ -151,6 +153,62 @@ class TestShakeGrid(unittest.TestCase):
         message = 'Got:\n%s\nExpected:\n%s\n' % (bounds, expected_result)
         self.assertEqual(bounds, expected_result, message)
 
+    def test_mmi_grid(self):
+        """Test the MMI grid built by the parser."""
+        mmi_grid = NORMAL_SHAKE_GRID.mmi_grid
+        self.assertEqual((101, 101), mmi_grid.shape)
+        self.assertTrue(mmi_grid.flags['C_CONTIGUOUS'])
+
+        # The first row is the northern row of the grid.
+        mmi_data = NORMAL_SHAKE_GRID.mmi_data
+        self.assertEqual((10201, 3), mmi_data.shape)
+        self.assertEqual(-1.1813, mmi_data[0][1])
+        self.assertEqual(-1.1813, mmi_data[100][1])
+        self.assertEqual(list(mmi_grid[0]), list(mmi_data[:101, 2]))
+        self.assertEqual(mmi_grid.max(), mmi_data[:, 2].max())
+
+        # Smoothing keeps the shape of the grid.
+        self.assertEqual((101, 101), SMOOTHED_SHAKE_GRID.mmi_grid.shape)
+
+    def test_mmi_grid_not_square(self):
+        """Test the MMI grid of a grid with more columns than rows."""
+        with open(SOURCE_PATH) as source_file:
+            header = source_file.read().split('<grid_data>')[0]
+        header = header.replace(
+            'nlon="101" nlat="101"', 'nlon="12" nlat="10"')
+        lines = []
+        for row in range(10):
+            for column in range(12):
+                lines.append('%s %s 0 0 %s 0.5 1 600' % (
+                    139.37 + column * 0.025,
+                    -1.1813 - row * 0.025,
+                    row * 12 + column + 1))
+        grid_path = os.path.join(temp_dir(__name__), 'not_square', 'grid.xml')
+        os.makedirs(os.path.dirname(grid_path))
+        with open(grid_path, 'w') as grid_file:
+            grid_file.write(header)
+            grid_file.write('<grid_data>\n%s\n</grid_data>\n' % '\n'.join(
+                lines))
+            grid_file.write('</shakemap_grid>\n')
+
+        shake_grid = ShakeGrid('Not square', 'Not square', grid_path)
+        self.assertEqual((10, 12), shake_grid.mmi_grid.shape)
+        self.assertEqual(
+            list(range(1, 121)), shake_grid.mmi_grid.ravel().tolist())
+
+        # The smoothing runs on the grid with the right shape.
+        smoothed_grid = ShakeGrid(
+            'Not square',
+            'Not square',
+            grid_path,
+            smoothing_method=NUMPY_SMOOTHING)
+        self.assertEqual((10, 12), smoothed_grid.mmi_grid.shape)
+        self.assertEqual((120, 3), smoothed_grid.mmi_data.shape)
+        # The first row is still the northern row.
+        self.assertLess(
+            smoothed_grid.mmi_grid[0].mean(),
+            smoothed_grid.mmi_grid[-1].mean())
+
     def test_grid_file_path(self):
         """Test grid_file_path works properly."""
         grid_path = SMOOTHED_SHAKE_GRID.grid_file_path()
@@ -207,6 +265,21 @@ class TestShakeGrid(unittest.TestCase):
         keywords = read_iso19115_metadata(raster_path)
         self.assertIn('extra_keywords', list(keywords.keys()))
 
+    def test_mmi_to_raster_values(self):
+        """Check the raster has the values of the MMI grid."""
+        raster_path = NORMAL_SHAKE_GRID.mmi_to_raster(
+            force_flag=True, algorithm=USE_ASCII)
+        dataset = gdal.Open(raster_path)
+        self.assertEqual(101, dataset.RasterXSize)
+        self.assertEqual(101, dataset.RasterYSize)
+        values = dataset.GetRasterBand(1).ReadAsArray()
+        dataset = None
+        expected = numpy.round(NORMAL_SHAKE_GRID.mmi_grid, 3)
+        self.assertTrue(numpy.allclose(values, expected, atol=1e-3))
+
+        # No intermediate file is left in memory.
+        self.assertIsNone(NORMAL_SHAKE_GRID._memory_directory)
+
     def test_mmi_to_shapefile(self):
         """Check we can convert the shake event to a shapefile."""
         # Check the shp file
@@ -107,6 +107,8 @@ from safe.gui.widgets.message import (
     show_no_keywords_message
 )
 from safe.impact_function.impact_function import ImpactFunction
+from safe.impact_function.impact_function_task import (
+    run_impact_function_in_background)
 from safe.impact_function.multi_exposure_wrapper import \
     MultiExposureImpactFunction
 from safe.messaging import styles
@@ -1332,7 +1334,11 @@ class Dock(QDockWidget, FORM_CLASS):
             not self.disable_rounding_action.isChecked())
 
         try:
-            status, message = self.impact_function.run()
+            if setting('run_analysis_in_background', expected_type=bool):
+                status, message = run_impact_function_in_background(
+                    self.impact_function)
+            else:
+                status, message = self.impact_function.run()
             message = basestring_to_message(message)
         except BaseException:
             # We have an exception only if we are in debug mode.
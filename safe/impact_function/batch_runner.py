@@ -0,0 +1,699 @@
+# coding=utf-8
+
+"""
+Run batches of scenarios without the QGIS interface.
+
+The scenarios are read from the same text files as the batch runner dialog.
+They run in a pool of processes, each process keeps the layers it loaded for
+the next scenarios and the prepared hazard layers are shared with the hazard
+cache. Completed scenarios are written to a checkpoint file in the output
+folder, an interrupted batch started again skips them. The timing of each
+scenario and the throughput are written to a summary CSV file.
+
+Usage, with the QGIS python libraries in the PYTHONPATH::
+
+    python -m safe.impact_function.batch_runner scenarios.txt \\
+        --output /path/to/output --workers 4 --report
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+from configparser import ConfigParser, MissingSectionHeaderError
+from glob import glob
+from io import StringIO
+from queue import Queue
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsRasterLayer,
+    QgsRectangle,
+    QgsVectorLayer,
+)
+
+from safe.datastore.folder import Folder
+from safe.definitions.constants import ANALYSIS_SUCCESS, PREPARE_SUCCESS
+from safe.definitions.reports.components import all_default_report_components
+from safe.impact_function.impact_function import ImpactFunction
+from safe.impact_function.multi_exposure_worker import (
+    initialize_worker,
+    python_executable,
+    worker_arguments)
+from safe.report.impact_report import ImpactReport
+from safe.utilities.gis import extent_string_to_array
+from safe.utilities.utilities import get_error_message, monkey_patch_keywords
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+CHECKPOINT_FILE = 'batch_checkpoint.jsonl'
+SUMMARY_FILE = 'batch_summary.csv'
+SUMMARY_COLUMNS = [
+    'scenario',
+    'scenario_file',
+    'status',
+    'message',
+    'start',
+    'duration',
+    'scenarios_per_hour',
+]
+
+SCENARIO_SUCCESS = 'success'
+SCENARIO_INVALID_INPUT = 'invalid_input'
+SCENARIO_PREPARE_FAILED = 'prepare_failed'
+SCENARIO_ANALYSIS_FAILED = 'analysis_failed'
+SCENARIO_REPORT_FAILED = 'report_failed'
+SCENARIO_ERROR = 'error'
+
+# Layers loaded by this process, by path, reused by the next scenarios.
+_LOADED_LAYERS = {}
+
+
+def read_scenarios(filename):
+    """Read keywords dictionary from file.
+
+    :param filename: Name of file holding scenarios .
+
+    :return Dictionary of with structure like this
+        {{ 'foo' : { 'a': 'b', 'c': 'd'},
+            { 'bar' : { 'd': 'e', 'f': 'g'}}
+
+    A scenarios file may look like this:
+
+        [jakarta_flood]
+        hazard: /path/to/hazard.tif
+        exposure: /path/to/exposure.tif
+        function: function_id
+        aggregation: /path/to/aggregation_layer.tif
+        extent: minx, miny, maxx, maxy
+
+    Notes:
+        path for hazard, exposure, and aggregation are relative to scenario
+        file path
+    """
+    # Input checks
+    filename = os.path.abspath(filename)
+
+    blocks = {}
+    parser = ConfigParser()
+
+    # Parse the file content.
+    # if the content don't have section header
+    # we use the filename.
+    try:
+        parser.read(filename)
+    except MissingSectionHeaderError:
+        base_name = os.path.basename(filename)
+        name = os.path.splitext(base_name)[0]
+        section = '[%s]\n' % name
+        content = section + open(filename).read()
+        parser.read_file(StringIO(content))
+
+    # convert to dictionary
+    for section in parser.sections():
+        items = parser.items(section)
+        # add section as scenario name
+        items.append(('scenario_name', section))
+        # add full path to the blocks
+        items.append(('full_path', filename))
+        blocks[section] = {}
+        for key, value in items:
+            blocks[section][key] = value
+
+    # Ok we have generated a structure that looks like this:
+    # blocks = {{ 'foo' : { 'a': 'b', 'c': 'd'},
+    #           { 'bar' : { 'd': 'e', 'f': 'g'}}
+    # where foo and bar are scenarios and their dicts are the options for
+    # that scenario (e.g. hazard, exposure etc)
+    return blocks
+
+
+def scenario_key(scenario):
+    """Identifier of a scenario in a batch.
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :return: The path of the scenario file and the scenario name.
+    :rtype: str
+    """
+    return '%s:%s' % (scenario['full_path'], scenario['scenario_name'])
+
+
+def scenario_output_directory(output_directory, scenario):
+    """Output folder of a scenario in a batch.
+
+    It is unique for each scenario key, scenarios with the same name in
+    several files don't share their outputs.
+
+    :param output_directory: The output folder of the batch.
+    :type output_directory: str
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :return: The path of the folder.
+    :rtype: str
+    """
+    stem = os.path.splitext(os.path.basename(scenario['full_path']))[0]
+    digest = hashlib.sha1(
+        scenario_key(scenario).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(
+        output_directory,
+        '%s_%s_%s' % (stem, scenario['scenario_name'], digest))
+
+
+def scenario_layer_path(scenario, layer_purpose):
+    """Absolute path of a layer of a scenario.
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :param layer_purpose: hazard, exposure or aggregation.
+    :type layer_purpose: str
+
+    :return: The path, None if the scenario doesn't use this layer.
+    :rtype: str
+    """
+    path = scenario.get(layer_purpose)
+    if not path:
+        return None
+    directory = os.path.dirname(scenario['full_path'])
+    return os.path.normpath(os.path.join(directory, path))
+
+
+def load_scenario_layer(path):
+    """Load a layer of a scenario, once per process.
+
+    The keywords are read again for each scenario, as the impact function
+    changes them.
+
+    :param path: The path of the raster or vector layer.
+    :type path: str
+
+    :return: The layer, None if it is not valid.
+    :rtype: QgsMapLayer
+    """
+    layer = _LOADED_LAYERS.get(path)
+    if layer is None:
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        layer = QgsRasterLayer(path, base_name)
+        if not layer.isValid():
+            layer = QgsVectorLayer(path, base_name, 'ogr')
+        if not layer.isValid():
+            LOGGER.warning('Input in scenario is not recognized/supported')
+            return None
+        _LOADED_LAYERS[path] = layer
+    monkey_patch_keywords(layer)
+    return layer
+
+
+def _message_text(message):
+    """Text of a message returned by the impact function.
+
+    :param message: The message.
+    :type message: m.Message, str
+
+    :return: The text.
+    :rtype: str
+    """
+    if message is None:
+        return ''
+    if hasattr(message, 'to_text'):
+        return message.to_text()
+    return str(message)
+
+
+def _run_scenario(scenario, output_directory, report, use_hazard_cache):
+    """Prepare and run the impact function of a scenario.
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :param output_directory: The folder of the scenario outputs.
+    :type output_directory: str
+
+    :param report: If the reports must be generated.
+    :type report: bool
+
+    :param use_hazard_cache: If the hazard cache must be used.
+    :type use_hazard_cache: bool
+
+    :return: The status of the scenario and a message.
+    :rtype: (str, str)
+    """
+    layers = {}
+    for layer_purpose in ['hazard', 'exposure', 'aggregation']:
+        path = scenario_layer_path(scenario, layer_purpose)
+        if path:
+            layers[layer_purpose] = load_scenario_layer(path)
+            if layers[layer_purpose] is None:
+                return SCENARIO_INVALID_INPUT, 'Unable to load %s' % path
+        elif layer_purpose != 'aggregation':
+            return (
+                SCENARIO_INVALID_INPUT,
+                'Scenario does not contain %s path' % layer_purpose)
+
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    impact_function = ImpactFunction()
+    impact_function.datastore = Folder(output_directory)
+    impact_function.datastore.default_vector_format = 'geojson'
+    impact_function.use_hazard_cache = use_hazard_cache
+    impact_function.hazard = layers['hazard']
+    impact_function.exposure = layers['exposure']
+    if layers.get('aggregation'):
+        impact_function.aggregation = layers['aggregation']
+    elif scenario.get('extent'):
+        coordinates = extent_string_to_array(scenario['extent'])
+        impact_function.requested_extent = QgsRectangle(*coordinates)
+        impact_function.crs = QgsCoordinateReferenceSystem(
+            scenario.get('extent_crs', 'EPSG:4326'))
+
+    status, message = impact_function.prepare()
+    if status != PREPARE_SUCCESS:
+        return SCENARIO_PREPARE_FAILED, _message_text(message)
+
+    status, message = impact_function.run()
+    if status != ANALYSIS_SUCCESS:
+        return SCENARIO_ANALYSIS_FAILED, _message_text(message)
+
+    if report:
+        status, message = impact_function.generate_report(
+            all_default_report_components,
+            os.path.join(output_directory, 'output'))
+        if status != ImpactReport.REPORT_GENERATION_SUCCESS:
+            return SCENARIO_REPORT_FAILED, _message_text(message)
+
+    return SCENARIO_SUCCESS, ''
+
+
+def run_scenario(task):
+    """Run a scenario and time it, in a worker process or in this process.
+
+    The task is a dictionary with:
+    * scenario: the scenario from read_scenarios.
+    * output: the output folder of the batch.
+    * report: if the reports must be generated.
+    * use_hazard_cache: if the hazard cache must be used.
+
+    :param task: The description of the scenario to run.
+    :type task: dict
+
+    :return: The row of the scenario for the summary.
+    :rtype: OrderedDict
+    """
+    scenario = task['scenario']
+    row = _scenario_row(scenario)
+
+    start = time.time()
+    try:
+        row['status'], row['message'] = _run_scenario(
+            scenario,
+            scenario_output_directory(task['output'], scenario),
+            task['report'],
+            task['use_hazard_cache'])
+    except Exception as e:
+        # Exceptions raised in a worker may not be sent back to the parent.
+        row['status'] = SCENARIO_ERROR
+        row['message'] = _message_text(get_error_message(e))
+    row['duration'] = round(time.time() - start, 3)
+    return row
+
+
+def _scenario_row(scenario):
+    """Row of a scenario for the summary, before it runs.
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :return: The row, without the status, the message and the duration.
+    :rtype: OrderedDict
+    """
+    row = OrderedDict()
+    row['scenario'] = scenario['scenario_name']
+    row['scenario_file'] = scenario['full_path']
+    row['start'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    row['key'] = scenario_key(scenario)
+    return row
+
+
+def _error_row(scenario, error):
+    """Row of a scenario which failed outside of run_scenario.
+
+    :param scenario: A scenario from read_scenarios.
+    :type scenario: dict
+
+    :param error: The exception raised by the pool.
+    :type error: Exception
+
+    :return: The row of the scenario for the summary.
+    :rtype: OrderedDict
+    """
+    row = _scenario_row(scenario)
+    row['status'] = SCENARIO_ERROR
+    row['message'] = _message_text(get_error_message(error))
+    row['duration'] = 0
+    return row
+
+
+def read_checkpoint(path):
+    """Read the scenarios completed by a previous run of the batch.
+
+    :param path: The path of the checkpoint file.
+    :type path: str
+
+    :return: The rows of the completed scenarios, by scenario key.
+    :rtype: dict
+    """
+    completed = OrderedDict()
+    if not os.path.exists(path):
+        return completed
+    with open(path) as checkpoint:
+        for line in checkpoint:
+            try:
+                row = json.loads(line, object_pairs_hook=OrderedDict)
+            except ValueError:
+                # The last line is incomplete if the batch was killed.
+                continue
+            if row.get('status') == SCENARIO_SUCCESS:
+                completed[row['key']] = row
+    return completed
+
+
+def schedule_scenarios(scenarios):
+    """Group the scenarios sharing their prepared hazard.
+
+    Scenarios with the same hazard, aggregation and extent are in the same
+    group. The first scenario of a group fills the hazard cache, the other
+    ones must start after it so their hazard is prepared once.
+
+    :param scenarios: List of scenarios from read_scenarios.
+    :type scenarios: list
+
+    :return: The list of groups, each group is a list of scenarios.
+    :rtype: list
+    """
+    def inputs(scenario):
+        return (
+            scenario_layer_path(scenario, 'hazard') or '',
+            scenario_layer_path(scenario, 'aggregation') or '',
+            scenario.get('extent', ''))
+
+    groups = OrderedDict()
+    for scenario in sorted(scenarios, key=inputs):
+        groups.setdefault(inputs(scenario), []).append(scenario)
+    return list(groups.values())
+
+
+class BatchRunner():
+
+    """Run scenarios in a pool of processes, with a checkpoint.
+
+    .. versionadded:: 5.0
+    """
+
+    def __init__(
+            self,
+            scenarios,
+            output_directory,
+            workers=1,
+            report=False,
+            use_hazard_cache=True,
+            resume=True):
+        """Constructor.
+
+        :param scenarios: List of scenarios from read_scenarios.
+        :type scenarios: list
+
+        :param output_directory: The folder for the outputs of every
+            scenario, the checkpoint and the summary.
+        :type output_directory: str
+
+        :param workers: Number of processes. With one, the scenarios run in
+            this process.
+        :type workers: int
+
+        :param report: If the reports must be generated.
+        :type report: bool
+
+        :param use_hazard_cache: If the prepared hazard layers are shared
+            with the hazard cache.
+        :type use_hazard_cache: bool
+
+        :param resume: If the scenarios in the checkpoint must be skipped.
+        :type resume: bool
+        """
+        self.scenarios = scenarios
+        self.output_directory = output_directory
+        self.workers = workers
+        self.report = report
+        self.use_hazard_cache = use_hazard_cache
+        self.resume = resume
+
+    @property
+    def checkpoint_path(self):
+        """Path of the checkpoint file of the batch.
+
+        :return: The path.
+        :rtype: str
+        """
+        return os.path.join(self.output_directory, CHECKPOINT_FILE)
+
+    @property
+    def summary_path(self):
+        """Path of the summary CSV file of the batch.
+
+        :return: The path.
+        :rtype: str
+        """
+        return os.path.join(self.output_directory, SUMMARY_FILE)
+
+    def _tasks(self, groups):
+        """Tasks for run_scenario.
+
+        :param groups: List of groups of scenarios from schedule_scenarios.
+        :type groups: list
+
+        :return: List of groups of tasks.
+        :rtype: list
+        """
+        return [[{
+            'scenario': scenario,
+            'output': self.output_directory,
+            'report': self.report,
+            'use_hazard_cache': self.use_hazard_cache,
+        } for scenario in group] for group in groups]
+
+    def _results(self, groups):
+        """Run the tasks and yield the rows as soon as they are done.
+
+        The first task of each group is submitted first. The other tasks of
+        a group are submitted when the first one is done, they find its
+        prepared hazard in the hazard cache.
+
+        :param groups: List of groups of tasks for run_scenario.
+        :type groups: list
+
+        :return: Generator of rows.
+        :rtype: generator
+        """
+        count = sum(len(group) for group in groups)
+        if self.workers <= 1 or count <= 1:
+            for group in groups:
+                for task in group:
+                    yield run_scenario(task)
+            return
+
+        # QGIS can't be forked, each worker starts its own QGIS.
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(python_executable())
+        pool = context.Pool(
+            processes=min(self.workers, count),
+            initializer=initialize_worker,
+            initargs=worker_arguments() + (self.report,))
+        rows = Queue()
+
+        def submit(task):
+            # An error raised outside of run_scenario, while pickling the
+            # task for instance, must give a row too or the batch waits
+            # forever.
+            pool.apply_async(
+                run_scenario,
+                (task, ),
+                callback=rows.put,
+                error_callback=lambda e: rows.put(
+                    _error_row(task['scenario'], e)))
+
+        try:
+            waiting = OrderedDict()
+            for group in groups:
+                waiting[scenario_key(group[0]['scenario'])] = group[1:]
+                submit(group[0])
+            for _ in range(count):
+                row = rows.get()
+                for task in waiting.pop(row['key'], []):
+                    submit(task)
+                yield row
+        finally:
+            pool.close()
+            pool.join()
+
+    def run(self):
+        """Run the scenarios which are not completed yet.
+
+        Each completed scenario is appended to the checkpoint as soon as it
+        is done. The summary is written at the end.
+
+        :return: The rows of the summary, one per scenario.
+        :rtype: list
+        """
+        if not os.path.exists(self.output_directory):
+            os.makedirs(self.output_directory)
+
+        completed = OrderedDict()
+        if self.resume:
+            completed = read_checkpoint(self.checkpoint_path)
+        elif os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        scenarios = [
+            scenario for scenario in self.scenarios
+            if scenario_key(scenario) not in completed]
+        LOGGER.info(
+            'Batch: %s scenarios to run, %s already completed.'
+            % (len(scenarios), len(self.scenarios) - len(scenarios)))
+
+        rows = []
+        start = time.time()
+        tasks = self._tasks(schedule_scenarios(scenarios))
+        with open(self.checkpoint_path, 'a') as checkpoint:
+            for row in self._results(tasks):
+                LOGGER.info('Batch: %s %s in %ss' % (
+                    row['scenario'], row['status'], row['duration']))
+                checkpoint.write(json.dumps(row) + '\n')
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                rows.append(row)
+        duration = time.time() - start
+
+        keys = [scenario_key(scenario) for scenario in self.scenarios]
+        previous = [completed[key] for key in keys if key in completed]
+        self.write_summary(previous + rows, len(rows), duration)
+        return previous + rows
+
+    def write_summary(self, rows, count, duration):
+        """Write the summary CSV file.
+
+        The last row is the total of this run, with the throughput.
+
+        :param rows: The rows of the scenarios.
+        :type rows: list
+
+        :param count: Number of scenarios run this time.
+        :type count: int
+
+        :param duration: Duration of this run, in seconds.
+        :type duration: float
+        """
+        throughput = round(count * 3600.0 / duration, 2) if duration else 0
+        total = OrderedDict()
+        total['scenario'] = 'total'
+        total['status'] = '%s/%s %s' % (
+            len([row for row in rows if row['status'] == SCENARIO_SUCCESS]),
+            len(rows),
+            SCENARIO_SUCCESS)
+        total['duration'] = round(duration, 3)
+        total['scenarios_per_hour'] = throughput
+
+        with open(self.summary_path, 'w', newline='') as summary:
+            writer = csv.DictWriter(
+                summary, SUMMARY_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows + [total]:
+                writer.writerow(row)
+
+
+def scenario_files(paths):
+    """List the scenario files from files and folders.
+
+    :param paths: Scenario text files or folders containing them.
+    :type paths: list
+
+    :return: List of scenario files.
+    :rtype: list
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob(os.path.join(path, '*.txt'))))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv=None):
+    """Command line entry point of the batch runner.
+
+    :param argv: The arguments, default to the ones of the command line.
+    :type argv: list
+
+    :return: The exit code, 1 if a scenario failed.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Run InaSAFE scenario files without QGIS Desktop.')
+    parser.add_argument(
+        'scenarios', nargs='+',
+        help='Scenario text files or folders containing them.')
+    parser.add_argument(
+        '-o', '--output', required=True,
+        help='Output folder, with the checkpoint and the summary.')
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help='Number of processes running the scenarios.')
+    parser.add_argument(
+        '--report', action='store_true',
+        help='Generate the reports of each scenario.')
+    parser.add_argument(
+        '--no-hazard-cache', action='store_true',
+        help='Do not share the prepared hazard layers between scenarios.')
+    parser.add_argument(
+        '--restart', action='store_true',
+        help='Run every scenario again, ignoring the checkpoint.')
+    arguments = parser.parse_args(argv)
+
+    scenarios = []
+    for filename in scenario_files(arguments.scenarios):
+        scenarios.extend(list(read_scenarios(filename).values()))
+
+    initialize_worker(*worker_arguments(), gui_enabled=arguments.report)
+
+    runner = BatchRunner(
+        scenarios,
+        os.path.abspath(arguments.output),
+        workers=arguments.workers,
+        report=arguments.report,
+        use_hazard_cache=not arguments.no_hazard_cache,
+        resume=not arguments.restart)
+    rows = runner.run()
+    print('Summary written to %s' % runner.summary_path)
+
+    failed = [row for row in rows if row['status'] != SCENARIO_SUCCESS]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
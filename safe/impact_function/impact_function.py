@@ -4,6 +4,7 @@
 
 
 import getpass
+import json
 import logging
 from collections import OrderedDict
 from copy import deepcopy
@@ -19,7 +20,9 @@ from qgis.core import (
     QgsGeometry,
     QgsCoordinateTransform,
     QgsCoordinateReferenceSystem,
+    QgsFeature,
     QgsFeatureRequest,
+    QgsProcessingMultiStepFeedback,
     QgsRectangle,
     QgsVectorLayer,
     Qgis,
@@ -32,6 +35,7 @@ from qgis.utils import iface as iface_object
 
 from safe import messaging as m
 from safe.common.exceptions import (
+    AnalysisCanceledError,
     InaSAFEError,
     InvalidExtentError,
     WrongEarthquakeFunction,
@@ -43,6 +47,7 @@ from safe.common.utilities import temp_dir
 from safe.common.version import get_version
 from safe.datastore.datastore import DataStore
 from safe.datastore.folder import Folder
+from safe.datastore.hazard_cache import HazardCache
 from safe.definitions import count_ratio_mapping
 from safe.definitions.analysis_steps import analysis_steps
 from safe.definitions.constants import (
@@ -142,10 +147,17 @@ from safe.definitions.utilities import (
     get_name,
     set_provenance,
     get_provenance,
-    update_template_component
+    update_template_component,
+    HazardProfile
 )
+from safe.gis.processing_tools import (
+    analysis_feedback,
+    analysis_transform_context,
+    check_analysis_canceled,
+    set_analysis_feedback)
 from safe.gis.raster.clip_bounding_box import clip_by_extent
 from safe.gis.raster.polygonize import polygonize
+from safe.gis.raster.raster_zonal_stats import raster_zonal_stats
 from safe.gis.raster.reclassify import reclassify as reclassify_raster
 from safe.gis.raster.zonal_statistics import zonal_stats
 from safe.gis.sanity_check import check_inasafe_fields, check_layer
@@ -184,7 +196,7 @@ from safe.impact_function.create_extra_layers import (
     create_valid_aggregation,
 )
 from safe.impact_function.impact_function_utilities import (
-    check_input_layer, report_urls)
+    analysis_canceled_message, check_input_layer, report_urls)
 from safe.impact_function.postprocessors import (
     run_single_post_processor, enough_input)
 from safe.impact_function.provenance_utilities import (
@@ -205,6 +217,7 @@ from safe.utilities.gis import (
 from safe.utilities.gis import qgis_version
 from safe.utilities.i18n import tr
 from safe.utilities.metadata import (
+    active_classification,
     active_thresholds_value_maps,
     copy_layer_keywords,
     write_iso19115_metadata,
@@ -249,13 +262,27 @@ class ImpactFunction():
         self._exposure_summary = None
         self._aggregate_hazard_impacted = None
         self._aggregation_summary = None
+
+        # A continuous raster exposure is summed by zone of the aggregate
+        # hazard if the hazard is a raster, see raster_zonal_stats.
+        self._use_raster_engine = False
         self._analysis_impacted = None
+
+        # Hazard and aggregate hazard layers prepared by another impact
+        # function, see hazard_preparation_key. They are read-only.
+        self._prepared_hazard = None
+        self._prepared_aggregate_hazard = None
         self._exposure_summary_table = None
         self._profiling_table = None
+        # Name of the profiling table in the datastore, it is loaded from the
+        # datastore only when it is used.
+        self._profiling_table_name = None
 
         # Use debug to store intermediate results
         self.debug_mode = False
         self.use_rounding = True
+        # Use the hazard cache, None to follow the use_hazard_cache setting.
+        self.use_hazard_cache = None
 
         # Requested extent to use (according to the CRS property).
         self._requested_extent = None
@@ -273,6 +300,8 @@ class ImpactFunction():
 
         # set this to a gui call back / web callback etc as needed.
         self._callback = self.console_progress_callback
+        # Feedback used to report the progress and to cancel the analysis.
+        self._feedback = None
 
         # Names
         self._name = None  # e.g. Flood Raster on Building Polygon
@@ -297,6 +326,8 @@ class ImpactFunction():
         self._preprocessors_layers = {}  # List of layers produced
         self._impact_report = None
         self._report_metadata = []
+        # Snapshot of the hazard classes preferences, taken in prepare().
+        self._hazard_profile = None
 
         # Environment
         set_provenance(self._provenance, provenance_host_name, gethostname())
@@ -464,7 +495,8 @@ class ImpactFunction():
         row = m.Row()
         row.add(m.Cell(tr('Function'), header=True))
         row.add(m.Cell(tr('Time'), header=True))
-        if setting(key='memory_profile', expected_type=bool):
+        memory_profile = setting(key='memory_profile', expected_type=bool)
+        if memory_profile:
             row.add(m.Cell(tr('Memory'), header=True))
         table.add(row)
 
@@ -494,7 +526,7 @@ class ImpactFunction():
             if time is None:
                 time = busy
             new_row.add(m.Cell(time))
-            if setting(key='memory_profile', expected_type=bool):
+            if memory_profile:
                 memory_used = tree.memory_used
                 if memory_used is None:
                     memory_used = busy
@@ -598,9 +630,14 @@ class ImpactFunction():
 
         return outputs
 
-    def _outputs(self):
+    def _outputs(self, load_profiling=True):
         """List of layers containing outputs from the IF.
 
+        :param load_profiling: If the profiling table must be loaded from the
+            datastore when it's not loaded yet. If False, it is only in the
+            list once it has been loaded.
+        :type load_profiling: bool
+
         :returns: A list of vector layers.
         :rtype: list
         """
@@ -615,7 +652,10 @@ class ImpactFunction():
             self._analysis_impacted)
         layers[layer_purpose_exposure_summary_table['key']] = (
             self._exposure_summary_table)
-        layers[layer_purpose_profiling['key']] = self._profiling_table
+        if load_profiling:
+            layers[layer_purpose_profiling['key']] = self.profiling
+        else:
+            layers[layer_purpose_profiling['key']] = self._profiling_table
 
         # Extra layers produced by pre-processing
         layers.update(self._preprocessors_layers)
@@ -643,7 +683,7 @@ class ImpactFunction():
         :returns: A vector layer.
         :rtype: QgsMapLayer
         """
-        return self._outputs()[0]
+        return self._outputs(load_profiling=False)[0]
 
     @property
     def impact_report(self):
@@ -723,13 +763,29 @@ class ImpactFunction():
     def profiling(self):
         """Return the profiling layer.
 
-        It's a QgsVectorLayer without geometry.
+        It's a QgsVectorLayer without geometry. It is loaded from the
+        datastore the first time it is used.
 
         :returns: A vector layer.
         :rtype: QgsVectorLayer
         """
+        if self._profiling_table is None and self._profiling_table_name:
+            self._profiling_table = self.datastore.layer(
+                self._profiling_table_name)
         return self._profiling_table
 
+    @property
+    def hazard_profile(self):
+        """Return the hazard profile used by the analysis.
+
+        It's a snapshot of the hazard classes preferences taken when the
+        impact function is prepared.
+
+        :returns: The hazard profile.
+        :rtype: HazardProfile
+        """
+        return self._hazard_profile
+
     @property
     def requested_extent(self):
         """Property for the extent requested by the user.
@@ -904,6 +960,72 @@ class ImpactFunction():
         """
         self._callback = callback
 
+    @property
+    def feedback(self):
+        """Property for the feedback of the analysis.
+
+        Processing algorithms and long loops report their progress to this
+        feedback. The analysis stops when the feedback is canceled.
+
+        :returns: The feedback, None if there isn't any.
+        :rtype: QgsProcessingFeedback
+
+        .. versionadded:: 5.0
+        """
+        return self._feedback
+
+    @feedback.setter
+    def feedback(self, feedback):
+        """Setter for feedback property.
+
+        :param feedback: The feedback, it can be shared with other tasks.
+        :type feedback: QgsProcessingFeedback
+        """
+        self._feedback = feedback
+
+    def cancel(self):
+        """Cancel the analysis running with a feedback.
+
+        The analysis stops at the next step or in the next iterations of a
+        long loop and run returns ANALYSIS_FAILED_BAD_INPUT.
+
+        .. versionadded:: 5.0
+        """
+        if self._feedback is not None:
+            self._feedback.cancel()
+
+    def is_canceled(self):
+        """Check if the analysis has been canceled.
+
+        :returns: True if the feedback has been canceled.
+        :rtype: bool
+
+        .. versionadded:: 5.0
+        """
+        return self._feedback is not None and self._feedback.isCanceled()
+
+    def _progress(self, current, maximum, message):
+        """Report the progress of the analysis from one step to the next.
+
+        The callback is called and the feedback moves to the step.
+
+        :param current: Current step.
+        :type current: int
+
+        :param maximum: Number of steps.
+        :type maximum: int
+
+        :param message: The step, see safe.definitions.analysis_steps.
+        :type message: dict
+
+        :raises: AnalysisCanceledError if the analysis has been canceled.
+        """
+        self.callback(current, maximum, message)
+        feedback = analysis_feedback()
+        if feedback is not None:
+            feedback.setCurrentStep(current)
+            check_analysis_canceled()
+
     @staticmethod
     def console_progress_callback(current, maximum, message=None):
         """Simple console based callback implementation for tests.
@@ -928,6 +1050,8 @@ class ImpactFunction():
 
     def reset_state(self):
         """Method to reset the state of the impact function."""
+        self._profiling_table = None
+        self._profiling_table_name = None
         self.state = {
             'hazard': {
                 'process': [],
@@ -1203,6 +1327,9 @@ class ImpactFunction():
             # Set output layer expected
             self._output_layer_expected = self._compute_output_layer_expected()
 
+            # Snapshot the hazard preferences for the whole analysis.
+            self._hazard_profile = HazardProfile()
+
             return PREPARE_SUCCESS, None
 
     def output_layers_expected(self):
@@ -1365,6 +1492,150 @@ class ImpactFunction():
 
         return PREPARE_SUCCESS, None
 
+    def _can_use_raster_engine(self):
+        """Check if the exposure can be summed by zone of aggregate hazard.
+
+        With a raster hazard on a continuous raster exposure, the aggregate
+        hazard features of the same aggregation area and hazard class are
+        summed together, see raster_zonal_stats.
+
+        :returns: True if the raster engine can be used.
+        :rtype: bool
+        """
+        return (
+            is_raster_layer(self.hazard)
+            and is_raster_layer(self.exposure)
+            and self.exposure.keywords.get('layer_mode') == 'continuous')
+
+    def hazard_preparation_key(self):
+        """Key describing the hazard and aggregate hazard preparation.
+
+        Impact functions with the same key produce the same hazard and
+        aggregate hazard layers whatever their exposure: same hazard and
+        keywords, same classification for the exposure, same analysis CRS and
+        extent and same aggregation fields. These layers can be prepared once
+        with prepare_hazard and shared with set_prepared_hazard.
+
+        The impact function must be prepared first.
+
+        :returns: The key, None if the impact function is not ready.
+        :rtype: str
+        """
+        if not self._is_ready:
+            return None
+
+        hazard_keywords = get_provenance(
+            self._provenance, provenance_hazard_keywords)
+        exposure_key = self.exposure.keywords['exposure']
+
+        # See aggregation_preparation, a ratio is removed from the aggregation
+        # if the exposure has the equivalent count.
+        removed_ratios = []
+        if self.aggregation:
+            crs = self.aggregation.crs()
+            exposure_fields = self.exposure.keywords.get('inasafe_fields', {})
+            aggregation_fields = self.aggregation.keywords['inasafe_fields']
+            non_compulsory_fields = get_non_compulsory_fields(
+                layer_purpose_exposure['key'], exposure_key)
+            for count_field in non_compulsory_fields:
+                ratio_field = count_ratio_mapping.get(count_field['key'])
+                if (ratio_field in aggregation_fields
+                        and count_field['key'] in exposure_fields):
+                    removed_ratios.append(ratio_field)
+        else:
+            crs = self._crs
+
+        key = {
+            'hazard': get_provenance(
+                self._provenance, provenance_hazard_layer),
+            'hazard_keywords': hazard_keywords,
+            'classification': active_classification(
+                hazard_keywords, exposure_key),
+            'thresholds': active_thresholds_value_maps(
+                hazard_keywords, exposure_key),
+            'crs': crs.authid(),
+            'analysis_extent': self._analysis_extent.asWkt(),
+            'aggregation': get_provenance(
+                self._provenance, provenance_aggregation_layer),
+            'removed_ratios': sorted(removed_ratios),
+        }
+        return json.dumps(key, sort_keys=True, default=str)
+
+    @profile
+    def prepare_hazard(self):
+        """Prepare only the hazard and the aggregate hazard layers.
+
+        The impact function must be prepared first. It is not ready anymore
+        after this call, the layers are meant to be shared with impact
+        functions having the same hazard_preparation_key.
+
+        :returns: A tuple with the hazard and the aggregate hazard layers.
+        :rtype: (QgsVectorLayer, QgsVectorLayer)
+        """
+        self.reset_state()
+        self.aggregation_preparation()
+        self.hazard_preparation()
+        self.aggregate_hazard_preparation()
+        self._is_ready = False
+        return self.hazard, self._aggregate_hazard_impacted
+
+    def set_prepared_hazard(self, hazard, aggregate_hazard):
+        """Use hazard layers already prepared by another impact function.
+
+        The hazard and the aggregate hazard preparations are skipped. These
+        layers are not modified, the aggregate hazard is copied in memory.
+
+        :param hazard: The prepared hazard layer.
+        :type hazard: QgsVectorLayer
+
+        :param aggregate_hazard: The prepared aggregate hazard layer.
+        :type aggregate_hazard: QgsVectorLayer
+        """
+        self._prepared_hazard = hazard
+        self._prepared_aggregate_hazard = aggregate_hazard
+
+    def _hazard_cache_lookup(self):
+        """Look for the prepared hazard layers in the hazard cache.
+
+        The cache is used if the use_hazard_cache attribute or setting is
+        on, if the hazard is not prepared yet and not in debug mode.
+
+        :returns: A tuple with the cache key, None if the cache can't be used,
+            and the cached hazard and aggregate hazard layers, None if they
+            are not in the cache.
+        :rtype: (str, tuple)
+        """
+        if self._prepared_hazard or self.debug_mode:
+            return None, None
+        use_hazard_cache = self.use_hazard_cache
+        if use_hazard_cache is None:
+            use_hazard_cache = setting('use_hazard_cache', expected_type=bool)
+        if not use_hazard_cache:
+            return None, None
+
+        try:
+            key = HazardCache.key(self)
+            if not key:
+                return None, None
+            return key, HazardCache().layers(key)
+        except Exception as e:
+            # The cache must not stop the analysis.
+            LOGGER.info('The hazard cache can not be read: %s' % e)
+            return None, None
+
+    def _hazard_cache_add(self, key):
+        """Add the prepared hazard layers to the hazard cache.
+
+        :param key: The cache key from _hazard_cache_lookup.
+        :type key: str
+        """
+        try:
+            HazardCache().add_layers(
+                key, self.hazard, self._aggregate_hazard_impacted)
+        except Exception as e:
+            # The cache must not stop the analysis.
+            LOGGER.info('The hazard cache can not be written: %s' % e)
+
     def debug_layer(self, layer, check_fields=True, add_to_datastore=None):
         """Write the layer produced to the datastore if debug mode is on.
 
@@ -1445,25 +1716,29 @@ class ImpactFunction():
         try:
             self.reset_state()
             clear_prof_data()
+            if self._feedback is not None:
+                set_analysis_feedback(QgsProcessingMultiStepFeedback(
+                    len(analysis_steps), self._feedback))
             self._run()
 
             # Get the profiling log
             self._performance_log = profiling_log()
             self.callback(8, 8, analysis_steps['profiling'])
 
-            self._profiling_table = create_profile_layer(
+            profiling_table = create_profile_layer(
                 self.performance_log_message())
             result, name = self.datastore.add_layer(
-                self._profiling_table, self._profiling_table.keywords['title'])
+                profiling_table, profiling_table.keywords['title'])
             if not result:
                 raise Exception(
                     'Something went wrong with the datastore : {error_message}'
                     .format(error_message=name))
-            self._profiling_table = self.datastore.layer(name)
-            self.profiling.keywords['provenance_data'] = self.provenance
+            self._profiling_table = None
+            self._profiling_table_name = name
+            profiling_table.keywords['provenance_data'] = self.provenance
             write_iso19115_metadata(
-                self.profiling.source(),
-                self.profiling.keywords)
+                self.datastore.layer_uri(name),
+                profiling_table.keywords)
 
             # Style all output layers.
             self.style()
@@ -1484,6 +1759,12 @@ class ImpactFunction():
             else:
                 self.aggregation = None
 
+            if self._feedback is not None:
+                self._feedback.setProgress(100)
+
+        except AnalysisCanceledError:
+            return ANALYSIS_FAILED_BAD_INPUT, analysis_canceled_message()
+
         except NoFeaturesInExtentError:
             warning_heading = m.Heading(
                 tr('No features in the extent'), **WARNING_STYLE)
@@ -1565,6 +1846,9 @@ class ImpactFunction():
             return ANALYSIS_FAILED_BAD_INPUT, message
 
         except Exception as e:
+            if self.is_canceled():
+                # A processing algorithm might fail when it is canceled.
+                return ANALYSIS_FAILED_BAD_INPUT, analysis_canceled_message()
             if self.debug_mode:
                 # We run in debug mode, we do not want to catch the exception.
                 # You should download the First Aid plugin for instance.
@@ -1576,12 +1860,15 @@ class ImpactFunction():
         else:
             return ANALYSIS_SUCCESS, None
 
+        finally:
+            set_analysis_feedback(None)
+
     @profile
     def _run(self):
         """Internal function to run the impact function with profiling."""
         LOGGER.info('ANALYSIS : The impact function is starting.')
         step_count = len(analysis_steps)
-        self.callback(0, step_count, analysis_steps['initialisation'])
+        self._progress(0, step_count, analysis_steps['initialisation'])
 
         # Set a unique name for this impact
         self._unique_name = self._name.replace(' ', '')
@@ -1596,7 +1883,7 @@ class ImpactFunction():
         if not self._datastore:
             # By default, results will go in a temporary folder.
             # Users are free to set their own datastore with the setter.
-            self.callback(1, step_count, analysis_steps['data_store'])
+            self._progress(1, step_count, analysis_steps['data_store'])
 
             default_user_directory = setting(
                 'defaultUserDirectory', default='')
@@ -1621,10 +1908,11 @@ class ImpactFunction():
 
         self._performance_log = profiling_log()
 
-        self.callback(2, step_count, analysis_steps['pre_processing'])
+        self._progress(2, step_count, analysis_steps['pre_processing'])
         self.pre_process()
 
-        self.callback(3, step_count, analysis_steps['aggregation_preparation'])
+        self._progress(
+            3, step_count, analysis_steps['aggregation_preparation'])
         self.aggregation_preparation()
 
         # Special case for earthquake hazard on population. We need to remove
@@ -1648,24 +1936,33 @@ class ImpactFunction():
         step_count = len(analysis_steps)
 
         self._performance_log = profiling_log()
-        self.callback(4, step_count, analysis_steps['hazard_preparation'])
+        self._progress(4, step_count, analysis_steps['hazard_preparation'])
+        hazard_cache_key, cached_layers = self._hazard_cache_lookup()
+        if cached_layers:
+            self.set_prepared_hazard(*cached_layers)
         self.hazard_preparation()
 
         self._performance_log = profiling_log()
-        self.callback(
+        self._progress(
             5, step_count, analysis_steps['aggregate_hazard_preparation'])
         self.aggregate_hazard_preparation()
+        if cached_layers:
+            # The layers from the cache are only used for this run.
+            self.set_prepared_hazard(None, None)
+        elif hazard_cache_key:
+            self._hazard_cache_add(hazard_cache_key)
 
         self._performance_log = profiling_log()
-        self.callback(6, step_count, analysis_steps['exposure_preparation'])
+        self._progress(6, step_count, analysis_steps['exposure_preparation'])
         self.exposure_preparation()
 
         self._performance_log = profiling_log()
-        self.callback(7, step_count, analysis_steps['combine_hazard_exposure'])
+        self._progress(
+            7, step_count, analysis_steps['combine_hazard_exposure'])
         self.intersect_exposure_and_aggregate_hazard()
 
         self._performance_log = profiling_log()
-        self.callback(8, step_count, analysis_steps['post_processing'])
+        self._progress(8, step_count, analysis_steps['post_processing'])
         if is_vector_layer(self._exposure_summary):
             # We post process the exposure summary
             self.post_process(self._exposure_summary)
@@ -1699,7 +1996,7 @@ class ImpactFunction():
                         self.debug_layer(self._exposure_summary)
 
         self._performance_log = profiling_log()
-        self.callback(9, step_count, analysis_steps['summary_calculation'])
+        self._progress(9, step_count, analysis_steps['summary_calculation'])
         self.summary_calculation()
 
         self._end_datetime = datetime.now()
@@ -2129,6 +2426,14 @@ class ImpactFunction():
         """This function is doing the hazard preparation."""
         LOGGER.info('ANALYSIS : Hazard preparation')
 
+        self._use_raster_engine = self._can_use_raster_engine()
+
+        if self._prepared_hazard:
+            self.set_state_process(
+                'hazard', 'Use the hazard layer already prepared')
+            self.hazard = self._prepared_hazard
+            return
+
         use_same_projection = (
             self.hazard.crs().authid() == self._crs.authid())
         self.set_state_info(
@@ -2141,7 +2446,8 @@ class ImpactFunction():
             extent = self._analysis_impacted.extent()
             if not use_same_projection:
                 transform = QgsCoordinateTransform(
-                    self._crs, self.hazard.crs(), QgsProject.instance())
+                    self._crs, self.hazard.crs(),
+                    analysis_transform_context())
                 extent = transform.transform(extent)
 
             self.set_state_process(
@@ -2211,6 +2517,35 @@ class ImpactFunction():
         aggregation areas and assign hazard class.
         """
         LOGGER.info('ANALYSIS : Aggregate hazard preparation')
+        if self._prepared_aggregate_hazard:
+            self.set_state_process(
+                'aggregation',
+                'Copy the aggregate hazard layer already prepared')
+            prepared = self._prepared_aggregate_hazard
+            # The primary key of a GeoPackage is not an attribute to copy.
+            primary_keys = prepared.dataProvider().pkAttributeIndexes()
+            indexes = [
+                index for index in range(prepared.fields().count())
+                if index not in primary_keys]
+            self._aggregate_hazard_impacted = create_memory_layer(
+                prepared.name(),
+                prepared.geometryType(),
+                prepared.crs(),
+                [prepared.fields().at(index) for index in indexes])
+            features = []
+            for feature in prepared.getFeatures():
+                attributes = feature.attributes()
+                copy = QgsFeature()
+                copy.setGeometry(feature.geometry())
+                copy.setAttributes([attributes[index] for index in indexes])
+                features.append(copy)
+            self._aggregate_hazard_impacted.dataProvider().addFeatures(
+                features)
+            self._aggregate_hazard_impacted.keywords = copy_layer_keywords(
+                prepared.keywords)
+            self.debug_layer(self._aggregate_hazard_impacted)
+            return
+
         self.set_state_process('hazard', 'Make hazard layer valid')
         self.hazard = clean_layer(self.hazard)
         self.debug_layer(self.hazard)
@@ -2314,7 +2649,23 @@ class ImpactFunction():
         However, this function will set the impact layer.
         """
         LOGGER.info('ANALYSIS : Intersect Exposure and Aggregate Hazard')
-        if is_raster_layer(self.exposure):
+        if self._use_raster_engine:
+            self.set_state_process(
+                'impact function',
+                'Zonal stats between exposure, hazard and aggregation')
+            # noinspection PyTypeChecker
+            self._aggregate_hazard_impacted = raster_zonal_stats(
+                self.exposure, self._aggregate_hazard_impacted)
+            self.debug_layer(self._aggregate_hazard_impacted)
+
+            self.set_state_process('impact function', 'Add default values')
+            self._aggregate_hazard_impacted = add_default_values(
+                self._aggregate_hazard_impacted)
+            self.debug_layer(self._aggregate_hazard_impacted)
+
+            self._exposure_summary = None
+
+        elif is_raster_layer(self.exposure):
             self.set_state_process(
                 'impact function',
                 'Zonal stats between exposure and aggregate hazard')
@@ -2419,7 +2770,7 @@ class ImpactFunction():
 
             if valid:
                 valid, message = run_single_post_processor(
-                    layer, post_processor)
+                    layer, post_processor, self._hazard_profile)
                 if valid:
                     self.set_state_process('post_processor', name)
                     message = '{name} : Running'.format(name=name)
@@ -2446,7 +2797,9 @@ class ImpactFunction():
                 'impact function',
                 'Aggregate the impact summary')
             self._aggregate_hazard_impacted = aggregate_hazard_summary(
-                self.exposure_summary, self._aggregate_hazard_impacted)
+                self.exposure_summary,
+                self._aggregate_hazard_impacted,
+                self._hazard_profile)
             self.debug_layer(self._exposure_summary, add_to_datastore=False)
 
         self.set_state_process(
@@ -2459,14 +2812,18 @@ class ImpactFunction():
         self.set_state_process(
             'impact function', 'Aggregate the analysis summary')
         self._analysis_impacted = analysis_summary(
-            self._aggregate_hazard_impacted, self._analysis_impacted)
+            self._aggregate_hazard_impacted,
+            self._analysis_impacted,
+            self._hazard_profile)
         self.debug_layer(self._analysis_impacted)
 
         if self._exposure.keywords.get('classification'):
             self.set_state_process(
                 'impact function', 'Build the exposure summary table')
             self._exposure_summary_table = exposure_summary_table(
-                self._aggregate_hazard_impacted, self._exposure_summary)
+                self._aggregate_hazard_impacted,
+                self._exposure_summary,
+                hazard_profile=self._hazard_profile)
             self.debug_layer(
                 self._exposure_summary_table, add_to_datastore=False)
 
@@ -2482,7 +2839,9 @@ class ImpactFunction():
 
         # Let's style layers which have a geometry and have hazard_class
         hazard_class = hazard_class_field['key']
-        for layer in self._outputs():
+        # The profiling table is not loaded if it's not used yet, it doesn't
+        # have any style.
+        for layer in self._outputs(load_profiling=False):
             without_geometries = [
                 QgsWkbTypes.NullGeometry,
                 QgsWkbTypes.UnknownGeometry]
@@ -2501,7 +2860,7 @@ class ImpactFunction():
             self.analysis_impacted, analysis_width, analysis_color)
 
         # Styling is finished, save them as QML
-        for layer in self._outputs():
+        for layer in self._outputs(load_profiling=False):
             layer.saveDefaultStyle()
 
     @property
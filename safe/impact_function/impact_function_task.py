@@ -0,0 +1,314 @@
+# coding=utf-8
+
+"""
+Run an impact function in a QGIS task, in the background.
+
+The analysis runs in a thread of the QGIS task manager. It doesn't use the
+layers of the project, its input layers are loaded again from their source
+in the task thread. Its progress is sent
+through a single QgsProcessingFeedback to the task, and the steps are sent to
+the callback of the impact function in the main thread. Canceling the task
+cancels the feedback, the analysis stops at the next step or in the next
+iterations of a long loop.
+"""
+
+import logging
+
+from qgis.core import (
+    QgsApplication,
+    QgsFeatureRequest,
+    QgsMapLayer,
+    QgsProject,
+    QgsProcessingFeedback,
+    QgsTask,
+)
+from qgis.PyQt.QtCore import QEventLoop, QThread, pyqtSignal
+
+from safe.datastore.datastore import DataStore
+from safe.definitions.constants import (
+    ANALYSIS_SUCCESS,
+    ANALYSIS_FAILED_BAD_INPUT,
+    ANALYSIS_FAILED_BAD_CODE)
+from safe.gis.processing_tools import set_analysis_transform_context
+from safe.gis.tools import full_layer_uri, load_layer
+from safe.impact_function.impact_function import ImpactFunction
+from safe.impact_function.impact_function_utilities import (
+    analysis_canceled_message)
+from safe.utilities.gis import is_vector_layer
+from safe.utilities.i18n import tr
+from safe.utilities.metadata import copy_layer_keywords
+from safe.utilities.utilities import get_error_message
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+LOGGER = logging.getLogger('InaSAFE')
+
+
+# The attributes of the impact functions holding their input layers.
+INPUT_LAYER_ATTRIBUTES = ['_hazard', '_exposure', '_exposures', '_aggregation']
+
+
+def input_layers_description(impact_function):
+    """Describe the input layers of an impact function, in the main thread.
+
+    The input layers belong to the main thread, they may be in the project
+    and rendered on the map. The task loads its own layers from their source
+    with this description. A layer in memory can't be loaded again, a copy
+    of its features is made instead. Input layers of the single exposure
+    impact functions of a multi exposure analysis are described too.
+
+    :param impact_function: The impact function.
+    :type impact_function: ImpactFunction, MultiExposureImpactFunction
+
+    :return: A list of (impact function, attribute, layers) where layers
+        are described with a dictionary, or copied. The same layer used
+        by several impact functions is described once.
+    :rtype: list
+    """
+    descriptions = []
+    layers = {}
+
+    def describe(layer):
+        if id(layer) not in layers:
+            if layer.providerType() == 'memory':
+                description = layer.materialize(QgsFeatureRequest())
+                description.keywords = copy_layer_keywords(layer.keywords)
+            else:
+                description = {
+                    'uri': full_layer_uri(layer),
+                    'name': layer.name(),
+                    'keywords': copy_layer_keywords(layer.keywords),
+                    'selection': None,
+                }
+                if is_vector_layer(layer) and layer.selectedFeatureCount():
+                    description['selection'] = layer.selectedFeatureIds()
+            layers[id(layer)] = description
+        return layers[id(layer)]
+
+    impact_functions = [impact_function] + list(
+        getattr(impact_function, '_impact_functions', []))
+    for analysis in impact_functions:
+        for attribute in INPUT_LAYER_ATTRIBUTES:
+            value = getattr(analysis, attribute, None)
+            if isinstance(value, QgsMapLayer):
+                descriptions.append((analysis, attribute, describe(value)))
+            elif isinstance(value, list):
+                layers_description = [describe(layer) for layer in value]
+                descriptions.append((analysis, attribute, layers_description))
+    return descriptions
+
+
+def load_input_layers(descriptions):
+    """Set the input layers of the impact functions, in the task thread.
+
+    The layers are set without their setters, the impact functions stay
+    ready to run.
+
+    :param descriptions: The description from input_layers_description.
+    :type descriptions: list
+    """
+    layers = {}
+
+    def load(description):
+        if isinstance(description, QgsMapLayer):
+            return description
+        if id(description) not in layers:
+            layer = load_layer(description['uri'], description['name'])[0]
+            layer.keywords = copy_layer_keywords(description['keywords'])
+            if description['selection'] is not None:
+                layer.selectByIds(description['selection'])
+            layers[id(description)] = layer
+        return layers[id(description)]
+
+    for analysis, attribute, description in descriptions:
+        if isinstance(description, list):
+            setattr(analysis, attribute, [load(d) for d in description])
+        else:
+            setattr(analysis, attribute, load(description))
+
+
+def move_layers_to_thread(impact_function, thread):
+    """Move the layers created by an impact function to another thread.
+
+    Layers are QObjects, the ones created in the task thread must be moved
+    to the main thread before being used there. The attributes are walked
+    recursively through lists, dictionaries, the datastore and the single
+    exposure impact functions of a multi exposure analysis.
+
+    :param impact_function: The impact function.
+    :type impact_function: ImpactFunction, MultiExposureImpactFunction
+
+    :param thread: The thread to move the layers to.
+    :type thread: QThread
+    """
+    current_thread = QThread.currentThread()
+    visited = set()
+
+    def move(value):
+        if id(value) in visited:
+            return
+        visited.add(id(value))
+        if isinstance(value, QgsMapLayer):
+            if value.thread() == current_thread:
+                value.moveToThread(thread)
+        elif isinstance(value, dict):
+            for item in list(value.values()):
+                move(item)
+        elif isinstance(value, (list, tuple, set)):
+            for item in list(value):
+                move(item)
+        elif isinstance(value, (ImpactFunction, DataStore)) or (
+                value is impact_function):
+            for item in list(vars(value).values()):
+                move(item)
+
+    move(impact_function)
+
+
+class ImpactFunctionTask(QgsTask):
+
+    """Task running a prepared impact function.
+
+    It works with ImpactFunction and MultiExposureImpactFunction. The result
+    is in the status and message attributes, like the ones returned by the
+    run method of the impact function. For a multi exposure analysis, the
+    exposure key returned by its run method is in the exposure attribute.
+
+    .. versionadded:: 5.0
+    """
+
+    # Emitted in the main thread for each step of the analysis.
+    step_changed = pyqtSignal(int, int, object)
+    # Emitted in the main thread with the status and the message.
+    analysis_finished = pyqtSignal(int, object)
+
+    def __init__(self, impact_function):
+        """Constructor.
+
+        :param impact_function: The prepared impact function.
+        :type impact_function: ImpactFunction
+        """
+        description = impact_function.name or tr('InaSAFE analysis')
+        super(ImpactFunctionTask, self).__init__(
+            description, QgsTask.CanCancel)
+        self.impact_function = impact_function
+        self.status = None
+        self.message = None
+        # The exposure key returned by a multi exposure impact function.
+        self.exposure = None
+        # The exception raised in debug mode.
+        self.exception = None
+
+        self._main_thread = QThread.currentThread()
+        # The layers of the project must not be used in the task thread.
+        self._input_layers = input_layers_description(impact_function)
+        self._transform_context = QgsProject.instance().transformContext()
+        self._callback = impact_function.callback
+        self.feedback = impact_function.feedback
+        if self.feedback is None:
+            self.feedback = QgsProcessingFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.step_changed.connect(self._step_changed)
+
+    def _step_changed(self, current, maximum, message):
+        """Send a step of the analysis to the callback, in the main thread.
+
+        :param current: Current step.
+        :type current: int
+
+        :param maximum: Number of steps.
+        :type maximum: int
+
+        :param message: The step, see safe.definitions.analysis_steps.
+        :type message: dict
+        """
+        if self._callback:
+            self._callback(current, maximum, message)
+
+    def run(self):
+        """Run the impact function, in the task thread.
+
+        :return: True if the analysis succeeded.
+        :rtype: bool
+        """
+        impact_function = self.impact_function
+        impact_function.callback = self.step_changed.emit
+        impact_function.feedback = self.feedback
+        set_analysis_transform_context(self._transform_context)
+        try:
+            load_input_layers(self._input_layers)
+            result = impact_function.run()
+            if isinstance(impact_function, ImpactFunction):
+                self.status, self.message = result
+            else:
+                self.status, self.message, self.exposure = result
+        except Exception as e:
+            # The impact function raises exceptions in debug mode only.
+            self.exception = e
+            self.status = ANALYSIS_FAILED_BAD_CODE
+            self.message = get_error_message(e)
+        finally:
+            impact_function.callback = self._callback
+            set_analysis_transform_context(None)
+            move_layers_to_thread(impact_function, self._main_thread)
+        return self.status == ANALYSIS_SUCCESS
+
+    def cancel(self):
+        """Cancel the task and the analysis."""
+        self.feedback.cancel()
+        super(ImpactFunctionTask, self).cancel()
+
+    def finished(self, result):
+        """Called in the main thread when the task is finished.
+
+        :param result: The value returned by run.
+        :type result: bool
+        """
+        del result
+        if self.status is None:
+            # The task has been canceled before starting.
+            self.status = ANALYSIS_FAILED_BAD_INPUT
+            self.message = analysis_canceled_message()
+        self.analysis_finished.emit(self.status, self.message)
+
+
+def run_impact_function_in_background(impact_function):
+    """Run an impact function in a task and wait for its result.
+
+    The main thread keeps processing its events while waiting, so the map is
+    still rendered. The analysis is listed in the QGIS task manager where it
+    can be canceled.
+
+    :param impact_function: The prepared impact function.
+    :type impact_function: ImpactFunction, MultiExposureImpactFunction
+
+    :return: A tuple with the status of the IF and an error message if
+        needed, like ImpactFunction.run. The exposure key is added for a
+        multi exposure impact function, like
+        MultiExposureImpactFunction.run.
+    :rtype: (int, m.Message), (int, m.Message, str)
+
+    :raises: The exception of the impact function in debug mode.
+
+    .. versionadded:: 5.0
+    """
+    task = ImpactFunctionTask(impact_function)
+    loop = QEventLoop()
+    task.analysis_finished.connect(loop.quit)
+    task.taskTerminated.connect(loop.quit)
+    QgsApplication.taskManager().addTask(task)
+    # The task signals are delivered by this loop, not before.
+    loop.exec_()
+
+    if task.exception is not None:
+        raise task.exception
+    if task.status is None:
+        result = ANALYSIS_FAILED_BAD_INPUT, analysis_canceled_message()
+    else:
+        result = task.status, task.message
+    if not isinstance(impact_function, ImpactFunction):
+        result += (task.exposure, )
+    return result
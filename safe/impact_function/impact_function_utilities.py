@@ -17,6 +17,7 @@ from safe.definitions.reports import (
 from safe.definitions.versions import inasafe_keyword_version
 from safe.gis.sanity_check import check_inasafe_fields
 from safe.gui.widgets.message import generate_input_error_message
+from safe.messaging import styles
 from safe.report.impact_report import ImpactReport
 from safe.utilities.gis import is_vector_layer
 from safe.utilities.i18n import tr
@@ -37,6 +38,21 @@ LAYER_PARENT_ANALYSIS_ROLE = LAYER_ORIGIN_ROLE + 1  # Name of the parent IF
 LAYER_PURPOSE_KEY_OR_ID_ROLE = LAYER_PARENT_ANALYSIS_ROLE + 1  # Layer purpose
 
 
+def analysis_canceled_message():
+    """Message when the analysis has been canceled through its feedback.
+
+    :return: The message.
+    :rtype: m.Message
+
+    .. versionadded:: 5.0
+    """
+    message = m.Message()
+    message.add(m.Heading(
+        tr('Analysis canceled'), **styles.RED_LEVEL_4_STYLE))
+    message.add(tr('The analysis has been canceled.'))
+    return message
+
+
 def check_input_layer(layer, purpose):
     """Function to check if the layer is valid.
 
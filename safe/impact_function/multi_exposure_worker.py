@@ -0,0 +1,197 @@
+# coding=utf-8
+
+"""
+Run a single exposure impact function in another process.
+
+QGIS layers can't be sent to another process. A task describes the inputs of
+an impact function with their URI and their keywords. The worker sends back
+the URI of the analysis layer, the impact function can be loaded again from
+its metadata.
+"""
+
+import logging
+import sys
+from os.path import exists, join
+
+from qgis.core import QgsApplication, QgsCoordinateReferenceSystem
+from qgis.PyQt.QtCore import QCoreApplication
+
+from safe.datastore.folder import Folder
+from safe.definitions.constants import (
+    PREPARE_SUCCESS,
+    ANALYSIS_SUCCESS,
+    ANALYSIS_FAILED_BAD_INPUT,
+    ANALYSIS_FAILED_BAD_CODE)
+from safe.gis.processing_tools import initialize_processing
+from safe.gis.tools import load_layer, full_layer_uri
+from safe.impact_function.impact_function import ImpactFunction
+from safe.utilities.metadata import copy_layer_keywords
+from safe.utilities.utilities import get_error_message
+
+LOGGER = logging.getLogger('InaSAFE')
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+# The QGIS application of a worker process.
+WORKER_APPLICATION = None
+
+
+def python_executable():
+    """Python interpreter used to start the worker processes.
+
+    Inside QGIS Desktop, sys.executable can be QGIS itself.
+
+    :returns: The path to the Python interpreter.
+    :rtype: str
+    """
+    if 'python' in sys.executable.lower():
+        return sys.executable
+    name = 'python.exe' if sys.platform == 'win32' else 'python3'
+    for path in [join(sys.exec_prefix, name),
+                 join(sys.exec_prefix, 'bin', name)]:
+        if exists(path):
+            return path
+    return sys.executable
+
+
+def worker_arguments():
+    """Arguments for initialize_worker to start the same QGIS environment.
+
+    :returns: The prefix path and the names used by the settings.
+    :rtype: tuple
+    """
+    return (
+        QgsApplication.prefixPath(),
+        QCoreApplication.organizationName(),
+        QCoreApplication.organizationDomain(),
+        QCoreApplication.applicationName())
+
+
+def initialize_worker(
+        prefix_path, organization_name, organization_domain, application_name,
+        gui_enabled=False):
+    """Start QGIS and Processing in a worker process.
+
+    The organization and the application names are the ones of the parent
+    process, so the worker reads the same InaSAFE settings.
+
+    :param prefix_path: The QGIS prefix path.
+    :type prefix_path: str
+
+    :param organization_name: The organization name of the parent process.
+    :type organization_name: str
+
+    :param organization_domain: The organization domain of the parent.
+    :type organization_domain: str
+
+    :param application_name: The application name of the parent process.
+    :type application_name: str
+
+    :param gui_enabled: If the worker needs a GUI application, to print
+        reports for instance.
+    :type gui_enabled: bool
+    """
+    global WORKER_APPLICATION  # pylint: disable=W0603
+    QCoreApplication.setOrganizationName(organization_name)
+    QCoreApplication.setOrganizationDomain(organization_domain)
+    QCoreApplication.setApplicationName(application_name)
+    QgsApplication.setPrefixPath(prefix_path, True)
+    WORKER_APPLICATION = QgsApplication([], gui_enabled)
+    WORKER_APPLICATION.initQgis()
+    initialize_processing()
+
+
+def layer_task(layer, keywords=None):
+    """Describe a layer with values which can be sent to another process.
+
+    :param layer: The layer, it must not be a memory layer.
+    :type layer: QgsMapLayer
+
+    :param keywords: Keywords to use instead of the layer keywords.
+    :type keywords: dict
+
+    :returns: The full URI and the keywords of the layer.
+    :rtype: dict
+    """
+    if keywords is None:
+        keywords = layer.keywords
+    return {
+        'uri': full_layer_uri(layer),
+        'keywords': copy_layer_keywords(keywords),
+    }
+
+
+def load_layer_task(task):
+    """Load a layer described by layer_task.
+
+    :param task: The layer description.
+    :type task: dict
+
+    :returns: The layer with its keywords.
+    :rtype: QgsMapLayer
+    """
+    layer = load_layer(task['uri'])[0]
+    layer.keywords = task['keywords']
+    return layer
+
+
+def run_impact_function(task):
+    """Prepare and run a single exposure impact function from a task.
+
+    The task is a dictionary with:
+    * hazard, exposure, aggregation, prepared_hazard and
+      prepared_aggregate_hazard: layers described with layer_task, None if
+      not used.
+    * selected_features: the list of selected aggregation features, None to
+      use all of them.
+    * crs: the analysis CRS authid if there is no aggregation.
+    * datastore: the folder of the datastore, None to use the default one.
+    * use_rounding: option of the impact function.
+
+    :param task: The description of the impact function.
+    :type task: dict
+
+    :returns: A tuple with the status, the error message if needed and the
+        full URI of the analysis layer if the analysis succeeded.
+    :rtype: (int, m.Message, str)
+    """
+    try:
+        impact_function = ImpactFunction()
+        impact_function.use_rounding = task['use_rounding']
+        impact_function.hazard = load_layer_task(task['hazard'])
+        impact_function.exposure = load_layer_task(task['exposure'])
+        if task['aggregation']:
+            aggregation = load_layer_task(task['aggregation'])
+            if task['selected_features'] is not None:
+                aggregation.selectByIds(task['selected_features'])
+                impact_function.use_selected_features_only = True
+            impact_function.aggregation = aggregation
+        else:
+            impact_function.crs = QgsCoordinateReferenceSystem(task['crs'])
+
+        if task['datastore']:
+            impact_function.datastore = Folder(task['datastore'])
+            impact_function.datastore.default_vector_format = 'geojson'
+
+        if task['prepared_hazard']:
+            impact_function.set_prepared_hazard(
+                load_layer_task(task['prepared_hazard']),
+                load_layer_task(task['prepared_aggregate_hazard']))
+
+        code, message = impact_function.prepare()
+        if code != PREPARE_SUCCESS:
+            return ANALYSIS_FAILED_BAD_INPUT, message, None
+
+        LOGGER.info('Running %s' % impact_function.name)
+        code, message = impact_function.run()
+        if code != ANALYSIS_SUCCESS:
+            return code, message, None
+
+        return code, None, full_layer_uri(impact_function.analysis_impacted)
+
+    except Exception as e:
+        # Exceptions raised in a worker may not be sent back to the parent.
+        return ANALYSIS_FAILED_BAD_CODE, get_error_message(e), None
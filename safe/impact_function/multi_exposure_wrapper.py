@@ -9,6 +9,7 @@ This class will manage how to launch and optimize a multi exposure analysis.
 
 import getpass
 import logging
+import multiprocessing
 from copy import deepcopy
 from datetime import datetime
 from os import makedirs
@@ -99,7 +100,7 @@ from safe.definitions.utilities import (
     set_provenance,
     definition)
 from safe.gis.tools import (
-    geometry_type, load_layer_from_registry, full_layer_uri)
+    geometry_type, load_layer, load_layer_from_registry, full_layer_uri)
 from safe.gis.vector.prepare_vector_layer import prepare_vector_layer
 from safe.gis.vector.summary_5_multi_exposure import (
     multi_exposure_analysis_summary,
@@ -112,6 +113,13 @@ from safe.impact_function.create_extra_layers import (
 from safe.impact_function.impact_function import ImpactFunction
 from safe.impact_function.impact_function_utilities import (
     check_input_layer, FROM_CANVAS, report_urls)
+from safe.impact_function.multi_exposure_worker import (
+    initialize_worker,
+    layer_task,
+    python_executable,
+    run_impact_function,
+    worker_arguments,
+)
 from safe.impact_function.provenance_utilities import (
     get_multi_exposure_analysis_question)
 from safe.impact_function.style import simple_polygon_without_brush
@@ -180,8 +188,15 @@ class MultiExposureImpactFunction():
         self.debug_mode = False
         self.use_rounding = True
 
+        # Number of processes running the exposures. With more than one, the
+        # hazard is prepared once and the exposures run in parallel.
+        self.max_workers = setting(
+            'multi_exposure_max_workers', expected_type=int)
+
         # Metadata
         self.callback = None
+        # Feedback shared by the impact functions run in this process.
+        self.feedback = None
         self.debug = False
         self.use_selected_features_only = False
         self._name = None
@@ -963,28 +978,14 @@ class MultiExposureImpactFunction():
         dict_of_analysis_summary_path = {}
         dict_of_analysis_summary_id = {}
 
-        for i, impact_function in enumerate(self._impact_functions):
-            self._current_impact_function = impact_function
-            LOGGER.info('Running %s' % impact_function.name)
-            if isinstance(self._datastore, Folder):
-                # We can include this analysis in the parent datastore.
-                # We can't do that with a geopackage.
-                current_name = impact_function.name.replace(' ', '')
-                current_name = replace_accentuated_characters(current_name)
-                folder = temp_dir(join(self._datastore.uri_path, current_name))
-                if not exists(folder):
-                    makedirs(folder)
-                impact_function.datastore = Folder(folder)
-                impact_function.datastore.default_vector_format = 'geojson'
-
-            impact_function.hazard.keywords = copy_layer_keywords(
-                self._hazard_keywords)
-            code, message = impact_function.run()
-            if code != ANALYSIS_SUCCESS:
-                current_exposure = (
-                    impact_function.exposure.keywords['exposure'])
-                return code, message, current_exposure
+        if self._can_run_in_parallel():
+            code, message, current_exposure = self._run_in_parallel()
+        else:
+            code, message, current_exposure = self._run_sequentially()
+        if code != ANALYSIS_SUCCESS:
+            return code, message, current_exposure
 
+        for i, impact_function in enumerate(self._impact_functions):
             if (self._aggregation and i == 1) or not self._aggregation:
                 list_geometries.append(impact_function.analysis_extent)
 
@@ -1122,6 +1123,191 @@ class MultiExposureImpactFunction():
 
         return ANALYSIS_SUCCESS, None, None
 
+    def _impact_function_folder(self, impact_function):
+        """Folder of a single exposure impact function.
+
+        :param impact_function: The single exposure impact function.
+        :type impact_function: ImpactFunction
+
+        :return: The folder inside the multi exposure datastore. None if the
+            datastore is not a folder, the impact function will use its
+            default datastore.
+        :rtype: str
+        """
+        if not isinstance(self._datastore, Folder):
+            # We can include this analysis in the parent datastore.
+            # We can't do that with a geopackage.
+            return None
+
+        current_name = impact_function.name.replace(' ', '')
+        current_name = replace_accentuated_characters(current_name)
+        folder = temp_dir(join(self._datastore.uri_path, current_name))
+        if not exists(folder):
+            makedirs(folder)
+        return folder
+
+    def _run_sequentially(self):
+        """Run the single exposure impact functions one after the other.
+
+        :return: A tuple with the status of the IF, an error message and the
+            current exposure key if needed.
+        :rtype: (int, m.Message, str)
+        """
+        for impact_function in self._impact_functions:
+            self._current_impact_function = impact_function
+            LOGGER.info('Running %s' % impact_function.name)
+            folder = self._impact_function_folder(impact_function)
+            if folder:
+                impact_function.datastore = Folder(folder)
+                impact_function.datastore.default_vector_format = 'geojson'
+
+            impact_function.hazard.keywords = copy_layer_keywords(
+                self._hazard_keywords)
+            impact_function.feedback = self.feedback
+            code, message = impact_function.run()
+            if code != ANALYSIS_SUCCESS:
+                current_exposure = (
+                    impact_function.exposure.keywords['exposure'])
+                return code, message, current_exposure
+
+        return ANALYSIS_SUCCESS, None, None
+
+    def _can_run_in_parallel(self):
+        """Check if the exposures can run in a pool of processes.
+
+        Each process loads the layers again from their source, so memory
+        layers can't be used. The debug mode runs in this process only.
+
+        :return: True if the exposures can run in parallel.
+        :rtype: bool
+        """
+        if self.max_workers <= 1 or self.debug or self.debug_mode:
+            return False
+
+        layers = [self._hazard] + self._exposures
+        if self._aggregation:
+            layers.append(self._aggregation)
+        for layer in layers:
+            if layer.providerType() == 'memory':
+                LOGGER.info(
+                    'The layer %s is in memory, the exposures are running '
+                    'sequentially.' % layer.name())
+                return False
+        return True
+
+    def _prepare_shared_hazard(self, impact_function, index):
+        """Prepare the hazard layers shared by several exposures.
+
+        :param impact_function: One of the impact functions sharing them.
+        :type impact_function: ImpactFunction
+
+        :param index: A unique number for the name of the layers.
+        :type index: int
+
+        :return: The prepared hazard and aggregate hazard layers, described
+            for the worker processes. None if the preparation failed, each
+            exposure will prepare the hazard and report the error.
+        :rtype: list
+        """
+        impact_function.hazard.keywords = copy_layer_keywords(
+            self._hazard_keywords)
+        try:
+            hazard, aggregate_hazard = impact_function.prepare_hazard()
+        except Exception as e:
+            LOGGER.info('The hazard can not be prepared once: %s' % e)
+            return None
+
+        layers = []
+        for layer, name in [
+                (hazard, 'prepared_hazard_%s' % index),
+                (aggregate_hazard, 'prepared_aggregate_hazard_%s' % index)]:
+            result, name = self._datastore.add_layer(layer, name)
+            if not result:
+                raise Exception(
+                    tr('Something went wrong with the datastore : '
+                       '{error_message}').format(error_message=name))
+            layers.append(
+                layer_task(self._datastore.layer(name), layer.keywords))
+        return layers
+
+    def _run_in_parallel(self):
+        """Run the single exposure impact functions in a pool of processes.
+
+        The hazard and the aggregate hazard layers are prepared once for the
+        exposures with the same hazard preparation key and saved in the
+        datastore. Each worker reads them, runs the rest of its analysis and
+        writes its outputs in its own folder. The single exposure impact
+        functions are then loaded again from their analysis layer.
+
+        :return: A tuple with the status of the IF, an error message and the
+            current exposure key if needed.
+        :rtype: (int, m.Message, str)
+        """
+        keys = [
+            impact_function.hazard_preparation_key()
+            for impact_function in self._impact_functions]
+
+        tasks = []
+        shared_layers = {}
+        for impact_function, key in zip(self._impact_functions, keys):
+            task = {
+                'hazard': layer_task(self._hazard, self._hazard_keywords),
+                'exposure': layer_task(impact_function.exposure),
+                'aggregation': None,
+                'selected_features': None,
+                'crs': None,
+                'datastore': self._impact_function_folder(impact_function),
+                'use_rounding': self.use_rounding,
+                'prepared_hazard': None,
+                'prepared_aggregate_hazard': None,
+            }
+            if self._aggregation:
+                task['aggregation'] = layer_task(self._aggregation)
+                if (self.use_selected_features_only
+                        and self._aggregation.selectedFeatureCount() > 0):
+                    task['selected_features'] = list(
+                        self._aggregation.selectedFeatureIds())
+            else:
+                task['crs'] = self._crs.authid()
+
+            # A hazard used by a single exposure is prepared by its worker.
+            if key and keys.count(key) > 1:
+                if key not in shared_layers:
+                    shared_layers[key] = self._prepare_shared_hazard(
+                        impact_function, len(shared_layers))
+                if shared_layers[key]:
+                    task['prepared_hazard'], task[
+                        'prepared_aggregate_hazard'] = shared_layers[key]
+            tasks.append(task)
+
+        # QGIS can't be forked, each worker starts its own QGIS.
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(python_executable())
+        pool = context.Pool(
+            processes=min(self.max_workers, len(tasks)),
+            initializer=initialize_worker,
+            initargs=worker_arguments())
+        try:
+            results = pool.map(run_impact_function, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        impact_functions = []
+        for impact_function, result in zip(self._impact_functions, results):
+            code, message, analysis_uri = result
+            if code != ANALYSIS_SUCCESS:
+                current_exposure = (
+                    impact_function.exposure.keywords['exposure'])
+                return code, message, current_exposure
+
+            analysis_impacted = load_layer(analysis_uri)[0]
+            impact_functions.append(ImpactFunction.load_from_output_metadata(
+                analysis_impacted.keywords))
+
+        self._impact_functions = impact_functions
+        return ANALYSIS_SUCCESS, None, None
+
     def generate_report(
             self,
             components,
@@ -2,13 +2,16 @@
 
 """Postprocessors."""
 
+import ast
 
+import numpy
 # noinspection PyUnresolvedReferences
 from qgis.core import QgsFeatureRequest
 
 from safe.definitions.minimum_needs import minimum_needs_parameter
+from safe.definitions.utilities import HazardProfile
 from safe.gis.vector.tools import (
-    create_field_from_definition, SizeCalculator)
+    create_field_from_definition, SizeCalculator, BulkAttributeWriter)
 from safe.processors import (
     field_input_type,
     keyword_input_type,
@@ -19,7 +22,8 @@ from safe.processors import (
     constant_input_type,
     geometry_property_input_type,
     layer_property_input_type,
-    size_calculator_input_value
+    size_calculator_input_value,
+    hazard_profile_input_type
 )
 from safe.utilities.i18n import tr
 from safe.utilities.profiling import profile
@@ -30,6 +34,42 @@ __license__ = "GPL version 3"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+# Cache of compiled formulas, the key is the formula string.
+_compiled_formulas = {}
+
+
+def is_null(value):
+    """Check if an attribute value is null.
+
+    :param value: The value to check.
+    :type value: object
+
+    :returns: True if the value is None or a null QVariant.
+    :rtype: bool
+    """
+    return value is None or (hasattr(value, 'isNull') and value.isNull())
+
+
+def compile_formula(formula):
+    """Parse and compile a formula only once.
+
+    :param formula: A simple formula.
+    :type formula: str
+
+    :returns: Tuple with the code object and the set of variable names used
+        in the formula.
+    :rtype: (code, set)
+    """
+    compiled = _compiled_formulas.get(formula)
+    if compiled is None:
+        tree = ast.parse(formula.strip(), mode='eval')
+        names = set(
+            node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+        code = compile(tree, '<formula>', 'eval')
+        compiled = (code, names)
+        _compiled_formulas[formula] = compiled
+    return compiled
+
 
 def evaluate_formula(formula, variables):
     """Very simple formula evaluator. Beware the security.
@@ -44,39 +84,117 @@ def evaluate_formula(formula, variables):
     :rtype: float, int
     """
     for key, value in list(variables.items()):
-        if value is None or (hasattr(value, 'isNull') and value.isNull()):
+        if is_null(value):
             # If one value is null, we return null.
             return value
-        formula = formula.replace(key, str(value))
-    result = eval(formula)
+    code, _ = compile_formula(formula)
+    result = eval(code, {'__builtins__': {}}, dict(variables))
     return result
 
 
+def evaluate_formula_columns(formula, variables, count):
+    """Evaluate a formula on whole columns at once.
+
+    Each variable is either a list of values, one per feature, or a single
+    value shared by all features. The null semantic is the same as
+    evaluate_formula: if one input is null for a feature, the result for
+    this feature is this null value.
+
+    If the columns can not be evaluated with NumPy (non numeric values,
+    division by zero, ...), we fall back to evaluate_formula row by row so
+    the result is the same as before.
+
+    :param formula: A simple formula.
+    :type formula: str
+
+    :param variables: A collection of variable (key and list or value).
+    :type variables: dict
+
+    :param count: The number of features.
+    :type count: int
+
+    :returns: The list of results, one per feature.
+    :rtype: list
+    """
+    code, _ = compile_formula(formula)
+
+    results = [None] * count
+    valid = numpy.ones(count, dtype=bool)
+    columns = {}
+    for key, value in list(variables.items()):
+        if isinstance(value, list):
+            nulls = numpy.fromiter(
+                (is_null(item) for item in value), dtype=bool, count=count)
+            for index in numpy.flatnonzero(nulls & valid).tolist():
+                results[index] = value[index]
+            valid &= ~nulls
+            columns[key] = value
+        elif is_null(value):
+            for index in numpy.flatnonzero(valid).tolist():
+                results[index] = value
+            valid[:] = False
+
+    indexes = numpy.flatnonzero(valid)
+    if not len(indexes):
+        return results
+
+    namespace = dict(variables)
+    for key, value in list(columns.items()):
+        column = numpy.array([value[index] for index in indexes.tolist()])
+        if column.dtype.kind not in 'iuf':
+            # Not a numeric column, NumPy can't help us.
+            break
+        namespace[key] = column
+    else:
+        try:
+            with numpy.errstate(all='raise'):
+                computed = eval(code, {'__builtins__': {}}, namespace)
+            computed = numpy.broadcast_to(computed, indexes.shape)
+        except Exception:  # pylint: disable=broad-except
+            pass
+        else:
+            for index, value in zip(indexes.tolist(), computed.tolist()):
+                results[index] = value
+            return results
+
+    for index in indexes.tolist():
+        parameters = {}
+        for key, value in list(variables.items()):
+            if key in columns:
+                value = value[index]
+            parameters[key] = value
+        results[index] = evaluate_formula(formula, parameters)
+    return results
+
+
 @profile
-def run_single_post_processor(layer, post_processor):
+def run_single_post_processor(layer, post_processor, hazard_profile=None):
     """Run single post processor.
 
     If the layer has the output field, it will pass the post
     processor calculation.
 
+    Input columns are read from the layer in a single pass. Formulas are
+    compiled once and evaluated on whole columns, python functions are called
+    for each feature. All outputs are then written back in bulk through the
+    data provider.
+
     :param layer: The vector layer to use for post processing.
     :type layer: QgsVectorLayer
 
     :param post_processor: A post processor definition.
     :type post_processor: dict
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined and the post processor needs it, a new one is created from
+        the current settings.
+    :type hazard_profile: HazardProfile
+
     :returns: Tuple with True if success, else False with an error message.
     :rtype: (bool, str)
     """
-    if not layer.editBuffer():
-
-        # Turn on the editing mode.
-        if not layer.startEditing():
-            msg = tr('The impact layer could not start the editing mode.')
-            return False, msg
-
-    # Calculate based on formula
-    # Iterate all possible output and create the correct field.
+    # Check every output before touching the layer.
+    outputs = []
     for output_key, output_value in list(post_processor['output'].items()):
 
         # Get output attribute name
@@ -89,183 +207,210 @@ def run_single_post_processor(layer, post_processor):
             msg = tr(
                 'The field name %s already exists.'
                 % output_field_name)
-            layer.rollBack()
             return False, msg
 
-        # Add output attribute name to the layer
-        field = create_field_from_definition(output_value['value'])
-        result = layer.addAttribute(field)
-        if not result:
-            msg = tr(
-                'Error while creating the field %s.'
-                % output_field_name)
-            layer.rollBack()
-            return False, msg
+        outputs.append(output_value)
 
-        # Get the index of output attribute
-        output_field_index = layer.fields().lookupField(output_field_name)
+    # Get the input field's indexes for input
+    input_indexes = {}
 
-        if layer.fields().lookupField(output_field_name) == -1:
-            msg = tr(
-                'The field name %s has not been created.'
-                % output_field_name)
-            layer.rollBack()
-            return False, msg
+    input_properties = {}
 
-        # Get the input field's indexes for input
-        input_indexes = {}
+    # Default parameters
+    default_parameters = {}
 
-        input_properties = {}
+    msg = None
 
-        # Default parameters
-        default_parameters = {}
+    # Iterate over every inputs.
+    for key, values in list(post_processor['input'].items()):
+        values = values if isinstance(values, list) else [values]
+        for value in values:
+            is_constant_input = (
+                value['type'] == constant_input_type)
+            is_field_input = (
+                value['type'] == field_input_type or
+                value['type'] == dynamic_field_input_type)
+            is_geometry_input = (
+                value['type'] == geometry_property_input_type)
+            is_keyword_input = (
+                value['type'] == keyword_input_type)
+            is_needs_input = (
+                value['type'] == needs_profile_input_type)
+            is_layer_property_input = (
+                value['type'] == layer_property_input_type)
+            is_hazard_profile_input = (
+                value['type'] == hazard_profile_input_type)
+            if value['type'] == keyword_value_expected:
+                break
+            if is_constant_input:
+                default_parameters[key] = value['value']
+                break
+            elif is_field_input:
+                if value['type'] == dynamic_field_input_type:
+                    key_template = value['value']['key']
+                    field_param = value['field_param']
+                    field_key = key_template % field_param
+                else:
+                    field_key = value['value']['key']
+
+                inasafe_fields = layer.keywords['inasafe_fields']
+                name_field = inasafe_fields.get(field_key)
+
+                if not name_field:
+                    msg = tr(
+                        '%s has not been found in inasafe fields.'
+                        % value['value']['key'])
+                    continue
+
+                index = layer.fields().lookupField(name_field)
+
+                if index == -1:
+                    fields = layer.fields().toList()
+                    msg = tr(
+                        'The field name %s has not been found in %s'
+                        % (
+                            name_field,
+                            [f.name() for f in fields]
+                        ))
+                    continue
+
+                input_indexes[key] = index
+                break
 
-        msg = None
+            # For geometry, create new field that contain the value
+            elif is_geometry_input:
+                input_properties[key] = geometry_property_input_type['key']
+                break
 
-        # Iterate over every inputs.
-        for key, values in list(post_processor['input'].items()):
-            values = values if isinstance(values, list) else [values]
-            for value in values:
-                is_constant_input = (
-                    value['type'] == constant_input_type)
-                is_field_input = (
-                    value['type'] == field_input_type or
-                    value['type'] == dynamic_field_input_type)
-                is_geometry_input = (
-                    value['type'] == geometry_property_input_type)
-                is_keyword_input = (
-                    value['type'] == keyword_input_type)
-                is_needs_input = (
-                    value['type'] == needs_profile_input_type)
-                is_layer_property_input = (
-                    value['type'] == layer_property_input_type)
-                if value['type'] == keyword_value_expected:
-                    break
-                if is_constant_input:
-                    default_parameters[key] = value['value']
-                    break
-                elif is_field_input:
-                    if value['type'] == dynamic_field_input_type:
-                        key_template = value['value']['key']
-                        field_param = value['field_param']
-                        field_key = key_template % field_param
-                    else:
-                        field_key = value['value']['key']
-
-                    inasafe_fields = layer.keywords['inasafe_fields']
-                    name_field = inasafe_fields.get(field_key)
-
-                    if not name_field:
-                        msg = tr(
-                            '%s has not been found in inasafe fields.'
-                            % value['value']['key'])
-                        continue
-
-                    index = layer.fields().lookupField(name_field)
-
-                    if index == -1:
-                        fields = layer.fields().toList()
-                        msg = tr(
-                            'The field name %s has not been found in %s'
-                            % (
-                                name_field,
-                                [f.name() for f in fields]
-                            ))
-                        continue
-
-                    input_indexes[key] = index
-                    break
+            # for keyword
+            elif is_keyword_input:
+                # See http://stackoverflow.com/questions/14692690/
+                # access-python-nested-dictionary-items-via-a-list-of-keys
+                value = reduce(
+                    lambda d, k: d[k], value['value'], layer.keywords)
 
-                # For geometry, create new field that contain the value
-                elif is_geometry_input:
-                    input_properties[key] = geometry_property_input_type['key']
-                    break
+                default_parameters[key] = value
+                break
 
-                # for keyword
-                elif is_keyword_input:
-                    # See http://stackoverflow.com/questions/14692690/
-                    # access-python-nested-dictionary-items-via-a-list-of-keys
-                    value = reduce(
-                        lambda d, k: d[k], value['value'], layer.keywords)
+            # for needs profile
+            elif is_needs_input:
+                need_parameter = minimum_needs_parameter(
+                    parameter_name=value['value'])
+                value = need_parameter.value
 
-                    default_parameters[key] = value
-                    break
+                default_parameters[key] = value
+                break
 
-                # for needs profile
-                elif is_needs_input:
-                    need_parameter = minimum_needs_parameter(
-                        parameter_name=value['value'])
-                    value = need_parameter.value
+            # for layer property
+            elif is_layer_property_input:
+                if value['value'] == layer_crs_input_value:
+                    default_parameters[key] = layer.crs()
 
-                    default_parameters[key] = value
-                    break
+                if value['value'] == size_calculator_input_value:
+                    exposure = layer.keywords.get('exposure')
+                    if not exposure:
+                        keywords = layer.keywords.get('exposure_keywords')
+                        exposure = keywords.get('exposure')
 
-                # for layer property
-                elif is_layer_property_input:
-                    if value['value'] == layer_crs_input_value:
-                        default_parameters[key] = layer.crs()
+                    default_parameters[key] = SizeCalculator(
+                        layer.crs(), layer.geometryType(), exposure)
+                break
 
-                    if value['value'] == size_calculator_input_value:
-                        exposure = layer.keywords.get('exposure')
-                        if not exposure:
-                            keywords = layer.keywords.get('exposure_keywords')
-                            exposure = keywords.get('exposure')
+            # for the hazard profile
+            elif is_hazard_profile_input:
+                if hazard_profile is None:
+                    hazard_profile = HazardProfile()
+                default_parameters[key] = hazard_profile
+                break
 
-                        default_parameters[key] = SizeCalculator(
-                            layer.crs(), layer.geometryType(), exposure)
-                    break
+        else:
+            # executed when we can't find all the inputs
+            return False, msg
 
+    # Read all input columns in one pass.
+    request = QgsFeatureRequest().setSubsetOfAttributes(
+        list(input_indexes.values()))
+    if not input_properties:
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+
+    inputs = input_indexes.copy()
+    inputs.update(input_properties)
+
+    feature_ids = []
+    columns = {key: [] for key in inputs}
+    for feature in layer.getFeatures(request):
+        feature_ids.append(feature.id())
+        attributes = feature.attributes()
+        for key, value in list(inputs.items()):
+            if value == geometry_property_input_type['key']:
+                columns[key].append(feature.geometry())
             else:
-                # executed when we can't find all the inputs
-                layer.rollBack()
-                return False, msg
-
-        # Create iterator for feature
-        request = QgsFeatureRequest().setSubsetOfAttributes(
-            list(input_indexes.values()))
-        iterator = layer.getFeatures(request)
-
-        inputs = input_indexes.copy()
-        inputs.update(input_properties)
-
-        # Iterate all feature
-        for feature in iterator:
-            attributes = feature.attributes()
-
-            # Create dictionary to store the input
-            parameters = {}
-            parameters.update(default_parameters)
-
-            # Fill up the input from fields
-            for key, value in list(inputs.items()):
-                if value == geometry_property_input_type['key']:
-                    parameters[key] = feature.geometry()
-                else:
-                    parameters[key] = attributes[value]
-            # Fill up the input from geometry property
-
-            # Evaluate the function
-            python_function = output_value.get('function')
-            if python_function:
-                # Launch the python function
-                post_processor_result = python_function(**parameters)
-            else:
-                # Evaluate the function
-                formula = output_value['formula']
-                post_processor_result = evaluate_formula(
-                    formula, parameters)
-
-            # The affected postprocessor returns a boolean.
-            if isinstance(post_processor_result, bool):
-                post_processor_result = tr(str(post_processor_result))
-
-            layer.changeAttributeValue(
-                feature.id(),
-                output_field_index,
-                post_processor_result
-            )
-
-    layer.commitChanges()
+                columns[key].append(attributes[value])
+
+    count = len(feature_ids)
+
+    # Create dictionary to store the input, same order as before: default
+    # parameters first, then the inputs from the layer.
+    variables = {}
+    variables.update(default_parameters)
+    variables.update(columns)
+
+    # Evaluate every output on the whole columns.
+    results = []
+    for output_value in outputs:
+        python_function = output_value.get('function')
+        if python_function:
+            # Launch the python function for each feature
+            output = []
+            for index in range(count):
+                parameters = {}
+                parameters.update(default_parameters)
+                for key, column in list(columns.items()):
+                    parameters[key] = column[index]
+                output.append(python_function(**parameters))
+        else:
+            # Evaluate the formula
+            output = evaluate_formula_columns(
+                output_value['formula'], variables, count)
+        results.append(output)
+
+    # Flush any pending edit before using the data provider.
+    if layer.isEditable():
+        layer.commitChanges()
+
+    # Add output attributes to the layer
+    data_provider = layer.dataProvider()
+    fields = [
+        create_field_from_definition(output_value['value'])
+        for output_value in outputs]
+    if not data_provider.addAttributes(fields):
+        msg = tr(
+            'Error while creating the field %s.'
+            % ', '.join([field.name() for field in fields]))
+        return False, msg
+    layer.updateFields()
+
+    # Get the index of output attributes
+    output_indexes = []
+    for output_value in outputs:
+        output_field_name = output_value['value']['field_name']
+        output_field_index = layer.fields().lookupField(output_field_name)
+        if output_field_index == -1:
+            msg = tr(
+                'The field name %s has not been created.'
+                % output_field_name)
+            return False, msg
+        output_indexes.append(output_field_index)
+
+    with BulkAttributeWriter(layer) as writer:
+        for row, feature_id in enumerate(feature_ids):
+            for output_field_index, output in zip(output_indexes, results):
+                post_processor_result = output[row]
+                # The affected postprocessor returns a boolean.
+                if isinstance(post_processor_result, bool):
+                    post_processor_result = tr(str(post_processor_result))
+                writer.change_attribute_value(
+                    feature_id, output_field_index, post_processor_result)
     return True, None
 
 
@@ -294,6 +439,8 @@ def enough_input(layer, post_processor_input):
             is_needs_input = input_value['type'] == needs_profile_input_type
             is_keyword_input = input_value['type'] == keyword_input_type
             is_layer_input = input_value['type'] == layer_property_input_type
+            is_hazard_profile_input = (
+                input_value['type'] == hazard_profile_input_type)
             is_keyword_value = input_value['type'] == keyword_value_expected
             is_geometry_input = (
                 input_value['type'] == geometry_property_input_type)
@@ -337,6 +484,9 @@ def enough_input(layer, post_processor_input):
             elif is_layer_input or is_geometry_input:
                 # will be taken from the layer itself, so always true
                 break
+            elif is_hazard_profile_input:
+                # will be taken from the analysis, so always true
+                break
             elif is_keyword_value:
                 try:
                     value = reduce(
@@ -0,0 +1,89 @@
+# coding=utf-8
+
+"""Test the headless batch runner."""
+
+import csv
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+from safe.definitions.constants import INASAFE_TEST
+from safe.test.utilities import get_qgis_app, standard_data_path
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from safe.impact_function.batch_runner import (
+    BatchRunner,
+    SCENARIO_INVALID_INPUT,
+    SCENARIO_SUCCESS,
+    read_checkpoint,
+    read_scenarios,
+    schedule_scenarios,
+    scenario_key,
+    scenario_output_directory)
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    """Test the batch runner."""
+
+    def setUp(self):
+        self.output = mkdtemp()
+        scenario_file = standard_data_path(
+            'control', 'scenarios', 'scenario1.txt')
+        self.scenarios = list(read_scenarios(scenario_file).values())
+
+    def tearDown(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+
+    def test_schedule_scenarios(self):
+        """Test the scenarios are grouped by hazard."""
+        scenarios = self.scenarios + [
+            dict(self.scenarios[1], scenario_name='Same hazard')]
+        groups = schedule_scenarios(scenarios)
+        self.assertEqual(len(groups), 2)
+        group = [g for g in groups if len(g) == 2][0]
+        self.assertEqual(
+            [scenario['scenario_name'] for scenario in group],
+            [self.scenarios[1]['scenario_name'], 'Same hazard'])
+
+    def test_scenario_output_directory(self):
+        """Test scenarios with the same name in two files don't collide."""
+        scenario = self.scenarios[1]
+        other = dict(scenario, full_path='/other/folder/scenario1.txt')
+        self.assertNotEqual(
+            scenario_output_directory(self.output, scenario),
+            scenario_output_directory(self.output, other))
+
+    def test_batch_runner(self):
+        """Test a batch runs and resumes from its checkpoint."""
+        runner = BatchRunner(
+            self.scenarios, self.output, use_hazard_cache=False)
+        rows = runner.run()
+        status = {row['scenario']: row['status'] for row in rows}
+        self.assertEqual(status['dummy test'], SCENARIO_INVALID_INPUT)
+        self.assertEqual(status['Flood Polygon'], SCENARIO_SUCCESS)
+
+        completed = read_checkpoint(runner.checkpoint_path)
+        self.assertEqual(
+            list(completed.keys()), [scenario_key(self.scenarios[1])])
+
+        with open(runner.summary_path) as summary:
+            summary_rows = list(csv.DictReader(summary))
+        self.assertEqual(len(summary_rows), 3)
+        self.assertEqual(summary_rows[-1]['scenario'], 'total')
+        self.assertGreater(float(summary_rows[-1]['scenarios_per_hour']), 0)
+
+        # The completed scenario is not run again.
+        rows = runner.run()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            read_checkpoint(runner.checkpoint_path), completed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -99,6 +99,7 @@ from qgis.core import (
     QgsMapLayer,
     QgsCoordinateReferenceSystem,
     QgsGeometry,
+    QgsProcessingFeedback,
     Qgis)
 from osgeo import gdal
 from qgis.PyQt.QtCore import QT_VERSION_STR
@@ -709,6 +710,40 @@ class TestImpactFunction(unittest.TestCase):
         # test_provenance pass
         del hazard_layer
 
+    def test_cancel(self):
+        """Test the analysis stops when its feedback is canceled."""
+        hazard_layer = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        exposure_layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'building-points.geojson')
+        aggregation_layer = load_test_vector_layer(
+            'gisv4', 'aggregation', 'small_grid.geojson')
+
+        impact_function = ImpactFunction()
+        impact_function.aggregation = aggregation_layer
+        impact_function.exposure = exposure_layer
+        impact_function.hazard = hazard_layer
+        impact_function.feedback = QgsProcessingFeedback()
+        status, message = impact_function.prepare()
+        self.assertEqual(PREPARE_SUCCESS, status, message)
+
+        steps = []
+        impact_function.callback = (
+            lambda current, maximum, message=None: steps.append(current))
+        impact_function.cancel()
+        self.assertTrue(impact_function.is_canceled())
+        status, message = impact_function.run()
+        self.assertEqual(ANALYSIS_FAILED_BAD_INPUT, status, message)
+        # The analysis stops at the first step.
+        self.assertEqual(steps, [0])
+
+        # It runs again with a new feedback.
+        impact_function.feedback = QgsProcessingFeedback()
+        impact_function.callback = impact_function.console_progress_callback
+        status, message = impact_function.run()
+        self.assertEqual(ANALYSIS_SUCCESS, status, message)
+        self.assertEqual(impact_function.feedback.progress(), 100)
+
     def test_scenario(
             self, scenario_path=None, use_debug=True, test_loader=False):
         """Run test single scenario."""
@@ -264,3 +264,44 @@ class TestMultiExposureImpactFunction(unittest.TestCase):
         new_analysis_layer_id = new_impact_function.provenance[
             provenance_layer_analysis_impacted['provenance_key']]
         self.assertEqual(old_analysis_layer_id, new_analysis_layer_id)
+
+    def test_multi_exposure_in_parallel(self):
+        """Test the exposures running in a pool of processes."""
+        hazard_layer = load_test_vector_layer(
+            'gisv4', 'hazard', 'classified_vector.geojson')
+        building_layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'building-points.geojson')
+        population_layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'population.geojson')
+        roads_layer = load_test_vector_layer(
+            'gisv4', 'exposure', 'roads.geojson')
+        aggregation_layer = load_test_vector_layer(
+            'gisv4', 'aggregation', 'small_grid.geojson')
+
+        summaries = []
+        for max_workers in [1, 3]:
+            impact_function = MultiExposureImpactFunction()
+            impact_function.max_workers = max_workers
+            impact_function.hazard = hazard_layer
+            impact_function.exposures = [
+                building_layer, population_layer, roads_layer]
+            impact_function.aggregation = aggregation_layer
+
+            code, message = impact_function.prepare()
+            self.assertEqual(code, PREPARE_SUCCESS, message)
+
+            for single_impact_function in impact_function.impact_functions:
+                self.assertIsNotNone(
+                    single_impact_function.hazard_preparation_key())
+
+            code, message, exposure = impact_function.run()
+            self.assertEqual(code, ANALYSIS_SUCCESS, message)
+            self.assertEqual(len(impact_function.impact_functions), 3)
+
+            analysis = impact_function.analysis_impacted
+            summaries.append(
+                dict(zip(
+                    [field.name() for field in analysis.fields()],
+                    next(analysis.getFeatures()).attributes())))
+
+        self.assertDictEqual(summaries[0], summaries[1])
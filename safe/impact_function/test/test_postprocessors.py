@@ -57,6 +57,7 @@ from safe.test.utilities import load_test_vector_layer
 from safe.impact_function.postprocessors import (
     run_single_post_processor,
     evaluate_formula,
+    evaluate_formula_columns,
     enough_input)
 
 
@@ -520,6 +521,36 @@ class TestPostProcessors(unittest.TestCase):
         }
         self.assertIsNone(evaluate_formula(formula, variables))
 
+    def test_evaluate_formula_columns(self):
+        """Test for evaluating formula on columns."""
+        formula = '(population - fatalities) * displacement_ratio'
+        variables = {
+            'displacement_ratio': 0.5,
+            'population': [10, None, 4, 3.5],
+            'fatalities': [2, 1, 0, 0.5]
+        }
+        expected = [
+            evaluate_formula(formula, {
+                'displacement_ratio': 0.5,
+                'population': population,
+                'fatalities': fatalities})
+            for population, fatalities in zip(
+                variables['population'], variables['fatalities'])
+        ]
+        self.assertEqual(expected, [4, None, 2, 1.5])
+        self.assertEqual(
+            expected, evaluate_formula_columns(formula, variables, 4))
+
+        # Non numeric values are evaluated feature by feature.
+        variables = {
+            'population': ['a', 2],
+            'gender_ratio': [2, 3]
+        }
+        self.assertEqual(
+            ['aa', 6],
+            evaluate_formula_columns(
+                'population * gender_ratio', variables, 2))
+
 
 if __name__ == '__main__':
     unittest.main()
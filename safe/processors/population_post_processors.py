@@ -63,7 +63,8 @@ from safe.processors.post_processor_inputs import (
     field_input_type,
     keyword_input_type,
     dynamic_field_input_type,
-    keyword_value_expected)
+    keyword_value_expected,
+    hazard_profile_input_type)
 from safe.utilities.i18n import tr
 
 # A postprocessor can be defined with a formula or with a python function.
@@ -100,6 +101,9 @@ post_processor_displaced_ratio = {
                 'field_param': exposure_population['key'],
                 'type': dynamic_field_input_type,
             }],
+        'hazard_profile': {
+            'type': hazard_profile_input_type,
+        },
     },
     'output': {
         'population_displacement_ratio': {
@@ -189,6 +193,9 @@ post_processor_fatality_ratio = {
             'value': ['hazard_keywords', 'classification'],
             'expected_value': earthquake_mmi_scale['key']
         },
+        'hazard_profile': {
+            'type': hazard_profile_input_type,
+        },
     },
     'output': {
         'fatality_ratio': {
@@ -171,7 +171,11 @@ def calculate_cardinality(
 
 # This postprocessor function is also used in the aggregation_summary
 def post_processor_affected_function(
-        exposure=None, hazard=None, classification=None, hazard_class=None):
+        exposure=None,
+        hazard=None,
+        classification=None,
+        hazard_class=None,
+        hazard_profile=None):
     """Private function used in the affected postprocessor.
 
     It returns a boolean if it's affected or not, or not exposed.
@@ -188,11 +192,19 @@ def post_processor_affected_function(
     :param hazard_class: The hazard class of the feature.
     :type hazard_class: str
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, the settings and definitions are read.
+    :type hazard_profile: HazardProfile
+
     :return: If this hazard class is affected or not. It can be `not exposed`.
         The not exposed value returned is the key defined in
         `hazard_classification.py` at the top of the file.
     :rtype: bool,'not exposed'
     """
+    if hazard_profile is not None:
+        return hazard_profile.is_affected(
+            hazard, classification, hazard_class, exposure)
+
     if exposure == exposure_population['key']:
         affected = is_affected(
             hazard, classification, hazard_class)
@@ -214,7 +226,11 @@ def post_processor_affected_function(
 
 
 def post_processor_population_displacement_function(
-        hazard=None, classification=None, hazard_class=None, population=None):
+        hazard=None,
+        classification=None,
+        hazard_class=None,
+        population=None,
+        hazard_profile=None):
     """Private function used in the displacement postprocessor.
 
     :param hazard: The hazard to use.
@@ -230,16 +246,27 @@ def post_processor_population_displacement_function(
         condition for the postprocessor to run.
     :type population: float, int
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, the settings are read.
+    :type hazard_profile: HazardProfile
+
     :return: The displacement ratio for a given hazard class.
     :rtype: float
     """
     _ = population  # NOQA
 
+    if hazard_profile is not None:
+        return hazard_profile.displacement_rate(
+            hazard, classification, hazard_class)
+
     return get_displacement_rate(hazard, classification, hazard_class)
 
 
 def post_processor_population_fatality_function(
-        classification=None, hazard_class=None, population=None):
+        classification=None,
+        hazard_class=None,
+        population=None,
+        hazard_profile=None):
     """Private function used in the fatality postprocessor.
 
     :param classification: The hazard classification to use.
@@ -252,10 +279,18 @@ def post_processor_population_fatality_function(
         condition for the postprocessor to run.
     :type population: float, int
 
+    :param hazard_profile: The hazard profile of the analysis. If it's not
+        defined, the definitions are read.
+    :type hazard_profile: HazardProfile
+
     :return: The displacement ratio for a given hazard class.
     :rtype: float
     """
     _ = population  # NOQA
+
+    if hazard_profile is not None:
+        return hazard_profile.fatality_rate(classification, hazard_class)
+
     for hazard in hazard_classes_all:
         if hazard['key'] == classification:
             classification = hazard['classes']
@@ -52,6 +52,13 @@ layer_property_input_type = {
         'This type of input takes it\'s value from a layer property. For '
         'example the layer Coordinate Reference System of the layer.')
 }
+hazard_profile_input_type = {
+    'key': 'hazard_profile',
+    'description': tr(
+        'This type of input takes the hazard profile of the analysis. It '
+        'tells if a hazard class is affected, and its displacement and '
+        'fatality rates.')
+}
 post_processor_input_types = [
     constant_input_type,
     field_input_type,
@@ -59,7 +66,8 @@ post_processor_input_types = [
     keyword_input_type,
     needs_profile_input_type,
     geometry_property_input_type,
-    layer_property_input_type
+    layer_property_input_type,
+    hazard_profile_input_type
 ]
 
 # Input values
@@ -37,7 +37,8 @@ from safe.processors.post_processor_inputs import (
     size_calculator_input_value,
     keyword_input_type,
     field_input_type,
-    keyword_value_expected)
+    keyword_value_expected,
+    hazard_profile_input_type)
 from safe.utilities.i18n import tr
 
 __copyright__ = "Copyright 2016, The InaSAFE Project"
@@ -274,6 +275,9 @@ post_processor_affected = {
             'type': keyword_input_type,
             'value': ['hazard_keywords', 'hazard'],
         },
+        'hazard_profile': {
+            'type': hazard_profile_input_type,
+        },
     },
     'output': {
         'affected': {
@@ -13,14 +13,58 @@ Contact : ole.moller.nielsen@gmail.com
 
 import json
 
+import numpy as np
+
+# Initial number of groups in the accumulators of a FlatTable.
+FLAT_TABLE_CAPACITY = 64
+
+# Number of values added one by one before they are summed in the
+# accumulators.
+FLAT_TABLE_BUFFER_SIZE = 65536
+
+
+def _group_key(value):
+    """Key of a group value in the codes of a FlatTable.
+
+    True is equal to 1 in python, they must still be different groups.
+
+    :param value: The value of a group.
+    :type value: any
+
+    :returns: The key of the value.
+    :rtype: any
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return bool, bool(value)
+    return value
+
+
+def _is_integer(value):
+    """Check if a value is summed as an integer.
+
+    :param value: The value to add.
+    :type value: int, float
+
+    :returns: True for integers and booleans.
+    :rtype: bool
+    """
+    return isinstance(value, (int, np.integer, np.bool_))
+
 
 class FlatTable():
     """ Flat table object - used as a source of data for pivot tables.
     After constructing the object, repeatedly call "add_value" method
-    for each row of the input table. FlatTable stores only fields
-    that are important for the creation of pivot tables later. It also
-    aggregates values of rows where specified fields have the same value,
-    saving memory by not storing all source data.
+    for each row of the input table, or "add_values" once with columns.
+    FlatTable stores only fields that are important for the creation of
+    pivot tables later. It also aggregates values of rows where specified
+    fields have the same value, saving memory by not storing all source data.
+
+    Each group value is stored once and replaced by an integer code, in the
+    order of first appearance. A row of the table is a tuple of codes and its
+    value is summed in numpy arrays, so the memory used depends on the
+    number of distinct groups, not on the number of added values. Like a sum
+    in python, the sum of a row stays an integer while only integers are
+    added to it.
 
     An example of use for the flat table - afterwards it can be converted
     into a pivot table:
@@ -33,37 +77,318 @@ class FlatTable():
             hazard_type=f['hazard'],
             road_type=f['road'],
             zone=f['zone'])
+
+    pivot_table = flat_table.to_pivot(
+        row_field='road_type', column_field='hazard_type')
     """
 
     def __init__(self, *args):
         """ Construct flat table, fields are passed"""
         self.groups = args
-        self.data = {}
-        # Store keys, allowing for consistent ordered
-        self.data_keys = []
+        self._reset()
+
+    def _reset(self):
+        """Remove all values from the table."""
+        # For each group, the distinct values and their codes.
+        self._group_values = [[] for _ in self.groups]
+        self._group_codes = [{} for _ in self.groups]
+        # Row of each tuple of codes, and of each tuple of group values
+        # already added with add_value.
+        self._index = {}
+        self._rows = {}
+        self._keys = np.zeros(
+            (FLAT_TABLE_CAPACITY, len(self.groups)), dtype=np.int64)
+        # The integers and the other values are summed separately, the sum
+        # of a row is a float if it got any float.
+        self._integer_sums = np.zeros(FLAT_TABLE_CAPACITY, dtype=np.int64)
+        self._float_sums = np.zeros(FLAT_TABLE_CAPACITY, dtype=np.float64)
+        self._is_float = np.zeros(FLAT_TABLE_CAPACITY, dtype=bool)
+        self._size = 0
+        # Values from add_value, not summed yet.
+        self._pending_rows = []
+        self._pending_values = []
+
+    def _encode(self, group_index, value):
+        """Get the code of a group value, adding it if needed.
+
+        :param group_index: The index of the group.
+        :type group_index: int
+
+        :param value: The value of the group.
+        :type value: any
+
+        :returns: The code of the value.
+        :rtype: int
+        """
+        codes = self._group_codes[group_index]
+        key = _group_key(value)
+        code = codes.get(key)
+        if code is None:
+            code = len(codes)
+            codes[key] = code
+            self._group_values[group_index].append(value)
+        return code
+
+    def _row(self, key):
+        """Get the row of a tuple of codes, adding it if needed.
+
+        :param key: The tuple of codes.
+        :type key: tuple
+
+        :returns: The row in the accumulators.
+        :rtype: int
+        """
+        row = self._index.get(key)
+        if row is None:
+            row = self._size
+            if row == len(self._is_float):
+                self._keys = np.concatenate(
+                    [self._keys, np.zeros_like(self._keys)])
+                self._integer_sums = np.concatenate(
+                    [self._integer_sums, np.zeros_like(self._integer_sums)])
+                self._float_sums = np.concatenate(
+                    [self._float_sums, np.zeros_like(self._float_sums)])
+                self._is_float = np.concatenate(
+                    [self._is_float, np.zeros_like(self._is_float)])
+            self._keys[row] = key
+            self._index[key] = row
+            self._size += 1
+        return row
+
+    def _accumulate(self, rows, values):
+        """Sum values in the accumulators.
+
+        :param rows: The row of each value.
+        :type rows: list, numpy.ndarray
+
+        :param values: The values to add.
+        :type values: list, numpy.ndarray
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'biuf':
+            integers = np.full(len(values), values.dtype.kind in 'biu')
+        else:
+            # numpy would convert [1, 2.5] to floats.
+            integers = np.fromiter(
+                (_is_integer(value) for value in values),
+                dtype=bool,
+                count=len(values))
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            values = array
+
+        if integers.any():
+            np.add.at(
+                self._integer_sums,
+                rows[integers],
+                values[integers].astype(np.int64))
+        if not integers.all():
+            floats = ~integers
+            self._float_sums[:self._size] += np.bincount(
+                rows[floats],
+                weights=values[floats].astype(np.float64),
+                minlength=self._size)
+            self._is_float[rows[floats]] = True
 
     def add_value(self, value, **kwargs):
-        key = tuple(kwargs[group] for group in self.groups)
-        if key not in self.data:
-            self.data[key] = 0
-        self.data_keys.append(key)
-        self.data[key] += value
+        """Add a value to the group given by the keyword arguments.
+
+        :param value: The value to add.
+        :type value: int, float
+
+        :param kwargs: The value of each group.
+        :type kwargs: dict
+        """
+        values = tuple(kwargs[group] for group in self.groups)
+        key = tuple(_group_key(value) for value in values)
+        row = self._rows.get(key)
+        if row is None:
+            row = self._row(tuple(
+                self._encode(i, group_value)
+                for i, group_value in enumerate(values)))
+            self._rows[key] = row
+        self._pending_rows.append(row)
+        self._pending_values.append(value)
+        if len(self._pending_rows) >= FLAT_TABLE_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        """Sum the pending values in the accumulators."""
+        if not self._pending_rows:
+            return
+        self._accumulate(self._pending_rows, self._pending_values)
+        self._pending_rows = []
+        self._pending_values = []
+
+    def _totals(self):
+        """Return the sum of each row of the table, as floats.
+
+        :returns: The sums, in the order of the rows.
+        :rtype: numpy.ndarray
+        """
+        self._flush()
+        return (
+            self._integer_sums[:self._size] + self._float_sums[:self._size])
+
+    def _values(self):
+        """Return the sum of each row of the table, as python numbers.
+
+        :returns: The sums in the order of the rows, integers for the rows
+            which only got integers.
+        :rtype: list
+        """
+        self._flush()
+        integer_sums = self._integer_sums[:self._size].tolist()
+        float_sums = self._float_sums[:self._size].tolist()
+        return [
+            integer_sum + float_sum if is_float else integer_sum
+            for integer_sum, float_sum, is_float in zip(
+                integer_sums, float_sums, self._is_float[:self._size])]
+
+    def add_values(self, values, **columns):
+        """Add many values at once, with a column for each group.
+
+        ..versionadded:: 5.0
+
+        :param values: The values to add.
+        :type values: list, numpy.ndarray
+
+        :param columns: For each group, the list or the array of its values,
+            with the same length as values.
+        :type columns: dict
+        """
+        if not isinstance(values, np.ndarray):
+            array = np.empty(len(values), dtype=object)
+            array[:] = values
+            if all(_is_integer(value) for value in values):
+                values = array.astype(np.int64)
+            elif not any(_is_integer(value) for value in values):
+                values = array.astype(np.float64)
+            else:
+                values = array
+        if not len(values):
+            return
+
+        if self.groups:
+            codes = [
+                self._encode_column(i, columns[group])
+                for i, group in enumerate(self.groups)]
+            dims = [len(values) for values in self._group_values]
+            if np.prod(dims, dtype=np.float64) < 2 ** 62:
+                # A single integer for each tuple of codes.
+                combined = np.ravel_multi_index(codes, dims)
+                unique, first, inverse = np.unique(
+                    combined, return_index=True, return_inverse=True)
+                keys = np.stack(np.unravel_index(unique, dims), axis=1)
+            else:
+                keys, first, inverse = np.unique(
+                    np.stack(codes, axis=1),
+                    axis=0,
+                    return_index=True,
+                    return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            keys = np.zeros((1, 0), dtype=np.int64)
+            first = np.zeros(1, dtype=np.int64)
+            inverse = np.zeros(len(values), dtype=np.int64)
+
+        # Keep the order of first appearance for the new groups.
+        rows = np.empty(len(keys), dtype=np.int64)
+        for position in np.argsort(first, kind='stable'):
+            rows[position] = self._row(tuple(keys[position].tolist()))
+        self._accumulate(rows[inverse], values)
+
+    def _encode_column(self, group_index, column):
+        """Get the codes of all values of a column.
+
+        :param group_index: The index of the group.
+        :type group_index: int
+
+        :param column: The values of the group.
+        :type column: list, numpy.ndarray
+
+        :returns: The codes.
+        :rtype: numpy.ndarray
+        """
+        if not isinstance(column, np.ndarray):
+            # Keep python values, numpy would convert [1, 'a'] to strings.
+            values = np.empty(len(column), dtype=object)
+            values[:] = column
+            column = values
+        try:
+            if column.dtype == object and any(
+                    isinstance(value, (bool, np.bool_)) for value in column):
+                # numpy.unique would merge True and 1.
+                raise TypeError
+            unique, first, inverse = np.unique(
+                column, return_index=True, return_inverse=True)
+        except TypeError:
+            # Values which can not be sorted, like None with strings.
+            return np.fromiter(
+                (self._encode(group_index, value) for value in column),
+                dtype=np.int64,
+                count=len(column))
+        unique = unique.tolist()
+        lookup = np.empty(len(unique), dtype=np.int64)
+        for position in np.argsort(first, kind='stable'):
+            lookup[position] = self._encode(group_index, unique[position])
+        return lookup[inverse.reshape(-1)]
 
     def get_value(self, **kwargs):
         """Return the value for a specific key."""
-        key = tuple(kwargs[group] for group in self.groups)
-        if key not in self.data:
-            self.data[key] = 0
-        return self.data[key]
+        key = []
+        for i, group in enumerate(self.groups):
+            code = self._group_codes[i].get(_group_key(kwargs[group]))
+            if code is None:
+                return 0
+            key.append(code)
+        row = self._index.get(tuple(key))
+        if row is None:
+            return 0
+        return self._values()[row]
 
     def group_values(self, group_name):
         """Return all distinct group values for given group."""
         group_index = self.groups.index(group_name)
-        values = []
-        for key in self.data_keys:
-            if key[group_index] not in values:
-                values.append(key[group_index])
-        return values
+        return list(self._group_values[group_index])
+
+    @property
+    def data(self):
+        """The sum for each group, in the order of first appearance.
+
+        :returns: Dictionary with the tuple of group values as key.
+        :rtype: dict
+        """
+        return dict(zip(self._decoded_keys(), self._values()))
+
+    def _decoded_keys(self):
+        """Return the tuple of group values of each row.
+
+        :returns: List of tuples.
+        :rtype: list
+        """
+        columns = [
+            [values[code] for code in self._keys[:self._size, i].tolist()]
+            for i, values in enumerate(self._group_values)]
+        if not columns:
+            return [()] * self._size
+        return list(zip(*columns))
+
+    def to_pivot(self, **kwargs):
+        """Make a pivot table out of this flat table.
+
+        ..versionadded:: 5.0
+
+        The pivot table is computed from the codes and the accumulators of
+        the flat table, without building the dictionary of data.
+
+        :param kwargs: The arguments of PivotTable.
+        :type kwargs: dict
+
+        :returns: The pivot table.
+        :rtype: PivotTable
+        """
+        return PivotTable(self, **kwargs)
 
     def to_json(self):
         """Return json representation of FlatTable
@@ -91,7 +416,7 @@ class FlatTable():
         :rtype: dict
         """
         list_data = []
-        for key, value in list(self.data.items()):
+        for key, value in zip(self._decoded_keys(), self._values()):
             row = list(key)
             row.append(value)
             list_data.append(row)
@@ -118,7 +443,10 @@ class FlatTable():
             ["primary", "medium", 20]
             ]
         """
-        self.groups = tuple(groups)
+        groups = tuple(groups)
+        if groups != self.groups:
+            self.groups = groups
+            self._reset()
         for item in data:
             kwargs = {}
             for i in range(len(self.groups)):
@@ -210,46 +538,24 @@ class PivotTable():
         if affected_columns is None:
             affected_columns = []
 
-        if len(flat_table.data) == 0:
+        size = flat_table._size
+        if size == 0:
             raise ValueError('No input data')
 
-        if row_field is not None:
-            flat_row_index = flat_table.groups.index(row_field)
-        if column_field is not None:
-            flat_column_index = flat_table.groups.index(column_field)
+        keys = flat_table._keys[:size]
+        values = flat_table._totals()
+
+        # apply filtering
         if filter_field is not None:
             flat_filter_index = flat_table.groups.index(filter_field)
-
-        sums = {}  # key = (row, column), value = sum
-        sums_affected = {}  # key = row, value = sum
-        for flat_key, flat_value in list(flat_table.data.items()):
-            # apply filtering
-            if filter_field is not None:
-                if flat_key[flat_filter_index] != filter_value:
-                    continue
-
-            if column_field is not None:
-                current_value = flat_key[flat_column_index]
-                if current_value in affected_columns:
-                    if row_field is not None:
-                        row_key = flat_key[flat_row_index]
-                    else:
-                        row_key = ''
-
-                    if row_key not in list(sums_affected.keys()):
-                        sums_affected[row_key] = 0
-                    sums_affected[row_key] += flat_value
-
-            if column_field is not None and row_field is not None:
-                key = flat_key[flat_row_index], flat_key[flat_column_index]
-            elif row_field is not None:
-                key = (flat_key[flat_row_index], '')
-            elif column_field is not None:
-                key = ('', flat_key[flat_column_index])
-
-            if key not in sums:
-                sums[key] = 0
-            sums[key] += flat_value
+            filter_code = flat_table._group_codes[flat_filter_index].get(
+                _group_key(filter_value))
+            if filter_code is None:
+                selected = np.zeros(len(keys), dtype=bool)
+            else:
+                selected = keys[:, flat_filter_index] == filter_code
+            keys = keys[selected]
+            values = values[selected]
 
         # TODO: configurable order of rows
         # - undefined
@@ -257,45 +563,66 @@ class PivotTable():
         # - using column's values
         # - custom (using function)
 
-        # determine rows
-
+        # determine rows, the code of a group value is its index
         if row_field is None:
             self.rows = ['']
+            row_index = np.zeros(len(keys), dtype=np.int64)
         else:
             self.rows = flat_table.group_values(row_field)
+            row_index = keys[:, flat_table.groups.index(row_field)]
 
         # determine columns
+        if column_field is not None:
+            flat_column_index = flat_table.groups.index(column_field)
+            column_values = flat_table.group_values(column_field)
+            column_codes = keys[:, flat_column_index]
         if columns is not None:
             self.columns = columns
         elif column_field is None:
             self.columns = ['']
         else:
-            self.columns = flat_table.group_values(column_field)
+            self.columns = column_values
 
-        self.affected_columns = affected_columns
+        if column_field is None:
+            column_index = np.zeros(len(keys), dtype=np.int64)
+        else:
+            # Position of each column value in the columns of the table.
+            lookup = np.array(
+                [self.columns.index(value) if value in self.columns else -1
+                 for value in column_values],
+                dtype=np.int64)
+            column_index = lookup[column_codes]
+            if (column_index < 0).any():
+                missing = column_values[
+                    column_codes[column_index < 0][0]]
+                raise ValueError('%s is not in list' % repr(missing))
 
-        self.total = 0.0
-        self.total_rows = [0.0] * len(self.rows)
-        self.total_columns = [0.0] * len(self.columns)
-        self.data = [[] for i in range(len(self.rows))]
-        for i in range(len(self.rows)):
-            self.data[i] = [0.0] * len(self.columns)
+        self.affected_columns = affected_columns
 
-        for (sum_row, sum_column), sum_value in list(sums.items()):
-            sum_row_index = self.rows.index(sum_row)
-            sum_column_index = self.columns.index(sum_column)
-            self.data[sum_row_index][sum_column_index] = sum_value
+        rows_count = len(self.rows)
+        columns_count = len(self.columns)
+        sums = np.bincount(
+            row_index * columns_count + column_index,
+            weights=values,
+            minlength=rows_count * columns_count).reshape(
+                rows_count, columns_count)
 
-            self.total_rows[sum_row_index] += sum_value
-            self.total_columns[sum_column_index] += sum_value
-            self.total += sum_value
+        self.data = sums.tolist()
+        self.total_rows = sums.sum(axis=1).tolist()
+        self.total_columns = sums.sum(axis=0).tolist()
+        self.total = float(sums.sum())
 
         self.total_rows_affected = [0.0] * len(self.rows)
         self.total_affected = 0.0
-        for row, value in list(sums_affected.items()):
-            self.total_affected += value
-            sum_row_index = self.rows.index(row)
-            self.total_rows_affected[sum_row_index] = value
+        if column_field is not None and affected_columns:
+            affected = np.array(
+                [value in affected_columns for value in column_values],
+                dtype=bool)[column_codes]
+            self.total_rows_affected = np.bincount(
+                row_index[affected],
+                weights=values[affected],
+                minlength=rows_count).tolist()
+            self.total_affected = float(values[affected].sum())
 
         self.total_percent_rows_affected = [0.0] * len(self.rows)
         for row, value in enumerate(self.total_rows_affected):
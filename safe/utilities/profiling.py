@@ -2,15 +2,29 @@
 
 """This module contains logic for performance profiling.
 
-This code was taken from http://stackoverflow.com/a/3620972
+The first version of this code was taken from
+http://stackoverflow.com/a/3620972
 
-"""
+Open steps are kept in an explicit stack per thread, so adding a step to the
+tree is a constant time operation and does not need to inspect the python
+stack. The tree can be exported as JSON or CSV to compare several runs.
 
+"""
 
-import inspect
+import csv
+import json
+import os
+import sys
+import threading
 import time
 from functools import wraps
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
 from safe.utilities.memory_checker import get_free_memory
 from safe.utilities.settings import setting
 
@@ -19,50 +33,180 @@ __license__ = "Creative Commons"
 __email__ = "info@inasafe.org"
 __revision__ = '$Format:%H$'
 
+try:
+    perf_counter_ns = time.perf_counter_ns
+except AttributeError:
+    # Python < 3.7
+    def perf_counter_ns():
+        """Fallback for time.perf_counter_ns.
+
+        :returns: The value of the performance counter in nanoseconds.
+        :rtype: int
+        """
+        return int(time.perf_counter() * 1e9)
+
+# Set INASAFE_PROFILING=0 to not wrap functions at all.
+PROFILING_ENABLED = os.environ.get('INASAFE_PROFILING', '1') != '0'
+
+# Columns of the CSV export.
+PROFILING_COLUMNS = [
+    'path',
+    'function',
+    'depth',
+    'calls',
+    'total_time_ms',
+    'self_time_ms',
+    'memory_used',
+    'peak_rss_kb',
+]
+
+_state = threading.local()
+
+# Runtime switch, see set_profiling_enabled.
+_switch = {'enabled': True}
+
+
+def _current_state():
+    """Get the profiling state of the current thread.
+
+    :returns: The thread local state with the root, the stack of open steps
+        and the memory profile flag.
+    :rtype: threading.local
+    """
+    if not hasattr(_state, 'stack'):
+        _state.root = None
+        _state.stack = []
+        _state.memory_profile = None
+    return _state
+
+
+def _memory_profile():
+    """Get the memory profile flag, read once per run from the settings.
+
+    :returns: True if the memory should be profiled.
+    :rtype: bool
+    """
+    state = _current_state()
+    if state.memory_profile is None:
+        state.memory_profile = bool(
+            setting(key='memory_profile', expected_type=bool))
+    return state.memory_profile
+
+
+def peak_rss():
+    """Get the peak resident set size of the process so far.
+
+    :returns: The peak RSS in KB or None if it is not available.
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Bytes on MacOS, KB on Linux.
+        peak = peak // 1024
+    return peak
+
 
 class Tree():
     """Internal representation of the tree."""
 
-    def __init__(self, key):
-
+    __slots__ = (
+        'key',
+        'parent',
+        'children',
+        '_start_time',
+        '_end_time',
+        '_start_memory',
+        '_end_memory',
+        '_peak_rss',
+    )
+
+    def __init__(self, key, memory_profile=None):
+        """Constructor.
+
+        :param key: Name of the function.
+        :type key: str
+
+        :param memory_profile: If the memory should be profiled. If not
+            provided, the cached setting is used.
+        :type memory_profile: bool
+        """
         # Name of the current function
         self.key = key
         self.parent = None
 
-        # Time of creation
-        self._start_time = time.time()
-
-        # Time at the end.
-        self._end_time = None
-
-        if setting(key='memory_profile', expected_type=bool):
-            # memory at creation
+        # Memory at creation and at termination
+        self._start_memory = None
+        self._end_memory = None
+        if memory_profile is None:
+            memory_profile = _memory_profile()
+        if memory_profile:
             self._start_memory = get_free_memory()
 
-            # memory at termination
-            self._end_memory = None
-
         # Children
         self.children = []
 
+        # Peak resident set size at the end.
+        self._peak_rss = None
+
+        # Time at the end.
+        self._end_time = None
+
+        # Time of creation, in nanoseconds.
+        self._start_time = perf_counter_ns()
+
     def ended(self):
         """We call this method when the function is finished."""
-        self._end_time = time.time()
+        self._end_time = perf_counter_ns()
 
-        if setting(key='memory_profile', expected_type=bool):
+        if self._start_memory is not None:
             self._end_memory = get_free_memory()
 
+        self._peak_rss = peak_rss()
+
+    @property
+    def total_time_ns(self):
+        """The duration of the function, children included.
+
+        ..versionadded:: 5.0
+
+        This property might return None if the function is still running.
+
+        :rtype: int
+        """
+        if self._end_time is None:
+            return None
+        return self._end_time - self._start_time
+
+    @property
+    def self_time_ns(self):
+        """The duration of the function, without its children.
+
+        ..versionadded:: 5.0
+
+        This property might return None if the function is still running.
+
+        :rtype: int
+        """
+        total = self.total_time_ns
+        if total is None:
+            return None
+        children = sum(
+            child.total_time_ns for child in self.children
+            if child.total_time_ns is not None)
+        return max(total - children, 0)
+
     @property
     def elapsed_time(self):
-        """To know the duration of the function.
+        """To know the duration of the function, in seconds.
 
         This property might return None if the function is still running.
         """
-        if self._end_time:
-            elapsed_time = round(self._end_time - self._start_time, 3)
-            return elapsed_time
-        else:
+        total = self.total_time_ns
+        if total is None:
             return None
+        return round(total / 1e9, 3)
 
     @property
     def memory_used(self):
@@ -74,21 +218,45 @@ class Tree():
 
         This function should help to show memory leaks or ram greedy code.
         """
-        if self._end_memory:
-            memory_used = self._end_memory - self._start_memory
-            return memory_used
+        if self._end_memory is not None and self._start_memory is not None:
+            return self._end_memory - self._start_memory
         else:
             return None
 
+    @property
+    def peak_rss(self):
+        """The peak RSS of the process when the function finished, in KB.
+
+        ..versionadded:: 5.0
+
+        This property might return None if the function is still running or
+        if the platform does not provide it.
+        """
+        return self._peak_rss
+
     def append(self, node):
         """To append a new child."""
-        if node.parent == self.key and not self.elapsed_time:
-            self.children.append(node)
-        else:
-            # Recursive call
-            for child in self.children:
-                if not child.elapsed_time:
-                    child.append(node)
+        node.parent = self
+        self.children.append(node)
+
+    def as_dict(self):
+        """Return the tree as a dictionary, recursively.
+
+        ..versionadded:: 5.0
+
+        :returns: The tree with timings in milliseconds.
+        :rtype: dict
+        """
+        return {
+            'function': self.key,
+            'name': str(self),
+            'calls': 1,
+            'total_time_ms': _to_ms(self.total_time_ns),
+            'self_time_ms': _to_ms(self.self_time_ns),
+            'memory_used': self.memory_used,
+            'peak_rss_kb': self.peak_rss,
+            'children': [child.as_dict() for child in self.children],
+        }
 
     def __str__(self):
         # It might be a private function.
@@ -103,40 +271,209 @@ class Tree():
         return step
 
 
-ROOT = None
+def _to_ms(nanoseconds):
+    """Convert nanoseconds to milliseconds.
+
+    :param nanoseconds: The duration or None.
+    :type nanoseconds: int
+
+    :returns: The duration in milliseconds or None.
+    :rtype: float
+    """
+    if nanoseconds is None:
+        return None
+    return round(nanoseconds / 1e6, 3)
 
 
 def profile(fn):
+    """Decorator to add a function as a step in the profiling tree.
+
+    If the environment variable INASAFE_PROFILING is set to 0 when the module
+    is imported, the function is returned as is.
+    """
+    if not PROFILING_ENABLED:
+        return fn
+
     @wraps(fn)
     def with_profiling(*args, **kwargs):
-        global ROOT
-
-        current_frame = inspect.currentframe()
-        parent_frame = inspect.getouterframes(current_frame)[1]
-        parent_name = parent_frame[3]
+        if not _switch['enabled']:
+            return fn(*args, **kwargs)
 
+        state = _current_state()
+        stack = state.stack
         current_step = Tree(fn.__name__)
 
-        if ROOT:
-            current_step.parent = parent_name
-            ROOT.append(current_step)
+        if stack:
+            stack[-1].append(current_step)
+        elif state.root is None:
+            state.root = current_step
         else:
-            ROOT = current_step
+            # A new step started after the root has ended.
+            state.root.append(current_step)
 
-        ret = fn(*args, **kwargs)
-
-        current_step.ended()
-        return ret
+        stack.append(current_step)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            current_step.ended()
+            stack.pop()
 
     return with_profiling
 
 
+def profiling_event(key):
+    """Add an instantaneous step to the profiling tree.
+
+    ..versionadded:: 5.0
+
+    It records something which happened in the current step, a cache hit for
+    instance. The event is exported like a function call, so the number of
+    events is the number of calls.
+
+    :param key: Name of the event.
+    :type key: str
+    """
+    if not PROFILING_ENABLED or not _switch['enabled']:
+        return
+
+    state = _current_state()
+    event = Tree(key, memory_profile=False)
+    event.ended()
+    if state.stack:
+        state.stack[-1].append(event)
+    elif state.root is None:
+        state.root = event
+    else:
+        state.root.append(event)
+
+
+def set_profiling_enabled(enabled):
+    """Switch the profiling on or off at runtime.
+
+    When switched off, decorated functions are called directly without
+    creating any step.
+
+    :param enabled: True to profile functions.
+    :type enabled: bool
+    """
+    _switch['enabled'] = bool(enabled)
+
+
 def profiling_log():
     """Get the profiling logs."""
-    global ROOT
-    return ROOT
+    return _current_state().root
 
 
 def clear_prof_data():
-    global ROOT
-    ROOT = None
+    """Clear the profiling tree of the current thread.
+
+    The memory profile setting will be read again at the next step.
+    """
+    state = _current_state()
+    state.root = None
+    state.stack = []
+    state.memory_profile = None
+
+
+def profiling_rows(tree=None):
+    """Flatten the profiling tree, grouping calls by their path.
+
+    ..versionadded:: 5.0
+
+    Calls of the same function in the same parent are merged: their times
+    are summed, the number of calls is counted and the highest peak RSS is
+    kept.
+
+    :param tree: The tree to flatten. The current tree if not provided.
+    :type tree: Tree
+
+    :returns: List of rows, using PROFILING_COLUMNS as keys, in the order of
+        the first call.
+    :rtype: list
+    """
+    if tree is None:
+        tree = profiling_log()
+    rows = {}
+    if tree is None:
+        return []
+
+    def walk(node, path, depth):
+        path = path + '/' + node.key if path else node.key
+        row = rows.get(path)
+        if row is None:
+            row = {
+                'path': path,
+                'function': node.key,
+                'depth': depth,
+                'calls': 0,
+                'total_time_ms': 0.0,
+                'self_time_ms': 0.0,
+                'memory_used': None,
+                'peak_rss_kb': None,
+            }
+            rows[path] = row
+        row['calls'] += 1
+        if node.total_time_ns is not None:
+            row['total_time_ms'] += node.total_time_ns / 1e6
+            row['self_time_ms'] += node.self_time_ns / 1e6
+        if node.memory_used is not None:
+            row['memory_used'] = (row['memory_used'] or 0) + node.memory_used
+        if node.peak_rss is not None:
+            row['peak_rss_kb'] = max(row['peak_rss_kb'] or 0, node.peak_rss)
+        for child in node.children:
+            walk(child, path, depth + 1)
+
+    walk(tree, '', 0)
+
+    rows = list(rows.values())
+    for row in rows:
+        row['total_time_ms'] = round(row['total_time_ms'], 3)
+        row['self_time_ms'] = round(row['self_time_ms'], 3)
+    return rows
+
+
+def profiling_to_json(path, tree=None):
+    """Export the profiling tree to a JSON file.
+
+    ..versionadded:: 5.0
+
+    :param path: Path of the JSON file.
+    :type path: str
+
+    :param tree: The tree to export. The current tree if not provided.
+    :type tree: Tree
+
+    :returns: The path of the file.
+    :rtype: str
+    """
+    if tree is None:
+        tree = profiling_log()
+    data = {
+        'tree': tree.as_dict() if tree else None,
+        'steps': profiling_rows(tree),
+    }
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+    return path
+
+
+def profiling_to_csv(path, tree=None):
+    """Export the flattened profiling tree to a CSV file.
+
+    ..versionadded:: 5.0
+
+    :param path: Path of the CSV file.
+    :type path: str
+
+    :param tree: The tree to export. The current tree if not provided.
+    :type tree: Tree
+
+    :returns: The path of the file.
+    :rtype: str
+    """
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=PROFILING_COLUMNS)
+        writer.writeheader()
+        for row in profiling_rows(tree):
+            writer.writerow(row)
+    return path
@@ -7,6 +7,31 @@ import json
 from safe.utilities.pivot_table import FlatTable, PivotTable
 
 
+class DictFlatTable():
+    """The FlatTable before its numpy accumulators, to compare outputs."""
+
+    def __init__(self, *args):
+        self.groups = args
+        self.data = {}
+
+    def add_value(self, value, **kwargs):
+        key = tuple(kwargs[group] for group in self.groups)
+        if key not in self.data:
+            self.data[key] = 0
+        self.data[key] += value
+
+    def to_dict(self):
+        list_data = []
+        for key, value in list(self.data.items()):
+            row = list(key)
+            row.append(value)
+            list_data.append(row)
+        return {
+            'groups': self.groups,
+            'data': list_data
+        }
+
+
 class PivotTableTest(unittest.TestCase):
     """Tests for reading and writing of raster and vector data."""
 
@@ -202,6 +227,101 @@ class PivotTableTest(unittest.TestCase):
         self.assertEqual(flat_table.data[('primary', 'high')], 10)
         self.assertEqual(flat_table.data[('primary', 'medium')], 20)
 
+    def test_add_values(self):
+        """Test adding many values at once in the FlatTable."""
+        flat_table = FlatTable("road_type", "hazard")
+        flat_table.add_values(
+            [0, 30, 50, 10, 20, 40],
+            road_type=[
+                'residential', 'residential', 'residential',
+                'primary', 'primary', 'secondary'],
+            hazard=['high', 'medium', 'low', 'high', 'medium', 'low'])
+
+        self.assertEqual(flat_table.to_dict(), self.flat_table.to_dict())
+        self.assertEqual(
+            flat_table.group_values('road_type'),
+            ['residential', 'primary', 'secondary'])
+
+        # Values are summed with the ones added before.
+        flat_table.add_values(
+            [5.5, 4.5],
+            road_type=['primary', 'tertiary'],
+            hazard=['high', None])
+        self.assertEqual(flat_table.get_value(
+            road_type='primary', hazard='high'), 15.5)
+        self.assertEqual(flat_table.get_value(
+            road_type='tertiary', hazard=None), 4.5)
+        self.assertEqual(flat_table.get_value(
+            road_type='tertiary', hazard='high'), 0)
+        self.assertEqual(
+            flat_table.group_values('hazard'),
+            ['high', 'medium', 'low', None])
+
+    def test_same_output_as_dictionary(self):
+        """Test the output is the same as the FlatTable with a dictionary."""
+        rows = [
+            (3, 'residential', 'high'),
+            (4, 'residential', 'high'),
+            (2.5, 'primary', 'high'),
+            (1, 'primary', 'high'),
+            (0.5, 'secondary', 'low'),
+            (True, 'secondary', 'medium'),
+            (True, 'secondary', 'medium'),
+            (7, None, 'low'),
+        ]
+        expected = DictFlatTable('road_type', 'hazard')
+        flat_table = FlatTable('road_type', 'hazard')
+        for value, road_type, hazard in rows:
+            expected.add_value(value, road_type=road_type, hazard=hazard)
+            flat_table.add_value(value, road_type=road_type, hazard=hazard)
+        self.assertEqual(flat_table.to_dict(), expected.to_dict())
+        self.assertEqual(flat_table.to_json(), json.dumps(expected.to_dict()))
+
+        values, road_types, hazards = list(zip(*rows))
+        flat_table = FlatTable('road_type', 'hazard')
+        flat_table.add_values(
+            list(values), road_type=road_types, hazard=hazards)
+        self.assertEqual(flat_table.to_json(), json.dumps(expected.to_dict()))
+
+        # Integer sums stay integers.
+        data = flat_table.data
+        self.assertIsInstance(data[('residential', 'high')], int)
+        self.assertEqual(data[('residential', 'high')], 7)
+        self.assertIsInstance(data[('primary', 'high')], float)
+        self.assertEqual(data[('secondary', 'medium')], 2)
+
+    def test_boolean_groups(self):
+        """Test True and 1 are different groups."""
+        for add_values in [False, True]:
+            flat_table = FlatTable('flag')
+            if add_values:
+                flat_table.add_values([1, 2, 4], flag=[True, 1, True])
+            else:
+                flat_table.add_value(1, flag=True)
+                flat_table.add_value(2, flag=1)
+                flat_table.add_value(4, flag=True)
+            self.assertEqual(flat_table.group_values('flag'), [True, 1])
+            self.assertEqual(
+                flat_table.to_dict()['data'], [[True, 5], [1, 2]])
+            self.assertEqual(flat_table.get_value(flag=True), 5)
+            self.assertEqual(flat_table.get_value(flag=1), 2)
+
+    def test_to_pivot(self):
+        """Test the pivot table made by the FlatTable."""
+        pivot_table = self.flat_table.to_pivot(
+            row_field='road_type',
+            column_field='hazard',
+            affected_columns=self.affected_columns)
+        expected = PivotTable(
+            self.flat_table,
+            row_field='road_type',
+            column_field='hazard',
+            affected_columns=self.affected_columns)
+
+        self.assertEqual(pivot_table.data, expected.data)
+        self.assertEqual(pivot_table.total_affected, 60)
+        self.assertEqual(pivot_table.total_rows_affected, [30, 30, 0])
+
 
 if __name__ == '__main__':
     suite = unittest.makeSuite(PivotTableTest, 'test')
@@ -0,0 +1,142 @@
+# coding=utf-8
+"""Tests for the profiling module."""
+
+import csv
+import json
+import os
+import unittest
+
+from safe.common.utilities import unique_filename
+from safe.utilities.profiling import (
+    profile,
+    profiling_log,
+    profiling_event,
+    clear_prof_data,
+    profiling_rows,
+    profiling_to_csv,
+    profiling_to_json,
+    set_profiling_enabled,
+)
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+
+@profile
+def _leaf():
+    """A profiled function without children."""
+    return 1
+
+
+@profile
+def _analysis():
+    """A profiled function calling another one several times."""
+    return sum(_leaf() for _ in range(3))
+
+
+@profile
+def _cached():
+    """A profiled function recording events."""
+    profiling_event('cache_miss')
+    profiling_event('cache_hit')
+    profiling_event('cache_hit')
+
+
+@profile
+def _failing():
+    """A profiled function raising an exception."""
+    raise ValueError
+
+
+@profile
+def _recovering():
+    """A profiled function calling another one after a failing one."""
+    try:
+        _failing()
+    except ValueError:
+        pass
+    return _leaf()
+
+
+class TestProfiling(unittest.TestCase):
+    """Test the profiling tree."""
+
+    def setUp(self):
+        """Clear the profiling tree."""
+        clear_prof_data()
+
+    def tearDown(self):
+        """Switch on the profiling again."""
+        set_profiling_enabled(True)
+        clear_prof_data()
+
+    def test_profiling_tree(self):
+        """Test the structure and the export of the profiling tree."""
+        self.assertEqual(_analysis(), 3)
+
+        tree = profiling_log()
+        self.assertEqual(tree.key, '_analysis')
+        self.assertEqual(str(tree), 'Analysis')
+        self.assertEqual(len(tree.children), 3)
+        for child in tree.children:
+            self.assertIs(child.parent, tree)
+            self.assertEqual(child.children, [])
+            self.assertIsNotNone(child.elapsed_time)
+        self.assertGreaterEqual(tree.total_time_ns, tree.self_time_ns)
+
+        rows = profiling_rows()
+        self.assertEqual(
+            [row['path'] for row in rows], ['_analysis', '_analysis/_leaf'])
+        self.assertEqual([row['calls'] for row in rows], [1, 3])
+        self.assertEqual([row['depth'] for row in rows], [0, 1])
+
+        path = unique_filename(suffix='.json')
+        profiling_to_json(path)
+        with open(path) as json_file:
+            data = json.load(json_file)
+        self.assertEqual(data['tree']['function'], '_analysis')
+        self.assertEqual(len(data['tree']['children']), 3)
+        self.assertEqual(len(data['steps']), 2)
+        os.remove(path)
+
+        path = unique_filename(suffix='.csv')
+        profiling_to_csv(path)
+        with open(path) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(rows[1]['path'], '_analysis/_leaf')
+        self.assertEqual(rows[1]['calls'], '3')
+        os.remove(path)
+
+    def test_profiling_exception(self):
+        """Test that a step is closed even if the function fails."""
+        with self.assertRaises(ValueError):
+            _failing()
+        self.assertIsNotNone(profiling_log().elapsed_time)
+
+        # The failing step is closed, the next step is its sibling and not
+        # one of its children.
+        clear_prof_data()
+        _recovering()
+        self.assertEqual(profiling_log().key, '_recovering')
+        self.assertEqual(
+            [child.key for child in profiling_log().children],
+            ['_failing', '_leaf'])
+        self.assertEqual(profiling_log().children[0].children, [])
+
+    def test_profiling_event(self):
+        """Test that events are recorded in the current step."""
+        _cached()
+        rows = profiling_rows()
+        self.assertEqual(
+            [row['path'] for row in rows],
+            ['_cached', '_cached/cache_miss', '_cached/cache_hit'])
+        self.assertEqual([row['calls'] for row in rows], [1, 1, 2])
+        self.assertEqual(str(profiling_log().children[1]), 'Cache hit')
+
+    def test_profiling_disabled(self):
+        """Test that nothing is recorded when the profiling is off."""
+        set_profiling_enabled(False)
+        self.assertEqual(_analysis(), 3)
+        self.assertIsNone(profiling_log())
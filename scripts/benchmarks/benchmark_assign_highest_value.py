@@ -0,0 +1,129 @@
+# coding=utf-8
+"""Benchmark of the spatial join used by assign_highest_value.
+
+The bulk spatial join is compared with the previous implementation, which
+visited the hazard areas class by class and tested each exposure feature
+found by a QgsSpatialIndex with the prepared geometry of the area. Both must
+assign the same hazard area to each exposure feature. The exposure features
+can be copied many times to get layers as big as real analyses.
+
+Usage, from the root of the repository, with QGIS python libraries in the
+PYTHONPATH::
+
+    python scripts/benchmarks/benchmark_assign_highest_value.py --copies 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from safe.definitions.constants import INASAFE_TEST  # NOQA
+from safe.test.utilities import get_qgis_app, standard_data_path  # NOQA
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from qgis.core import QgsFeature, QgsGeometry, QgsSpatialIndex  # NOQA
+
+from safe.definitions.fields import hazard_class_field  # NOQA
+from safe.definitions.hazard_classifications import (  # NOQA
+    generic_hazard_classes, not_exposed_class)
+from safe.gis.tools import load_layer  # NOQA
+from safe.gis.vector.spatial_join import highest_class_join  # NOQA
+from safe.utilities.metadata import read_iso19115_metadata  # NOQA
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+HAZARD = ('gisv4', 'intermediate', 'aggregate_classified_hazard.geojson')
+EXPOSURES = [
+    ('gisv4', 'exposure', 'buildings.geojson'),
+    ('gisv4', 'exposure', 'building-points.geojson'),
+]
+
+
+def spatial_index_join(zones, ranks, geometries):
+    """The join of the previous implementation of assign_highest_value.
+
+    :param zones: The hazard areas.
+    :type zones: list
+
+    :param ranks: The rank of each hazard area, -1 to ignore it.
+    :type ranks: list
+
+    :param geometries: The exposure geometries.
+    :type geometries: list
+
+    :returns: The index of the hazard area of each geometry, -1 if none.
+    :rtype: list
+    """
+    features = []
+    spatial_index = QgsSpatialIndex()
+    for index, geometry in enumerate(geometries):
+        feature = QgsFeature(index)
+        feature.setGeometry(geometry)
+        spatial_index.insertFeature(feature)
+        features.append(feature)
+
+    result = [-1] * len(geometries)
+    for rank in sorted(set(rank for rank in ranks if rank >= 0)):
+        for zone_index, zone in enumerate(zones):
+            if ranks[zone_index] != rank:
+                continue
+            engine = QgsGeometry.createGeometryEngine(zone.constGet())
+            engine.prepareGeometry()
+            for index in spatial_index.intersects(zone.boundingBox()):
+                if engine.intersects(geometries[index].constGet()):
+                    result[index] = zone_index
+                    spatial_index.deleteFeature(features[index])
+    return result
+
+
+def main():
+    """Run the benchmark and print the durations."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--copies', type=int, default=1,
+        help='Number of copies of each exposure feature.')
+    arguments = parser.parse_args()
+
+    hazard_path = standard_data_path(*HAZARD)
+    hazard = load_layer(hazard_path)[0]
+    keywords = read_iso19115_metadata(hazard_path)
+    hazard_field = keywords['inasafe_fields'][hazard_class_field['key']]
+    levels = [level['key'] for level in generic_hazard_classes['classes']]
+    levels.append(not_exposed_class['key'])
+    zones = []
+    ranks = []
+    for area in hazard.getFeatures():
+        zones.append(area.geometry())
+        value = area[hazard_field]
+        ranks.append(levels.index(value) if value in levels else -1)
+
+    print('{:<32}{:>10}{:>16}{:>16}{:>10}'.format(
+        'exposure', 'features', 'previous (s)', 'bulk (s)', 'same'))
+    for exposure in EXPOSURES:
+        layer = load_layer(standard_data_path(*exposure))[0]
+        geometries = [
+            feature.geometry() for feature in layer.getFeatures()
+        ] * arguments.copies
+
+        start = time.time()
+        expected = spatial_index_join(zones, ranks, geometries)
+        previous_time = time.time() - start
+
+        start = time.time()
+        result = highest_class_join(zones, ranks, geometries)
+        bulk_time = time.time() - start
+
+        print('{:<32}{:>10}{:>16.3f}{:>16.3f}{:>10}'.format(
+            exposure[-1], len(geometries), previous_time, bulk_time,
+            str(expected == result.tolist())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Benchmark of the gaussian smoothing used for ShakeMaps.
+
+It compares safe.gis.raster.contour.convolve with the previous
+implementation, which looped over every point in python, on a 1000x1000
+grid.
+
+Usage, from the root of the repository, with QGIS python libraries in the
+PYTHONPATH::
+
+    python scripts/benchmarks/benchmark_convolve.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from safe.gis.raster.contour import convolve, gaussian_kernel  # NOQA
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+SIZE = 1000
+SIGMA = 0.9
+
+
+def loop_convolve(input, weights):
+    """The previous convolution, looping over every point of the input.
+
+    :param input: The 2 dimensional array.
+    :type input: numpy.ndarray
+
+    :param weights: The kernel.
+    :type weights: numpy.ndarray
+
+    :returns: The convolved array.
+    :rtype: numpy.ndarray
+    """
+    output = np.copy(input)
+    half = weights.shape[0] // 2
+    padded = np.pad(input, half, mode='symmetric')
+    size = weights.shape[0]
+    for i in range(input.shape[0]):
+        for j in range(input.shape[1]):
+            overlapping = padded[i:i + size, j:j + size]
+            output[i, j] = np.sum(weights * overlapping)
+    return output
+
+
+def main():
+    """Run the benchmark and print the durations."""
+    grid = np.random.RandomState(0).random_sample((SIZE, SIZE)) * 10
+    weights = gaussian_kernel(SIGMA)
+
+    start = time.time()
+    vectorized = convolve(grid, weights)
+    vectorized_time = time.time() - start
+
+    start = time.time()
+    looped = loop_convolve(grid, weights)
+    looped_time = time.time() - start
+
+    print('Grid of {size}x{size}, sigma {sigma}'.format(
+        size=SIZE, sigma=SIGMA))
+    print('Vectorized: {:.3f} s'.format(vectorized_time))
+    print('Loop: {:.3f} s'.format(looped_time))
+    print('Speedup: {:.0f}x'.format(looped_time / vectorized_time))
+    print('Max difference: {:.2e}'.format(np.abs(vectorized - looped).max()))
+
+
+if __name__ == '__main__':
+    main()
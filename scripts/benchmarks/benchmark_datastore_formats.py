@@ -0,0 +1,146 @@
+# coding=utf-8
+"""Benchmark of the vector formats of the folder datastore.
+
+Each output layer of the test data is written to a folder datastore in every
+supported vector format, then read again like the impact function does:
+the layer is loaded from the datastore and all its features are fetched.
+The features can be copied many times to get layers as big as real analyses.
+
+Usage, from the root of the repository, with QGIS python libraries in the
+PYTHONPATH::
+
+    python scripts/benchmarks/benchmark_datastore_formats.py --copies 100
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from tempfile import mkdtemp
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from safe.definitions.constants import INASAFE_TEST  # NOQA
+from safe.test.utilities import get_qgis_app, standard_data_path  # NOQA
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app(qsetting=INASAFE_TEST)
+
+from safe.datastore.folder import Folder, VECTOR_EXTENSIONS  # NOQA
+from safe.gis.vector.tools import create_memory_layer  # NOQA
+from safe.gis.tools import load_layer  # NOQA
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+# Outputs of the impact function in the test data.
+OUTPUTS = [
+    ('gisv4', 'impacts', 'building-points-classified-vector.geojson'),
+    ('gisv4', 'intermediate', 'aggregate_classified_hazard_summary.geojson'),
+    ('gisv4', 'intermediate', 'analysis.geojson'),
+    ('gisv4', 'intermediate', 'summaries',
+     'land_cover_exposure_summary.geojson'),
+    ('gisv4', 'intermediate', 'summaries',
+     'multi_exposure_aggregation_buildings.geojson'),
+]
+
+
+def copy_features(layer, copies):
+    """Copy the features of a layer many times in a memory layer.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param copies: Number of copies of each feature.
+    :type copies: int
+
+    :returns: The memory layer.
+    :rtype: QgsVectorLayer
+    """
+    memory = create_memory_layer(
+        layer.name(), layer.geometryType(), layer.crs(), layer.fields())
+    features = list(layer.getFeatures())
+    provider = memory.dataProvider()
+    for _ in range(copies):
+        provider.addFeatures(features)
+    return memory
+
+
+def write_and_reload(layer, extension):
+    """Write a layer in a new folder datastore and read it again.
+
+    :param layer: The vector layer.
+    :type layer: QgsVectorLayer
+
+    :param extension: The vector format of the datastore.
+    :type extension: str
+
+    :returns: The write and the reload durations in seconds and the size of
+        the files in bytes.
+    :rtype: (float, float, int)
+    """
+    path = mkdtemp()
+    try:
+        data_store = Folder(path)
+        data_store.default_vector_format = extension
+
+        start = time.time()
+        result, name = data_store.add_layer(layer, 'output')
+        write_time = time.time() - start
+        if not result:
+            raise Exception(name)
+
+        start = time.time()
+        reloaded = data_store.layer(name)
+        for feature in reloaded.getFeatures():
+            pass
+        reload_time = time.time() - start
+        del reloaded
+
+        size = sum(
+            os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        return write_time, reload_time, size
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    """Run the benchmark and print the durations."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--copies', type=int, default=1,
+        help='Number of copies of each feature.')
+    arguments = parser.parse_args()
+
+    extensions = []
+    for extension in VECTOR_EXTENSIONS:
+        data_store = Folder(mkdtemp())
+        data_store.default_vector_format = extension
+        if data_store.default_vector_format == extension:
+            extensions.append(extension)
+        shutil.rmtree(data_store.uri_path, ignore_errors=True)
+
+    print('{:<48}{:>9}{:>10}{:>10}{:>10}{:>10}'.format(
+        'layer', 'format', 'features', 'write (s)', 'read (s)', 'size (kB)'))
+    totals = dict((extension, 0.0) for extension in extensions)
+    for output in OUTPUTS:
+        layer = load_layer(standard_data_path(*output))[0]
+        layer = copy_features(layer, arguments.copies)
+        for extension in extensions:
+            write_time, reload_time, size = write_and_reload(
+                layer, extension)
+            totals[extension] += write_time + reload_time
+            print('{:<48}{:>9}{:>10}{:>10.3f}{:>10.3f}{:>10.0f}'.format(
+                output[-1], extension, layer.featureCount(), write_time,
+                reload_time, size / 1024.0))
+
+    print('')
+    print('Total write and read time per format:')
+    for extension in sorted(extensions, key=lambda e: totals[e]):
+        print('{:<10}{:>10.3f} s'.format(extension, totals[extension]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Micro-benchmark for the definitions lookup.
+
+It shows that the cost of ``definition()`` is the same for the first and the
+last definition of ``safe.definitions``, whereas scanning
+``dir(safe.definitions)`` grows with the position of the definition.
+
+Usage, from the root of the repository, with QGIS python libraries in the
+PYTHONPATH::
+
+    python scripts/benchmarks/benchmark_definitions.py
+"""
+
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from safe import definitions  # NOQA
+from safe.definitions.utilities import definition  # NOQA
+
+__copyright__ = "Copyright 2018, The InaSAFE Project"
+__license__ = "GPL version 3"
+__email__ = "info@inasafe.org"
+__revision__ = '$Format:%H$'
+
+NUMBER = 1000
+
+
+def scan_definition(keyword, key=None):
+    """Lookup as it was done before the registry, by scanning definitions.
+
+    :param keyword: A keyword key.
+    :type keyword: str
+
+    :param key: A specific key for a deeper search
+    :type key: str
+
+    :returns: The definition or None.
+    :rtype: dict, None
+    """
+    for item in dir(definitions):
+        if not item.startswith("__"):
+            var = getattr(definitions, item)
+            if isinstance(var, dict):
+                if var.get('key') == keyword or var.get(key) == keyword:
+                    return var
+    return None
+
+
+def main():
+    """Run the benchmark and print the time per call."""
+    keys = []
+    for item in dir(definitions):
+        var = getattr(definitions, item)
+        if isinstance(var, dict) and isinstance(var.get('key'), str):
+            keys.append(var['key'])
+
+    samples = [
+        ('first', keys[0]),
+        ('middle', keys[len(keys) // 2]),
+        ('last', keys[-1]),
+        ('missing', 'Mega flux capacitor'),
+    ]
+
+    print('{count} definitions, {number} calls per lookup'.format(
+        count=len(keys), number=NUMBER))
+    print('{:<10}{:>20}{:>20}'.format(
+        'position', 'registry (us)', 'scan (us)'))
+    for position, key in samples:
+        registry = timeit(lambda: definition(key), number=NUMBER)
+        scan = timeit(lambda: scan_definition(key), number=NUMBER)
+        print('{:<10}{:>20.2f}{:>20.2f}'.format(
+            position, registry * 1e6 / NUMBER, scan * 1e6 / NUMBER))
+
+
+if __name__ == '__main__':
+    main()